@@ -23,6 +23,11 @@ class ADMETAnalysisRequest(BaseModel):
     include_svg: bool = True
 
 
+class WashBatchRequest(BaseModel):
+    """Request model for batch SMILES standardization"""
+    smiles: List[str]
+
+
 class BatchExportRequest(BaseModel):
     """Request model for batch CSV export"""
     results: List[dict]
@@ -397,7 +402,7 @@ async def wash_molecule(
     admet_service = Depends(get_admet_service)
 ):
     """
-    Standardize SMILES via ADMETlab washmol.
+    Standardize SMILES locally (salt stripping, neutralization, tautomers).
     
     - **smiles**: Input SMILES
     - Returns: Standardized SMILES
@@ -416,3 +421,37 @@ async def wash_molecule(
             status_code=500,
             detail=f"Molecule washing failed: {str(e)}"
         )
+
+
+@router.post("/wash/batch")
+async def wash_molecules_batch(
+    request: WashBatchRequest,
+    admet_service = Depends(get_admet_service)
+):
+    """
+    Standardize many SMILES in one call.
+
+    - **smiles**: List of input SMILES (max 10,000)
+    - Returns: Standardized SMILES in input order
+    """
+    if not request.smiles:
+        raise HTTPException(400, "No SMILES provided")
+    if len(request.smiles) > 10000:
+        raise HTTPException(400, "Too many SMILES (max 10,000 per request)")
+
+    try:
+        washed = await admet_service.wash_batch(request.smiles)
+
+        return {
+            "count": len(washed),
+            "results": [
+                {"original": original, "washed": cleaned, "changed": original != cleaned}
+                for original, cleaned in zip(request.smiles, washed)
+            ]
+        }
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Batch molecule washing failed: {str(e)}"
+        )
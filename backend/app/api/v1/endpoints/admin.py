@@ -45,6 +45,30 @@ async def get_system_stats(
         )
 
 
+@router.get("/stats/activity", response_model=List[Dict[str, Any]])
+async def get_activity_timeseries(
+    days: int = Query(30, ge=1, le=365),
+    current_admin: User = Depends(get_current_admin_user),
+    admin_service: AdminService = Depends(get_admin_service)
+):
+    """
+    Get daily activity counts
+    
+    Requires admin access. Returns one entry per day with the number of new
+    users, conversations, messages and document chunks.
+    
+    Query parameters:
+    - **days**: Number of days to return, ending today
+    """
+    try:
+        return await admin_service.get_activity_timeseries(days)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get activity timeseries: {str(e)}"
+        )
+
+
 @router.get("/users", response_model=List[UserProfile])
 async def get_all_users(
     limit: Optional[int] = Query(None, ge=1, le=1000),
@@ -263,6 +287,9 @@ async def get_migration_status(
 async def run_migration(
     max_chunks: Optional[int] = Query(None, ge=1, le=10000),
     batch_size: Optional[int] = Query(None, ge=1, le=1000),
+    run_id: str = Query("default", min_length=1, max_length=100),
+    dual_write: bool = Query(False),
+    reset: bool = Query(False),
     current_admin: User = Depends(get_current_admin_user),
     db: Client = Depends(get_db)
 ):
@@ -270,10 +297,14 @@ async def run_migration(
     Run embedding migration
     
     Requires admin access. Migrates embeddings from hash-based to Mistral embeddings.
+    Progress is persisted per run, so calling again resumes where the last call stopped.
     
     Query parameters:
     - **max_chunks**: Maximum number of chunks to migrate (optional)
     - **batch_size**: Batch size for migration (optional)
+    - **run_id**: Name of the run to start or resume
+    - **dual_write**: Stage new embeddings next to the old ones until cutover
+    - **reset**: Start the run over from the first chunk
     """
     try:
         migration_service = get_migration_service(db)
@@ -289,7 +320,10 @@ async def run_migration(
         # Run migration
         result = await migration_service.run_migration(
             max_chunks=max_chunks,
-            batch_size=batch_size
+            batch_size=batch_size,
+            run_id=run_id,
+            dual_write=dual_write,
+            reset=reset
         )
         
         return result
@@ -303,6 +337,26 @@ async def run_migration(
         )
 
 
+@router.post("/migration/cutover", response_model=Dict[str, Any])
+async def cutover_migration(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Client = Depends(get_db)
+):
+    """
+    Switch search to dual-written embeddings
+    
+    Requires admin access. Run after a dual_write migration has finished.
+    """
+    try:
+        migration_service = get_migration_service(db)
+        return await migration_service.cutover()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to cut over embeddings: {str(e)}"
+        )
+
+
 @router.post("/migration/validate", response_model=Dict[str, Any])
 async def validate_migration(
     current_admin: User = Depends(get_current_admin_user),
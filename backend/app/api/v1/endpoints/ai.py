@@ -4,7 +4,7 @@ AI Chat API endpoints
 FULLY DECOUPLED: Uses ServiceContainer for all service access.
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
 from fastapi.responses import StreamingResponse, Response
@@ -252,9 +252,14 @@ async def chat_stream(
                     yield "data: " + json.dumps({"text": "🔬 Analyzing data...\n\n"}) + "\n\n"
 
                     full_context = (context or "")
-                    result = await lab_service.generate_report(chat_request.message, full_context, "Standard", None)
-                    if result.get("error"): yield "data: " + json.dumps({"text": f"❌ Error: {result.get('error')}"}) + "\n\n"
-                    else: yield "data: " + json.dumps({"text": result.get("full_report", "")}) + "\n\n"
+                    result = {}
+                    # Sections run concurrently; markdown arrives in document order as it becomes ready
+                    async for event in lab_service.generate_report_stream(chat_request.message, full_context, "Standard", None):
+                        if event["type"] == "markdown":
+                            yield "data: " + json.dumps({"text": event["text"]}) + "\n\n"
+                        elif event["type"] == "complete":
+                            result = event["report"]
+                    if result.get("error"): yield "data: " + json.dumps({"text": f"\n\n❌ Error: {result.get('error')}"}) + "\n\n"
 
                     # Create the branch in assistant_responses instead of messages
                     if saved_msg:
@@ -373,6 +378,21 @@ async def get_available_modes(
         )
 
 
+def _make_image_analyzer(db: Client):
+    """Image analyzer injected into document processing (avoids circular import with AIService)"""
+    async def image_analyzer(image_bytes: bytes) -> str:
+        try:
+            from app.services.ai import AIService
+            ai_service_temp = AIService(db)
+            b64_str = base64.b64encode(image_bytes).decode('utf-8')
+            data_url = f"data:image/jpeg;base64,{b64_str}"
+            return await ai_service_temp.analyze_image(data_url)
+        except Exception as e:
+            logger.error(f"Image analysis failed: {e}")
+            return ""
+    return image_analyzer
+
+
 @router.post("/documents/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     conversation_id: UUID,
@@ -434,26 +454,13 @@ async def upload_document(
                 }
             )
         
-        # Create image analyzer function (injected to avoid circular dependency)
-        async def image_analyzer(image_bytes: bytes) -> str:
-            """Local image analyzer to avoid circular import with AIService"""
-            try:
-                from app.services.ai import AIService
-                ai_service_temp = AIService(chat_service.db)
-                b64_str = base64.b64encode(image_bytes).decode('utf-8')
-                data_url = f"data:image/jpeg;base64,{b64_str}"
-                return await ai_service_temp.analyze_image(data_url)
-            except Exception as e:
-                logger.error(f"Image analysis failed: {e}")
-                return ""
-
         # Process document WITH image analyzer injected
         result = await rag_service.process_uploaded_file(
             file_content=file_content,
             filename=file.filename or "unknown",
             conversation_id=conversation_id,
             user_id=current_user.id,
-            image_analyzer=image_analyzer  # Injected dependency
+            image_analyzer=_make_image_analyzer(chat_service.db)  # Injected dependency
         )
         
         return result
@@ -481,6 +488,7 @@ async def upload_document(
 async def upload_multiple_documents(
     conversation_id: UUID,
     files: List[UploadFile] = File(...),
+    stream: bool = False,
     current_user: User = Depends(get_current_user),
     rag_service: EnhancedRAGService = Depends(get_rag_service),
     chat_service: ChatService = Depends(get_chat_service)
@@ -490,7 +498,11 @@ async def upload_multiple_documents(
     
     - **conversation_id**: Conversation to associate the documents with
     - **files**: List of document files (PDF, DOCX, TXT, PPTX, XLSX, CSV, SDF, images)
+    - **stream**: If true, respond with server-sent events: one "file_progress"
+      event per file and stage, then a "summary" event
     
+    Files are extracted concurrently and their chunks share embedding
+    batches and one bulk insert. A failing file does not affect the others.
     Returns summary of all uploads with individual results
     """
     try:
@@ -508,97 +520,107 @@ async def upload_multiple_documents(
                 detail="No files provided"
             )
         
-        # Process each file
-        results = []
-        successful_count = 0
-        failed_count = 0
-        total_chunks = 0
+        # Validate each file up front; only valid files enter the pipeline
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        accepted: List[Tuple[int, bytes, str]] = []
         max_size = 10 * 1024 * 1024  # 10MB per file
         
-        for file in files:
-            try:
-                # Read file content
-                file_content = await file.read()
-                
-                # Validate file size
-                if len(file_content) > max_size:
-                    results.append({
-                        "filename": file.filename,
-                        "success": False,
-                        "message": f"File too large ({len(file_content)} bytes). Maximum size is 10MB.",
-                        "chunk_count": 0
-                    })
-                    failed_count += 1
-                    continue
-                
-                if len(file_content) == 0:
-                    results.append({
-                        "filename": file.filename,
-                        "success": False,
-                        "message": "File is empty (0 bytes)",
-                        "chunk_count": 0
-                    })
-                    failed_count += 1
-                    continue
-                
-                # Check if format is supported
-                if not rag_service.document_loader.is_supported_format(file.filename or "unknown"):
-                    from pathlib import Path
-                    file_extension = Path(file.filename or "unknown").suffix.lower()
-                    supported_formats = rag_service.document_loader.get_supported_formats()
-                    
-                    results.append({
-                        "filename": file.filename,
-                        "success": False,
-                        "message": f"Unsupported file format '{file_extension}'. Supported: {', '.join(supported_formats)}",
-                        "chunk_count": 0
-                    })
-                    failed_count += 1
-                    continue
-                
-                # Process document
-                result = await rag_service.process_uploaded_file(
-                    file_content=file_content,
-                    filename=file.filename or "unknown",
-                    conversation_id=conversation_id,
-                    user_id=current_user.id
-                )
-                
-                results.append({
-                    "filename": file.filename,
+        for i, file in enumerate(files):
+            file_content = await file.read()
+            filename = file.filename or "unknown"
+            
+            if len(file_content) > max_size:
+                message = f"File too large ({len(file_content)} bytes). Maximum size is 10MB."
+            elif len(file_content) == 0:
+                message = "File is empty (0 bytes)"
+            elif not rag_service.document_loader.is_supported_format(filename):
+                from pathlib import Path
+                file_extension = Path(filename).suffix.lower()
+                supported_formats = rag_service.document_loader.get_supported_formats()
+                message = f"Unsupported file format '{file_extension}'. Supported: {', '.join(supported_formats)}"
+            else:
+                accepted.append((i, file_content, filename))
+                continue
+            
+            results[i] = {
+                "filename": file.filename,
+                "success": False,
+                "message": message,
+                "chunk_count": 0
+            }
+        
+        async def run_pipeline(progress_callback=None):
+            async def on_progress(event):
+                # Report against the position in the uploaded list
+                event["index"] = accepted[event["index"]][0]
+                await progress_callback(event)
+            
+            processed = await rag_service.process_uploaded_files(
+                files=[(content, filename) for _, content, filename in accepted],
+                conversation_id=conversation_id,
+                user_id=current_user.id,
+                image_analyzer=_make_image_analyzer(chat_service.db),
+                progress_callback=on_progress if progress_callback else None
+            )
+            for (i, _, _), result in zip(accepted, processed):
+                results[i] = {
+                    "filename": files[i].filename,
                     "success": result.success,
                     "message": result.message,
                     "chunk_count": result.chunk_count,
                     "processing_time": result.processing_time,
                     "warnings": result.warnings,
+                    "errors": result.errors,
                     "file_info": result.file_info
-                })
-                
-                if result.success:
-                    successful_count += 1
-                    total_chunks += result.chunk_count
+                }
+            
+            successful_count = sum(1 for r in results if r["success"])
+            failed_count = len(files) - successful_count
+            return {
+                "success": successful_count > 0,
+                "message": f"Processed {len(files)} files: {successful_count} successful, {failed_count} failed",
+                "total_files": len(files),
+                "successful_count": successful_count,
+                "failed_count": failed_count,
+                "total_chunks": sum(r["chunk_count"] for r in results if r["success"]),
+                "results": results
+            }
+        
+        if not stream:
+            return await run_pipeline()
+        
+        async def generate_stream():
+            events: asyncio.Queue = asyncio.Queue()
+            
+            for i, result in enumerate(results):
+                if result is not None:
+                    yield f"data: {json.dumps({'type': 'file_progress', 'index': i, 'filename': result['filename'], 'stage': 'failed', 'message': result['message']})}\n\n"
+            
+            pipeline = asyncio.create_task(run_pipeline(events.put))
+            while not (pipeline.done() and events.empty()):
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({getter, pipeline}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield f"data: {json.dumps(getter.result(), default=str)}\n\n"
                 else:
-                    failed_count += 1
-                    
+                    getter.cancel()
+            
+            try:
+                summary = pipeline.result()
+                yield f"data: {json.dumps({'type': 'summary', **summary}, default=str)}\n\n"
             except Exception as e:
-                results.append({
-                    "filename": file.filename,
-                    "success": False,
-                    "message": f"Error processing file: {str(e)}",
-                    "chunk_count": 0
-                })
-                failed_count += 1
+                logger.error(f"Multiple upload error: {e}")
+                yield f"data: {json.dumps({'type': 'error', 'message': f'Failed to process multiple documents: {str(e)}'})}\n\n"
+            yield "data: [DONE]\n\n"
         
-        # Return summary
-        return {
-            "success": successful_count > 0,
-            "message": f"Processed {len(files)} files: {successful_count} successful, {failed_count} failed",
-            "total_files": len(files),
-            "successful_count": successful_count,
-            "failed_count": failed_count,
-            "total_chunks": total_chunks,
-            "results": results
-        }
+        return StreamingResponse(
+            generate_stream(),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive"
+            }
+        )
         
     except HTTPException:
         raise
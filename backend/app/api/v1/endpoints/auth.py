@@ -104,12 +104,12 @@ async def login(
         
         # Update last_login timestamp
         try:
-            from app.core.database import get_db
+            from app.core.database import get_db, async_db_execute
             from datetime import datetime
             db = get_db()
-            db.table("users").update({
+            await async_db_execute(lambda: db.table("users").update({
                 "last_login": datetime.utcnow().isoformat()
-            }).eq("id", str(user.id)).execute()
+            }).eq("id", str(user.id)).execute())
         except Exception as e:
             print(f"⚠️ Failed to update last_login: {e}")
         
@@ -200,12 +200,12 @@ async def get_current_user(
         # Verify token
         token_data = auth_service.verify_token(credentials.credentials)
         
-        # Get user
-        user = await auth_service.get_user_by_email(token_data.email)
+        # Get user; None also for tokens revoked by a later security change
+        user = await auth_service.get_user_for_token(token_data)
         if not user:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found or token revoked"
             )
         
         return user
@@ -240,8 +240,8 @@ async def get_current_user_dependency(
         # Verify token
         token_data = auth_service.verify_token(credentials.credentials)
         
-        # Get user
-        user = await auth_service.get_user_by_email(token_data.email)
+        # Get user (cached per worker; rejects revoked tokens)
+        user = await auth_service.get_user_for_token(token_data)
         if not user or not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -59,6 +59,11 @@ class PolypharmacyRequest(BaseModel):
     drugs: List[str]
 
 
+class GWASBatchRequest(BaseModel):
+    """Request model for batch variant annotation"""
+    rsids: List[str]
+
+
 def get_chat_service(db: Client = Depends(get_db)) -> ChatService:
     """Get chat service"""
     return ChatService(db)
@@ -862,6 +867,50 @@ async def gwas_lookup(
         )
 
 
+@router.post("/gwas/batch")
+async def gwas_batch_lookup(
+    request: GWASBatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Annotate many variants at once, streamed back as Server-Sent Events.
+
+    - **rsids**: List of dbSNP IDs (max 500)
+    - Returns: One `data:` event per variant as it completes, then `[DONE]`
+    """
+    import json
+    from app.services.gwas_service import gwas_service
+
+    if not request.rsids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one rsID is required"
+        )
+    if len(request.rsids) > 500:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Too many variants (max 500 per request)"
+        )
+
+    async def generate_stream():
+        try:
+            async for result in gwas_service.lookup_variants(request.rsids):
+                yield f"data: {json.dumps(result, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"❌ GWAS batch lookup failed: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive"
+        }
+    )
+
+
 @router.post("/pharmgx/report")
 async def generate_pharmgx_report(
     file: UploadFile,
@@ -870,18 +919,15 @@ async def generate_pharmgx_report(
     """
     Generate pharmacogenomic report from genetic data file.
 
-    Accepts 23andMe or AncestryDNA raw data files.
+    Accepts 23andMe or AncestryDNA raw data files (plain, .gz or .zip).
     Returns PGx report with gene analysis and drug recommendations.
     """
     try:
         from app.services.pharmgx_service import pharmgx_service
 
-        # Read file content
-        file_content = await file.read()
-
-        # Generate report
+        # Stream from the spooled upload instead of reading it into memory
         report = await pharmgx_service.generate_report(
-            file_content=file_content,
+            file_content=file.file,
             filename=file.filename or "genetic_data.txt"
         )
 
@@ -911,10 +957,8 @@ async def pharmgx_drug_lookup(
     try:
         from app.services.pharmgx_service import pharmgx_service
 
-        file_content = await file.read()
-
         result = await pharmgx_service.single_drug_lookup(
-            file_content=file_content,
+            file_content=file.file,
             filename=file.filename or "genetic_data.txt",
             drug_name=drug_name
         )
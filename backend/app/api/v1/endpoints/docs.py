@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
 from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-import asyncio, json, io, uuid
+from typing import Optional, Dict, Any
+import json
 
 from app.core.security import get_current_user
 from app.core.database import get_db
 from app.models.user import User
 from app.core.container import get_container
+from app.services.job_store import job_store
 from supabase import Client
 
 router = APIRouter()
@@ -25,9 +26,6 @@ class DocGenerateRequest(BaseModel):
     outline: Dict[str, Any]
     doc_type: str = "report"
 
-# --- Storage for in-progress jobs ---
-doc_jobs: dict = {}  # job_id -> {"status": ..., "docx_bytes": ..., "queue": asyncio.Queue}
-
 # --- Endpoints ---
 
 @router.post("/outline")
@@ -80,13 +78,7 @@ async def generate_document(
 ):
     """Step 2: Start background DOCX generation. Returns job_id."""
     try:
-        job_id = str(uuid.uuid4())
-        doc_jobs[job_id] = {
-            "status": "started", 
-            "docx_bytes": None, 
-            "queue": asyncio.Queue(),
-            "message": "Initializing..."
-        }
+        job_id = job_store.create("doc", doc_type=request.doc_type)
         
         background_tasks.add_task(run_doc_generation, job_id, request)
         return {"job_id": job_id}
@@ -110,48 +102,42 @@ async def run_doc_generation(job_id: str, request: DocGenerateRequest, db: Clien
     doc_service = get_doc_service(multi_provider)
     
     async def on_progress(data):
-        doc_jobs[job_id].update({
-            "message": data.get("message", "")
-        })
-        await doc_jobs[job_id]["queue"].put(data)
+        await job_store.publish(job_id, data)
     
     try:
         docx_bytes = await doc_service.generate_document(
             outline=request.outline,
             on_progress=on_progress
         )
-        doc_jobs[job_id]["docx_bytes"] = docx_bytes
-        doc_jobs[job_id]["status"] = "complete"
-        await doc_jobs[job_id]["queue"].put({"status": "complete", "job_id": job_id})
+        await job_store.complete(
+            job_id, docx_bytes,
+            filename=f"benchside_doc_{job_id[:8]}.docx",
+            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
     except Exception as e:
-        doc_jobs[job_id]["status"] = "error"
-        await doc_jobs[job_id]["queue"].put({"status": "error", "error": str(e)})
+        await job_store.fail(job_id, str(e))
 
 @router.get("/status/{job_id}")
 async def get_doc_status(job_id: str):
     """SSE endpoint for document generation progress"""
-    if job_id not in doc_jobs:
+    if not job_store.get(job_id):
         raise HTTPException(404, "Job not found")
 
     async def event_generator():
-        queue = doc_jobs[job_id]["queue"]
-        while True:
-            data = await queue.get()
+        async for data in job_store.follow(job_id):
             yield {"event": "message", "data": json.dumps(data)}
-            if data.get("status") in ["complete", "error"]:
-                break
     
     return EventSourceResponse(event_generator())
 
 @router.get("/download/{job_id}")
 async def download_document(job_id: str, current_user: User = Depends(get_current_user)):
     """Download generated DOCX"""
-    job = doc_jobs.get(job_id)
-    if not job or not job["docx_bytes"]:
+    artifact = job_store.artifact(job_id)
+    if not artifact:
         raise HTTPException(404, "Document job not found or not complete")
     
-    return StreamingResponse(
-        io.BytesIO(job["docx_bytes"]),
-        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        headers={"Content-Disposition": f"attachment; filename=benchside_doc_{job_id[:8]}.docx"}
+    return FileResponse(
+        artifact["path"],
+        media_type=artifact["media_type"],
+        filename=artifact["filename"]
     )
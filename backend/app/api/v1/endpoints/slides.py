@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-import asyncio, json, io, uuid
+import json, io
 
 from app.core.security import get_current_user
 from app.models.user import User
+from app.services.job_store import job_store
 
 router = APIRouter()
 
@@ -29,10 +30,6 @@ class SlideGenerateRequest(BaseModel):
     outline: SlideOutline
     generate_images: bool = True
 
-# --- Storage for in-progress jobs ---
-# Using a dictionary to store progress queues
-slide_jobs: dict = {}  # job_id -> {"status": ..., "pptx_bytes": ..., "queue": asyncio.Queue}
-
 # --- Endpoints ---
 
 @router.post("/outline")
@@ -83,15 +80,7 @@ async def generate_slides(
 ):
     """Step 2-4: Start background PPTX generation. Returns job_id."""
     try:
-        job_id = str(uuid.uuid4())
-        slide_jobs[job_id] = {
-            "status": "started", 
-            "pptx_bytes": None, 
-            "queue": asyncio.Queue(),
-            "current": 0,
-            "total": len(request.outline.slides),
-            "message": "Initializing..."
-        }
+        job_id = job_store.create("slides", current=0, total=len(request.outline.slides))
         
         background_tasks.add_task(run_slide_generation, job_id, request)
         return {"job_id": job_id}
@@ -104,14 +93,8 @@ async def run_slide_generation(job_id: str, request: SlideGenerateRequest):
     slide_service = get_slide_service()
     
     async def on_progress(data):
-        # Update internal state for polling
-        slide_jobs[job_id].update({
-            "current": data.get("current", 0),
-            "total": data.get("total", 0),
-            "message": data.get("message", "")
-        })
-        # Push to queue for SSE
-        await slide_jobs[job_id]["queue"].put(data)
+        # Persisted so /status can replay it from any worker
+        await job_store.publish(job_id, data)
     
     try:
         pptx_bytes = await slide_service.generate_slides(
@@ -119,40 +102,37 @@ async def run_slide_generation(job_id: str, request: SlideGenerateRequest):
             generate_images=request.generate_images,
             on_progress=on_progress
         )
-        slide_jobs[job_id]["pptx_bytes"] = pptx_bytes
-        slide_jobs[job_id]["status"] = "complete"
-        await slide_jobs[job_id]["queue"].put({"status": "complete", "job_id": job_id})
+        await job_store.complete(
+            job_id, pptx_bytes,
+            filename=f"benchside_slides_{job_id[:8]}.pptx",
+            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+        )
     except Exception as e:
-        slide_jobs[job_id]["status"] = "error"
-        await slide_jobs[job_id]["queue"].put({"status": "error", "error": str(e)})
+        await job_store.fail(job_id, str(e))
 
 @router.get("/status/{job_id}")
 async def get_slide_status(job_id: str):
     """SSE endpoint for slide generation progress"""
-    if job_id not in slide_jobs:
+    if not job_store.get(job_id):
         raise HTTPException(404, "Job not found")
 
     async def event_generator():
-        queue = slide_jobs[job_id]["queue"]
-        while True:
-            data = await queue.get()
+        async for data in job_store.follow(job_id):
             yield {"event": "message", "data": json.dumps(data)}
-            if data.get("status") in ["complete", "error"]:
-                break
     
     return EventSourceResponse(event_generator())
 
 @router.get("/download/{job_id}")
 async def download_slides(job_id: str, current_user: User = Depends(get_current_user)):
     """Download generated PPTX"""
-    job = slide_jobs.get(job_id)
-    if not job or not job["pptx_bytes"]:
+    artifact = job_store.artifact(job_id)
+    if not artifact:
         raise HTTPException(404, "Slide job not found or not complete")
     
-    return StreamingResponse(
-        io.BytesIO(job["pptx_bytes"]),
-        media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        headers={"Content-Disposition": f"attachment; filename=benchside_slides_{job_id[:8]}.pptx"}
+    return FileResponse(
+        artifact["path"],
+        media_type=artifact["media_type"],
+        filename=artifact["filename"]
     )
 
 @router.post("/outline/export/manuscript")
@@ -29,8 +29,8 @@ class SecurityMiddleware:
             # Verify token
             token_data = self.auth_service.verify_token(credentials.credentials)
             
-            # Get user
-            user = await self.auth_service.get_user_by_email(token_data.email)
+            # Get user (cached per worker; no I/O on the hot path)
+            user = await self.auth_service.get_user_for_token(token_data)
             if not user or not user.is_active:
                 return None
             
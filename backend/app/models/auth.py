@@ -19,6 +19,7 @@ class TokenData(BaseModel):
     user_id: Optional[str] = None
     email: Optional[str] = None
     is_admin: bool = False
+    auth_version: int = 1  # "ver" claim; tokens issued before it existed are version 1
 
 
 class LoginRequest(BaseModel):
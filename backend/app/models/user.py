@@ -56,6 +56,7 @@ class UserInDB(UserBase):
     created_at: datetime
     updated_at: datetime
     language: str = "en"
+    auth_version: int = 1  # bumped on security changes, see migration 022
     
     class Config:
         from_attributes = True
@@ -6,6 +6,8 @@ Integrates with:
 1. Local ADMET-AI Engine (Chemprop v2) - Primary
 2. RDKit - Final fallback for basic properties
 
+SMILES washing runs locally via RDKit MolStandardize (see mol_standardizer).
+
 Local Engine: http://localhost:7861 (admet-engine PM2 service)
 """
 
@@ -18,6 +20,7 @@ from supabase import Client
 from app.core.container import container
 from app.services.postprocessing import admet_processor
 from app.services.gasa_service import gasa_predictor
+from app.services.mol_standardizer import mol_standardizer
 
 
 class RateLimiter:
@@ -131,37 +134,33 @@ class ADMETService:
     
     async def wash_molecule(self, smiles: str) -> str:
         """
-        Standardize and clean SMILES using ADMETlab API or RDKit fallback.
+        Standardize and clean SMILES with the local RDKit MolStandardize pipeline.
+
+        Strips salts/solvents, neutralizes charges and canonicalizes tautomers.
+        Returns the original SMILES if it can't be parsed.
         """
         try:
-            # Try ADMETlab wash API first
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                # ADMETlab 2.0/3.0 endpoint (mockable for tests)
-                url = "https://admetmesh.scbdd.com/api/wash"
-                response = await client.post(url, json={"smiles": smiles})
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    # Handle both flat and new wrapped data format
-                    if isinstance(data, dict):
-                        if 'washmol' in data:
-                            return data['washmol']
-                        if 'data' in data and isinstance(data['data'], list) and len(data['data']) > 0:
-                            if 'washmol' in data['data'][0]:
-                                return data['data'][0]['washmol']
-
-            # Fallback to local RDKit
-            from rdkit import Chem
-            mol = Chem.MolFromSmiles(smiles)
-            if mol:
-                return Chem.MolToSmiles(mol, canonical=True, isomericSmiles=False)
-            
+            return await mol_standardizer.astandardize(smiles)
         except Exception as e:
-            print(f"⚠️ Molecule washing fallback active: {e}")
-            
-        # Last resort: return original
-        return smiles
-    
+            print(f"⚠️ Molecule washing failed: {e}")
+            return smiles
+
+    async def wash_batch(self, smiles_list: List[str]) -> List[str]:
+        """
+        Standardize many SMILES at once (process pool for large lists).
+
+        Args:
+            smiles_list: Input SMILES
+
+        Returns:
+            Washed SMILES in input order (originals kept on failure)
+        """
+        try:
+            return await mol_standardizer.astandardize_batch(smiles_list)
+        except Exception as e:
+            print(f"⚠️ Batch molecule washing failed: {e}")
+            return list(smiles_list)
+
     async def get_svg(self, smiles: str) -> Optional[str]:
         """
         Generate molecule SVG using RDKit.
@@ -1091,13 +1090,18 @@ CRITICAL RULES:
         """
         results = []
 
+        # Standardize the whole batch up front (one pool fan-out, cached)
+        raw_smiles = [mol["smiles"] if isinstance(mol, dict) else mol for mol in molecules]
+        washed_smiles = await self.wash_batch(raw_smiles)
+
         for i, mol in enumerate(molecules):
-            smiles = mol["smiles"] if isinstance(mol, dict) else mol
+            smiles = raw_smiles[i]
+            washed = washed_smiles[i]
             name = mol.get("name") if isinstance(mol, dict) else (mol if isinstance(mol, str) else f"Molecule {i+1}")
 
             try:
                 # 1. Get raw predictions (dict with 46 keys)
-                admet_data = await self.predict_admet(smiles)
+                admet_data = await self.predict_admet(washed)
 
                 # 2. Build structured categories from raw data
                 categories = self.processor.build_structured_categories(admet_data)
@@ -1109,10 +1113,10 @@ CRITICAL RULES:
                     from app.services.gasa_service import gasa_predictor
 
                     # Calculate GASA (try main predictor first, then fallback)
-                    gasa_result = gasa_predictor.predict_single(smiles)
+                    gasa_result = gasa_predictor.predict_single(washed)
                     if not gasa_result:
                         # Fallback to simple GASA (more reliable on VPS without torch-data/DGL)
-                        gasa_result = simple_gasa_predictor.predict_single(smiles)
+                        gasa_result = simple_gasa_predictor.predict_single(washed)
                         method_label = "RDKit"
                     else:
                         method_label = "ML"
@@ -1130,6 +1134,7 @@ CRITICAL RULES:
                 results.append({
                     "index": i + 1,
                     "smiles": smiles,
+                    "washed_smiles": washed,
                     "molecule_name": name,
                     "success": True,
                     "engine": admet_data.get("_engine", "Unknown"),
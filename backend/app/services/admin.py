@@ -1,16 +1,35 @@
 """
 Admin service for system management
+
+Dashboard numbers are computed in Postgres: totals come from trigger-kept
+counters, recent activity from a daily materialized view, and list pages get
+their per-row counts from one joined RPC (migration 020). If those RPCs are
+not installed yet, the service falls back to COUNT queries so nothing is
+ever pulled into Python just to be counted.
 """
 
+import asyncio
+import logging
+import os
+import re
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 from supabase import Client
 
+from app.core.database import async_db_execute
 from app.models.user import User, UserProfile
 from app.models.conversation import Conversation
 from app.models.support import SupportRequest
 
+logger = logging.getLogger(__name__)
+
+# Window for the "new_this_month" figures and the default activity chart
+ADMIN_STATS_WINDOW_DAYS = int(os.environ.get("ADMIN_STATS_WINDOW_DAYS", "30"))
+
+# Characters with meaning in PostgREST filter strings
+_FILTER_UNSAFE = re.compile(r"[,()*%\\]")
+
 
 class AdminService:
     """Admin service for system management and monitoring"""
@@ -18,91 +37,94 @@ class AdminService:
     def __init__(self, db: Client):
         self.db = db
     
+    async def _rpc(self, name: str, params: Optional[Dict[str, Any]] = None):
+        return await async_db_execute(lambda: self.db.rpc(name, params or {}).execute())
+    
+    async def _count(self, table: str, **filters) -> int:
+        """Exact COUNT(*) computed by Postgres; only the number comes back"""
+        def run():
+            query = self.db.table(table).select("id", count="exact", head=True)
+            for key, value in filters.items():
+                column, _, op = key.partition("__")
+                query = getattr(query, op or "eq")(column, value)
+            return query.execute()
+        result = await async_db_execute(run)
+        return result.count or 0
+    
     async def get_system_stats(self) -> Dict[str, Any]:
         """Get overall system statistics"""
         try:
-            # Get user stats
-            users_result = self.db.table("users").select("id, created_at, is_active").execute()
-            users_data = users_result.data or []
-            
-            total_users = len(users_data)
-            active_users = len([u for u in users_data if u.get("is_active", True)])
-            
-            # Users created in last 30 days
-            thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).isoformat()
-            new_users = len([
-                u for u in users_data 
-                if u.get("created_at", "") > thirty_days_ago
-            ])
-            
-            # Get conversation stats
-            conversations_result = self.db.table("conversations").select("id, created_at").execute()
-            conversations_data = conversations_result.data or []
-            
-            total_conversations = len(conversations_data)
-            new_conversations = len([
-                c for c in conversations_data 
-                if c.get("created_at", "") > thirty_days_ago
-            ])
-            
-            # Get message stats
-            messages_result = self.db.table("messages").select("id, created_at").execute()
-            messages_data = messages_result.data or []
-            
-            total_messages = len(messages_data)
-            new_messages = len([
-                m for m in messages_data 
-                if m.get("created_at", "") > thirty_days_ago
-            ])
-            
-            # Get document stats
-            documents_result = self.db.table("document_chunks").select("id, created_at").execute()
-            documents_data = documents_result.data or []
-            
-            total_documents = len(documents_data)
-            new_documents = len([
-                d for d in documents_data 
-                if d.get("created_at", "") > thirty_days_ago
-            ])
-            
-            # Get support request stats
-            support_result = self.db.table("support_requests").select("id, status, created_at").execute()
-            support_data = support_result.data or []
+            try:
+                result = await self._rpc("admin_system_stats", {"p_days": ADMIN_STATS_WINDOW_DAYS})
+                stats = dict(result.data or {})
+            except Exception as e:
+                logger.warning(f"⚠️ admin_system_stats RPC unavailable, counting directly: {e}")
+                stats = await self._count_system_stats()
             
-            total_support_requests = len(support_data)
-            open_support_requests = len([
-                s for s in support_data 
-                if s.get("status") == "open"
-            ])
-            
-            return {
-                "users": {
-                    "total": total_users,
-                    "active": active_users,
-                    "new_this_month": new_users
-                },
-                "conversations": {
-                    "total": total_conversations,
-                    "new_this_month": new_conversations
-                },
-                "messages": {
-                    "total": total_messages,
-                    "new_this_month": new_messages
-                },
-                "documents": {
-                    "total": total_documents,
-                    "new_this_month": new_documents
-                },
-                "support": {
-                    "total": total_support_requests,
-                    "open": open_support_requests
-                },
-                "last_updated": datetime.utcnow().isoformat()
-            }
+            stats["last_updated"] = datetime.utcnow().isoformat()
+            return stats
             
         except Exception as e:
             raise Exception(f"Failed to get system stats: {str(e)}")
     
+    async def _count_system_stats(self) -> Dict[str, Any]:
+        """Fallback for databases without migration 020: parallel COUNT queries"""
+        since = (datetime.utcnow() - timedelta(days=ADMIN_STATS_WINDOW_DAYS)).isoformat()
+        (
+            total_users, active_users, new_users,
+            total_conversations, new_conversations,
+            total_messages, new_messages,
+            total_documents, new_documents,
+            total_support_requests, open_support_requests,
+        ) = await asyncio.gather(
+            self._count("users"),
+            self._count("users", is_active=True),
+            self._count("users", created_at__gt=since),
+            self._count("conversations"),
+            self._count("conversations", created_at__gt=since),
+            self._count("messages"),
+            self._count("messages", created_at__gt=since),
+            self._count("document_chunks"),
+            self._count("document_chunks", created_at__gt=since),
+            self._count("support_requests"),
+            self._count("support_requests", status="open"),
+        )
+        return {
+            "users": {
+                "total": total_users,
+                "active": active_users,
+                "new_this_month": new_users
+            },
+            "conversations": {
+                "total": total_conversations,
+                "new_this_month": new_conversations
+            },
+            "messages": {
+                "total": total_messages,
+                "new_this_month": new_messages
+            },
+            "documents": {
+                "total": total_documents,
+                "new_this_month": new_documents
+            },
+            "support": {
+                "total": total_support_requests,
+                "open": open_support_requests
+            }
+        }
+    
+    async def get_activity_timeseries(self, days: int = ADMIN_STATS_WINDOW_DAYS) -> List[Dict[str, Any]]:
+        """Daily new users/conversations/messages/documents for the last `days` days"""
+        try:
+            result = await self._rpc("admin_activity_by_day", {"p_days": days})
+            return result.data or []
+        except Exception as e:
+            raise Exception(f"Failed to get activity timeseries: {str(e)}")
+    
+    async def refresh_aggregates(self, reconcile: bool = False) -> None:
+        """Refresh the daily activity view (and optionally re-derive the counters)"""
+        await self._rpc("refresh_admin_stats", {"p_reconcile": reconcile})
+    
     async def get_all_users(
         self, 
         limit: Optional[int] = None, 
@@ -111,44 +133,45 @@ class AdminService:
     ) -> List[UserProfile]:
         """Get all users with profiles"""
         try:
+            try:
+                result = await self._rpc("admin_list_users", {
+                    "p_limit": limit,
+                    "p_offset": offset,
+                    "p_search": search or None,
+                })
+                return [
+                    UserProfile(**row["user_data"], conversation_count=row["conversation_count"])
+                    for row in result.data or []
+                ]
+            except Exception as e:
+                logger.warning(f"⚠️ admin_list_users RPC unavailable, using count queries: {e}")
+            
             query = self.db.table("users").select("*").order("created_at", desc=True)
             
+            if search:
+                term = _FILTER_UNSAFE.sub(" ", search).strip()
+                query = query.or_(
+                    f"email.ilike.*{term}*,first_name.ilike.*{term}*,last_name.ilike.*{term}*"
+                )
+            
             if limit:
                 query = query.limit(limit)
             
             if offset:
                 query = query.offset(offset)
             
-            result = query.execute()
+            result = await async_db_execute(query.execute)
             users_data = result.data or []
             
-            # Filter by search if provided
-            if search:
-                search_lower = search.lower()
-                users_data = [
-                    u for u in users_data 
-                    if (search_lower in u.get("email", "").lower() or
-                        search_lower in u.get("first_name", "").lower() or
-                        search_lower in u.get("last_name", "").lower())
-                ]
-            
-            # Get conversation counts for each user
-            users = []
-            for user_data in users_data:
-                # Get conversation count
-                conv_result = self.db.table("conversations").select(
-                    "id"
-                ).eq("user_id", user_data["id"]).execute()
-                
-                conversation_count = len(conv_result.data or [])
-                
-                user_profile = UserProfile(
-                    **user_data,
-                    conversation_count=conversation_count
-                )
-                users.append(user_profile)
+            # Server-side counts for the whole page, issued concurrently
+            counts = await asyncio.gather(*(
+                self._count("conversations", user_id=user_data["id"]) for user_data in users_data
+            ))
             
-            return users
+            return [
+                UserProfile(**user_data, conversation_count=count)
+                for user_data, count in zip(users_data, counts)
+            ]
             
         except Exception as e:
             raise Exception(f"Failed to get users: {str(e)}")
@@ -156,24 +179,25 @@ class AdminService:
     async def get_user_details(self, user_id: UUID) -> Optional[UserProfile]:
         """Get detailed user information"""
         try:
-            # Get user
-            user_result = self.db.table("users").select("*").eq("id", str(user_id)).execute()
+            try:
+                result = await self._rpc("admin_list_users", {"p_user_id": str(user_id)})
+                if not result.data:
+                    return None
+                row = result.data[0]
+                return UserProfile(**row["user_data"], conversation_count=row["conversation_count"])
+            except Exception as e:
+                logger.warning(f"⚠️ admin_list_users RPC unavailable, using count query: {e}")
+            
+            user_result = await async_db_execute(
+                lambda: self.db.table("users").select("*").eq("id", str(user_id)).execute()
+            )
             
             if not user_result.data:
                 return None
             
-            user_data = user_result.data[0]
-            
-            # Get conversation count
-            conv_result = self.db.table("conversations").select(
-                "id"
-            ).eq("user_id", str(user_id)).execute()
-            
-            conversation_count = len(conv_result.data or [])
-            
             return UserProfile(
-                **user_data,
-                conversation_count=conversation_count
+                **user_result.data[0],
+                conversation_count=await self._count("conversations", user_id=str(user_id))
             )
             
         except Exception as e:
@@ -198,6 +222,28 @@ class AdminService:
     ) -> List[Dict[str, Any]]:
         """Get all conversations with user info"""
         try:
+            try:
+                result = await self._rpc("admin_list_conversations", {
+                    "p_limit": limit,
+                    "p_offset": offset,
+                })
+                return [
+                    {
+                        "id": row["id"],
+                        "title": row["title"],
+                        "user_id": row["user_id"],
+                        "user_email": row.get("user_email") or "Unknown",
+                        "user_name": f"{row.get('first_name') or ''} {row.get('last_name') or ''}".strip(),
+                        "message_count": row["message_count"],
+                        "document_count": row["document_count"],
+                        "created_at": row["created_at"],
+                        "updated_at": row["updated_at"]
+                    }
+                    for row in result.data or []
+                ]
+            except Exception as e:
+                logger.warning(f"⚠️ admin_list_conversations RPC unavailable, using count queries: {e}")
+            
             query = self.db.table("conversations").select(
                 "*, users(email, first_name, last_name)"
             ).order("updated_at", desc=True)
@@ -208,38 +254,30 @@ class AdminService:
             if offset:
                 query = query.offset(offset)
             
-            result = query.execute()
+            result = await async_db_execute(query.execute)
             conversations_data = result.data or []
             
-            # Format conversations with stats
+            # Server-side counts for the whole page, issued concurrently
+            counts = await asyncio.gather(*(
+                self._count(table, conversation_id=conv_data["id"])
+                for conv_data in conversations_data
+                for table in ("messages", "document_chunks")
+            ))
+            
             conversations = []
-            for conv_data in conversations_data:
-                # Get message count
-                msg_result = self.db.table("messages").select(
-                    "id"
-                ).eq("conversation_id", conv_data["id"]).execute()
-                
-                message_count = len(msg_result.data or [])
-                
-                # Get document count
-                doc_result = self.db.table("document_chunks").select(
-                    "id"
-                ).eq("conversation_id", conv_data["id"]).execute()
-                
-                document_count = len(doc_result.data or [])
-                
-                conversation = {
+            for i, conv_data in enumerate(conversations_data):
+                user = conv_data.get("users") or {}
+                conversations.append({
                     "id": conv_data["id"],
                     "title": conv_data["title"],
                     "user_id": conv_data["user_id"],
-                    "user_email": conv_data.get("users", {}).get("email", "Unknown"),
-                    "user_name": f"{conv_data.get('users', {}).get('first_name', '')} {conv_data.get('users', {}).get('last_name', '')}".strip(),
-                    "message_count": message_count,
-                    "document_count": document_count,
+                    "user_email": user.get("email", "Unknown"),
+                    "user_name": f"{user.get('first_name') or ''} {user.get('last_name') or ''}".strip(),
+                    "message_count": counts[2 * i],
+                    "document_count": counts[2 * i + 1],
                     "created_at": conv_data["created_at"],
                     "updated_at": conv_data["updated_at"]
-                }
-                conversations.append(conversation)
+                })
             
             return conversations
             
@@ -270,19 +308,10 @@ class AdminService:
             # Get recent activity
             one_hour_ago = (datetime.utcnow() - timedelta(hours=1)).isoformat()
             
-            # Recent messages
-            recent_messages_result = self.db.table("messages").select(
-                "id"
-            ).gte("created_at", one_hour_ago).execute()
-            
-            recent_messages = len(recent_messages_result.data or [])
-            
-            # Recent users
-            recent_users_result = self.db.table("users").select(
-                "id"
-            ).gte("created_at", one_hour_ago).execute()
-            
-            recent_users = len(recent_users_result.data or [])
+            recent_messages, recent_users = await asyncio.gather(
+                self._count("messages", created_at__gte=one_hour_ago),
+                self._count("users", created_at__gte=one_hour_ago),
+            )
             
             return {
                 "status": "healthy" if db_healthy else "unhealthy",
@@ -3,8 +3,11 @@ Authentication service
 Handles user authentication, JWT tokens, and password management
 """
 
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Awaitable, Callable, Tuple
 from uuid import UUID
 import bcrypt
 import jwt
@@ -19,8 +22,39 @@ from cachetools import TTLCache
 from supabase import Client as SupabaseClient
 from app.services.email import EmailService
 
-# Cache user lookups for 60 seconds to avoid hitting DB on every request
-_user_cache = TTLCache(maxsize=500, ttl=60)
+# Per-worker cache of (auth_version, User) by email, so authenticated requests
+# don't hit the DB. auth_version is bumped by the database on password, role,
+# activation or email changes (migration 022) and carried in tokens as "ver".
+AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", "60"))
+_user_cache = TTLCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+
+# Lookups in flight per cache key; concurrent misses for one user share a query
+_user_lookups: Dict[str, "asyncio.Task"] = {}
+
+# Database calls run via asyncio.to_thread. bcrypt gets its own small pool: a
+# login burst must not take the default executor threads those calls (and
+# streaming chats) depend on
+AUTH_BCRYPT_WORKERS = int(os.environ.get("AUTH_BCRYPT_WORKERS", "2"))
+_bcrypt_executor = ThreadPoolExecutor(max_workers=AUTH_BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+CachedUser = Tuple[int, User]
+
+
+async def _single_flight(key: str, load: Callable[[], Awaitable[Optional[CachedUser]]]) -> Optional[CachedUser]:
+    """Run load() once for all concurrent callers with the same key"""
+    task = _user_lookups.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(load())
+        _user_lookups[key] = task
+        
+        def forget(done: "asyncio.Task"):
+            if _user_lookups.get(key) is done:
+                del _user_lookups[key]
+        
+        task.add_done_callback(forget)
+    # shield: one caller disconnecting must not cancel the lookup for the others
+    return await asyncio.shield(task)
 
 
 class AuthService:
@@ -54,6 +88,16 @@ class AuthService:
         except Exception:
             return False
     
+    async def hash_password_async(self, password: str) -> str:
+        """Hash password on the bcrypt thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_bcrypt_executor, self.hash_password, password)
+    
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify password on the bcrypt thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_bcrypt_executor, self.verify_password, plain_password, hashed_password)
+    
     def create_access_token(self, data: Dict[str, Any], expires_delta: Optional[timedelta] = None, token_type: str = "access") -> str:
         """Create JWT access token"""
         to_encode = data.copy()
@@ -89,6 +133,9 @@ class AuthService:
             user_id: str = payload.get("sub")
             email: str = payload.get("email")
             is_admin: bool = payload.get("is_admin", False)
+            # Tokens from before the "ver" claim existed count as the
+            # column's baseline version, so any later security change revokes them
+            auth_version: int = payload.get("ver") or 1
             
             if user_id is None or email is None:
                 raise HTTPException(
@@ -96,7 +143,7 @@ class AuthService:
                     detail="Invalid token payload"
                 )
             
-            return TokenData(user_id=user_id, email=email, is_admin=is_admin)
+            return TokenData(user_id=user_id, email=email, is_admin=is_admin, auth_version=auth_version)
             
         except InvalidTokenError:
             raise HTTPException(
@@ -108,7 +155,9 @@ class AuthService:
         """Register a new user"""
         try:
             # Check if user already exists
-            existing_user = self.db.table("users").select("id").eq("email", user_data.email).execute()
+            existing_user = await asyncio.to_thread(
+                lambda: self.db.table("users").select("id").eq("email", user_data.email).execute()
+            )
             if existing_user.data:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -116,7 +165,7 @@ class AuthService:
                 )
             
             # Hash password
-            hashed_password = self.hash_password(user_data.password)
+            hashed_password = await self.hash_password_async(user_data.password)
             
             # Create user record
             user_dict = user_data.dict(exclude={"password"})
@@ -137,7 +186,7 @@ class AuthService:
                 )
             
             
-            result = self.db.table("users").insert(user_dict).execute()
+            result = await asyncio.to_thread(lambda: self.db.table("users").insert(user_dict).execute())
             
             if not result.data:
                 raise HTTPException(
@@ -160,7 +209,9 @@ class AuthService:
         """Authenticate user with email and password"""
         try:
             # Get user by email
-            result = self.db.table("users").select("*").eq("email", email).execute()
+            result = await asyncio.to_thread(
+                lambda: self.db.table("users").select("*").eq("email", email).execute()
+            )
             
             if not result.data:
                 return None
@@ -173,13 +224,13 @@ class AuthService:
                 return None
             
             # Verify password
-            if not self.verify_password(password, user.password_hash):
+            if not await self.verify_password_async(password, user.password_hash):
                 return None
                 
             # Pre-warm the cache if verified
             if user.is_verified:
                 cache_key = f"user:email:{email}"
-                _user_cache[cache_key] = User(**user_data)
+                _user_cache[cache_key] = (user.auth_version, User(**user_data))
             
             return user
             
@@ -253,7 +304,9 @@ class AuthService:
     async def get_user_by_id(self, user_id: UUID) -> Optional[User]:
         """Get user by ID"""
         try:
-            result = self.db.table("users").select("*").eq("id", str(user_id)).execute()
+            result = await asyncio.to_thread(
+                lambda: self.db.table("users").select("*").eq("id", str(user_id)).execute()
+            )
             
             if not result.data:
                 return None
@@ -266,13 +319,46 @@ class AuthService:
     
     async def get_user_by_email(self, email: str) -> Optional[User]:
         """Get user by email (with caching)"""
-        # Check cache first
+        entry = await self._get_user_entry(email)
+        return entry[1] if entry else None
+    
+    async def get_user_for_token(self, token_data: TokenData) -> Optional[User]:
+        """
+        Resolve the user of a verified access token
+        
+        This is the per-request auth path: on a cache hit it is a dict lookup
+        with no I/O. Tokens issued before the user's last security change
+        (an older "ver" than the user's auth_version) are rejected.
+        """
+        entry = await self._get_user_entry(token_data.email, token_data.auth_version)
+        if not entry:
+            return None
+        
+        auth_version, user = entry
+        if token_data.auth_version < auth_version:
+            return None
+        return user
+    
+    async def _get_user_entry(self, email: str, min_version: Optional[int] = None) -> Optional[CachedUser]:
+        """
+        Cached (auth_version, User) for an email
+        
+        A cached entry older than min_version (a token minted after the
+        change this worker hasn't seen yet) is reloaded.
+        """
         cache_key = f"user:email:{email}"
-        if cache_key in _user_cache:
-            return _user_cache[cache_key]
+        entry = _user_cache.get(cache_key)
+        if entry is not None and (min_version is None or entry[0] >= min_version):
+            return entry
         
+        return await _single_flight(cache_key, lambda: self._load_user_entry(email))
+    
+    async def _load_user_entry(self, email: str) -> Optional[CachedUser]:
+        """Load a user from the database into the cache"""
         try:
-            result = self.db.table("users").select("*").eq("email", email).execute()
+            result = await asyncio.to_thread(
+                lambda: self.db.table("users").select("*").eq("email", email).execute()
+            )
             
             if not result.data:
                 return None
@@ -284,8 +370,9 @@ class AuthService:
             print(f"👤 get_user_by_email: {email} -> first_name='{user.first_name}'")
             
             # Store in cache
-            _user_cache[cache_key] = user
-            return user
+            entry = (user_data.get("auth_version", 1), user)
+            _user_cache[f"user:email:{email}"] = entry
+            return entry
             
         except Exception:
             return None
@@ -299,7 +386,9 @@ class AuthService:
                 return None
             
             # Update user in DB
-            result = self.db.table("users").update(user_update).eq("id", str(user_id)).execute()
+            result = await asyncio.to_thread(
+                lambda: self.db.table("users").update(user_update).eq("id", str(user_id)).execute()
+            )
             if not result.data:
                 return None
             
@@ -324,7 +413,7 @@ class AuthService:
                 return False
                 
             # Delete from DB
-            self.db.table("users").delete().eq("id", str(user_id)).execute()
+            await asyncio.to_thread(lambda: self.db.table("users").delete().eq("id", str(user_id)).execute())
             
             # Invalidate cache
             cache_key = f"user:email:{user.email}"
@@ -340,7 +429,8 @@ class AuthService:
         token_data = {
             "sub": str(user.id),
             "email": user.email,
-            "is_admin": user.is_admin
+            "is_admin": user.is_admin,
+            "ver": user.auth_version
         }
         
         access_token = self.create_access_token(token_data)
@@ -358,9 +448,16 @@ class AuthService:
             # Verify refresh token
             token_data = self.verify_token(refresh_token, "refresh")
             
-            # Get current user data
-            user = await self.get_user_by_id(UUID(token_data.user_id))
-            if not user or not user.is_active:
+            # Get current user data; a refresh token from before the user's
+            # last security change is no longer valid
+            entry = await self._get_user_entry(token_data.email, token_data.auth_version)
+            auth_version, user = entry if entry else (None, None)
+            if (
+                not user
+                or not user.is_active
+                or str(user.id) != token_data.user_id
+                or token_data.auth_version < auth_version
+            ):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="User not found or inactive"
@@ -376,7 +473,8 @@ class AuthService:
                 is_admin=user.is_admin,
                 is_active=user.is_active,
                 created_at=user.created_at,
-                updated_at=user.updated_at
+                updated_at=user.updated_at,
+                auth_version=auth_version
             )
             
             return await self.create_tokens(user_in_db)
@@ -406,7 +504,7 @@ class AuthService:
             )
             
             # Hash password
-            hashed_password = self.hash_password(admin_data.password)
+            hashed_password = await self.hash_password_async(admin_data.password)
             
             # Insert admin user with admin flag
             user_dict = admin_data.dict(exclude={"password"})
@@ -543,7 +641,7 @@ class AuthService:
                 raise HTTPException(status_code=400, detail="Invalid token")
                 
             # Hash new password
-            hashed_password = self.hash_password(new_password)
+            hashed_password = await self.hash_password_async(new_password)
             
             # Update user
             updates = {"password_hash": hashed_password}
@@ -554,7 +652,7 @@ class AuthService:
             # if existing and not existing.is_verified:
             #     updates["is_verified"] = True
             
-            self.db.table("users").update(updates).eq("id", user_id).execute()
+            await asyncio.to_thread(lambda: self.db.table("users").update(updates).eq("id", user_id).execute())
             
             # Invalidate cache
             # We need email for cache key, easiest to just clear by ID if we could, 
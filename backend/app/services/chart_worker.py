@@ -0,0 +1,446 @@
+"""
+Chart Worker
+
+Child-process side of the chart rendering pool (see plotting.ChartWorkerPool),
+run as `python -m app.services.chart_worker`.
+
+Each worker imports matplotlib / seaborn / numpy once at start-up, caps its
+own address space, then renders one chart at a time from code framed on
+stdin and writes PNG bytes back on stdout. Before every chart the CPU-time soft limit
+is moved to "used so far + per-chart budget", so a runaway plot is killed by
+SIGXCPU without affecting the API process. Plotting code runs against a
+small builtins allow-list modelled on scripts/analysis_worker.py, with
+imports limited to the plotting / numeric stack. validate_chart_code()
+rejects dunder / private attribute access (the usual way out of a builtins
+sandbox), attribute assignment and the file I/O entry points of pandas,
+numpy and matplotlib. Every attribute read in chart code is then routed
+through guarded_getattr(), which refuses modules outside ALLOWED_MODULES
+(`plt.matplotlib.os`) and callables defined outside the plotting stack
+(`matplotlib.Path`), so a plain attribute chain cannot leave the sandbox.
+
+As a second layer, confine() drops the worker to an unprivileged user in
+its own network namespace, with a Landlock ruleset that leaves the Python
+installation and font directories readable and nothing writable.
+
+Only stdlib is imported at module level so the parent can import this
+module cheaply.
+"""
+
+import argparse
+import ast
+import builtins
+import ctypes
+import io
+import os
+import stat
+import struct
+import sys
+import traceback
+import types
+
+# Frames in both directions: 1-byte status + 4-byte big-endian length + payload
+FRAME_HEADER = struct.Struct(">cI")
+READY, CODE, OK, ERROR = b"R", b"C", b"K", b"E"
+
+ALLOWED_IMPORTS = {
+    'matplotlib', 'matplotlib.pyplot', 'matplotlib.figure', 'matplotlib.ticker',
+    'matplotlib.colors', 'matplotlib.patches', 'matplotlib.cm',
+    'seaborn', 'numpy', 'pandas', 'math', 'statistics', 'random', 'datetime',
+}
+
+# Modules chart code may hold a reference to (`np.random`, `plt.cm`, ...)
+ALLOWED_MODULES = ALLOWED_IMPORTS | {
+    'numpy.random', 'numpy.linalg', 'numpy.fft', 'numpy.ma',
+    'matplotlib.dates', 'matplotlib.gridspec', 'matplotlib.lines',
+    'matplotlib.markers', 'matplotlib.collections', 'matplotlib.text',
+    'matplotlib.transforms', 'matplotlib.legend', 'matplotlib.colorbar',
+    'matplotlib.style', 'matplotlib.patheffects',
+}
+
+# Packages whose functions and classes chart code may call
+ALLOWED_CALLABLE_ROOTS = {
+    'numpy', 'matplotlib', 'seaborn', 'pandas', 'cycler',
+    'math', 'statistics', 'random', 'datetime', 'builtins',
+}
+
+
+# pandas / numpy / matplotlib functions that read or write files (or reach
+# native code); plotting code gets its data inline
+BLOCKED_ATTRIBUTES = {
+    'load', 'loads', 'save', 'savez', 'savez_compressed', 'loadtxt', 'savetxt',
+    'genfromtxt', 'fromfile', 'tofile', 'memmap', 'fromregex', 'DataSource',
+    'ctypeslib', 'ctypes', 'f2py', 'distutils', 'testing',
+    'to_csv', 'to_excel', 'to_pickle', 'to_parquet', 'to_json', 'to_hdf',
+    'to_sql', 'to_feather', 'to_html', 'to_latex', 'to_markdown', 'to_stata',
+    'to_xml', 'to_clipboard', 'to_orc', 'ExcelWriter', 'HDFStore', 'io',
+    'savefig', 'imsave', 'imread', 'get_cachedir', 'get_data_path',
+    'load_dataset', 'get_data_home', 'rc_file',
+}
+
+# Builtins that would undo the allow-list if reached through a module attribute
+UNSAFE_BUILTINS = {
+    id(getattr(builtins, name))
+    for name in (
+        'open', 'exec', 'eval', 'compile', 'getattr', 'setattr', 'delattr',
+        'globals', 'locals', 'vars', '__import__', 'input', 'breakpoint',
+        'help', 'type', 'memoryview',
+    )
+}
+
+# Interpreter internals reachable without dunders (generator.gi_frame.f_back ...)
+UNSAFE_TYPES = (types.FrameType, types.CodeType, types.TracebackType)
+
+# Name the rewritten chart code calls for every attribute read
+GETATTR_NAME = '__chart_getattr__'
+
+
+def validate_chart_code(code: str) -> None:
+    """
+    Reject chart code that could escape the sandbox.
+
+    Raises:
+        ValueError: On private/dunder attribute access, attribute
+            assignment, dunder names, imports outside ALLOWED_IMPORTS, or
+            file I/O functions (see BLOCKED_ATTRIBUTES)
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise ValueError(f"Invalid chart code: {e.msg} (line {e.lineno})")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            if not isinstance(node.ctx, ast.Load):
+                raise ValueError(f"Assigning to '.{node.attr}' is not allowed in chart code")
+            if node.attr.startswith('_'):
+                raise ValueError(f"Access to '{node.attr}' is not allowed in chart code")
+            if node.attr in BLOCKED_ATTRIBUTES or node.attr.startswith('read_'):
+                raise ValueError(f"File access ('{node.attr}') is not allowed in chart code")
+        elif isinstance(node, ast.Name) and node.id.startswith('__'):
+            raise ValueError(f"Access to '{node.id}' is not allowed in chart code")
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            if isinstance(node, ast.ImportFrom) and (node.level or node.module not in ALLOWED_IMPORTS):
+                raise ValueError(f"Import of '{node.module}' is not allowed in chart code")
+            for alias in node.names:
+                if isinstance(node, ast.Import) and alias.name not in ALLOWED_IMPORTS:
+                    raise ValueError(f"Import of '{alias.name}' is not allowed in chart code")
+                if alias.name == '*':
+                    raise ValueError("Star imports are not allowed in chart code")
+                if alias.name.startswith('_') or alias.name in BLOCKED_ATTRIBUTES or alias.name.startswith('read_'):
+                    raise ValueError(f"Import of '{alias.name}' is not allowed in chart code")
+
+
+def guarded_getattr(obj, name: str):
+    """
+    getattr() for chart code: refuse modules outside ALLOWED_MODULES,
+    callables from outside the plotting stack, unsafe builtins and
+    interpreter internals.
+
+    Raises:
+        ValueError: If the attribute resolves to something off-limits
+    """
+    if name.startswith('_'):
+        raise ValueError(f"Access to '{name}' is not allowed in chart code")
+    value = getattr(obj, name)
+    if isinstance(value, types.ModuleType):
+        if value.__name__ not in ALLOWED_MODULES:
+            raise ValueError(f"Access to module '{value.__name__}' is not allowed in chart code")
+    elif isinstance(value, UNSAFE_TYPES) or id(value) in UNSAFE_BUILTINS:
+        raise ValueError(f"Access to '{name}' is not allowed in chart code")
+    elif callable(value):
+        module = getattr(value, '__module__', None)
+        if isinstance(module, str) and module.split('.')[0] not in ALLOWED_CALLABLE_ROOTS:
+            raise ValueError(f"Access to '{name}' ({module}) is not allowed in chart code")
+    return value
+
+
+class _GuardAttributes(ast.NodeTransformer):
+    """Rewrite every `obj.name` read into `__chart_getattr__(obj, 'name')`."""
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        self.generic_visit(node)
+        call = ast.Call(
+            func=ast.Name(id=GETATTR_NAME, ctx=ast.Load()),
+            args=[node.value, ast.Constant(node.attr)],
+            keywords=[],
+        )
+        return ast.copy_location(call, node)
+
+
+def compile_chart_code(code: str):
+    """Validate chart code and compile it with attribute reads guarded."""
+    validate_chart_code(code)
+    tree = _GuardAttributes().visit(ast.parse(code))
+    return compile(ast.fix_missing_locations(tree), '<chart>', 'exec')
+
+
+def _safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name not in ALLOWED_IMPORTS:
+        raise ImportError(f"Import of '{name}' is not allowed in chart code")
+    module = builtins.__import__(name, globals, locals, fromlist, level)
+    for attr in fromlist or ():
+        try:
+            guarded_getattr(module, attr)
+        except ValueError as e:
+            raise ImportError(str(e))
+    return module
+
+
+SAFE_BUILTINS = {
+    name: getattr(builtins, name)
+    for name in (
+        'range', 'len', 'str', 'int', 'float', 'list', 'dict', 'tuple', 'set',
+        'bool', 'print', 'min', 'max', 'sum', 'abs', 'round', 'sorted',
+        'enumerate', 'zip', 'map', 'filter', 'isinstance', 'reversed',
+        'any', 'all', 'pow', 'divmod', 'slice', 'frozenset', 'complex',
+        'iter', 'next', '__build_class__',
+        'ValueError', 'TypeError', 'KeyError', 'IndexError', 'Exception',
+    )
+}
+SAFE_BUILTINS['__import__'] = _safe_import
+
+
+def apply_memory_limit(memory_mb: int) -> None:
+    """Cap the worker's address space (no-op where `resource` is unavailable)."""
+    if not memory_mb:
+        return
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def arm_cpu_limit(cpu_seconds: int) -> None:
+    """Allow `cpu_seconds` more CPU time from now; SIGXCPU terminates the worker past that."""
+    if not cpu_seconds:
+        return
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = used + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+# Linux constants for confine(): unshare(2) flags, prctl(2) option, Landlock syscalls
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+PR_SET_NO_NEW_PRIVS = 38
+SYS_LANDLOCK_CREATE_RULESET, SYS_LANDLOCK_ADD_RULE, SYS_LANDLOCK_RESTRICT_SELF = 444, 445, 446
+LANDLOCK_CREATE_RULESET_VERSION = 1
+LANDLOCK_RULE_PATH_BENEATH = 1
+LANDLOCK_ACCESS_FS_READ_FILE = 1 << 2
+LANDLOCK_ACCESS_FS_READ_DIR = 1 << 3
+UNPRIVILEGED_ID = 65534  # nobody / nogroup
+
+
+class _RulesetAttr(ctypes.Structure):
+    _fields_ = [("handled_access_fs", ctypes.c_uint64),
+                ("handled_access_net", ctypes.c_uint64),
+                ("scoped", ctypes.c_uint64)]
+
+
+class _PathBeneathAttr(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [("allowed_access", ctypes.c_uint64), ("parent_fd", ctypes.c_int32)]
+
+
+def _landlock_read_only(libc, read_paths) -> bool:
+    """Allow reading `read_paths` and no other filesystem or TCP access. False if unsupported."""
+    abi = libc.syscall(SYS_LANDLOCK_CREATE_RULESET, None, 0, LANDLOCK_CREATE_RULESET_VERSION)
+    if abi < 1:
+        return False
+    # Every filesystem right the running kernel knows about is handled (= denied unless allowed)
+    fs_rights = (1 << {1: 13, 2: 14, 3: 15, 4: 15}.get(abi, 16)) - 1
+    attr = _RulesetAttr(fs_rights, 0b11 if abi >= 4 else 0, 0b11 if abi >= 6 else 0)
+    size = 8 if abi < 4 else 16 if abi < 6 else 24
+    ruleset = libc.syscall(SYS_LANDLOCK_CREATE_RULESET, ctypes.byref(attr), ctypes.c_size_t(size), 0)
+    if ruleset < 0:
+        return False
+    try:
+        for path in read_paths:
+            try:
+                fd = os.open(path, os.O_PATH | os.O_CLOEXEC)
+            except OSError:
+                continue
+            try:
+                rights = LANDLOCK_ACCESS_FS_READ_FILE
+                if os.path.isdir(path):
+                    rights |= LANDLOCK_ACCESS_FS_READ_DIR
+                rule = _PathBeneathAttr(rights, fd)
+                libc.syscall(SYS_LANDLOCK_ADD_RULE, ruleset, LANDLOCK_RULE_PATH_BENEATH, ctypes.byref(rule), 0)
+            finally:
+                os.close(fd)
+        return libc.syscall(SYS_LANDLOCK_RESTRICT_SELF, ruleset, 0) == 0
+    finally:
+        os.close(ruleset)
+
+
+def _world_readable(path: str) -> bool:
+    """True if an unprivileged user can reach `path` (o+x on every ancestor, o+r on itself)."""
+    try:
+        if not os.stat(path).st_mode & stat.S_IROTH:
+            return False
+        while True:
+            if not os.stat(path).st_mode & stat.S_IXOTH:
+                return False
+            parent = os.path.dirname(path)
+            if parent == path:
+                return True
+            path = parent
+    except OSError:
+        return False
+
+
+def confine(read_paths) -> None:
+    """
+    Drop the worker's privileges once its imports are warm: its own network
+    namespace, no root (the `nobody` uid when the Python installation is
+    world-readable, otherwise a user namespace without capabilities), no
+    new processes, and (with Landlock) read-only access to `read_paths`
+    with no execute or write rights anywhere. Each step is best effort, so
+    the worker still runs on kernels without these features.
+    """
+    import resource
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.syscall.restype = ctypes.c_long
+    if os.geteuid() == 0 and all(_world_readable(path) for path in read_paths):
+        libc.unshare(CLONE_NEWNET)
+        os.setgroups([])
+        os.setgid(UNPRIVILEGED_ID)
+        os.setuid(UNPRIVILEGED_ID)
+    else:
+        libc.unshare(CLONE_NEWUSER | CLONE_NEWNET)
+    for limit in (resource.RLIMIT_NPROC, resource.RLIMIT_FSIZE):
+        try:
+            resource.setrlimit(limit, (0, 0))
+        except (ValueError, OSError):
+            pass
+    libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0)
+    _landlock_read_only(libc, read_paths)
+
+
+def confined_read_paths():
+    """Paths a warm worker still needs to read: the Python installation and fonts."""
+    import site
+    import matplotlib
+    from matplotlib import font_manager
+    paths = {sys.prefix, sys.base_prefix, sys.exec_prefix, matplotlib.get_data_path()}
+    paths.update(site.getsitepackages())
+    paths.update(os.path.dirname(font.fname) for font in font_manager.fontManager.ttflist)
+    return sorted(paths)
+
+
+def render_chart(code: str) -> bytes:
+    """Execute plotting code and return the current figure as a styled PNG."""
+    import math
+    import numpy as np
+    import matplotlib.pyplot as plt
+
+    compiled = compile_chart_code(code)
+    plt.close('all')
+    namespace = {
+        'np': np, 'plt': plt, 'math': math,
+        '__builtins__': SAFE_BUILTINS, GETATTR_NAME: guarded_getattr,
+    }
+    try:
+        import seaborn as sns
+        namespace['sns'] = sns
+    except ImportError:
+        pass
+
+    try:
+        exec(compiled, namespace)
+
+        fig = plt.gcf()
+        if not fig.get_axes():
+            raise ValueError("Code did not produce a plot. Make sure to call plt.plot(), plt.bar(), etc.")
+
+        # Style it nicely
+        fig.set_facecolor('#0a0a0a')
+        for ax in fig.get_axes():
+            ax.set_facecolor('#0a0a0a')
+            ax.tick_params(colors='#999')
+            ax.xaxis.label.set_color('#ccc')
+            ax.yaxis.label.set_color('#ccc')
+            ax.title.set_color('#fff')
+            for spine in ax.spines.values():
+                spine.set_color('#333')
+
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=150, bbox_inches='tight',
+                    facecolor=fig.get_facecolor(), edgecolor='none')
+        return buf.getvalue()
+    finally:
+        plt.close('all')
+
+
+def read_frame(stream):
+    """Read one (status, payload) frame; returns None at EOF."""
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    status, length = FRAME_HEADER.unpack(header)
+    return status, stream.read(length)
+
+
+def write_frame(stream, status: bytes, payload: bytes) -> None:
+    stream.write(FRAME_HEADER.pack(status, len(payload)) + payload)
+    stream.flush()
+
+
+def worker_main(cpu_seconds: int, memory_mb: int) -> None:
+    """Worker loop: warm imports, signal ready, then render charts until stdin closes."""
+    # The protocol owns the real stdout; anything chart code prints is discarded
+    channel = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    requests = sys.stdin.buffer
+
+    # One BLAS thread per worker; parallelism comes from the pool size
+    for var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = "1"
+    apply_memory_limit(memory_mb)
+
+    import warnings
+    warnings.filterwarnings('ignore')
+    import numpy  # noqa: F401
+    import matplotlib
+    matplotlib.use('Agg')  # Non-interactive backend
+    import matplotlib.pyplot  # noqa: F401
+    try:
+        import seaborn  # noqa: F401
+    except ImportError:
+        pass
+    confine(confined_read_paths())
+
+    write_frame(channel, READY, str(os.getpid()).encode())
+    while True:
+        frame = read_frame(requests)
+        if frame is None:
+            break
+        code = frame[1].decode("utf-8")
+        arm_cpu_limit(cpu_seconds)
+        try:
+            write_frame(channel, OK, render_chart(code))
+        except MemoryError:
+            write_frame(channel, ERROR, b"Chart exceeded the worker memory limit")
+        except Exception as e:
+            message = str(e) or traceback.format_exc(limit=1)
+            write_frame(channel, ERROR, message.encode("utf-8", "replace"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sandboxed chart rendering worker")
+    parser.add_argument("--cpu-seconds", type=int, default=0)
+    parser.add_argument("--memory-mb", type=int, default=0)
+    args = parser.parse_args()
+    worker_main(args.cpu_seconds, args.memory_mb)
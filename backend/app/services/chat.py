@@ -18,6 +18,7 @@ from app.models.conversation import (
     Message, MessageCreate
 )
 from app.models.user import User
+from app.services.dataset_store import dataset_store
 
 logger = logging.getLogger(__name__)
 
@@ -84,7 +85,8 @@ class ChatService:
             )
             
             # --- TRANSLATION LOGIC ---
-            from app.services.translation import translation_service
+            from app.services.translation_service import TranslationService
+            translator = TranslationService(self.db)
             
             target_lang = getattr(user, 'language', 'en')
             conversations = []
@@ -114,36 +116,38 @@ class ChatService:
                 batch = convs_needing_translation[:MAX_INLINE_TRANSLATIONS]
                 logger.info(f"Translating {len(batch)}/{len(convs_needing_translation)} titles to {target_lang}")
                 
-                async def translate_title_and_update(conv):
+                async def translate_titles_and_update(convs):
+                    # One packed request for all titles (translation memory first)
                     try:
-                        translated_title = await translation_service.translate_text(conv.title, target_lang)
+                        results = await translator.translate_many(
+                            [c.title for c in convs], source_language=None, targets=[target_lang]
+                        )
+                    except Exception as e:
+                        logger.warning(f"Title translation task error: {e}")
+                        return
+                    updates = []
+                    for conv, translated in zip(convs, results):
+                        translated_title = translated.get(target_lang)
                         if translated_title:
                             if not conv.title_translations: conv.title_translations = {}
                             conv.title_translations[target_lang] = translated_title
-                            
-                            conv_id = str(conv.id)
-                            translations = conv.title_translations
-                            await async_db_execute(
-                                lambda: self.db.table("conversations").update({
-                                    "title_translations": translations
-                                }).eq("id", conv_id).execute()
-                            )
-                    except Exception as e:
-                        logger.warning(f"Title translation task error: {e}")
+                            updates.append(async_db_execute(
+                                lambda conv_id=str(conv.id), translations=conv.title_translations:
+                                    self.db.table("conversations").update({
+                                        "title_translations": translations
+                                    }).eq("id", conv_id).execute()
+                            ))
+                    await asyncio.gather(*updates, return_exceptions=True)
                 
-                translation_tasks = [translate_title_and_update(c) for c in batch]
                 try:
-                    await asyncio.gather(*translation_tasks)
+                    await translate_titles_and_update(batch)
                 except Exception as e:
                     logger.error(f"Title translation gather error: {e}")
                 
                 # Fire-and-forget remaining translations in background
                 remaining = convs_needing_translation[MAX_INLINE_TRANSLATIONS:]
                 if remaining:
-                    async def translate_remaining():
-                        for c in remaining:
-                            await translate_title_and_update(c)
-                    asyncio.create_task(translate_remaining())
+                    asyncio.create_task(translate_titles_and_update(remaining))
 
             logger.debug(f"get_user_conversations: {(time.time()-start)*1000:.0f}ms, count={len(conversations)}")
             return conversations
@@ -261,6 +265,7 @@ class ChatService:
                     .eq("user_id", uid)\
                     .execute()
             )
+            await asyncio.to_thread(dataset_store.delete_conversation, conversation_id)
             
             logger.debug(f"delete_conversation: {(time.time()-start)*1000:.0f}ms")
             return True
@@ -514,7 +519,8 @@ class ChatService:
                 messages = messages[-limit:]
             
             # --- TRANSLATION LOGIC ---
-            from app.services.translation import translation_service
+            from app.services.translation_service import TranslationService
+            translator = TranslationService(self.db)
             
             target_lang = getattr(user, 'language', 'en')
             messages_needing_translation = []
@@ -530,36 +536,38 @@ class ChatService:
                 batch = messages_needing_translation[:MAX_INLINE_TRANSLATIONS]
                 logger.info(f"Translating {len(batch)}/{len(messages_needing_translation)} messages to {target_lang}")
                 
-                async def translate_and_update(msg):
+                async def translate_and_update(msgs):
+                    # Short messages are packed into one request; repeats come from memory
                     try:
-                        translated_text = await translation_service.translate_text(msg.content, target_lang)
+                        results = await translator.translate_many(
+                            [m.content for m in msgs], source_language=None, targets=[target_lang]
+                        )
+                    except Exception as e:
+                        logger.warning(f"Translation task error: {e}")
+                        return
+                    updates = []
+                    for msg, translated in zip(msgs, results):
+                        translated_text = translated.get(target_lang)
                         if translated_text:
                             if not msg.translations: msg.translations = {}
                             msg.translations[target_lang] = translated_text
-                            
-                            msg_id = str(msg.id)
-                            translations = msg.translations
-                            await async_db_execute(
-                                lambda: self.db.table("messages").update({
-                                    "translations": translations
-                                }).eq("id", msg_id).execute()
-                            )
-                    except Exception as e:
-                        logger.warning(f"Translation task error: {e}")
+                            updates.append(async_db_execute(
+                                lambda msg_id=str(msg.id), translations=msg.translations:
+                                    self.db.table("messages").update({
+                                        "translations": translations
+                                    }).eq("id", msg_id).execute()
+                            ))
+                    await asyncio.gather(*updates, return_exceptions=True)
                 
-                translation_tasks = [translate_and_update(m) for m in batch]
                 try:
-                    await asyncio.gather(*translation_tasks)
+                    await translate_and_update(batch)
                 except Exception as e:
                     logger.error(f"Translation gather error: {e}")
                 
                 # Fire-and-forget remaining translations in background
                 remaining = messages_needing_translation[MAX_INLINE_TRANSLATIONS:]
                 if remaining:
-                    async def translate_remaining():
-                        for m in remaining:
-                            await translate_and_update(m)
-                    asyncio.create_task(translate_remaining())
+                    asyncio.create_task(translate_and_update(remaining))
 
             logger.debug(f"get_conversation_messages: {(time.time()-start)*1000:.0f}ms, count={len(messages)}")
             return messages
@@ -568,6 +576,77 @@ class ChatService:
             logger.error(f"get_conversation_messages failed: {e}")
             return []
     
+    async def get_thread_message_ids(self, conversation_id: UUID, user: User, page_size: int = 1000) -> List[str]:
+        """
+        Ids of the active thread in order, without loading message content.
+
+        Only (id, parent_id, created_at) rows are fetched, page by page, so
+        very long conversations can then be read in batches with
+        iter_messages_by_id().
+        """
+        conv_id = str(conversation_id)
+        uid = str(user.id)
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            result = await async_db_execute(
+                lambda: self.db.table("messages").select("id,parent_id,created_at")\
+                    .eq("conversation_id", conv_id)\
+                    .eq("user_id", uid)\
+                    .order("created_at")\
+                    .range(start, start + page_size - 1)\
+                    .execute()
+            )
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                break
+            start += page_size
+
+        # Same active-thread resolution as get_conversation_messages()
+        by_id = {r["id"]: r for r in rows}
+        parent_ids = {r.get("parent_id") for r in rows if r.get("parent_id")}
+        leaves = [r for r in rows if r["id"] not in parent_ids]
+        if not leaves:
+            return [r["id"] for r in rows]
+        thread = []
+        curr = max(leaves, key=lambda r: r["created_at"])
+        while curr:
+            thread.append(curr["id"])
+            if not curr.get("parent_id"):
+                break
+            curr = by_id.get(curr["parent_id"])
+        return thread[::-1]
+
+    async def iter_messages_by_id(self, message_ids: List[str], user: User, batch_size: int = 100):
+        """Yield lists of Message objects for the given ids, in the given order, one DB batch at a time."""
+        uid = str(user.id)
+        for i in range(0, len(message_ids), batch_size):
+            batch = [str(m) for m in message_ids[i:i + batch_size]]
+            result = await async_db_execute(
+                lambda: self.db.table("messages").select("*")\
+                    .in_("id", batch)\
+                    .eq("user_id", uid)\
+                    .execute()
+            )
+            by_id = {str(r["id"]): r for r in result.data or []}
+            page = []
+            for msg_id in batch:
+                r = by_id.get(msg_id)
+                if not r:
+                    continue
+                page.append(Message(
+                    id=r["id"],
+                    conversation_id=r["conversation_id"],
+                    role=r["role"],
+                    content=r["content"],
+                    metadata=r.get("metadata", {}),
+                    parent_id=r.get("parent_id"),
+                    translations=r.get("translations") or {},
+                    created_at=r["created_at"]
+                ))
+            yield page
+
     async def get_recent_messages(self, conversation_id: UUID, user: User, limit: int = 20) -> List[Message]:
         """Get recent messages for AI context"""
         start = time.time()
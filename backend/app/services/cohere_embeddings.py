@@ -4,42 +4,50 @@ Handles embedding generation using Cohere API with caching
 Supports both text and image embeddings
 Much faster than Mistral - 100 requests/minute on free tier
 Uses direct HTTP calls to avoid dependency conflicts
+Batches are sent with the API's multi-input request shape
 """
 
 import asyncio
 import base64
 import hashlib
 import httpx
-import json
 import logging
+import math
+import mimetypes
+import os
 import time
-from typing import List, Optional, Dict, Any, Union
-from datetime import datetime, timedelta
-from cachetools import TTLCache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
 from app.core.config import settings
+from app.services.embedding_store import embedding_store
 
 logger = logging.getLogger(__name__)
 
+# Inputs per /embed request (the API accepts up to 96) and batches in flight
+COHERE_EMBED_BATCH_SIZE = int(os.environ.get("COHERE_EMBED_BATCH_SIZE", "96"))
+COHERE_IMAGE_BATCH_SIZE = int(os.environ.get("COHERE_IMAGE_BATCH_SIZE", "16"))
+COHERE_EMBED_CONCURRENCY = int(os.environ.get("COHERE_EMBED_CONCURRENCY", "4"))
 
-class EmbeddingCacheEntry:
-    """Cache entry for embeddings"""
-    def __init__(self, embedding: List[float], model_version: str):
-        self.embedding = embedding
-        self.model_version = model_version
-        self.created_at = datetime.utcnow()
-        self.expires_at = self.created_at + timedelta(seconds=settings.EMBEDDING_CACHE_TTL)
+# Image model. embed-english-v3.0 takes one image per request and cannot fuse
+# text with an image; embed-v4 models accept batches of interleaved
+# text+image `inputs`. Images and text must share one vector space for
+# cross-modal search, so switching to v4 means re-embedding the text too.
+COHERE_MULTIMODAL_MODEL = os.environ.get("COHERE_MULTIMODAL_MODEL", "embed-english-v3.0")
+FUSED_INPUT_MODEL_PREFIXES = ("embed-v4",)
 
 
 class CohereEmbeddingsService:
     """Service for generating embeddings using Cohere API"""
     
+    provider = "cohere"
+    
     def __init__(self):
         self.cohere_api_key = settings.COHERE_API_KEY
         self.cohere_base_url = "https://api.cohere.ai/v1"
+        self.cohere_v2_base_url = "https://api.cohere.ai/v2"  # mixed text/image `inputs`
         self.text_model_name = "embed-english-v3.0"
-        self.multimodal_model_name = "embed-english-v3.0"  # Same model handles both
+        self.multimodal_model_name = COHERE_MULTIMODAL_MODEL
         self.embedding_dimensions = 1024  # Cohere embed-english-v3.0 dimensions
         self.cache = None
         self.cache_stats = {
@@ -49,11 +57,13 @@ class CohereEmbeddingsService:
             "api_calls": 0,
             "total_requests": 0,
             "image_requests": 0,
-            "text_requests": 0
+            "text_requests": 0,
+            "rate_limited": 0  # 429 responses; read by the migration engine to back off
         }
         # Rate limiting: Cohere free tier allows 100 requests per minute
         self.last_api_call_time = 0
         self.min_time_between_calls = 0.6  # 0.6 seconds = 100 requests/minute
+        self.rate_limit_lock = asyncio.Lock()
         
         # Check API key
         if not self.cohere_api_key:
@@ -61,208 +71,193 @@ class CohereEmbeddingsService:
         else:
             logger.info("✅ Cohere embeddings service initialized (direct HTTP)")
         
-        # Initialize cache if enabled
+        # Persistent embedding store (shared by all workers) if caching is enabled
         if settings.ENABLE_EMBEDDING_CACHE:
-            self.cache = TTLCache(
-                maxsize=settings.EMBEDDING_CACHE_MAX_SIZE,
-                ttl=settings.EMBEDDING_CACHE_TTL
-            )
-            logger.info(f"✅ Embedding cache initialized (max_size={settings.EMBEDDING_CACHE_MAX_SIZE}, ttl={settings.EMBEDDING_CACHE_TTL}s)")
-    
-    def _get_cache_key(self, text: str) -> str:
-        """Generate cache key for text"""
-        text_hash = hashlib.sha256(text.encode()).hexdigest()
-        return f"cohere:{self.model_name}:{text_hash}"
+            self.cache = embedding_store
+            logger.info(f"✅ Embedding cache initialized (persistent store: {embedding_store.path})")
     
-    def _get_from_cache(self, text: str) -> Optional[List[float]]:
-        """Get embedding from cache if available"""
+    async def _get_many_from_cache(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Batch lookup of text embeddings in the embedding store"""
         if not self.cache:
-            return None
+            return [None] * len(texts)
         
-        cache_key = self._get_cache_key(text)
-        entry = self.cache.get(cache_key)
-        
-        if entry and isinstance(entry, EmbeddingCacheEntry):
-            if datetime.utcnow() < entry.expires_at:
-                self.cache_stats["hits"] += 1
-                return entry.embedding
-            else:
-                # Expired entry
-                del self.cache[cache_key]
-        
-        self.cache_stats["misses"] += 1
-        return None
+        found = await self.cache.aget_many(self.provider, self.text_model_name, self.embedding_dimensions, texts)
+        hits = sum(1 for embedding in found if embedding is not None)
+        self.cache_stats["hits"] += hits
+        self.cache_stats["misses"] += len(texts) - hits
+        return found
     
-    def _save_to_cache(self, text: str, embedding: List[float]):
-        """Save embedding to cache"""
+    async def _save_many_to_cache(self, texts: List[str], embeddings: List[Optional[List[float]]]):
+        """Batch write of text embeddings to the embedding store"""
         if not self.cache:
             return
         
-        cache_key = self._get_cache_key(text)
-        entry = EmbeddingCacheEntry(embedding, self.model_name)
-        self.cache[cache_key] = entry
+        await self.cache.aput_many(self.provider, self.text_model_name, self.embedding_dimensions, texts, embeddings)
     
     async def _rate_limit(self):
-        """Enforce rate limiting between API calls"""
-        current_time = time.time()
-        time_since_last_call = current_time - self.last_api_call_time
+        """
+        Reserve the next API slot
+        
+        Concurrent batches each take a slot min_time_between_calls after the
+        previous one, so parallel dispatch stays within the provider limit.
+        """
+        async with self.rate_limit_lock:
+            current_time = time.time()
+            slot = max(current_time, self.last_api_call_time + self.min_time_between_calls)
+            self.last_api_call_time = slot
         
-        if time_since_last_call < self.min_time_between_calls:
-            wait_time = self.min_time_between_calls - time_since_last_call
+        wait_time = slot - current_time
+        if wait_time > 0:
             logger.debug(f"⏳ Rate limiting: waiting {wait_time:.2f}s")
             await asyncio.sleep(wait_time)
-        
-        self.last_api_call_time = time.time()
     
-    def _encode_image_to_base64(self, image_path: str) -> str:
-        """Encode image file to base64 string"""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    def _load_image(self, image_path: str) -> Dict[str, str]:
+        """Read an image as a data URI plus a content hash for the cache key"""
+        path = Path(image_path)
+        if not path.exists():
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        
+        data = path.read_bytes()
+        mime_type = mimetypes.guess_type(path.name)[0] or "image/png"
+        return {
+            "data_uri": f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}",
+            "digest": hashlib.sha256(data).hexdigest()
+        }
     
-    async def embed_text(self, text: str) -> List[float]:
+    async def _post_embed(self, url: str, payload: Dict[str, Any], count: int) -> List[List[float]]:
         """
-        Generate embedding for a single text
+        Send one /embed request with `count` inputs
         
-        Args:
-            text: Text to embed
-            
         Returns:
-            List of floats representing the embedding vector
+            Embedding vectors in input order
         """
-        self.cache_stats["total_requests"] += 1
-        self.cache_stats["text_requests"] += 1
-        
-        # Check cache first
-        cached_embedding = self._get_from_cache(text)
-        if cached_embedding:
-            logger.debug(f"✅ Cache hit for text (length={len(text)})")
-            return cached_embedding
-        
-        # Check if API key is set
         if not self.cohere_api_key:
             logger.error("❌ Cohere API key not configured")
             raise ValueError("Cohere API key not configured")
         
-        # Rate limiting
         await self._rate_limit()
         
         try:
-            # Call Cohere API via HTTP
             self.cache_stats["api_calls"] += 1
-            logger.debug(f"🔄 Calling Cohere API for text (length={len(text)})")
+            logger.debug(f"🔄 Calling Cohere API for {count} inputs")
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with httpx.AsyncClient(timeout=60.0) as client:
                 response = await client.post(
-                    f"{self.cohere_base_url}/embed",
+                    url,
                     headers={
                         "Authorization": f"Bearer {self.cohere_api_key}",
                         "Content-Type": "application/json"
                     },
-                    json={
-                        "texts": [text],
-                        "model": self.text_model_name,
-                        "input_type": "search_document"
-                    }
+                    json=payload
                 )
                 
                 response.raise_for_status()
                 data = response.json()
-                
-                if "embeddings" not in data or not data["embeddings"]:
-                    raise ValueError("No embeddings returned from Cohere API")
-                
-                embedding = data["embeddings"][0]
             
-            # Validate embedding
-            if not embedding or len(embedding) != self.embedding_dimensions:
-                raise ValueError(f"Invalid embedding dimensions: expected {self.embedding_dimensions}, got {len(embedding) if embedding else 0}")
+            embeddings = data.get("embeddings")
+            if isinstance(embeddings, dict):  # v2 responses are keyed by embedding type
+                embeddings = embeddings.get("float")
+            if not embeddings or len(embeddings) != count:
+                raise ValueError(f"Expected {count} embeddings from Cohere API, got {len(embeddings) if embeddings else 0}")
             
-            # Cache the result
-            self._save_to_cache(text, embedding)
+            # Validate embeddings
+            for embedding in embeddings:
+                if not embedding or len(embedding) != self.embedding_dimensions:
+                    raise ValueError(f"Invalid embedding dimensions: expected {self.embedding_dimensions}, got {len(embedding) if embedding else 0}")
             
-            logger.debug(f"✅ Generated text embedding (dimensions={len(embedding)})")
-            return embedding
+            return embeddings
             
         except httpx.HTTPStatusError as e:
             self.cache_stats["errors"] += 1
+            if e.response.status_code == 429:
+                self.cache_stats["rate_limited"] += 1
             logger.error(f"❌ Cohere API error: {e.response.status_code} - {e.response.text}")
             raise
         except Exception as e:
             self.cache_stats["errors"] += 1
-            logger.error(f"❌ Error generating text embedding: {e}")
+            logger.error(f"❌ Error generating embeddings: {e}")
             raise
     
-    async def embed_image(self, image_path: str, image_description: Optional[str] = None) -> List[float]:
+    async def _embed_batched(
+        self,
+        keys: List[str],
+        items: List[Any],
+        batch_size: int,
+        send: Callable[[List[Any]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
         """
-        Generate embedding for an image
+        Resolve inputs from the cache, then embed the misses in concurrent batches
         
         Args:
-            image_path: Path to image file
-            image_description: Optional text description to combine with image
+            keys: Cache key per input (duplicates are embedded once)
+            items: Request payload item per input
+            batch_size: Inputs per API call
+            send: Coroutine embedding one batch of payload items
             
         Returns:
-            List of floats representing the embedding vector
+            One embedding per input, in order
         """
-        self.cache_stats["total_requests"] += 1
-        self.cache_stats["image_requests"] += 1
+        embeddings = await self._get_many_from_cache(keys)
         
-        # Check if API key is set
-        if not self.cohere_api_key:
-            logger.error("❌ Cohere API key not configured")
-            raise ValueError("Cohere API key not configured")
+        pending: Dict[str, int] = {}
+        for i, key in enumerate(keys):
+            if embeddings[i] is None and key not in pending:
+                pending[key] = i
+        if not pending:
+            return embeddings
         
-        # Check if file exists
-        if not Path(image_path).exists():
-            raise FileNotFoundError(f"Image file not found: {image_path}")
+        misses = list(pending.values())
+        batches = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+        semaphore = asyncio.Semaphore(COHERE_EMBED_CONCURRENCY)
         
-        # Rate limiting
-        await self._rate_limit()
+        async def run(batch: List[int]) -> List[List[float]]:
+            async with semaphore:
+                return await send([items[i] for i in batch])
         
-        try:
-            # Encode image to base64
-            image_base64 = self._encode_image_to_base64(image_path)
-            
-            # Call Cohere API via HTTP
-            self.cache_stats["api_calls"] += 1
-            logger.debug(f"🔄 Calling Cohere API for image: {image_path}")
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.cohere_base_url}/embed",
-                    headers={
-                        "Authorization": f"Bearer {self.cohere_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "images": [image_base64],
-                        "model": self.multimodal_model_name,
-                        "input_type": "image"
-                    }
-                )
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                if "embeddings" not in data or not data["embeddings"]:
-                    raise ValueError("No embeddings returned from Cohere API")
-                
-                embedding = data["embeddings"][0]
-            
-            # Validate embedding
-            if not embedding or len(embedding) != self.embedding_dimensions:
-                raise ValueError(f"Invalid embedding dimensions: expected {self.embedding_dimensions}, got {len(embedding) if embedding else 0}")
+        results = await asyncio.gather(*(run(batch) for batch in batches), return_exceptions=True)
+        
+        embedded: Dict[str, List[float]] = {}
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                continue
+            for i, embedding in zip(batch, result):
+                embedded[keys[i]] = embedding
+        
+        # Keep what succeeded even if another batch failed
+        await self._save_many_to_cache(list(embedded), list(embedded.values()))
+        
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            raise failures[0]
+        
+        return [embedding if embedding is not None else embedded[key] for key, embedding in zip(keys, embeddings)]
+    
+    async def embed_text(self, text: str) -> List[float]:
+        """
+        Generate embedding for a single text
+        
+        Args:
+            text: Text to embed
             
-            logger.debug(f"✅ Generated image embedding (dimensions={len(embedding)})")
-            return embedding
+        Returns:
+            List of floats representing the embedding vector
+        """
+        [embedding] = await self.embed_texts([text])
+        return embedding
+    
+    async def embed_image(self, image_path: str, image_description: Optional[str] = None) -> List[float]:
+        """
+        Generate embedding for an image
+        
+        Args:
+            image_path: Path to image file
+            image_description: Optional text description to combine with image
             
-        except httpx.HTTPStatusError as e:
-            self.cache_stats["errors"] += 1
-            logger.error(f"❌ Cohere API error: {e.response.status_code} - {e.response.text}")
-            raise
-        except Exception as e:
-            self.cache_stats["errors"] += 1
-            logger.error(f"❌ Error generating image embedding: {e}")
-            raise
+        Returns:
+            List of floats representing the embedding vector
+        """
+        [embedding] = await self.embed_images([image_path])
+        return embedding
     
     async def embed_multimodal(self, text: Optional[str] = None, image_path: Optional[str] = None) -> List[float]:
         """
@@ -275,91 +270,150 @@ class CohereEmbeddingsService:
         Returns:
             List of floats representing the embedding vector
         """
-        if not text and not image_path:
-            raise ValueError("Must provide either text or image_path")
+        [embedding] = await self.embed_multimodal_batch([(text, image_path)])
+        return embedding
+    
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for multiple texts
         
-        if text and not image_path:
-            return await self.embed_text(text)
+        Cache misses are sent COHERE_EMBED_BATCH_SIZE texts per request,
+        with up to COHERE_EMBED_CONCURRENCY requests in flight.
         
-        if image_path and not text:
-            return await self.embed_image(image_path)
+        Args:
+            texts: List of texts to embed
+            
+        Returns:
+            List of embedding vectors
+        """
+        self.cache_stats["total_requests"] += len(texts)
+        self.cache_stats["text_requests"] += len(texts)
         
-        # Both text and image provided - combine them
-        self.cache_stats["total_requests"] += 1
+        async def send(batch: List[str]) -> List[List[float]]:
+            return await self._post_embed(
+                f"{self.cohere_base_url}/embed",
+                {
+                    "texts": batch,
+                    "model": self.text_model_name,
+                    "input_type": "search_document"
+                },
+                len(batch)
+            )
         
-        # Check if API key is set
-        if not self.cohere_api_key:
-            logger.error("❌ Cohere API key not configured")
-            raise ValueError("Cohere API key not configured")
+        return await self._embed_batched(texts, texts, COHERE_EMBED_BATCH_SIZE, send)
+    
+    async def embed_images(self, image_paths: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for multiple images
         
-        # Rate limiting
-        await self._rate_limit()
+        Images are cached by content hash, so the same figure in another
+        upload is not embedded again.
         
-        try:
-            # Encode image to base64
-            image_base64 = self._encode_image_to_base64(image_path)
-            
-            # Call Cohere API with both text and image via HTTP
-            self.cache_stats["api_calls"] += 1
-            logger.debug(f"🔄 Calling Cohere API for multimodal (text + image)")
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.cohere_base_url}/embed",
-                    headers={
-                        "Authorization": f"Bearer {self.cohere_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "texts": [text],
-                        "images": [image_base64],
-                        "model": self.multimodal_model_name,
-                        "input_type": "search_document"
-                    }
-                )
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                if "embeddings" not in data or not data["embeddings"]:
-                    raise ValueError("No embeddings returned from Cohere API")
-                
-                embedding = data["embeddings"][0]
-            
-            # Validate embedding
-            if not embedding or len(embedding) != self.embedding_dimensions:
-                raise ValueError(f"Invalid embedding dimensions: expected {self.embedding_dimensions}, got {len(embedding) if embedding else 0}")
-            
-            logger.debug(f"✅ Generated multimodal embedding (dimensions={len(embedding)})")
-            return embedding
+        Args:
+            image_paths: Paths to image files
             
-        except httpx.HTTPStatusError as e:
-            self.cache_stats["errors"] += 1
-            logger.error(f"❌ Cohere API error: {e.response.status_code} - {e.response.text}")
-            raise
-        except Exception as e:
-            self.cache_stats["errors"] += 1
-            logger.error(f"❌ Error generating multimodal embedding: {e}")
-            raise
+        Returns:
+            List of embedding vectors
+        """
+        return await self.embed_multimodal_batch([(None, path) for path in image_paths])
     
-    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+    async def embed_multimodal_batch(
+        self, inputs: List[Tuple[Optional[str], Optional[str]]]
+    ) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts
+        Generate embeddings for multiple (text, image_path) inputs
+        
+        Text-only inputs go through embed_texts. With an embed-v4 model,
+        inputs with an image are sent as fused v2 `inputs` entries,
+        COHERE_IMAGE_BATCH_SIZE per request. embed-english-v3.0 accepts one
+        image per request and no text alongside it, so there each image is
+        embedded on its own and a caption, if any, is folded in as the
+        normalized mean of the image and caption embeddings.
         
         Args:
-            texts: List of texts to embed
+            inputs: (text, image_path) pairs; either may be None, not both
             
         Returns:
             List of embedding vectors
         """
-        embeddings = []
+        if any(not text and not image_path for text, image_path in inputs):
+            raise ValueError("Must provide either text or image_path")
+        
+        text_only = [i for i, (_, image_path) in enumerate(inputs) if not image_path]
+        with_image = [i for i, (_, image_path) in enumerate(inputs) if image_path]
         
-        for text in texts:
-            embedding = await self.embed_text(text)
-            embeddings.append(embedding)
+        embeddings: List[Optional[List[float]]] = [None] * len(inputs)
+        if text_only:
+            for i, embedding in zip(text_only, await self.embed_texts([inputs[i][0] for i in text_only])):
+                embeddings[i] = embedding
+        
+        if with_image:
+            self.cache_stats["total_requests"] += len(with_image)
+            self.cache_stats["image_requests"] += len(with_image)
+            
+            images = await asyncio.gather(*(asyncio.to_thread(self._load_image, inputs[i][1]) for i in with_image))
+            if self.multimodal_model_name.startswith(FUSED_INPUT_MODEL_PREFIXES):
+                vectors = await self._embed_fused([inputs[i][0] for i in with_image], images)
+            else:
+                vectors = await self._embed_images_separately([inputs[i][0] for i in with_image], images)
+            for i, embedding in zip(with_image, vectors):
+                embeddings[i] = embedding
         
         return embeddings
     
+    async def _embed_fused(self, texts: List[Optional[str]], images: List[Dict[str, str]]) -> List[List[float]]:
+        """embed-v4: one v2 `inputs` entry per (text, image), several per request"""
+        keys, items = [], []
+        for text, image in zip(texts, images):
+            content = [{"type": "image_url", "image_url": {"url": image["data_uri"]}}]
+            if text:
+                content.insert(0, {"type": "text", "text": text})
+            keys.append(f"image:{image['digest']}" + (f"\n{text}" if text else ""))
+            items.append({"content": content})
+        
+        async def send(batch: List[Dict[str, Any]]) -> List[List[float]]:
+            return await self._post_embed(
+                f"{self.cohere_v2_base_url}/embed",
+                {
+                    "inputs": batch,
+                    "model": self.multimodal_model_name,
+                    "input_type": "search_document",
+                    "embedding_types": ["float"],
+                    "output_dimension": self.embedding_dimensions
+                },
+                len(batch)
+            )
+        
+        return await self._embed_batched(keys, items, COHERE_IMAGE_BATCH_SIZE, send)
+    
+    async def _embed_images_separately(self, texts: List[Optional[str]], images: List[Dict[str, str]]) -> List[List[float]]:
+        """embed-english-v3.0: one image per request; captions are averaged in"""
+        async def send(batch: List[str]) -> List[List[float]]:
+            return await self._post_embed(
+                f"{self.cohere_base_url}/embed",
+                {
+                    "images": batch,
+                    "model": self.multimodal_model_name,
+                    "input_type": "image"
+                },
+                len(batch)
+            )
+        
+        image_vectors = await self._embed_batched(
+            [f"image:{image['digest']}" for image in images],
+            [image["data_uri"] for image in images],
+            1,
+            send
+        )
+        captioned = [i for i, text in enumerate(texts) if text]
+        if captioned:
+            caption_vectors = await self.embed_texts([texts[i] for i in captioned])
+            for i, caption in zip(captioned, caption_vectors):
+                mean = [(a + b) / 2 for a, b in zip(image_vectors[i], caption)]
+                norm = math.sqrt(sum(x * x for x in mean)) or 1.0
+                image_vectors[i] = [x / norm for x in mean]
+        return image_vectors
+    
     # Compatibility methods for existing code
     async def generate_embedding(self, text: str) -> List[float]:
         """Alias for embed_text for backward compatibility"""
@@ -374,8 +428,9 @@ class CohereEmbeddingsService:
         stats = self.cache_stats.copy()
         
         if self.cache:
-            stats["cache_size"] = len(self.cache)
-            stats["cache_max_size"] = self.cache.maxsize
+            stats["cache_size"] = self.cache.size()
+            stats["cache_max_size"] = self.cache.max_entries
+            stats["store"] = self.cache.get_stats()
         
         if stats["total_requests"] > 0:
             stats["cache_hit_rate"] = stats["hits"] / stats["total_requests"]
@@ -385,9 +440,9 @@ class CohereEmbeddingsService:
         return stats
     
     def clear_cache(self):
-        """Clear the embedding cache"""
+        """Clear the in-process embedding cache (the persistent store is shared and kept)"""
         if self.cache:
-            self.cache.clear()
+            self.cache.clear_memory()
             logger.info("🗑️  Embedding cache cleared")
 
 
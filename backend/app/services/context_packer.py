@@ -0,0 +1,252 @@
+"""
+Context Packer
+
+Fits prompt context (RAG chunks, research findings, history turns, tool
+output) into a token budget instead of concatenating it blindly.
+
+- Tokens are counted with tiktoken (cl100k_base) when installed, otherwise
+  with a fast regex estimate that errs on the high side.
+- Each candidate Snippet is scored from its relevance (e.g. vector
+  similarity) and recency. Near-duplicate passages (word-shingle Jaccard
+  above PACKER_DEDUPE_THRESHOLD) are dropped, keeping the higher-scoring copy.
+- The remaining snippets are packed as a 0/1 knapsack (maximum total score
+  within the budget), then returned in their original order so documents
+  read naturally. Pinned snippets are always kept, truncated if they alone
+  exceed the budget.
+- Conversation history is not scored: pack_history() keeps the newest turns
+  that fit, so the kept history is always a contiguous tail.
+- Budgets are per mode and per provider (the smaller of the two wins), and
+  can be overridden with CONTEXT_BUDGET_<MODE> / CONTEXT_BUDGET_<PROVIDER>.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+PACKER_DEDUPE_THRESHOLD = float(os.environ.get("PACKER_DEDUPE_THRESHOLD", "0.8"))
+PACKER_GRANULARITY = int(os.environ.get("PACKER_GRANULARITY", "16"))  # knapsack weight unit, tokens
+
+# Input-token budgets for prompt context (excluding the completion)
+MODE_CONTEXT_TOKENS = {
+    "fast": 4500,
+    "detailed": 24000,
+    "research": 24000,
+    "deep_research": 32000,
+    "deep_research_elite": 64000,
+    "deep_research_single_pass": 16000,
+}
+DEFAULT_CONTEXT_TOKENS = 12000
+
+# Hard per-request limits of the smallest model each provider serves
+PROVIDER_CONTEXT_TOKENS = {
+    "groq": 5000,  # 6000 TPM on the free tier, less the completion headroom
+    "mistral": 28000,
+    "nvidia": 28000,
+    "pollinations": 64000,
+}
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+_UNLOADED = object()
+_encoding: Any = _UNLOADED
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base, loaded on first use; None if unavailable."""
+    global _encoding
+    if _encoding is _UNLOADED:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # ImportError, or no cached encoding offline
+            logger.info(f"ℹ️ tiktoken unavailable ({e}); using estimated token counts")
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in `text` (tiktoken if available, else a conservative estimate)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Words and punctuation, plus a share for long words that split into several tokens
+    return max(len(_WORD_RE.findall(text)) + len(text) // 16, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to at most `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    # Binary search on characters against the estimate
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def context_budget(mode: str, provider: Optional[str] = None, reserve_tokens: int = 0) -> int:
+    """Tokens available for context in `mode` (and on `provider`, if known), minus `reserve_tokens`."""
+    budget = int(os.environ.get(f"CONTEXT_BUDGET_{mode.upper()}", MODE_CONTEXT_TOKENS.get(mode, DEFAULT_CONTEXT_TOKENS)))
+    if provider:
+        limit = os.environ.get(f"CONTEXT_BUDGET_{provider.upper()}", PROVIDER_CONTEXT_TOKENS.get(provider.lower()))
+        if limit is not None:
+            budget = min(budget, int(limit))
+    return max(0, budget - reserve_tokens)
+
+
+@dataclass
+class Snippet:
+    """One candidate piece of context."""
+    text: str
+    relevance: float = 0.0  # 0..1, e.g. vector similarity
+    recency: float = 0.0  # 0..1, 1 = newest
+    kind: str = "context"
+    pinned: bool = False
+    meta: Dict[str, Any] = field(default_factory=dict)
+    tokens: int = 0
+
+    def __post_init__(self):
+        if not self.tokens:
+            self.tokens = count_tokens(self.text)
+
+
+@dataclass
+class PackResult:
+    snippets: List[Snippet]  # kept snippets, in input order
+    tokens: int
+    dropped: int = 0
+    deduped: int = 0
+
+    def text(self, separator: str = "\n\n") -> str:
+        return separator.join(s.text for s in self.snippets)
+
+
+def _shingles(text: str, size: int = 3) -> frozenset:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+class ContextPacker:
+    """Relevance/recency-scored, de-duplicated, token-budgeted snippet selection."""
+
+    def __init__(self, relevance_weight: float = 1.0, recency_weight: float = 0.5,
+                 dedupe_threshold: float = PACKER_DEDUPE_THRESHOLD,
+                 granularity: int = PACKER_GRANULARITY):
+        self.relevance_weight = relevance_weight
+        self.recency_weight = recency_weight
+        self.dedupe_threshold = dedupe_threshold
+        self.granularity = max(1, granularity)
+
+    def score(self, snippet: Snippet) -> float:
+        # Small floor so zero-scored snippets still fill spare budget
+        return 0.01 + self.relevance_weight * snippet.relevance + self.recency_weight * snippet.recency
+
+    def _dedupe(self, indexed: List[tuple]) -> List[tuple]:
+        """Drop near-duplicates, visiting higher-scoring snippets first so they win."""
+        kept, kept_shingles = [], []
+        for item in sorted(indexed, key=lambda item: item[2], reverse=True):
+            shingles = _shingles(item[1].text)
+            duplicate = any(
+                len(shingles & other) / max(1, len(shingles | other)) >= self.dedupe_threshold
+                for other in kept_shingles
+            )
+            if not duplicate:
+                kept.append(item)
+                kept_shingles.append(shingles)
+        return kept
+
+    def _knapsack(self, items: List[tuple], capacity: int) -> List[tuple]:
+        """0/1 knapsack over token weights (in `granularity` units)."""
+        unit = self.granularity
+        slots = capacity // unit
+        if slots <= 0 or not items:
+            return []
+        weights = [max(1, -(-item[1].tokens // unit)) for item in items]  # ceil
+        best = [0.0] * (slots + 1)
+        choice = [[False] * (slots + 1) for _ in items]
+        for i, item in enumerate(items):
+            w, value = weights[i], item[2]
+            for c in range(slots, w - 1, -1):
+                candidate = best[c - w] + value
+                if candidate > best[c]:
+                    best[c] = candidate
+                    choice[i][c] = True
+        chosen, c = [], slots
+        for i in range(len(items) - 1, -1, -1):
+            if choice[i][c]:
+                chosen.append(items[i])
+                c -= weights[i]
+        return chosen
+
+    def pack(self, snippets: Sequence[Snippet], budget: int, separator_tokens: int = 2) -> PackResult:
+        """Choose the best-scoring non-duplicate snippets that fit in `budget` tokens."""
+        candidates = [s for s in snippets if s.text and s.text.strip()]
+        for s in candidates:
+            s.tokens += separator_tokens
+        indexed = [(i, s, self.score(s)) for i, s in enumerate(candidates)]
+
+        unique = self._dedupe(indexed)
+        deduped = len(indexed) - len(unique)
+
+        pinned = sorted((item for item in unique if item[1].pinned), key=lambda item: item[0])
+        remaining = budget
+        chosen = []
+        for i, s, score in pinned:
+            if s.tokens > remaining:
+                s.text = truncate_to_tokens(s.text, max(0, remaining - separator_tokens))
+                s.tokens = count_tokens(s.text) + separator_tokens
+            if s.text:
+                chosen.append((i, s, score))
+                remaining -= s.tokens
+
+        optional = [item for item in unique if not item[1].pinned and item[1].tokens <= remaining]
+        chosen += self._knapsack(optional, remaining)
+        chosen.sort(key=lambda item: item[0])
+
+        kept = [s for _, s, _ in chosen]
+        for s in candidates:
+            s.tokens -= separator_tokens
+        result = PackResult(
+            snippets=kept,
+            tokens=sum(s.tokens + separator_tokens for s in kept),
+            dropped=len(candidates) - len(kept) - deduped,
+            deduped=deduped,
+        )
+        logger.debug(f"📦 Packed {len(kept)}/{len(candidates)} snippets into {result.tokens}/{budget} tokens "
+                     f"({deduped} near-duplicates)")
+        return result
+
+    def pack_history(self, turns: Sequence[Snippet], budget: int, separator_tokens: int = 2) -> PackResult:
+        """Keep the newest turns (last in `turns`) that fit in `budget` tokens, stopping at the first that doesn't."""
+        kept, used = [], 0
+        for turn in reversed(turns):
+            if not turn.text or not turn.text.strip():
+                continue
+            cost = turn.tokens + separator_tokens
+            if used + cost > budget:
+                break
+            kept.append(turn)
+            used += cost
+        kept.reverse()
+        candidates = sum(1 for t in turns if t.text and t.text.strip())
+        return PackResult(snippets=kept, tokens=used, dropped=candidates - len(kept))
+
+
+context_packer = ContextPacker()
@@ -0,0 +1,545 @@
+"""
+Dataset Store
+
+Columnar storage for uploaded tabular files (CSV / XLSX).
+
+Each upload is converted once into a ZSTD-compressed Parquet file scoped to
+its conversation. Only a compact profile (schema, per-column stats, a short
+preview) is embedded into the RAG index. Data questions are answered by
+running validated aggregate query plans (filter / group / aggregate / sort)
+against the memory-mapped Parquet file, so row text never reaches the
+prompt.
+
+Query plans are plain JSON, never code. Columns, operators and aggregate
+functions are checked against allow-lists before anything is executed.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = pc = pq = None
+    PYARROW_AVAILABLE = False
+
+DEFAULT_STORE_DIR = str(Path(__file__).resolve().parents[2] / ".cache" / "datasets")
+
+TABULAR_EXTENSIONS = {".csv", ".xlsx"}
+CSV_ENCODINGS = ["utf-8", "latin-1", "cp1252", "iso-8859-1"]
+
+MAX_RESULT_ROWS = 50
+MAX_FILTERS = 20
+MAX_IN_VALUES = 100
+PROFILE_MAX_COLUMNS = 60
+PREVIEW_ROWS = 5
+
+FILTER_OPS = {"==", "!=", ">", ">=", "<", "<=", "in", "not_in", "contains", "is_null", "not_null"}
+AGGREGATIONS = {
+    "count": "count",
+    "count_distinct": "count_distinct",
+    "sum": "sum",
+    "mean": "mean",
+    "min": "min",
+    "max": "max",
+    "median": "approximate_median",
+    "stddev": "stddev",
+}
+
+
+class DatasetQueryError(ValueError):
+    """Raised when a query plan is invalid for the target dataset."""
+
+
+def _slugify(name: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower()
+    return slug[:64] or "dataset"
+
+
+def _json_scalar(value: Any) -> Any:
+    """Make a pandas/numpy scalar JSON-safe."""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, (int, bool, str)):
+        return value
+    return str(value)
+
+
+def read_tabular(content: bytes, filename: str) -> List[Tuple[Optional[str], pd.DataFrame, Optional[str]]]:
+    """
+    Parse an uploaded CSV / XLSX into DataFrames.
+
+    Returns:
+        List of (sheet_name, dataframe, encoding). CSVs yield one entry.
+    """
+    ext = Path(filename).suffix.lower()
+    if ext == ".csv":
+        for encoding in CSV_ENCODINGS:
+            try:
+                return [(None, pd.read_csv(io.BytesIO(content), encoding=encoding), encoding)]
+            except UnicodeDecodeError:
+                continue
+        raise ValueError(f"Could not decode {filename} with any of: {', '.join(CSV_ENCODINGS)}")
+
+    sheets = pd.read_excel(io.BytesIO(content), sheet_name=None, engine="openpyxl")
+    return [(name, df, None) for name, df in sheets.items()]
+
+
+def profile_frame(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Compact schema + stats summary for a DataFrame.
+
+    Numeric columns get min / max / mean; everything else gets the distinct
+    count and the most frequent values.
+    """
+    columns = []
+    for name in df.columns[:PROFILE_MAX_COLUMNS]:
+        series = df[name]
+        col = {
+            "name": str(name),
+            "type": str(series.dtype),
+            "nulls": int(series.isna().sum()),
+        }
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            non_null = series.dropna()
+            if len(non_null):
+                col.update({
+                    "min": _json_scalar(non_null.min()),
+                    "max": _json_scalar(non_null.max()),
+                    "mean": _json_scalar(non_null.mean()),
+                })
+        else:
+            counts = series.astype(str)[series.notna()].value_counts()
+            col["distinct"] = int(len(counts))
+            col["top"] = [str(v) for v in counts.index[:3]]
+        columns.append(col)
+
+    preview = df.head(PREVIEW_ROWS).astype(object).where(df.head(PREVIEW_ROWS).notna(), None)
+    return {
+        "rows": int(len(df)),
+        "column_count": int(len(df.columns)),
+        "columns": columns,
+        "preview": [
+            {str(k): _json_scalar(v) for k, v in row.items()}
+            for row in preview.to_dict(orient="records")
+        ],
+    }
+
+
+def render_profile(manifest: Dict[str, Any]) -> str:
+    """Markdown profile embedded in place of the raw rows."""
+    title = manifest.get("filename", "dataset")
+    if manifest.get("sheet"):
+        title += f" (sheet: {manifest['sheet']})"
+
+    lines = [f"# Dataset: {title}"]
+    if manifest.get("dataset_id"):
+        lines.append(f"**Dataset ID:** {manifest['dataset_id']}  ")
+    lines += [
+        f"**Shape:** {manifest['rows']} rows × {manifest['column_count']} columns",
+        "",
+        "## Columns",
+        "| Column | Type | Nulls | Summary |",
+        "| --- | --- | --- | --- |",
+    ]
+    for col in manifest["columns"]:
+        if "mean" in col:
+            summary = f"min {col['min']}, max {col['max']}, mean {col['mean']}"
+        elif "distinct" in col:
+            summary = f"{col['distinct']} distinct; top: {', '.join(col['top'])}"
+        else:
+            summary = "-"
+        lines.append(f"| {col['name']} | {col['type']} | {col['nulls']} | {summary} |")
+    if manifest["column_count"] > len(manifest["columns"]):
+        lines.append(f"| … | | | {manifest['column_count'] - len(manifest['columns'])} more columns |")
+
+    if manifest.get("preview"):
+        headers = list(manifest["preview"][0].keys())
+        lines += [
+            "",
+            f"## Preview (first {len(manifest['preview'])} rows)",
+            "| " + " | ".join(headers) + " |",
+            "| " + " | ".join(["---"] * len(headers)) + " |",
+        ]
+        for row in manifest["preview"]:
+            lines.append("| " + " | ".join("" if row[h] is None else str(row[h]) for h in headers) + " |")
+
+    if manifest.get("dataset_id"):
+        lines += [
+            "",
+            "_Full data is stored in columnar form; aggregate questions are answered by querying it directly._",
+        ]
+    return "\n".join(lines)
+
+
+def _to_arrow(df: pd.DataFrame) -> "pa.Table":
+    """Convert to Arrow, stringifying mixed-type object columns."""
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        for name in df.columns:
+            if df[name].dtype == object:
+                df[name] = df[name].map(lambda v: None if pd.isna(v) else str(v))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class DatasetStore:
+    """
+    Conversation-scoped Parquet store with sandboxed aggregate queries.
+
+    Layout: ``<root>/<conversation_id>/<dataset_id>.parquet`` plus a
+    ``<dataset_id>.json`` manifest holding the profile.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or os.environ.get("DATASET_STORE_DIR", DEFAULT_STORE_DIR))
+
+    @property
+    def available(self) -> bool:
+        return PYARROW_AVAILABLE
+
+    def _conversation_dir(self, conversation_id: Any) -> Path:
+        # Normalizing through UUID keeps arbitrary strings out of the path
+        return self.root / str(UUID(str(conversation_id)))
+
+    # ---------------- ingest ----------------
+
+    def ingest(self, content: bytes, filename: str, conversation_id: Any) -> List[Dict[str, Any]]:
+        """
+        Convert an uploaded CSV / XLSX into Parquet datasets.
+
+        Re-uploading the same file replaces its datasets.
+
+        Returns:
+            One manifest per dataset (one per sheet for XLSX)
+        """
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is not installed")
+
+        conv_dir = self._conversation_dir(conversation_id)
+        conv_dir.mkdir(parents=True, exist_ok=True)
+        self.delete_file(conversation_id, filename)
+
+        frames = read_tabular(content, filename)
+        base_id = self._base_id(conversation_id, filename)
+        manifests = []
+        for sheet, df, encoding in frames:
+            if df.empty and not len(df.columns):
+                continue
+            dataset_id = base_id if sheet is None or len(frames) == 1 else f"{base_id}__{_slugify(str(sheet))}"
+
+            pq.write_table(_to_arrow(df), conv_dir / f"{dataset_id}.parquet", compression="zstd")
+            manifest = {
+                "dataset_id": dataset_id,
+                "filename": filename,
+                "sheet": sheet,
+                "encoding": encoding,
+                "created_at": time.time(),
+                **profile_frame(df),
+            }
+            (conv_dir / f"{dataset_id}.json").write_text(json.dumps(manifest))
+            manifests.append(manifest)
+
+        logger.info(f"📊 Stored {len(manifests)} dataset(s) from {filename} for conversation {conversation_id}")
+        return manifests
+
+    def _base_id(self, conversation_id: Any, filename: str) -> str:
+        """
+        Dataset id (prefix) for ``filename``: the slugified stem, extended with
+        the extension and then a filename hash while another file in the
+        conversation already uses it (``x.csv`` and ``x.xlsx`` must not share
+        a Parquet file).
+        """
+        taken = {
+            m["dataset_id"] for m in self.list_datasets(conversation_id)
+            if m.get("filename") != filename
+        }
+        path = Path(filename)
+        stem = _slugify(path.stem)
+        candidates = [stem]
+        if path.suffix:
+            candidates.append(f"{stem}_{_slugify(path.suffix)}")
+        candidates.append(f"{stem}_{hashlib.sha256(filename.encode('utf-8')).hexdigest()[:8]}")
+        for candidate in candidates:
+            if not any(t == candidate or t.startswith(f"{candidate}__") for t in taken):
+                return candidate
+        return candidates[-1]
+
+    async def aingest(self, content: bytes, filename: str, conversation_id: Any) -> List[Dict[str, Any]]:
+        """Ingest without blocking the event loop."""
+        return await asyncio.to_thread(self.ingest, content, filename, conversation_id)
+
+    # ---------------- catalog ----------------
+
+    def list_datasets(self, conversation_id: Any) -> List[Dict[str, Any]]:
+        """Manifests for every dataset stored for the conversation."""
+        try:
+            conv_dir = self._conversation_dir(conversation_id)
+        except ValueError:
+            return []
+        if not conv_dir.is_dir():
+            return []
+        manifests = []
+        for path in sorted(conv_dir.glob("*.json")):
+            try:
+                manifests.append(json.loads(path.read_text()))
+            except Exception as e:
+                logger.warning(f"⚠️ Skipping unreadable dataset manifest {path}: {e}")
+        return manifests
+
+    def delete_file(self, conversation_id: Any, filename: str):
+        """Remove every dataset created from ``filename``."""
+        for manifest in self.list_datasets(conversation_id):
+            if manifest.get("filename") == filename:
+                conv_dir = self._conversation_dir(conversation_id)
+                for suffix in (".parquet", ".json"):
+                    (conv_dir / f"{manifest['dataset_id']}{suffix}").unlink(missing_ok=True)
+
+    def delete_conversation(self, conversation_id: Any):
+        """Remove all datasets for a conversation."""
+        try:
+            shutil.rmtree(self._conversation_dir(conversation_id), ignore_errors=True)
+        except ValueError:
+            pass
+
+    # ---------------- query ----------------
+
+    def query(self, conversation_id: Any, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a validated aggregate query plan.
+
+        Plan keys (all optional except ``dataset`` when several exist):
+            dataset: dataset_id
+            filters: [{"column", "op", "value"}]
+            group_by: [column, ...]
+            aggregations: [{"fn", "column"}]  (column may be omitted for count)
+            select: [column, ...]  (row listing when no aggregations)
+            sort: [{"column", "direction": "asc"|"desc"}]
+            limit: int (capped at MAX_RESULT_ROWS)
+
+        Returns:
+            {"dataset", "columns", "rows", "row_count", "truncated"}
+
+        Raises:
+            DatasetQueryError: If the plan references unknown datasets,
+                columns, operators or functions
+        """
+        if not PYARROW_AVAILABLE:
+            raise DatasetQueryError("Dataset queries are unavailable (pyarrow not installed)")
+        if not isinstance(plan, dict):
+            raise DatasetQueryError("Query plan must be an object")
+
+        manifests = {m["dataset_id"]: m for m in self.list_datasets(conversation_id)}
+        if not manifests:
+            raise DatasetQueryError("No datasets uploaded in this conversation")
+        dataset_id = plan.get("dataset") or (next(iter(manifests)) if len(manifests) == 1 else None)
+        if dataset_id not in manifests:
+            raise DatasetQueryError(f"Unknown dataset '{dataset_id}'. Available: {', '.join(manifests)}")
+
+        path = self._conversation_dir(conversation_id) / f"{dataset_id}.parquet"
+        schema = pq.read_schema(path)
+        columns = set(schema.names)
+
+        def check_column(name):
+            if not isinstance(name, str) or name not in columns:
+                raise DatasetQueryError(f"Unknown column '{name}'")
+            return name
+
+        filters = plan.get("filters") or []
+        group_by = [check_column(c) for c in (plan.get("group_by") or [])]
+        aggregations = plan.get("aggregations") or []
+        select = [check_column(c) for c in (plan.get("select") or [])]
+        if len(filters) > MAX_FILTERS:
+            raise DatasetQueryError(f"At most {MAX_FILTERS} filters are allowed")
+        try:
+            limit = max(1, min(int(plan.get("limit") or MAX_RESULT_ROWS), MAX_RESULT_ROWS))
+        except (TypeError, ValueError):
+            raise DatasetQueryError("limit must be an integer")
+
+        expression = None
+        needed = set(group_by) | set(select)
+        for f in filters:
+            if not isinstance(f, dict):
+                raise DatasetQueryError("Each filter must be an object")
+            name = check_column(f.get("column"))
+            needed.add(name)
+            clause = self._filter_expression(name, schema.field(name).type, f.get("op"), f.get("value"))
+            expression = clause if expression is None else expression & clause
+
+        agg_specs = []
+        output_names = []
+        for agg in aggregations:
+            if not isinstance(agg, dict) or agg.get("fn") not in AGGREGATIONS:
+                raise DatasetQueryError(f"Aggregation must be one of: {', '.join(AGGREGATIONS)}")
+            fn, name = agg["fn"], agg.get("column")
+            if name is None:
+                if fn != "count":
+                    raise DatasetQueryError(f"'{fn}' needs a column")
+                agg_specs.append(([], "count_all"))
+                output_names.append("count")
+            else:
+                needed.add(check_column(name))
+                agg_specs.append((name, AGGREGATIONS[fn]))
+                output_names.append(f"{fn}_{name}")
+        if group_by and not agg_specs:
+            agg_specs.append(([], "count_all"))
+            output_names.append("count")
+
+        read_columns = [c for c in schema.names if c in needed] if (needed or agg_specs) else None
+        try:
+            table = pq.read_table(path, columns=read_columns, filters=expression, memory_map=True)
+            if agg_specs:
+                table = table.group_by(group_by).aggregate(agg_specs)
+                table = table.rename_columns(list(group_by) + output_names)
+            elif select:
+                table = table.select(select)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+            raise DatasetQueryError(f"Query failed: {e}")
+
+        sort_keys = []
+        for s in plan.get("sort") or []:
+            name = s.get("column") if isinstance(s, dict) else None
+            if name not in table.column_names:
+                raise DatasetQueryError(f"Cannot sort by '{name}'")
+            sort_keys.append((name, "descending" if s.get("direction") == "desc" else "ascending"))
+        if sort_keys:
+            table = table.sort_by(sort_keys)
+
+        row_count = table.num_rows
+        table = table.slice(0, limit)
+        return {
+            "dataset": dataset_id,
+            "columns": table.column_names,
+            "rows": [[_json_scalar(v) for v in row.values()] for row in table.to_pylist()],
+            "row_count": row_count,
+            "truncated": row_count > limit,
+        }
+
+    @staticmethod
+    def _filter_expression(name: str, arrow_type: Any, op: Any, value: Any):
+        """Build a pyarrow filter expression, coercing values to the column type."""
+        if op not in FILTER_OPS:
+            raise DatasetQueryError(f"Filter op must be one of: {', '.join(sorted(FILTER_OPS))}")
+        field = pc.field(name)
+        if op == "is_null":
+            return field.is_null()
+        if op == "not_null":
+            return field.is_valid()
+        if op == "contains":
+            return pc.match_substring(field.cast(pa.string()), str(value), ignore_case=True)
+
+        def coerce(v):
+            try:
+                if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+                    return float(v)
+                if pa.types.is_boolean(arrow_type):
+                    return str(v).lower() in ("true", "1", "yes")
+                if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+                    return str(v)
+            except (TypeError, ValueError):
+                raise DatasetQueryError(f"Value {v!r} does not match the type of column '{name}'")
+            return v
+
+        if op in ("in", "not_in"):
+            if not isinstance(value, list) or len(value) > MAX_IN_VALUES:
+                raise DatasetQueryError(f"'{op}' needs a list of at most {MAX_IN_VALUES} values")
+            clause = field.isin([coerce(v) for v in value])
+            return ~clause if op == "not_in" else clause
+
+        value = coerce(value)
+        return {
+            "==": field == value,
+            "!=": field != value,
+            ">": field > value,
+            ">=": field >= value,
+            "<": field < value,
+            "<=": field <= value,
+        }[op]
+
+
+# ---------------- LLM planning helpers ----------------
+
+def build_query_prompt(question: str, manifests: List[Dict[str, Any]]) -> str:
+    """Prompt asking the model to turn a question into a JSON query plan."""
+    catalog = []
+    for m in manifests:
+        cols = ", ".join(f"{c['name']} ({c['type']})" for c in m["columns"])
+        catalog.append(f"- {m['dataset_id']} [{m['rows']} rows] from {m['filename']}: {cols}")
+
+    return f"""You translate questions about uploaded tables into a JSON query plan.
+
+Datasets:
+{chr(10).join(catalog)}
+
+Plan schema:
+{{"dataset": "<dataset id>",
+  "filters": [{{"column": "<col>", "op": "== | != | > | >= | < | <= | in | not_in | contains | is_null | not_null", "value": <value>}}],
+  "group_by": ["<col>"],
+  "aggregations": [{{"fn": "count | count_distinct | sum | mean | min | max | median | stddev", "column": "<col or omit for count>"}}],
+  "select": ["<col>"],
+  "sort": [{{"column": "<output col, e.g. mean_<col> or count>", "direction": "asc | desc"}}],
+  "limit": <1-{MAX_RESULT_ROWS}>}}
+
+Use exact column names. Aggregated outputs are named <fn>_<column> (or "count").
+If the question cannot be answered from these tables, return {{"dataset": null}}.
+Return ONLY the JSON object.
+
+Question: {question}"""
+
+
+def parse_query_plan(text: str) -> Optional[Dict[str, Any]]:
+    """Extract the JSON plan from a model response; None if there is no query."""
+    if not text:
+        return None
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        plan = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(plan, dict) or not plan.get("dataset"):
+        return None
+    return plan
+
+
+def render_result(result: Dict[str, Any]) -> str:
+    """Markdown table for a query result."""
+    if not result["rows"]:
+        return f"Query on `{result['dataset']}` returned no rows."
+    lines = [
+        "| " + " | ".join(result["columns"]) + " |",
+        "| " + " | ".join(["---"] * len(result["columns"])) + " |",
+    ]
+    for row in result["rows"]:
+        lines.append("| " + " | ".join("" if v is None else str(v) for v in row) + " |")
+    footer = f"\n_{result['row_count']} result rows"
+    footer += f", showing first {len(result['rows'])}_" if result["truncated"] else "_"
+    return "\n".join(lines) + footer
+
+
+# Singleton instance
+dataset_store = DatasetStore()
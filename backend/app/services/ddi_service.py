@@ -9,8 +9,9 @@ API Documentation:
 - RxNav: https://nmctest.nlm.nih.gov/RxNav/
 """
 
+import asyncio
 import httpx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
 import logging
 from datetime import datetime
@@ -24,7 +25,8 @@ class DDIService:
     - Drug name to RxCUI resolution via RxNorm
     - Interaction checking via RxNav API
     - Severity classification (Major, Moderate, Minor)
-    - Polypharmacy checking (multiple drugs)
+    - Polypharmacy checking (multiple drugs, one RxNav call + one batched AI call)
+    - Order-independent pair cache
     - Free NLM APIs - no key required
     """
     
@@ -41,6 +43,9 @@ class DDIService:
         "significant": "Moderate",
     }
     
+    # Marker for the safe default returned when no source could answer
+    UNAVAILABLE_DESCRIPTION = "Information temporarily unavailable."
+    
     def __init__(self):
         """Initialize DDIService"""
         self._cache: Dict[str, Dict[str, Any]] = {}
@@ -168,10 +173,10 @@ class DDIService:
         Returns:
             Dict with interaction details or None if no interaction
         """
-        # Check cache
-        cache_key = f"ddi:{drug_a.lower()}:{drug_b.lower()}"
+        # Check cache (A+B and B+A share an entry)
+        cache_key = self._pair_key(drug_a, drug_b)
         if cache_key in self._cache:
-            return self._cache[cache_key]
+            return self._orient(self._cache[cache_key], drug_a, drug_b)
         
         # Try to resolve drugs to RxCUIs
         rxcui_a = await self.resolve_drug(drug_a)
@@ -233,7 +238,9 @@ class DDIService:
         ai_result = await self._check_interaction_ai(drug_a, drug_b)
         ai_result["rxcui_a"] = rxcui_a or "Unknown"
         ai_result["rxcui_b"] = rxcui_b or "Unknown"
-        self._cache[cache_key] = ai_result
+        # Don't cache transient failures
+        if not self._is_unavailable(ai_result):
+            self._cache[cache_key] = ai_result
         return ai_result
 
     async def _check_interaction_ai(self, drug_a: str, drug_b: str) -> Dict[str, Any]:
@@ -270,14 +277,7 @@ Only provide the JSON object. No preamble, no postamble."""
                 use_rag=False
             )
             
-            # Extract JSON from response (handling potential markdown blocks)
-            content = raw_response
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            data = json.loads(content)
+            data = self._extract_json(raw_response)
             
             # Ensure severity is mapped to our required casing/values
             severity = data.get("severity", "None")
@@ -296,17 +296,31 @@ Only provide the JSON object. No preamble, no postamble."""
             
         except Exception as e:
             self.logger.error(f"AI DDI check failed: {e}")
-            # Safe default
-            return {
-                "drug_a": drug_a,
-                "drug_b": drug_b,
-                "interaction_found": False,
-                "severity": "Unknown",
-                "description": "Information temporarily unavailable.",
-                "mechanism": "The Interaction API is undergoing maintenance.",
-                "clinical_significance": "Consult a pharmacist.",
-                "evidence_level": "None"
-            }
+            return self._unavailable_result(drug_a, drug_b)
+
+    @staticmethod
+    def _extract_json(raw_response: str) -> Any:
+        """Parse JSON from an LLM response (handling potential markdown blocks)"""
+        content = raw_response
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+        return json.loads(content)
+
+    @classmethod
+    def _unavailable_result(cls, drug_a: str, drug_b: str) -> Dict[str, Any]:
+        """Safe default when neither RxNav nor the AI fallback can answer"""
+        return {
+            "drug_a": drug_a,
+            "drug_b": drug_b,
+            "interaction_found": False,
+            "severity": "Unknown",
+            "description": cls.UNAVAILABLE_DESCRIPTION,
+            "mechanism": "The Interaction API is undergoing maintenance.",
+            "clinical_significance": "Consult a pharmacist.",
+            "evidence_level": "None"
+        }
     
     def _parse_interaction(
         self, 
@@ -394,6 +408,152 @@ Only provide the JSON object. No preamble, no postamble."""
         
         return alternatives
     
+    @classmethod
+    def _is_unavailable(cls, result: Dict[str, Any]) -> bool:
+        return result.get("description") == cls.UNAVAILABLE_DESCRIPTION
+
+    @staticmethod
+    def _pair_key(drug_a: str, drug_b: str) -> str:
+        """Order-independent cache key for a drug pair"""
+        names = sorted([drug_a.lower().strip(), drug_b.lower().strip()])
+        return f"ddi:{names[0]}:{names[1]}"
+
+    @staticmethod
+    def _orient(result: Dict[str, Any], drug_a: str, drug_b: str) -> Dict[str, Any]:
+        """Return a copy of a cached pair result with drug_a/drug_b in the requested order"""
+        oriented = dict(result)
+        cached_a = str(result.get("drug_a", "")).lower().strip()
+        if cached_a and cached_a != drug_a.lower().strip() and cached_a == drug_b.lower().strip():
+            oriented["drug_a"], oriented["drug_b"] = result.get("drug_b"), result.get("drug_a")
+            oriented["rxcui_a"], oriented["rxcui_b"] = result.get("rxcui_b"), result.get("rxcui_a")
+        return oriented
+
+    async def _fetch_interaction_map(self, rxcuis: List[str]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Fetch every interaction among a set of RxCUIs in one RxNav call.
+
+        Uses the interaction list endpoint, which returns all pairs between
+        the given concepts at once.
+
+        Returns:
+            Map of sorted (rxcui, rxcui) -> RxNav interaction pair
+        """
+        interaction_map: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        if len(rxcuis) < 2:
+            return interaction_map
+
+        try:
+            async with httpx.AsyncClient(timeout=15.0) as client:
+                response = await client.get(
+                    f"{self.RXNAV_BASE}/interaction/list.json",
+                    params={
+                        "rxcuis": " ".join(rxcuis),
+                        "sources": "ONCHigh DrugBank"
+                    }
+                )
+
+            if response.status_code != 200:
+                return interaction_map
+
+            data = response.json()
+            for group in data.get("fullInteractionTypeGroup", []):
+                for full_type in group.get("fullInteractionType", []):
+                    for pair in full_type.get("interactionPair", []):
+                        concepts = pair.get("interactionConcept", [])
+                        pair_rxcuis = [
+                            concept.get("minConceptItem", {}).get("rxcui")
+                            for concept in concepts
+                        ]
+                        if len(pair_rxcuis) == 2 and all(pair_rxcuis):
+                            key = tuple(sorted(pair_rxcuis))
+                            # Keep the first (highest-priority source) pair
+                            interaction_map.setdefault(key, pair)
+        except Exception as e:
+            print(f"⚠️ RxNav list API error, falling back to AI: {e}")
+
+        return interaction_map
+
+    async def _check_interactions_ai_batch(
+        self,
+        pairs: List[Tuple[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Check several drug pairs with a single AI call.
+
+        Args:
+            pairs: (drug_a, drug_b) tuples not resolved by RxNav
+
+        Returns:
+            One result dict per pair, in input order
+        """
+        if len(pairs) == 1:
+            return [await self._check_interaction_ai(*pairs[0])]
+
+        print(f"🤖 AI Fallback: Checking DDI for {len(pairs)} pairs in one batch...")
+
+        pair_lines = "\n".join(
+            f"{i + 1}. {drug_a} + {drug_b}" for i, (drug_a, drug_b) in enumerate(pairs)
+        )
+        prompt = f"""You are a senior clinical pharmacologist. For EACH numbered drug pair below, identify if there is a known drug-drug interaction.
+
+{pair_lines}
+
+Consider pharmacokinetics (CYP450 metabolism, P-gp transport, protein binding) and pharmacodynamics.
+
+Respond STRICTLY with a JSON array containing exactly {len(pairs)} objects, in the same order as the pairs, each with the following keys:
+- pair_index: integer (the pair number above)
+- interaction_found: boolean
+- severity: string ("Major", "Moderate", "Minor", or "None")
+- description: string (Precise clinical summary. Include drug classes: e.g. "Statin + Azole Antifungal")
+- mechanism: string (Mechanistic reason, naming the drugs involved)
+- clinical_significance: string (Specific management strategy)
+- evidence_level: string (e.g., "★★★ (High - Clinical Trials)", "★★☆ (Moderate - Case Reports)", "★☆☆ (Low - Theoretical)")
+
+Only provide the JSON array. No preamble, no postamble."""
+
+        by_index: Dict[int, Dict[str, Any]] = {}
+        try:
+            raw_response = await self.ai_service.generate_response(
+                message=prompt,
+                conversation_id=None,  # System level
+                user=None,  # System level
+                mode="fast",
+                use_rag=False
+            )
+            entries = self._extract_json(raw_response)
+            if isinstance(entries, dict):
+                entries = entries.get("interactions", [])
+
+            for position, entry in enumerate(entries):
+                if not isinstance(entry, dict):
+                    continue
+                index = entry.pop("pair_index", position + 1)
+                try:
+                    by_index[int(index) - 1] = entry
+                except (TypeError, ValueError):
+                    by_index[position] = entry
+        except Exception as e:
+            self.logger.error(f"Batched AI DDI check failed: {e}")
+
+        results = []
+        for i, (drug_a, drug_b) in enumerate(pairs):
+            data = by_index.get(i)
+            if data is None:
+                results.append(self._unavailable_result(drug_a, drug_b))
+                continue
+
+            severity = str(data.get("severity", "None"))
+            if severity.lower() in self.SEVERITY_MAP:
+                data["severity"] = self.SEVERITY_MAP[severity.lower()]
+            data.update({
+                "drug_a": drug_a,
+                "drug_b": drug_b,
+                "alternatives": self._suggest_alternatives(drug_a, drug_b, data.get("severity", "None"))
+            })
+            results.append(data)
+
+        return results
+
     async def check_polypharmacy(
         self, 
         drugs: List[str]
@@ -401,27 +561,88 @@ Only provide the JSON object. No preamble, no postamble."""
         """
         Check all pairwise interactions for multiple drugs.
         
+        Resolves every RxCUI concurrently, fetches all RxNav interactions
+        among them in one request, and sends only the pairs RxNav couldn't
+        answer to a single batched AI prompt. Results are cached per
+        unordered pair.
+        
         Args:
             drugs: List of drug names
             
         Returns:
             List of all pairwise interactions
         """
-        if len(drugs) < 2:
+        # Drop case-insensitive duplicates, keeping first spelling
+        by_name: Dict[str, str] = {}
+        for drug in drugs:
+            by_name.setdefault(drug.lower().strip(), drug)
+        unique_drugs = list(by_name.values())
+        if len(unique_drugs) < 2:
             return []
         
-        interactions = []
+        pairs = [
+            (unique_drugs[i], unique_drugs[j])
+            for i in range(len(unique_drugs))
+            for j in range(i + 1, len(unique_drugs))
+        ]
         
-        # Check all pairs
-        for i in range(len(drugs)):
-            for j in range(i + 1, len(drugs)):
-                drug_a = drugs[i]
-                drug_b = drugs[j]
-                
-                interaction = await self.check_interaction(drug_a, drug_b)
-                if interaction:
-                    interaction["pair"] = f"{drug_a} + {drug_b}"
-                    interactions.append(interaction)
+        results: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        pending = []
+        for drug_a, drug_b in pairs:
+            cache_key = self._pair_key(drug_a, drug_b)
+            if cache_key in self._cache:
+                results[(drug_a, drug_b)] = self._orient(self._cache[cache_key], drug_a, drug_b)
+            else:
+                pending.append((drug_a, drug_b))
+        
+        if pending:
+            # 1. Resolve every involved drug concurrently
+            involved = list(dict.fromkeys(drug for pair in pending for drug in pair))
+            resolved = await asyncio.gather(
+                *[self.resolve_drug(drug) for drug in involved],
+                return_exceptions=True
+            )
+            rxcui_by_drug = {
+                drug: rxcui if isinstance(rxcui, str) else None
+                for drug, rxcui in zip(involved, resolved)
+            }
+            
+            # 2. One RxNav request for all pairs among the resolved drugs
+            rxcuis = list(dict.fromkeys(r for r in rxcui_by_drug.values() if r))
+            interaction_map = await self._fetch_interaction_map(rxcuis)
+            
+            unresolved = []
+            for drug_a, drug_b in pending:
+                rxcui_a, rxcui_b = rxcui_by_drug.get(drug_a), rxcui_by_drug.get(drug_b)
+                pair = None
+                if rxcui_a and rxcui_b:
+                    pair = interaction_map.get(tuple(sorted((rxcui_a, rxcui_b))))
+                if pair:
+                    results[(drug_a, drug_b)] = self._parse_interaction_pair(
+                        pair, drug_a, drug_b, rxcui_a, rxcui_b
+                    )
+                else:
+                    unresolved.append((drug_a, drug_b))
+            
+            # 3. Everything RxNav couldn't answer goes to one AI prompt
+            if unresolved:
+                ai_results = await self._check_interactions_ai_batch(unresolved)
+                for (drug_a, drug_b), ai_result in zip(unresolved, ai_results):
+                    ai_result["rxcui_a"] = rxcui_by_drug.get(drug_a) or "Unknown"
+                    ai_result["rxcui_b"] = rxcui_by_drug.get(drug_b) or "Unknown"
+                    results[(drug_a, drug_b)] = ai_result
+            
+            for drug_a, drug_b in pending:
+                result = results[(drug_a, drug_b)]
+                # Don't cache transient failures
+                if not self._is_unavailable(result):
+                    self._cache[self._pair_key(drug_a, drug_b)] = dict(result)
+        
+        interactions = []
+        for drug_a, drug_b in pairs:
+            interaction = dict(results[(drug_a, drug_b)])
+            interaction["pair"] = f"{drug_a} + {drug_b}"
+            interactions.append(interaction)
         
         # Sort by severity (most severe first)
         severity_order = {"Major": 0, "Moderate": 1, "Minor": 2, "None": 3, "Unknown": 4}
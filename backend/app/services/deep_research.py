@@ -10,8 +10,8 @@ import httpx
 import asyncio
 import xml.etree.ElementTree as ET
 import re
-from typing import Optional, Dict, Any, List, TypedDict, AsyncGenerator
-from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, TypedDict, AsyncGenerator, Awaitable, Callable
+from dataclasses import asdict, dataclass, field, fields
 from uuid import UUID
 from datetime import datetime
 import time
@@ -22,12 +22,76 @@ from bs4 import BeautifulSoup
 from app.core.config import settings
 from app.services.pmc_fulltext import PMCFullTextService
 from app.services.pdf_fulltext import PDFFullTextService
+from app.services.context_packer import Snippet, context_budget, context_packer
 from html.parser import HTMLParser
 from supabase import Client
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Report writer: "sections" streams the report one section at a time,
+# "single_pass" asks for the whole report in one request
+DEEP_RESEARCH_WRITER_MODE = os.environ.get("DEEP_RESEARCH_WRITER_MODE", "sections")
+WRITER_SECTION_SOURCES = int(os.environ.get("WRITER_SECTION_SOURCES", "12"))
+WRITER_SECTION_SOURCE_CHARS = int(os.environ.get("WRITER_SECTION_SOURCE_CHARS", "2000"))
+WRITER_SECTION_CONTEXT_TOKENS = int(os.environ.get("WRITER_SECTION_CONTEXT_TOKENS", "8000"))
+WRITER_SECTION_CONCURRENCY = int(os.environ.get("WRITER_SECTION_CONCURRENCY", "3"))
+WRITER_SECTION_RETRIES = 2
+WRITER_SECTION_RETRY_BACKOFF = 2.0
+
+# Fixed report structure; `focus` steers both the prompt and source selection
+REPORT_SECTIONS = [
+    {"heading": "Executive Summary", "words": 200,
+     "focus": "overview key findings efficacy outcomes conclusions"},
+    {"heading": "Background and Clinical Context", "words": 400,
+     "focus": "background epidemiology disease burden clinical context prevalence history"},
+    {"heading": "Mechanisms of Action and Pharmacodynamics", "words": 500,
+     "focus": "mechanism pathway receptor target inhibition signaling pharmacodynamics molecular"},
+    {"heading": "Comparative Analysis and Efficacy", "words": 500,
+     "focus": "efficacy comparison trial randomized response survival outcome versus standard"},
+    {"heading": "Safety Profiles and Adverse Events", "words": 400,
+     "focus": "safety adverse events toxicity tolerability side effects dose"},
+    {"heading": "Regulatory Framework and Approval Pathways", "words": 250,
+     "focus": "regulatory approval FDA EMA guideline label indication"},
+    {"heading": "Economic Impact and Market Access", "words": 200,
+     "focus": "cost economic market access pricing reimbursement effectiveness"},
+    {"heading": "Conclusion and Future Directions", "words": 350,
+     "focus": "future directions limitations evidence gaps ongoing trials research needs"},
+]
+
+SECTION_SYSTEM_PROMPT = """You are a senior medical/scientific research analyst writing ONE section of a
+highly academic review article on: {question}
+
+Write ONLY the section "## {heading}" (about {words} words), starting with that exact H2 heading.
+Section focus: {focus}.
+The tone must be objective, empirical, and strictly scientific.
+
+## RULES:
+1. **Quantitative Density**: Never say "more effective" or "showed promise." Give effect sizes, p-values, IC50s, response rates.
+2. **Molecular Granularity**: Describe specific pathways and mechanisms instead of generic definitions.
+3. Mechanisms and comparative-efficacy sections MUST include a Markdown table, followed on the next line by "Table adapted from [First Author] et al., [Year]".
+4. Map clinical findings to NCT IDs when present in the data.
+5. GROUND EVERY CLAIM in the GROUNDING DATA and cite using APA in-text citations (Author, Year). The author must match the first author's surname in the data exactly. Do NOT invent citations.
+6. Use H3 (###) for subsections. No code fences, no placeholders, no References section, no other sections.
+"""
+
+_TERM_RE = re.compile(r"[a-z0-9]{4,}")
+
+
+def _terms(text: str) -> List[str]:
+    """Lower-cased content words used for section/source relevance matching."""
+    return _TERM_RE.findall(text.lower())
+
+
+def strip_thinking(response: str) -> str:
+    """Strip Qwen 3.5 thinking mode tags (<think>...</think>), keeping only the final answer."""
+    if '<think>' in response:
+        think_end = response.rfind('</think>')
+        if think_end != -1:
+            response = response[think_end + len('</think>'):].strip()
+            logger.info("🧠 Stripped thinking tags from response")
+    return response
+
 
 # Shared HTML parser for DuckDuckGo results (extracted to avoid duplication)
 class DDGParser(HTMLParser):
@@ -118,13 +182,35 @@ class ResearchState:
     steps: List[ResearchStep] = field(default_factory=list)
     findings: List[Finding] = field(default_factory=list)
     citations: List[Citation] = field(default_factory=list)
-    report_sections: Dict[str, str] = field(default_factory=dict)
+    report_sections: Dict[str, str] = field(default_factory=dict)  # heading -> finished section markdown
+    failed_sections: List[str] = field(default_factory=list)
     final_report: str = ""
     iteration_count: int = 0
     max_iterations: int = 2  # Cap at 2 rounds to prevent SERP 429 loops
     status: str = "initializing"  # initializing, planning, researching, reviewing, writing, complete, error
     error_message: Optional[str] = None
     progress_log: List[str] = field(default_factory=list)
+    completed_nodes: List[str] = field(default_factory=list)  # graph nodes already run (for resume)
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot of the state, for resuming mid-graph."""
+        return asdict(self)
+
+    @classmethod
+    def from_checkpoint(cls, data: Dict[str, Any]) -> "ResearchState":
+        """Rebuild a state saved with to_checkpoint()."""
+        def build(kind, values):
+            names = {f.name for f in fields(kind)}
+            return kind(**{k: v for k, v in values.items() if k in names})
+
+        data = dict(data)
+        data["steps"] = [
+            build(ResearchStep, {**s, "findings": [build(Finding, f) for f in s.get("findings", [])]})
+            for s in data.get("steps", [])
+        ]
+        data["findings"] = [build(Finding, f) for f in data.get("findings", [])]
+        data["citations"] = [build(Citation, c) for c in data.get("citations", [])]
+        return build(cls, data)
 
 
 # ============================================================================
@@ -677,14 +763,7 @@ class DeepResearchService:
             if not response:
                 raise ValueError("Empty content from LLM")
             
-            # Strip Qwen 3.5 thinking mode tags (<think>...</think>)
-            # The model generates internal reasoning before the final answer
-            if '<think>' in response:
-                # Extract only the content after </think>
-                think_end = response.rfind('</think>')
-                if think_end != -1:
-                    response = response[think_end + len('</think>'):].strip()
-                    logger.info(f"🧠 Stripped thinking tags from response")
+            response = strip_thinking(response)
             
             duration = time.time() - start_time
             
@@ -1225,48 +1304,260 @@ Return as JSON: {{"queries": ["query1", "query2", "query3"]}}"""
         """
         Synthesize findings into a professional research report.
         """
+        async for _ in self._node_writer_streaming(state):
+            pass
+        return state
+
+    async def _node_writer_streaming(self, state: ResearchState) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Writer node that yields a "report_section" event as each section is done.
+
+        In "sections" mode every section is streamed through
+        MultiProviderService.generate_streaming with its own relevance-selected
+        sources. Sections already in state.report_sections are reused, so a
+        re-run only writes what is missing. "single_pass" keeps the original
+        one-request Tier 1 / Tier 2 report and yields no section events.
+        """
         state.status = "writing"
         state.progress_log.append(f"[{datetime.now().isoformat()}] Drafting final manuscript...")
         logger.info(f"ENTERING WRITER NODE WITH: {len(state.findings)} findings, {len(state.citations)} citations")
-        
+
         # Handle empty results
         if not state.citations and not state.findings:
             state.final_report = f"# Research Report: {state.research_question}\n\nNo significant data found."
             state.status = "complete"
-            return state
+            return
 
         # Prepare validated findings
         # --- Context Relevance Check ---
-        # NOTE: Bypassed aggressive LLM filtering here because it was falsely returning 0 IDs 
-        # and wiping the citation list under Mistral/Groq. 
+        # NOTE: Bypassed aggressive LLM filtering here because it was falsely returning 0 IDs
+        # and wiping the citation list under Mistral/Groq.
         # The researcher node already filters heuristics.
-        
-        # Compute citationCounts for sorting (Tier 2 fallback needs Top 20)
+        sorted_citations = self._rank_citations(state)
+
+        full_report_content = None
+        used_citations: List[Citation] = []
+        if DEEP_RESEARCH_WRITER_MODE == "sections":
+            section_sources = {
+                s["heading"]: self._select_section_sources(state, sorted_citations, s)
+                for s in REPORT_SECTIONS
+            }
+            async for event in self._write_sections(state, section_sources):
+                yield event
+            written = [s["heading"] for s in REPORT_SECTIONS if s["heading"] in state.report_sections]
+            if written:
+                full_report_content = f"# {state.research_question}\n\n" + "\n\n".join(
+                    state.report_sections[h] for h in written
+                )
+                used_ids = {c.id for h in written for c in section_sources[h]}
+                used_citations = [c for c in sorted_citations if c.id in used_ids]
+            else:
+                state.progress_log.append(f"[{datetime.now().isoformat()}] No sections could be written. Falling back to single-pass report...")
+
+        if full_report_content is None:
+            full_report_content, used_citations = await self._write_single_pass(state, sorted_citations)
+
+        self._finalize_report(state, full_report_content, used_citations)
+
+    def _rank_citations(self, state: ResearchState) -> List[Citation]:
+        """Sort citations by citationCount (descending) for source selection."""
         for citation in state.citations:
             finding = next((f for f in state.findings if f.title == citation.title), None)
             if finding and hasattr(finding, '_pubmed_data'):
                 citation._citationCount = finding._pubmed_data.get("citationCount", 0)
             else:
                 citation._citationCount = 0
-                
-        # Sort citations by relevance (citationCount descending)
-        sorted_citations = sorted(state.citations, key=lambda c: getattr(c, "_citationCount", 0), reverse=True)
-
-        def build_findings_text(citations_list):
-            text = ""
-            for c in citations_list:
-                f = next((f_ for f_ in state.findings if f_.title == c.title), None)
-                if f:
-                    text += f"\n[{c.id}] {c.title}\n"
-                    text += f"   Authors: {c.authors or 'Unknown'}\n"
-                    text += f"   Source: {c.source} | Year: {c.year or 'n.d.'}\n"
-                    if c.doi:
-                        text += f"   DOI: {c.doi}\n"
-                    if c.pmid:
-                        text += f"   PMID: {c.pmid}\n"
-                    text += f"   Key Content: {f.raw_content[:4000]}\n"
-            return text
 
+        return sorted(state.citations, key=lambda c: getattr(c, "_citationCount", 0), reverse=True)
+
+    def _build_findings_text(self, state: ResearchState, citations_list: List[Citation], max_chars: int = 4000) -> str:
+        text = ""
+        for c in citations_list:
+            f = next((f_ for f_ in state.findings if f_.title == c.title), None)
+            if f:
+                text += f"\n[{c.id}] {c.title}\n"
+                text += f"   Authors: {c.authors or 'Unknown'}\n"
+                text += f"   Source: {c.source} | Year: {c.year or 'n.d.'}\n"
+                if c.doi:
+                    text += f"   DOI: {c.doi}\n"
+                if c.pmid:
+                    text += f"   PMID: {c.pmid}\n"
+                text += f"   Key Content: {f.raw_content[:max_chars]}\n"
+        return text
+
+    def _pack_findings(self, state: ResearchState, citations_list: List[Citation], token_budget: int,
+                       max_chars: int = 4000) -> str:
+        """
+        Grounding text for `citations_list` (most relevant first) within `token_budget`.
+
+        Near-duplicate sources (the same abstract found via PubMed and Scholar)
+        are dropped, and lower-ranked sources give way when the budget is tight.
+        """
+        total = len(citations_list)
+        blocks = [
+            Snippet(self._build_findings_text(state, [c], max_chars), relevance=1 - i / max(1, total), kind="finding")
+            for i, c in enumerate(citations_list)
+        ]
+        packed = context_packer.pack(blocks, token_budget)
+        if packed.dropped or packed.deduped:
+            logger.info(f"📦 Grounding packed to {packed.tokens} tokens: {len(packed.snippets)}/{total} sources "
+                        f"({packed.deduped} near-duplicates)")
+        return packed.text(separator="")
+
+    def _select_section_sources(
+        self,
+        state: ResearchState,
+        ranked: List[Citation],
+        section: Dict[str, Any],
+        limit: int = None,
+    ) -> List[Citation]:
+        """
+        Pick the sources most relevant to one report section.
+
+        Scores each citation by how many of the section's focus terms (weighted
+        double) and research-question terms appear in its title and content,
+        with citation count as the tie-breaker via `ranked` order. Tops up from
+        `ranked` when few sources match.
+        """
+        limit = limit or WRITER_SECTION_SOURCES
+        focus_terms = set(_terms(f"{section['heading']} {section['focus']}"))
+        question_terms = set(_terms(state.research_question)) - focus_terms
+        findings_by_title = {f.title: f for f in state.findings}
+
+        scored = []
+        for rank, c in enumerate(ranked):
+            f = findings_by_title.get(c.title)
+            doc_terms = set(_terms(f"{c.title} {c.abstract or ''} {f.raw_content[:2000] if f else ''}"))
+            score = 2 * len(focus_terms & doc_terms) + len(question_terms & doc_terms)
+            scored.append((score, -rank, c))
+
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        selected = [c for score, _, c in scored if score > 0][:limit]
+        if len(selected) < limit:
+            chosen = {c.id for c in selected}
+            selected += [c for c in ranked if c.id not in chosen][:limit - len(selected)]
+        return selected
+
+    async def _write_sections(
+        self,
+        state: ResearchState,
+        section_sources: Dict[str, List[Citation]],
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Write the report sections concurrently and yield them in document order.
+
+        Each section is retried (continuing from any partial text) up to
+        WRITER_SECTION_RETRIES times; a section that still fails is recorded
+        in state.failed_sections and left out instead of restarting the report.
+        """
+        semaphore = asyncio.Semaphore(WRITER_SECTION_CONCURRENCY)
+        total = len(REPORT_SECTIONS)
+
+        async def write(section):
+            async with semaphore:
+                return await self._write_section(state, section, section_sources[section["heading"]])
+
+        tasks = {
+            i: asyncio.create_task(write(section))
+            for i, section in enumerate(REPORT_SECTIONS)
+            if section["heading"] not in state.report_sections
+        }
+        state.failed_sections = []
+        state.progress_log.append(f"[{datetime.now().isoformat()}] Writing {len(tasks)} of {total} report sections...")
+
+        try:
+            for i, section in enumerate(REPORT_SECTIONS):
+                heading = section["heading"]
+                if i in tasks:
+                    try:
+                        state.report_sections[heading] = await tasks[i]
+                    except Exception as e:
+                        logger.error(f"❌ Report section '{heading}' failed: {e}")
+                        state.failed_sections.append(heading)
+                        state.progress_log.append(f"[{datetime.now().isoformat()}] Section '{heading}' failed: {e}")
+                        yield {
+                            "type": "report_section_error",
+                            "index": i,
+                            "total": total,
+                            "heading": heading,
+                            "message": str(e),
+                        }
+                        continue
+
+                yield {
+                    "type": "report_section",
+                    "index": i,
+                    "total": total,
+                    "heading": heading,
+                    "content": state.report_sections[heading],
+                    "resumed": i not in tasks,
+                    "progress": 90 + int(8 * (i + 1) / total),
+                }
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def _write_section(self, state: ResearchState, section: Dict[str, Any], sources: List[Citation]) -> str:
+        """Stream one section; on a provider error, continue from the text received so far."""
+        from app.services.multi_provider import get_multi_provider
+
+        heading = section["heading"]
+        system_prompt = SECTION_SYSTEM_PROMPT.format(
+            question=state.research_question,
+            heading=heading,
+            words=section["words"],
+            focus=section["focus"],
+        )
+        user_prompt = f"""GROUNDING DATA — You MUST cite these sources extensively using APA format (Author, Year):
+{self._pack_findings(state, sources, WRITER_SECTION_CONTEXT_TOKENS, WRITER_SECTION_SOURCE_CHARS)}
+
+---
+Research Question: {state.research_question}
+
+Write the complete "## {heading}" section now."""
+
+        mp = get_multi_provider()
+        partial = ""
+        for attempt in range(WRITER_SECTION_RETRIES + 1):
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+            if partial.strip():
+                # Resume rather than rewrite what already streamed
+                messages += [
+                    {"role": "assistant", "content": partial},
+                    {"role": "user", "content": "Continue the section exactly where it stops. Do not repeat any text already written."},
+                ]
+            try:
+                async for chunk in mp.generate_streaming(
+                    messages=messages,
+                    mode="deep_research",
+                    max_tokens=max(2048, section["words"] * 4),
+                    temperature=0.7,
+                    frequency_penalty=0.4,
+                    presence_penalty=0.4,
+                ):
+                    partial += chunk
+                break
+            except Exception as e:
+                if attempt == WRITER_SECTION_RETRIES:
+                    raise
+                logger.warning(f"⚠️ Section '{heading}' interrupted after {len(partial)} chars ({e}); resuming")
+                await asyncio.sleep(WRITER_SECTION_RETRY_BACKOFF * (attempt + 1))
+
+        text = strip_thinking(partial).replace("```markdown", "").replace("```", "").strip()
+        # Normalise the heading so sections always assemble into the fixed structure
+        lines = text.split("\n")
+        if lines and lines[0].lstrip().startswith("#"):
+            lines = lines[1:]
+        body = "\n".join(lines).strip()
+        if not body:
+            raise ValueError("Empty section from LLM")
+        return f"## {heading}\n\n{body}"
+
+    async def _write_single_pass(self, state: ResearchState, sorted_citations: List[Citation]):
+        """Original whole-report generation: Tier 1 elite context, Tier 2 lite fallback."""
         report_sys_prompt = f"""You are a senior medical/scientific research analyst.
 Your task is to write a comprehensive, highly academic review article.
 Target length: **2,500–3,000 words** of dense, substantive analysis.
@@ -1323,7 +1614,7 @@ To match high-impact journals (e.g., Nature, Lancet, Cell), you MUST:
 
         # --- TIER 1: ELITE REPORT (Gemini via Pollinations, Massive Context) ---
         used_citations = sorted_citations[:60]  # Sonnet 4.5 has 256K context, increased from 30
-        elite_findings_text = build_findings_text(used_citations)
+        elite_findings_text = self._pack_findings(state, used_citations, context_budget("deep_research_elite", reserve_tokens=4000))
         
         report_user_prompt_elite = f"""GROUNDING DATA — You MUST cite these sources extensively using APA format (Author, Year):
 {elite_findings_text}
@@ -1350,7 +1641,7 @@ Write the COMPLETE, EXHAUSTIVE report now. Do not stop until all sections are fu
             # --- TIER 2: FALLBACK LITE REPORT (Groq Kimi, Small Context) ---
             state.progress_log.append(f"[{datetime.now().isoformat()}] Tier 1 exhausted. Triggering Tier 2 Fallback (Top 15 sources only)...")
             used_citations = sorted_citations[:15]
-            lite_findings_text = build_findings_text(used_citations)
+            lite_findings_text = self._pack_findings(state, used_citations, context_budget("deep_research_single_pass", reserve_tokens=4000))
             
             report_user_prompt_lite = f"""GROUNDING DATA — You MUST cite these sources extensively using APA format (Author, Year):
 {lite_findings_text}
@@ -1374,101 +1665,24 @@ Write the COMPLETE, EXHAUSTIVE report now. Do not stop until all sections are fu
                 logger.error(f"Tier 2 Fallback Report also failed: {e2}")
                 full_report_content = "The Research module encountered severe API rate limits across all providers and could not generate the text. However, the system successfully gathered the following bibliography:"
 
-        # --- STAGE 2.5: SANITIZE FORMATTING ERRORS ---
-        # Fix common LLM formatting issues like missing spaces between words
-        def sanitize_spacing(text):
-            # Fix camelCase concatenations (e.g., "spectrumsfrom" -> "spectrums from")
-            # Pattern: lowercase followed immediately by uppercase
-            text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-            
-            # Fix specific known concatenations in medical/biological context
-            replacements = [
-                (r'([a-z])from\b', r'\1 from'),  # spectrumsfrom -> spectrums from
-                (r'([a-z])to\b', r'\1 to'),      # resistantto -> resistant to
-                (r'([a-z])in\b', r'\1 in'),      # increasedin -> increased in
-                (r'([a-z])by\b', r'\1 by'),      # mediatedby -> mediated by
-                (r'([a-z])via\b', r'\1 via'),    # transportvia -> transport via
-                (r'([a-z])with\b', r'\1 with'),  # associatedwith -> associated with
-                (r'([a-z])on\b', r'\1 on'),      # dependenton -> dependent on
-                (r'([a-z])at\b', r'\1 at'),      # presentat -> present at
-                (r'([a-z])for\b', r'\1 for'),    # responsiblefor -> responsible for
-                (r'([a-z])as\b', r'\1 as'),      # suchas -> such as
-                (r'([a-z])the\b', r'\1 the'),    # againstthe -> against the
-                (r'([a-z])and\b', r'\1 and'),    # efficacyand -> efficacy and
-                (r'([a-z])have\b', r'\1 have'),  # patientshave -> patients have
-                (r'([a-z])has\b', r'\1 has'),    # resistancehas -> resistance has
-                (r'([a-z])been\b', r'\1 been'),  # hasbeen -> has been
-                (r'([a-z])were\b', r'\1 were'),  # theywere -> they were
-                (r'([a-z])are\b', r'\1 are'),    # theyare -> they are
-                (r'([a-z])was\b', r'\1 was'),    # itwas -> it was
-                (r'([a-z])is\b', r'\1 is'),      # itis -> it is
-                (r'([a-z])that\b', r'\1 that'),  # suggestedthat -> suggested that
-                (r'([a-z])this\b', r'\1 this'),  # notedthis -> noted this
-                (r'([a-z])these\b', r'\1 these'),  # usedthese -> used these
-                (r'([a-z])their\b', r'\1 their'),  # intheir -> in their
-                (r'([a-z])between\b', r'\1 between'),  # relationshipbetween -> relationship between
-                (r'([a-z])among\b', r'\1 among'),  # distributedamong -> distributed among
-                (r'([a-z])within\b', r'\1 within'),  # foundwithin -> found within
-                (r'([a-z])during\b', r'\1 during'),  # observedduring -> observed during
-                (r'([a-z])following\b', r'\1 following'),  # occurredfollowing -> occurred following
-                (r'([a-z])without\b', r'\1 without'),  # patientswithout -> patients without
-                (r'([a-z])under\b', r'\1 under'),  # studiedunder -> studied under
-                (r'([a-z])over\b', r'\1 over'),  # administeredover -> administered over
-                (r'([a-z])through\b', r'\1 through'),  # diffusedthrough -> diffused through
-                (r'([a-z])into\b', r'\1 into'),  # convertedinto -> converted into
-                (r'([a-z])onto\b', r'\1 onto'),  # loadedonto -> loaded onto
-                (r'([a-z])upon\b', r'\1 upon'),  # dependentupon -> dependent upon
-                (r'([a-z])across\b', r'\1 across'),  # distributedacross -> distributed across
-                (r'([a-z])against\b', r'\1 against'),  # activityagainst -> activity against
-                (r'([a-z])including\b', r'\1 including'),  # patientsincluding -> patients including
-                (r'([a-z])involving\b', r'\1 involving'),  # casesinvolving -> cases involving
-                (r'([a-z])requiring\b', r'\1 requiring'),  # interventionrequiring -> intervention requiring
-                (r'([a-z])resulting\b', r'\1 resulting'),  # changesresulting -> changes resulting
-                (r'([a-z])leading\b', r'\1 leading'),  # pathwayleading -> pathway leading
-                (r'([a-z])causing\b', r'\1 causing'),  # mutationcausing -> mutation causing
-                (r'([a-z])producing\b', r'\1 producing'),  # effectproducing -> effect producing
-                (r'([a-z])binding\b', r'\1 binding'),  # drugbinding -> drug binding
-                (r'([a-z])targeting\b', r'\1 targeting'),  # antibodytargeting -> antibody targeting
-                (r'([a-z])resistant\b', r'\1 resistant'),  # multidrugresistant -> multidrug resistant
-                (r'([a-z])sensitive\b', r'\1 sensitive'),  # antibioticsensitive -> antibiotic sensitive
-                (r'([a-z])positive\b', r'\1 positive'),  # Grampositive -> Gram positive
-                (r'([a-z])negative\b', r'\1 negative'),  # Gramnegative -> Gram negative
-                (r'([a-z])specific\b', r'\1 specific'),  # targetspecific -> target specific
-                (r'([a-z])dependent\b', r'\1 dependent'),  # pHdependent -> pH dependent
-                (r'([a-z])independent\b', r'\1 independent'),  # doseindependent -> dose independent
-                (r'([a-z])mediated\b', r'\1 mediated'),  # enzymemediated -> enzyme mediated
-                (r'([a-z])induced\b', r'\1 induced'),  # stressinduced -> stress induced
-                (r'([a-z])activated\b', r'\1 activated'),  # receptoractivated -> receptor activated
-                (r'([a-z])regulated\b', r'\1 regulated'),  # generegulated -> gene regulated
-                (r'([a-z])associated\b', r'\1 associated'),  # diseaseassociated -> disease associated
-                (r'([a-z])related\b', r'\1 related'),  # drugrelated -> drug related
-                (r'([a-z])induced\b', r'\1 induced'),  # druginduced -> drug induced
-                (r'([a-z])derived\b', r'\1 derived'),  # plantderived -> plant derived
-                (r'([a-z])based\b', r'\1 based'),  # evidencebased -> evidence based
-                (r'([a-z])coated\b', r'\1 coated'),  # filmcoated -> film coated
-                (r'([a-z])coated\b', r'\1 coated'),  # entericcoated -> enteric coated
-                (r'([a-z])released\b', r'\1 released'),  # timedreleased -> time released
-                (r'([a-z])soluble\b', r'\1 soluble'),  # watersoluble -> water soluble
-                (r'([a-z])insoluble\b', r'\1 insoluble'),  # waterinsoluble -> water insoluble
-                (r'([a-z])permeable\b', r'\1 permeable'),  # membranepermeable -> membrane permeable
-                (r'([a-z])impermeable\b', r'\1 impermeable'),  # membraneimpermeable -> membrane impermeable
-                (r'([a-z])selective\b', r'\1 selective'),  # nonselective -> non selective
-                (r'([a-z])competitive\b', r'\1 competitive'),  # uncompetitive -> un competitive
-                (r'([a-z])competitive\b', r'\1 competitive'),  # noncompetitive -> non competitive
-                (r'([a-z])specific\b', r'\1 specific'),  # nonspecific -> non specific
-            ]
-            
-            for pattern, replacement in replacements:
-                text = re.sub(pattern, replacement, text)
-            
-            # Fix double spaces created by the replacements
-            text = re.sub(r'  +', ' ', text)
-            
-            return text
-        
+        return full_report_content, used_citations
+
+    @staticmethod
+    def _sanitize_spacing(text: str) -> str:
+        """
+        Collapse runs of spaces between words.
+
+        Only whitespace is touched: splitting glued words by suffix
+        ("...in", "...on") also breaks real words such as "protein" and
+        "Action", and camelCase splitting breaks "mRNA" and "IgG".
+        """
+        return re.sub(r'(?<=\S)  +(?=\S)', ' ', text)
+
+    def _finalize_report(self, state: ResearchState, full_report_content: str, used_citations: List[Citation]) -> None:
+        """Sanitize the report body, keep only cited references, and fix the title."""
         # Apply spacing sanitization
         original_length = len(full_report_content)
-        full_report_content = sanitize_spacing(full_report_content)
+        full_report_content = self._sanitize_spacing(full_report_content)
         sanitized_length = len(full_report_content)
         
         if sanitized_length != original_length:
@@ -1477,7 +1691,6 @@ Write the COMPLETE, EXHAUSTIVE report now. Do not stop until all sections are fu
         # --- STAGE 2.6: FILTER TO ACTUALLY-CITED REFERENCES ---
         # Scan the LLM-generated body for (Author, Year) patterns and only keep
         # citations that were actually referenced in-text.
-        import re
         cited_patterns = re.findall(r'\(([A-Z][a-zA-Z]+(?:\s+et\s+al\.)?(?:\s+and\s+[A-Z][a-zA-Z]+)?),?\s*(\d{4})\)', full_report_content)
         cited_set = set()
         for author_match, year_match in cited_patterns:
@@ -1530,48 +1743,78 @@ Write the COMPLETE, EXHAUSTIVE report now. Do not stop until all sections are fu
         state.final_report = response
         state.status = "complete"
         state.progress_log.append(f"[{datetime.now().isoformat()}] Report compilation complete ({len(response)} characters)")
-        
-        return state
-    
+
     # ========================================================================
     # MAIN WORKFLOW EXECUTION
     # ========================================================================
     
-    async def run_research(self, question: str, user_id: UUID) -> ResearchState:
+    async def run_research(
+        self,
+        question: str,
+        user_id: UUID,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        on_checkpoint: Optional[Callable[[str, ResearchState], Awaitable[None]]] = None,
+    ) -> ResearchState:
         """
         Execute the full deep research workflow
+
+        `on_checkpoint(node, state)` is awaited after the planner, researcher
+        and reviewer nodes and after each report section. Passing a saved
+        `checkpoint` (ResearchState.to_checkpoint()) resumes the graph: nodes
+        already in state.completed_nodes are skipped and finished report
+        sections are reused.
         """
-        # Initialize state
-        state = ResearchState(research_question=question)
-        state.progress_log.append(f"[{datetime.now().isoformat()}] Deep Research initiated for: {question[:100]}...")
-        
+        if checkpoint:
+            state = ResearchState.from_checkpoint(checkpoint)
+            state.error_message = None
+            state.progress_log.append(f"[{datetime.now().isoformat()}] Resuming after: {', '.join(state.completed_nodes) or 'start'}")
+            logger.info(f"♻️ Deep Research: Resuming '{question[:50]}...' after {state.completed_nodes or 'start'}")
+        else:
+            state = ResearchState(research_question=question)
+            state.progress_log.append(f"[{datetime.now().isoformat()}] Deep Research initiated for: {question[:100]}...")
+
+        async def node_done(node: str) -> None:
+            if node not in state.completed_nodes:
+                state.completed_nodes.append(node)
+            if on_checkpoint:
+                await on_checkpoint(node, state)
+
         try:
             # Node A: Planning
-            logger.info(f"📍 Deep Research: Starting Planning Phase for question='{question[:50]}...'")
-            plan_start = datetime.now()
-            state = await self._node_planner(state)
-            logger.info(f"✅ Deep Research: Planning Complete ({state.plan_overview[:50]}...) - Duration: {(datetime.now() - plan_start).total_seconds():.2f}s")
-            
-            if state.error_message:
-                state.status = "error"
-                return state
-            
+            if "planner" not in state.completed_nodes:
+                logger.info(f"📍 Deep Research: Starting Planning Phase for question='{question[:50]}...'")
+                plan_start = datetime.now()
+                state = await self._node_planner(state)
+                logger.info(f"✅ Deep Research: Planning Complete ({state.plan_overview[:50]}...) - Duration: {(datetime.now() - plan_start).total_seconds():.2f}s")
+
+                if state.error_message:
+                    state.status = "error"
+                    return state
+                await node_done("planner")
+
             # Node B: Researching
-            logger.info(f"📍 Deep Research: Starting Research Phase with {len(state.steps)} steps")
-            research_start = datetime.now()
-            state = await self._node_researcher(state)
-            logger.info(f"✅ Deep Research: Research Complete (Found {len(state.findings)} sources) - Duration: {(datetime.now() - research_start).total_seconds():.2f}s")
-            
+            if "researcher" not in state.completed_nodes:
+                logger.info(f"📍 Deep Research: Starting Research Phase with {len(state.steps)} steps")
+                research_start = datetime.now()
+                state = await self._node_researcher(state)
+                logger.info(f"✅ Deep Research: Research Complete (Found {len(state.findings)} sources) - Duration: {(datetime.now() - research_start).total_seconds():.2f}s")
+                await node_done("researcher")
+
             # Node C: Reviewing
-            logger.info("📍 Deep Research: Starting Review Phase")
-            review_start = datetime.now()
-            state = await self._node_reviewer(state)
-            logger.info(f"✅ Deep Research: Review Complete (Validated {len(state.citations)} citations) - Duration: {(datetime.now() - review_start).total_seconds():.2f}s")
-            
-            # Node D: Writing
+            if "reviewer" not in state.completed_nodes:
+                logger.info("📍 Deep Research: Starting Review Phase")
+                review_start = datetime.now()
+                state = await self._node_reviewer(state)
+                logger.info(f"✅ Deep Research: Review Complete (Validated {len(state.citations)} citations) - Duration: {(datetime.now() - review_start).total_seconds():.2f}s")
+                await node_done("reviewer")
+
+            # Node D: Writing (checkpointed per section; finished sections are reused)
             logger.info("📍 Deep Research: Starting Writing Phase")
             write_start = datetime.now()
-            state = await self._node_writer(state)
+            async for event in self._node_writer_streaming(state):
+                if event["type"] == "report_section" and not event.get("resumed") and on_checkpoint:
+                    await on_checkpoint("writer", state)
+            await node_done("writer")
             logger.info(f"✅ Deep Research: Writing Complete - Duration: {(datetime.now() - write_start).total_seconds():.2f}s")
             
         except Exception as e:
@@ -1704,7 +1947,8 @@ Write the COMPLETE, EXHAUSTIVE report now. Do not stop until all sections are fu
                 "progress": 90
             })
             
-            state = await self._node_writer(state)
+            async for section_event in self._node_writer_streaming(state):
+                yield json.dumps(section_event)
             logger.info(f"✅ [Streaming] Deep Research: Writing Complete - Duration: {(datetime.now() - write_start).total_seconds():.2f}s")
             
             # Final report with full APA citation data
@@ -9,7 +9,7 @@ Never let the AI choose fonts, sizes, or colors directly.
 """
 
 import io
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from pptx import Presentation
 from pptx.util import Inches, Pt, Emu
 from pptx.dml.color import RGBColor
@@ -311,7 +311,8 @@ class DesignEngine:
     # ========================================
     
     def assemble_pptx(self, outline: Dict, content: List,
-                      images: Dict, theme: Dict) -> bytes:
+                      images: Dict, theme: Dict,
+                      on_slide: Optional[Callable[[int, int], None]] = None) -> bytes:
         """
         Build professional PPTX using python-pptx.
         
@@ -320,6 +321,7 @@ class DesignEngine:
             content: Refined slide content
             images: Dict of slide_index -> image_bytes
             theme: Theme dict from get_theme()
+            on_slide: Optional callback(built, total) after each slide is built
             
         Returns:
             PPTX file as bytes
@@ -377,6 +379,9 @@ class DesignEngine:
                 slide = prs.slides[-1]
                 notes_slide = slide.notes_slide
                 notes_slide.notes_text_frame.text = slide_data["speaker_notes"]
+
+            if on_slide:
+                on_slide(idx + 1, len(valid_slides))
         
         # Add slide numbers to all content slides
         self._add_slide_numbers(prs, theme)
@@ -0,0 +1,273 @@
+"""
+Diagram Renderer
+
+Renders Mermaid blocks to watermarked PNGs for DOCX / PDF / manuscript
+exports.
+
+- Fetches run concurrently, bounded by DIAGRAM_RENDER_CONCURRENCY, over one
+  shared HTTP client per batch.
+- Rendered PNGs are cached on disk by a hash of (backend, diagram source,
+  watermark), so re-exporting a conversation does not hit the renderer
+  again. Identical diagrams requested at the same time share one fetch.
+- Watermarking (PIL) runs in a worker thread, off the event loop.
+- The HTTP backend is pluggable. The default is kroki.io; point
+  DIAGRAM_RENDERER_URL at a self-hosted Kroki container to keep diagrams
+  on-premise, or register another backend in DIAGRAM_BACKENDS.
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = str(Path(__file__).resolve().parents[2] / ".cache" / "diagrams")
+DIAGRAM_RENDERER_BACKEND = os.environ.get("DIAGRAM_RENDERER_BACKEND", "kroki")
+DIAGRAM_RENDERER_URL = os.environ.get("DIAGRAM_RENDERER_URL", "https://kroki.io")
+DIAGRAM_RENDER_CONCURRENCY = int(os.environ.get("DIAGRAM_RENDER_CONCURRENCY", "6"))
+DIAGRAM_RENDER_TIMEOUT = float(os.environ.get("DIAGRAM_RENDER_TIMEOUT", "10"))
+DIAGRAM_CACHE_MAX_FILES = int(os.environ.get("DIAGRAM_CACHE_MAX_FILES", "2000"))
+
+WATERMARK_TEXT = "Benchside"
+
+# Inject a theme config to make colors readable
+MERMAID_THEME = "%%\n%%{init: {'theme': 'base', 'themeVariables': { 'primaryColor': '#ffffff', 'primaryTextColor': '#333333', 'primaryBorderColor': '#0066cc', 'lineColor': '#666666', 'tertiaryColor': '#f4f4f4', 'tertiaryBorderColor': '#cccccc'}}}%%\n"
+
+MERMAID_BLOCK = re.compile(r'```mermaid\n(.*?)\n```', re.DOTALL)
+
+# Kroki GET URLs get unwieldy past this; larger diagrams are POSTed
+MAX_GET_PAYLOAD = 4000
+
+
+class DiagramRenderError(Exception):
+    """A diagram could not be rendered; `status` is the HTTP status when there was one."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_kroki(text: str) -> str:
+    """Encode text for Kroki diagram rendering"""
+    compressed = zlib.compress(text.encode('utf-8'), 9)
+    return base64.urlsafe_b64encode(compressed).decode('utf-8')
+
+
+def add_watermark(img_bytes: bytes, text=WATERMARK_TEXT) -> bytes:
+    """Add a watermark to the bottom right of the image"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        img = Image.open(io.BytesIO(img_bytes)).convert("RGBA")
+
+        # Make a blank image for the text, initialized to transparent text color
+        txt = Image.new('RGBA', img.size, (255, 255, 255, 0))
+        d = ImageDraw.Draw(txt)
+
+        # Calculate position (bottom right)
+        width, height = img.size
+        margin = 10
+        font = ImageFont.load_default()
+
+        bbox = d.textbbox((0, 0), text, font=font)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+
+        x = width - text_width - margin - 5
+        y = height - text_height - margin - 5
+
+        # Draw text half-transparent blue
+        d.text((x, y), text, fill=(0, 102, 204, 180), font=font)
+
+        watermarked = Image.alpha_composite(img, txt)
+
+        out = io.BytesIO()
+        watermarked.save(out, format="PNG")
+        return out.getvalue()
+    except Exception as e:
+        logger.warning(f"Watermark error: {e}")
+        return img_bytes
+
+
+class KrokiBackend:
+    """Kroki HTTP API (kroki.io or a self-hosted Kroki container)."""
+
+    def __init__(self, base_url: str = DIAGRAM_RENDERER_URL):
+        self.base_url = base_url.rstrip("/")
+
+    @property
+    def name(self) -> str:
+        return f"kroki:{self.base_url}"
+
+    async def render(self, client: httpx.AsyncClient, source: str, diagram_type: str = "mermaid") -> bytes:
+        encoded = encode_kroki(source)
+        if len(encoded) <= MAX_GET_PAYLOAD:
+            resp = await client.get(f"{self.base_url}/{diagram_type}/png/{encoded}")
+        else:
+            resp = await client.post(
+                f"{self.base_url}/{diagram_type}/png",
+                content=source.encode("utf-8"),
+                headers={"Content-Type": "text/plain"}
+            )
+        if resp.status_code != 200:
+            raise DiagramRenderError(f"Diagram rendering failed: {resp.status_code}", status=resp.status_code)
+        return resp.content
+
+
+DIAGRAM_BACKENDS = {
+    "kroki": KrokiBackend,
+}
+
+
+class DiagramRenderer:
+    """Concurrent, cached Mermaid → watermarked PNG rendering shared by all exports."""
+
+    def __init__(self, backend=None, cache_dir: str = DEFAULT_CACHE_DIR,
+                 concurrency: int = DIAGRAM_RENDER_CONCURRENCY,
+                 max_cache_files: int = DIAGRAM_CACHE_MAX_FILES):
+        self.backend = backend or DIAGRAM_BACKENDS.get(DIAGRAM_RENDERER_BACKEND, KrokiBackend)()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_cache_files = max_cache_files
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._writes = 0
+        self.stats = {"renders": 0, "cache_hits": 0, "errors": 0}
+
+    def _key(self, source: str) -> str:
+        digest = hashlib.sha256()
+        for part in (self.backend.name, WATERMARK_TEXT, source):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _cache_path(self, key: str) -> Optional[Path]:
+        return self.cache_dir / key[:2] / f"{key}.png" if self.cache_dir else None
+
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        path = self._cache_path(key)
+        if not path:
+            return None
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # recency for pruning
+            return data
+        except OSError:
+            return None
+
+    def _cache_put(self, key: str, data: bytes) -> None:
+        path = self._cache_path(key)
+        if not path:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Diagram cache write failed: {e}")
+            return
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Keep the on-disk cache under max_cache_files, dropping least recently used."""
+        files = list(self.cache_dir.glob("*/*.png"))
+        excess = len(files) - self.max_cache_files
+        if excess <= 0:
+            return
+        files.sort(key=lambda p: p.stat().st_mtime)
+        for path in files[:excess]:
+            path.unlink(missing_ok=True)
+
+    async def _render_one(self, client: httpx.AsyncClient, source: str) -> bytes:
+        key = self._key(source)
+        cached = await asyncio.to_thread(self._cache_get, key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        # Identical diagrams already being rendered share that fetch
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            async with self._semaphore:
+                raw = await self.backend.render(client, source)
+            png = await asyncio.to_thread(add_watermark, raw)
+            await asyncio.to_thread(self._cache_put, key, png)
+            self.stats["renders"] += 1
+            future.set_result(png)
+            return png
+        except Exception as e:
+            self.stats["errors"] += 1
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure does not log a warning
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def render_many(self, sources: List[str]) -> List[Union[bytes, Exception]]:
+        """
+        Render Mermaid sources (theme applied here) concurrently.
+
+        Returns one entry per source: PNG bytes, or the exception that
+        prevented rendering it.
+        """
+        if not sources:
+            return []
+        async with httpx.AsyncClient(timeout=DIAGRAM_RENDER_TIMEOUT) as client:
+            return await asyncio.gather(
+                *(self._render_one(client, MERMAID_THEME + source.strip()) for source in sources),
+                return_exceptions=True
+            )
+
+    async def render_text_parts(self, text: str) -> List[Dict]:
+        """
+        Split text around ```mermaid blocks and render them.
+
+        Returns a list of {"type": "text", "content": str} and
+        {"type": "image", "data": bytes, "alt": "Diagram"} parts.
+        """
+        matches = list(MERMAID_BLOCK.finditer(text))
+        if not matches:
+            return [{"type": "text", "content": text}]
+
+        rendered = await self.render_many([m.group(1) for m in matches])
+        parts = []
+        last_end = 0
+        for match, result in zip(matches, rendered):
+            if match.start() > last_end:
+                parts.append({"type": "text", "content": text[last_end:match.start()]})
+            if isinstance(result, DiagramRenderError):
+                parts.append({"type": "text", "content": f"\n[{result}]\n"})
+            elif isinstance(result, Exception):
+                parts.append({"type": "text", "content": f"\n[Diagram generation error: {str(result)}]\n"})
+            else:
+                parts.append({"type": "image", "data": result, "alt": "Diagram"})
+            last_end = match.end()
+        if last_end < len(text):
+            parts.append({"type": "text", "content": text[last_end:]})
+        return parts
+
+    async def render_sources(self, sources: List[str]) -> Dict[str, bytes]:
+        """Map each distinct Mermaid source to its PNG, omitting failures."""
+        unique = list(dict.fromkeys(s.strip() for s in sources))
+        rendered = await self.render_many(unique)
+        return {s: png for s, png in zip(unique, rendered) if not isinstance(png, Exception)}
+
+
+diagram_renderer = DiagramRenderer()
@@ -21,6 +21,7 @@ import pandas as pd
 
 from app.core.config import settings
 from app.core.logging_config import RAGLogger
+from app.services.dataset_store import dataset_store, profile_frame, render_profile, TABULAR_EXTENSIONS
 
 logger = logging.getLogger(__name__)
 rag_logger = RAGLogger(__name__)
@@ -202,8 +203,6 @@ class EnhancedDocumentLoader:
         """
         try:
             start_time = time.time()
-            from app.services.smart_loader import process_file as smart_process
-            from app.core.config import settings
 
             # Basic Validation
             if not file_content:
@@ -220,6 +219,17 @@ class EnhancedDocumentLoader:
                     error_category=ErrorCategory.UNSUPPORTED_FORMAT
                 )
 
+            # Tabular uploads go to the columnar dataset store (queried at chat time)
+            ext = Path(filename).suffix.lower()
+            if ext in TABULAR_EXTENSIONS and (additional_metadata or {}).get("conversation_id") and dataset_store.available:
+                try:
+                    return await self._load_tabular_dataset(file_content, filename, additional_metadata)
+                except Exception as e:
+                    logger.warning(f"⚠️ Dataset store ingest failed for {filename}, using text loaders: {e}")
+
+            from app.services.smart_loader import process_file as smart_process
+            from app.core.config import settings
+
             # Default Prompt Strategy
             if not user_prompt:
                 user_prompt = (
@@ -277,6 +287,47 @@ class EnhancedDocumentLoader:
             logger.info("⚠️ Falling back to legacy loader...")
             return await self._legacy_load_document(file_content, filename, additional_metadata, image_analyzer)
 
+    async def _load_tabular_dataset(
+        self,
+        file_content: bytes,
+        filename: str,
+        additional_metadata: Dict[str, Any]
+    ) -> List[Document]:
+        """
+        Store a CSV/XLSX as Parquet and return one profile document per dataset.
+
+        Only the profile (schema, column stats, short preview) is embedded;
+        row-level questions are answered by querying the stored dataset.
+        """
+        manifests = await dataset_store.aingest(file_content, filename, additional_metadata["conversation_id"])
+        if not manifests:
+            raise DocumentProcessingError(
+                ErrorMessageTemplates.empty_content(filename),
+                error_category=ErrorCategory.EMPTY_CONTENT,
+                is_user_error=True,
+                details={"filename": filename}
+            )
+
+        ext = Path(filename).suffix.lower()
+        documents = []
+        for manifest in manifests:
+            metadata = dict(additional_metadata)
+            metadata.update({
+                "source": filename,
+                "filename": filename,
+                "file_extension": ext,
+                "file_type": ext.lstrip('.'),
+                "loader": "ColumnarDatasetStore",
+                "dataset_id": manifest["dataset_id"],
+                "sheet_name": manifest.get("sheet"),
+                "rows": manifest["rows"],
+                "columns": manifest["column_count"],
+                "encoding": manifest.get("encoding"),
+                "processed_at": time.time()
+            })
+            documents.append(Document(page_content=render_profile(manifest), metadata=metadata))
+        return documents
+
     async def _legacy_load_document(
         self, 
         file_content: bytes, 
@@ -541,18 +592,23 @@ class EnhancedDocumentLoader:
             content = f.read()
             
         api_key = os.getenv("MISTRAL_API_KEY", "")
+        vision_stats = {}
         extracted_text = await process_pdf_hybrid(
             content=content,
             filename=filename,
             user_prompt="",
             api_key=api_key,
             mode="detailed",
-            chunk_callback=None
+            chunk_callback=None,
+            stats=vision_stats
         )
         
+        metadata = {"source": filename, "loader": "PyMuPDF_Hybrid"}
+        if vision_stats:
+            metadata["vision_stats"] = vision_stats
         doc = Document(
             page_content=self._clean_text(extracted_text),
-            metadata={"source": filename, "loader": "PyMuPDF_Hybrid"}
+            metadata=metadata
         )
         return [doc]
 
@@ -723,18 +779,23 @@ class EnhancedDocumentLoader:
             content = f.read()
             
         api_key = os.getenv("MISTRAL_API_KEY", "")
+        vision_stats = {}
         extracted_text = await process_pptx_hybrid(
             content=content,
             filename=filename,
             user_prompt="",
             api_key=api_key,
             mode="detailed",
-            chunk_callback=None
+            chunk_callback=None,
+            stats=vision_stats
         )
         
+        metadata = {"source": filename, "loader": "python-pptx_Hybrid"}
+        if vision_stats:
+            metadata["vision_stats"] = vision_stats
         doc = Document(
             page_content=self._clean_text(extracted_text),
-            metadata={"source": filename, "loader": "python-pptx_Hybrid"}
+            metadata=metadata
         )
         return [doc]
     
@@ -748,20 +809,13 @@ class EnhancedDocumentLoader:
             for sheet_name in excel_file.sheet_names:
                 df = pd.read_excel(excel_file, sheet_name=sheet_name)
                 
-                # Convert dataframe to text representation
-                # Include column headers and data
-                content_parts = [f"Sheet: {sheet_name}\n"]
-                
-                # Add column headers
-                content_parts.append("Columns: " + ", ".join(df.columns.astype(str)) + "\n\n")
-                
-                # Add data rows
-                for idx, row in df.iterrows():
-                    row_text = " | ".join([f"{col}: {val}" for col, val in row.items() if pd.notna(val)])
-                    if row_text:
-                        content_parts.append(row_text + "\n")
-                
-                content = "".join(content_parts)
+                if df.empty and not len(df.columns):
+                    continue
+
+                # Summarize instead of rendering every row (large sheets blow up chunking)
+                content = render_profile({
+                    "filename": filename, "sheet": sheet_name, **profile_frame(df)
+                })
                 
                 if content.strip():
                     doc = Document(
@@ -835,19 +889,8 @@ class EnhancedDocumentLoader:
                     }
                 )
             
-            # Convert dataframe to text representation
-            content_parts = []
-            
-            # Add column headers
-            content_parts.append("Columns: " + ", ".join(df.columns.astype(str)) + "\n\n")
-            
-            # Add data rows
-            for idx, row in df.iterrows():
-                row_text = " | ".join([f"{col}: {val}" for col, val in row.items() if pd.notna(val)])
-                if row_text:
-                    content_parts.append(row_text + "\n")
-            
-            content = "".join(content_parts)
+            # Summarize instead of rendering every row (large files blow up chunking)
+            content = render_profile({"filename": filename, **profile_frame(df)}) if len(df.columns) else ""
             
             if not content.strip():
                 raise DocumentProcessingError(
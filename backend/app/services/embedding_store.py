@@ -0,0 +1,319 @@
+"""
+Embedding Store
+
+Content-addressed, persistent store for text embeddings shared by every
+embedding provider (Mistral, Cohere, local sentence-transformers).
+Re-uploading a paper, repeating a common query or re-running a migration
+resolves vectors locally instead of paying for another API call.
+
+- Key: SHA-256 of (provider, model, dimensions, text), so switching models
+  never returns a vector from the wrong embedding space
+- Storage: SQLite file (WAL) shared by all uvicorn workers on the host,
+  vectors packed as float32
+- Front cache: bounded in-process LRU for hot keys (queries)
+- Eviction: least-recently-used rows beyond EMBEDDING_STORE_MAX_ENTRIES
+  (default 100,000, about 400 MB of 1024-dimension vectors)
+- Locking: the front cache and counters have their own short-held lock,
+  so event-loop reads never wait behind a SQLite write running in a thread
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = str(
+    Path(__file__).resolve().parents[2] / ".cache" / "embeddings.sqlite"
+)
+
+
+def embedding_key(provider: str, model: str, dimensions: int, text: str) -> str:
+    """Content hash identifying one text in one embedding space."""
+    digest = hashlib.sha256(f"{provider}\n{model}\n{dimensions}\n".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingStore:
+    """
+    Persistent, size-bounded embedding cache with an in-memory front.
+
+    Features:
+    - Batch get/put so a whole ingest batch is one SQLite round trip
+    - Async wrappers that answer front-cache hits without a thread hop
+    - Hit/miss counters per lookup
+    - Degrades to memory-only if the database can't be opened
+    """
+
+    MAX_ENTRIES = int(os.environ.get("EMBEDDING_STORE_MAX_ENTRIES", "100000"))
+    MEMORY_ENTRIES = int(os.environ.get("EMBEDDING_STORE_MEMORY_ENTRIES", "5000"))
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        memory_entries: Optional[int] = None,
+    ):
+        self.path = path or os.environ.get("EMBEDDING_STORE_PATH", DEFAULT_STORE_PATH)
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self.memory_entries = self.MEMORY_ENTRIES if memory_entries is None else memory_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+        # Guards _memory and stats; never held across SQLite calls
+        self._lock = threading.Lock()
+        # Serialises use of the SQLite connection (always taken from a thread)
+        self._db_lock = threading.Lock()
+        self._disabled = False
+        self.stats = {"hits": 0, "memory_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the database lazily on first use (caller holds _db_lock)."""
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, "
+                "provider TEXT NOT NULL, "
+                "model TEXT NOT NULL, "
+                "dimensions INTEGER NOT NULL, "
+                "vector BLOB NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+            conn.commit()
+            self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        except Exception as e:
+            logger.warning(f"⚠️ Embedding store unavailable ({self.path}): {e}")
+            self._disabled = True
+        return self._conn
+
+    def _remember(self, key: str, vector: List[float]):
+        """Insert into the front cache (caller holds the lock)."""
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+        return found
+
+    def get_many(
+        self, provider: str, model: str, dimensions: int, texts: List[str]
+    ) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for texts, in order.
+
+        Args:
+            provider: Embedding provider name (e.g. "mistral")
+            model: Provider model name
+            dimensions: Vector size of the model
+            texts: Exact texts that were embedded
+
+        Returns:
+            One vector per text, or None where nothing is stored
+        """
+        keys = [embedding_key(provider, model, dimensions, t) for t in texts]
+        found = self._memory_lookup(keys)
+        self._fill_from_disk(keys, found)
+        return [found.get(key) for key in keys]
+
+    def _fill_from_disk(self, keys: List[str], found: Dict[str, List[float]]):
+        """Resolve keys missing from `found` from SQLite and count the lookup."""
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        memory_hits = len(set(keys)) - len(missing)
+        disk: Dict[str, List[float]] = {}
+        if missing:
+            with self._db_lock:
+                disk = self._read_disk(missing)
+        with self._lock:
+            for key, vector in disk.items():
+                self._remember(key, vector)
+            self.stats["memory_hits"] += memory_hits
+            self.stats["hits"] += memory_hits + len(disk)
+            self.stats["misses"] += len(missing) - len(disk)
+        found.update(disk)
+
+    def _read_disk(self, missing: List[str]) -> Dict[str, List[float]]:
+        """Fetch stored vectors and bump their last_used (caller holds _db_lock)."""
+        disk: Dict[str, List[float]] = {}
+        conn = self._connect()
+        if conn is not None:
+            try:
+                # SQLite caps bound parameters; look up in slices
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                    disk.update((key, _unpack(blob)) for key, blob in rows)
+                if disk:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in disk],
+                    )
+                    conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding store read failed: {e}")
+                disk = {}
+        return disk
+
+    def put_many(
+        self,
+        provider: str,
+        model: str,
+        dimensions: int,
+        texts: List[str],
+        vectors: List[Optional[List[float]]],
+    ):
+        """Store embeddings for texts; None vectors are skipped."""
+        items = [
+            (embedding_key(provider, model, dimensions, text), list(vector))
+            for text, vector in zip(texts, vectors)
+            if vector
+        ]
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+        added = evicted = 0
+        with self._db_lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                now = time.time()
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings "
+                    "(key, provider, model, dimensions, vector, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(key, provider, model, dimensions, _pack(vector), now, now) for key, vector in items],
+                )
+                added = conn.total_changes - before
+                count = self._count + added
+
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    # Trim 10% below the bound so eviction doesn't run on every put
+                    overflow += self.max_entries // 10
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key IN ("
+                        "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                        (overflow,),
+                    )
+                    count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                    evicted = overflow
+                conn.commit()
+                self._count = count
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding store write failed: {e}")
+        with self._lock:
+            self.stats["stores"] += added
+            self.stats["evictions"] += evicted
+
+    async def aget_many(
+        self, provider: str, model: str, dimensions: int, texts: List[str]
+    ) -> List[Optional[List[float]]]:
+        """Async get_many: front-cache hits are answered on the loop, the rest in a thread."""
+        keys = [embedding_key(provider, model, dimensions, t) for t in texts]
+        found = self._memory_lookup(keys)
+        if len(found) < len(set(keys)):
+            await asyncio.to_thread(self._fill_from_disk, keys, found)
+        else:
+            self._fill_from_disk(keys, found)  # only updates counters
+        return [found.get(key) for key in keys]
+
+    async def aput_many(
+        self,
+        provider: str,
+        model: str,
+        dimensions: int,
+        texts: List[str],
+        vectors: List[Optional[List[float]]],
+    ):
+        """Async put_many (SQLite write in a thread)."""
+        await asyncio.to_thread(self.put_many, provider, model, dimensions, texts, vectors)
+
+    def size(self) -> int:
+        """
+        Number of stored embeddings, as of the last store access.
+
+        Reads the tracked row count instead of querying SQLite, so it is
+        safe to call from the event loop (health and stats endpoints).
+        """
+        with self._lock:
+            return self._count if self._conn is not None else len(self._memory)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Counters plus overall hit rate (no SQLite access)."""
+        entries = self.size()
+        with self._lock:
+            stats = dict(self.stats)
+            memory_entries = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "entries": entries,
+            "memory_entries": memory_entries,
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+    def clear_memory(self):
+        """Drop the in-process front cache (the persistent store is kept)."""
+        with self._lock:
+            self._memory.clear()
+
+    def close(self):
+        """Close the database connection (called on application shutdown)."""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Singleton instance
+embedding_store = EmbeddingStore()
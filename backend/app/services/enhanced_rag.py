@@ -4,23 +4,35 @@ Replaces the custom RAG implementation with industry-standard tools
 """
 
 import logging
+import os
 import time
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, Union
 from uuid import UUID
 from supabase import Client
 from langchain_core.documents import Document
 
 from app.core.config import settings
+from app.core.database import async_db_execute
 from app.models.document import DocumentChunk, DocumentUploadResponse
 from app.services.embeddings import embeddings_service
 from app.services.document_loaders import document_loader, DocumentProcessingError
 from app.services.text_splitter import text_splitter
+from app.services.dataset_store import dataset_store
+from app.services.context_packer import Snippet, context_packer
 from app.core.logging_config import RAGLogger
 
 logger = logging.getLogger(__name__)
 rag_logger = RAGLogger(__name__)
 
+# Multi-file uploads: files extracted at once, embedding batches in flight,
+# and rows per document_chunks insert
+UPLOAD_EXTRACT_CONCURRENCY = int(os.environ.get("UPLOAD_EXTRACT_CONCURRENCY", "3"))
+UPLOAD_EMBED_CONCURRENCY = int(os.environ.get("UPLOAD_EMBED_CONCURRENCY", "2"))
+UPLOAD_INSERT_BATCH_SIZE = int(os.environ.get("UPLOAD_INSERT_BATCH_SIZE", "100"))
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
 
 class EnhancedRAGService:
     """Enhanced RAG service using LangChain document processing and Mistral embeddings"""
@@ -75,148 +87,21 @@ class EnhancedRAGService:
         }
 
         try:
-            logger.info(
-                f"📤 Processing uploaded file: {filename} ({file_size} bytes) for user {user_id}",
-                extra={
-                    'operation': 'file_upload',
-                    'document_name': filename,
-                    'file_size': file_size,
-                    'file_type': file_extension,
-                    'user_id': str(user_id),
-                    'conversation_id': str(conversation_id)
-                }
-            )
-
-            # Check if file format is supported
-            if not self.document_loader.is_supported_format(filename):
-                return DocumentUploadResponse(
-                    success=False,
-                    message=f"Unsupported file format. Supported formats: {', '.join(self.document_loader.get_supported_formats())}",
-                    chunk_count=0,
-                    file_info=file_info
-                )
-
-            # Load document using LangChain loaders
-            try:
-                # Use injected image analyzer if provided, otherwise create a simple one
-                if image_analyzer is None:
-                    # No image analyzer provided - images will be skipped or handled differently
-                    logger.warning(f"⚠️  No image analyzer provided for {filename}, images will not be analyzed")
-                    image_analyzer_func = None
-                else:
-                    image_analyzer_func = image_analyzer
-
-                # NOTE: We disabled streaming ingestion callback to support BATCH processing
-                # Batch processing yields better total throughput than streaming 1-by-1
-                logger.info(f"📥 Starting document load for {filename}...")
-                documents = await self.document_loader.load_document(
-                    file_content=file_content,
-                    filename=filename,
-                    additional_metadata={
-                        "user_id": str(user_id),
-                        "conversation_id": str(conversation_id)
-                    },
-                    image_analyzer=image_analyzer_func,
-                    user_prompt=user_prompt,
-                    mode=mode,
-                    chunk_callback=None # Disable callback for batch mode
-                )
-                logger.info(f"📄 Document loader returned {len(documents)} documents for {filename}")
-
-                # Debug: Log document content preview
-                if documents:
-                    for i, doc in enumerate(documents[:3]):  # Log first 3 docs
-                        preview = doc.page_content[:200].replace('\n', ' ') if doc.page_content else "[EMPTY]"
-                        logger.info(f"   Doc {i}: {len(doc.page_content)} chars - Preview: {preview}...")
-            except DocumentProcessingError as e:
-                # Use structured error information from DocumentProcessingError
-                logger.error(
-                    f"❌ Document processing error for {filename}: "
-                    f"category={e.error_category}, is_user_error={e.is_user_error}, "
-                    f"details={e.details}"
-                )
-                return DocumentUploadResponse(
-                    success=False,
-                    message=e.message,
-                    chunk_count=0,
-                    errors=[e.message],
-                    processing_time=time.time() - start_time
-                )
-            
-            if not documents:
-                return DocumentUploadResponse(
-                    success=False,
-                    message=f"No content could be extracted from {filename}",
-                    chunk_count=0,
-                    file_info=file_info
-                )
-            
-            # Update file_info with content length and encoding from documents
-            total_content_length = sum(len(doc.page_content) for doc in documents)
-            file_info["content_length"] = total_content_length
-            
-            # Extract encoding from document metadata if available
-            if documents and documents[0].metadata.get("encoding"):
-                file_info["encoding"] = documents[0].metadata.get("encoding")
-            
-            # DEBUG: Log content preview to verify extraction quality
-            if documents:
-                preview_len = 500
-                preview_text = documents[0].page_content[:preview_len].replace('\n', ' ')
-                logger.info(f"📄 Content Preview for {filename}: {preview_text}...")
-            
-            # Validate document content with enhanced error messages
-            logger.info(f"🔍 Validating document content for {filename}...")
-            validation_result = await self.document_loader.validate_document_content(
-                documents=documents,
+            extracted = await self._extract_chunks(
+                file_content=file_content,
                 filename=filename,
-                file_type=file_extension
-            )
-            logger.info(f"🔍 Validation result: {validation_result}")
-            if not validation_result["valid"]:
-                logger.error(f"❌ Document validation failed for {filename}: {validation_result.get('error')}")
-                return DocumentUploadResponse(
-                    success=False,
-                    message=validation_result.get("error", "Document validation failed"),
-                    chunk_count=0,
-                    file_info=file_info
-                )
-            logger.info(f"✅ Document validation passed for {filename}")
-            
-            # Collect validation warnings
-            for warning in validation_result.get("warnings", []):
-                logger.warning(f"⚠️  Document validation warning: {warning}")
-                processing_warnings.append(warning)
-            
-            # Split documents into chunks using LangChain text splitter
-            chunk_start_time = time.time()
-            logger.info(f"✂️  Splitting {len(documents)} documents into chunks...")
-            chunks = self.text_splitter.split_documents(documents)
-            chunk_duration = time.time() - chunk_start_time
-
-            logger.info(f"✂️  Text splitter returned {len(chunks)} chunks from {filename} ({chunk_duration:.2f}s)")
-
-            if not chunks:
-                logger.error(f"❌ No chunks generated from {filename}")
-                # Debug: Log why no chunks were generated
-                for i, doc in enumerate(documents):
-                    logger.warning(f"   Doc {i}: {len(doc.page_content)} chars, metadata: {doc.metadata}")
-                return DocumentUploadResponse(
-                    success=False,
-                    message=f"No chunks could be generated from {filename}",
-                    chunk_count=0,
-                    file_info=file_info
-                )
-            
-            logger.info(
-                f"✂️  Generated {len(chunks)} chunks from {filename} ({chunk_duration:.2f}s)",
-                extra={
-                    'operation': 'chunk_generation',
-                    'document_name': filename,
-                    'chunk_count': len(chunks),
-                    'duration': chunk_duration * 1000
-                }
+                conversation_id=conversation_id,
+                user_id=user_id,
+                file_info=file_info,
+                processing_warnings=processing_warnings,
+                start_time=start_time,
+                user_prompt=user_prompt,
+                mode=mode,
+                image_analyzer=image_analyzer
             )
+            if isinstance(extracted, DocumentUploadResponse):
+                return extracted
+            chunks = extracted
             
             # ==================================================================================
             # OPTIMIZED BATCH PROCESSING START
@@ -261,48 +146,11 @@ class EnhancedRAGService:
                 )
 
             # 3. Prepare Bulk Insert Data
-            bulk_data = []
-            success_count = 0
-            failed_count = 0
-            
-            expected_dims = settings.EMBEDDING_DIMENSIONS
-            current_timestamp = time.time()
-            
-            for i, chunk in enumerate(chunks):
-                embedding = embeddings[i]
-                
-                if not embedding:
-                    processing_errors.append(f"Failed to generate embedding for chunk {i}")
-                    failed_count += 1
-                    continue
-                
-                if len(embedding) != expected_dims:
-                    processing_errors.append(f"Invalid embedding dimensions for chunk {i}: {len(embedding)}")
-                    failed_count += 1
-                    continue
-
-                # Prepare enhanced metadata
-                metadata = chunk.metadata.copy()
-                metadata.update({
-                    "filename": filename,
-                    "user_id": str(user_id),
-                    "conversation_id": str(conversation_id),
-                    "embedding_model": settings.EMBEDDING_PROVIDER,
-                    "embedding_dimensions": expected_dims,
-                    "processing_timestamp": current_timestamp,
-                    "chunk_length": len(chunk.page_content),
-                    "langchain_processed": True
-                })
-                
-                chunk_data = {
-                    "conversation_id": str(conversation_id),
-                    "user_id": str(user_id),
-                    "content": chunk.page_content,
-                    "embedding": embedding,
-                    "metadata": metadata
-                }
-                bulk_data.append(chunk_data)
-                success_count += 1
+            bulk_data = self._build_chunk_rows(
+                chunks, embeddings, filename, conversation_id, user_id, processing_errors
+            )
+            success_count = len(bulk_data)
+            failed_count = len(chunks) - success_count
             
             # 4. Perform Bulk Insert
             storage_start_time = time.time()
@@ -398,6 +246,420 @@ class EnhancedRAGService:
 
 
     
+    async def process_uploaded_files(
+        self,
+        files: List[Tuple[bytes, str]],
+        conversation_id: UUID,
+        user_id: UUID,
+        mode: str = "detailed",
+        image_analyzer: Optional[Callable[[bytes], Awaitable[str]]] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        extract_concurrency: int = UPLOAD_EXTRACT_CONCURRENCY
+    ) -> List[DocumentUploadResponse]:
+        """
+        Process several uploaded files as one pipeline.
+
+        Files are loaded / split concurrently (at most `extract_concurrency`
+        at a time). Their chunks are pooled into full-size embedding batches
+        across files, started as soon as enough chunks are ready, and all rows
+        are bulk-inserted together. A file that fails only fails its own
+        result.
+
+        Args:
+            files: (file_content, filename) pairs
+            progress_callback: Awaited with a "file_progress" event
+                ({index, filename, stage, ...}) as each file moves through
+                extracting -> extracted -> embedded -> done / failed
+
+        Returns:
+            One DocumentUploadResponse per file, in input order
+        """
+        results: List[Optional[DocumentUploadResponse]] = [None] * len(files)
+        jobs: Dict[int, Dict[str, Any]] = {}
+        embeddings: Dict[int, List[Optional[List[float]]]] = {}
+        batch_size = getattr(self.embeddings_service, "max_batch_size", 16)
+        pending: List[Tuple[int, int]] = []  # (file index, chunk index) awaiting embedding
+        embed_tasks: List[asyncio.Task] = []
+        extract_semaphore = asyncio.Semaphore(max(1, extract_concurrency))
+        embed_semaphore = asyncio.Semaphore(UPLOAD_EMBED_CONCURRENCY)
+
+        async def report(index: int, stage: str, **details):
+            if progress_callback:
+                try:
+                    await progress_callback({
+                        "type": "file_progress",
+                        "index": index,
+                        "filename": files[index][1],
+                        "stage": stage,
+                        **details
+                    })
+                except Exception as e:
+                    logger.warning(f"⚠️ Upload progress callback failed: {e}")
+
+        async def embed(batch: List[Tuple[int, int]]):
+            texts = [jobs[f]["chunks"][c].page_content for f, c in batch]
+            async with embed_semaphore:
+                try:
+                    vectors = await self.embeddings_service.generate_embeddings_batch(texts)
+                except Exception as e:
+                    logger.error(f"❌ Shared embedding batch failed: {e}")
+                    vectors = [None] * len(batch)
+            for (f, c), vector in zip(batch, vectors):
+                embeddings[f][c] = vector
+
+        def flush(final: bool):
+            # Only full batches while files are still being extracted
+            while len(pending) >= batch_size or (final and pending):
+                batch = pending[:batch_size]
+                del pending[:batch_size]
+                embed_tasks.append(asyncio.create_task(embed(batch)))
+
+        async def extract(index: int):
+            file_content, filename = files[index]
+            from pathlib import Path
+            file_info = {
+                "filename": filename,
+                "format": Path(filename).suffix.lower(),
+                "size_bytes": len(file_content),
+                "content_length": 0,
+                "encoding": None
+            }
+            warnings: List[str] = []
+            start_time = time.time()
+            async with extract_semaphore:
+                await report(index, "extracting")
+                try:
+                    extracted = await self._extract_chunks(
+                        file_content=file_content,
+                        filename=filename,
+                        conversation_id=conversation_id,
+                        user_id=user_id,
+                        file_info=file_info,
+                        processing_warnings=warnings,
+                        start_time=start_time,
+                        mode=mode,
+                        image_analyzer=image_analyzer
+                    )
+                except Exception as e:
+                    error_msg = f"Unexpected error processing {filename}: {str(e)}"
+                    logger.error(f"❌ {error_msg}", exc_info=True)
+                    extracted = DocumentUploadResponse(
+                        success=False,
+                        message=error_msg,
+                        chunk_count=0,
+                        processing_time=time.time() - start_time,
+                        errors=[error_msg],
+                        file_info=file_info
+                    )
+
+            if isinstance(extracted, DocumentUploadResponse):
+                results[index] = extracted
+                await report(index, "failed", message=extracted.message)
+                return
+            jobs[index] = {"chunks": extracted, "file_info": file_info, "warnings": warnings, "start_time": start_time}
+            embeddings[index] = [None] * len(extracted)
+            pending.extend((index, c) for c in range(len(extracted)))
+            flush(final=False)
+            await report(index, "extracted", chunk_count=len(extracted))
+
+        await asyncio.gather(*(extract(i) for i in range(len(files))))
+        flush(final=True)
+        await asyncio.gather(*embed_tasks)
+
+        # One bulk insert across all files
+        rows: List[Dict[str, Any]] = []
+        owners: List[int] = []
+        for index, job in sorted(jobs.items()):
+            job["errors"] = []
+            file_rows = self._build_chunk_rows(
+                job["chunks"], embeddings[index], files[index][1], conversation_id, user_id, job["errors"]
+            )
+            if not file_rows:
+                results[index] = DocumentUploadResponse(
+                    success=False,
+                    message=f"Failed to generate embeddings for file {files[index][1]}",
+                    chunk_count=0,
+                    processing_time=time.time() - job["start_time"],
+                    errors=job["errors"] or None,
+                    file_info=job["file_info"]
+                )
+                await report(index, "failed", message=results[index].message)
+                continue
+            rows.extend(file_rows)
+            owners.extend([index] * len(file_rows))
+            await report(index, "embedded", chunk_count=len(file_rows))
+
+        inserted: Dict[int, int] = {}
+        for start in range(0, len(rows), UPLOAD_INSERT_BATCH_SIZE):
+            batch = rows[start:start + UPLOAD_INSERT_BATCH_SIZE]
+            batch_owners = owners[start:start + UPLOAD_INSERT_BATCH_SIZE]
+            try:
+                result = await async_db_execute(
+                    lambda batch=batch: self.db.table("document_chunks").insert(batch).execute()
+                )
+                error = None if result.data else "Database insert returned no rows"
+            except Exception as e:
+                error = str(e)
+            if error:
+                logger.error(f"❌ Bulk insert failed for rows {start}-{start + len(batch)}: {error}")
+            for owner in batch_owners:
+                if error:
+                    jobs[owner]["errors"].append(f"Failed to store chunk: {error}")
+                else:
+                    inserted[owner] = inserted.get(owner, 0) + 1
+
+        for index, job in sorted(jobs.items()):
+            if results[index] is not None:
+                continue
+            filename = files[index][1]
+            success_count = inserted.get(index, 0)
+            processing_time = time.time() - job["start_time"]
+            rag_logger.log_document_processing(
+                operation='file_upload',
+                filename=filename,
+                user_id=str(user_id),
+                conversation_id=str(conversation_id),
+                duration=processing_time,
+                chunk_count=success_count,
+                file_size=job["file_info"]["size_bytes"],
+                success=(success_count > 0)
+            )
+            results[index] = DocumentUploadResponse(
+                success=success_count > 0,
+                message=(f"Successfully processed {success_count} chunks from {filename}" if success_count
+                         else f"Failed to process any chunks from {filename}"),
+                chunk_count=success_count,
+                processing_time=processing_time,
+                errors=job["errors"] or None,
+                warnings=job["warnings"] or None,
+                file_info=job["file_info"]
+            )
+            await report(index, "done" if success_count else "failed",
+                         chunk_count=success_count, message=results[index].message)
+
+        return results
+
+    async def _extract_chunks(
+        self,
+        file_content: bytes,
+        filename: str,
+        conversation_id: UUID,
+        user_id: UUID,
+        file_info: Dict[str, Any],
+        processing_warnings: List[str],
+        start_time: float,
+        user_prompt: Optional[str] = None,
+        mode: str = "detailed",
+        image_analyzer: Optional[Callable[[bytes], Awaitable[str]]] = None
+    ) -> Union[List[Document], DocumentUploadResponse]:
+        """
+        Load, validate and split one file.
+
+        Returns the chunks, or the failed DocumentUploadResponse to send back.
+        Updates file_info and processing_warnings in place.
+        """
+        file_extension = file_info["format"]
+        file_size = file_info["size_bytes"]
+
+        logger.info(
+            f"📤 Processing uploaded file: {filename} ({file_size} bytes) for user {user_id}",
+            extra={
+                'operation': 'file_upload',
+                'document_name': filename,
+                'file_size': file_size,
+                'file_type': file_extension,
+                'user_id': str(user_id),
+                'conversation_id': str(conversation_id)
+            }
+        )
+
+        # Check if file format is supported
+        if not self.document_loader.is_supported_format(filename):
+            return DocumentUploadResponse(
+                success=False,
+                message=f"Unsupported file format. Supported formats: {', '.join(self.document_loader.get_supported_formats())}",
+                chunk_count=0,
+                file_info=file_info
+            )
+
+        # Load document using LangChain loaders
+        try:
+            # Use injected image analyzer if provided, otherwise create a simple one
+            if image_analyzer is None:
+                # No image analyzer provided - images will be skipped or handled differently
+                logger.warning(f"⚠️  No image analyzer provided for {filename}, images will not be analyzed")
+                image_analyzer_func = None
+            else:
+                image_analyzer_func = image_analyzer
+
+            # NOTE: We disabled streaming ingestion callback to support BATCH processing
+            # Batch processing yields better total throughput than streaming 1-by-1
+            logger.info(f"📥 Starting document load for {filename}...")
+            documents = await self.document_loader.load_document(
+                file_content=file_content,
+                filename=filename,
+                additional_metadata={
+                    "user_id": str(user_id),
+                    "conversation_id": str(conversation_id)
+                },
+                image_analyzer=image_analyzer_func,
+                user_prompt=user_prompt,
+                mode=mode,
+                chunk_callback=None # Disable callback for batch mode
+            )
+            logger.info(f"📄 Document loader returned {len(documents)} documents for {filename}")
+
+            # Debug: Log document content preview
+            if documents:
+                for i, doc in enumerate(documents[:3]):  # Log first 3 docs
+                    preview = doc.page_content[:200].replace('\n', ' ') if doc.page_content else "[EMPTY]"
+                    logger.info(f"   Doc {i}: {len(doc.page_content)} chars - Preview: {preview}...")
+        except DocumentProcessingError as e:
+            # Use structured error information from DocumentProcessingError
+            logger.error(
+                f"❌ Document processing error for {filename}: "
+                f"category={e.error_category}, is_user_error={e.is_user_error}, "
+                f"details={e.details}"
+            )
+            return DocumentUploadResponse(
+                success=False,
+                message=e.message,
+                chunk_count=0,
+                errors=[e.message],
+                processing_time=time.time() - start_time
+            )
+
+        if not documents:
+            return DocumentUploadResponse(
+                success=False,
+                message=f"No content could be extracted from {filename}",
+                chunk_count=0,
+                file_info=file_info
+            )
+
+        # Update file_info with content length and encoding from documents
+        total_content_length = sum(len(doc.page_content) for doc in documents)
+        file_info["content_length"] = total_content_length
+
+        # Extract encoding from document metadata if available
+        if documents and documents[0].metadata.get("encoding"):
+            file_info["encoding"] = documents[0].metadata.get("encoding")
+
+        # Surface VLM usage (images described, cache hit rate) for hybrid PDF/PPTX loads
+        if documents and documents[0].metadata.get("vision_stats"):
+            file_info["vision"] = documents[0].metadata.pop("vision_stats")
+
+        # DEBUG: Log content preview to verify extraction quality
+        if documents:
+            preview_len = 500
+            preview_text = documents[0].page_content[:preview_len].replace('\n', ' ')
+            logger.info(f"📄 Content Preview for {filename}: {preview_text}...")
+
+        # Validate document content with enhanced error messages
+        logger.info(f"🔍 Validating document content for {filename}...")
+        validation_result = await self.document_loader.validate_document_content(
+            documents=documents,
+            filename=filename,
+            file_type=file_extension
+        )
+        logger.info(f"🔍 Validation result: {validation_result}")
+        if not validation_result["valid"]:
+            logger.error(f"❌ Document validation failed for {filename}: {validation_result.get('error')}")
+            return DocumentUploadResponse(
+                success=False,
+                message=validation_result.get("error", "Document validation failed"),
+                chunk_count=0,
+                file_info=file_info
+            )
+        logger.info(f"✅ Document validation passed for {filename}")
+
+        # Collect validation warnings
+        for warning in validation_result.get("warnings", []):
+            logger.warning(f"⚠️  Document validation warning: {warning}")
+            processing_warnings.append(warning)
+
+        # Split documents into chunks using LangChain text splitter
+        chunk_start_time = time.time()
+        logger.info(f"✂️  Splitting {len(documents)} documents into chunks...")
+        chunks = self.text_splitter.split_documents(documents)
+        chunk_duration = time.time() - chunk_start_time
+
+        logger.info(f"✂️  Text splitter returned {len(chunks)} chunks from {filename} ({chunk_duration:.2f}s)")
+
+        if not chunks:
+            logger.error(f"❌ No chunks generated from {filename}")
+            # Debug: Log why no chunks were generated
+            for i, doc in enumerate(documents):
+                logger.warning(f"   Doc {i}: {len(doc.page_content)} chars, metadata: {doc.metadata}")
+            return DocumentUploadResponse(
+                success=False,
+                message=f"No chunks could be generated from {filename}",
+                chunk_count=0,
+                file_info=file_info
+            )
+
+        logger.info(
+            f"✂️  Generated {len(chunks)} chunks from {filename} ({chunk_duration:.2f}s)",
+            extra={
+                'operation': 'chunk_generation',
+                'document_name': filename,
+                'chunk_count': len(chunks),
+                'duration': chunk_duration * 1000
+            }
+        )
+
+        return chunks
+
+    def _build_chunk_rows(
+        self,
+        chunks: List[Document],
+        embeddings: List[Optional[List[float]]],
+        filename: str,
+        conversation_id: UUID,
+        user_id: UUID,
+        processing_errors: List[str]
+    ) -> List[Dict[str, Any]]:
+        """document_chunks rows for the chunks that got a valid embedding."""
+        bulk_data = []
+
+        expected_dims = settings.EMBEDDING_DIMENSIONS
+        current_timestamp = time.time()
+
+        for i, chunk in enumerate(chunks):
+            embedding = embeddings[i]
+
+            if not embedding:
+                processing_errors.append(f"Failed to generate embedding for chunk {i}")
+                continue
+
+            if len(embedding) != expected_dims:
+                processing_errors.append(f"Invalid embedding dimensions for chunk {i}: {len(embedding)}")
+                continue
+
+            # Prepare enhanced metadata
+            metadata = chunk.metadata.copy()
+            metadata.update({
+                "filename": filename,
+                "user_id": str(user_id),
+                "conversation_id": str(conversation_id),
+                "embedding_model": settings.EMBEDDING_PROVIDER,
+                "embedding_dimensions": expected_dims,
+                "processing_timestamp": current_timestamp,
+                "chunk_length": len(chunk.page_content),
+                "langchain_processed": True
+            })
+
+            chunk_data = {
+                "conversation_id": str(conversation_id),
+                "user_id": str(user_id),
+                "content": chunk.page_content,
+                "embedding": embedding,
+                "metadata": metadata
+            }
+            bulk_data.append(chunk_data)
+
+        return bulk_data
+
     async def store_text_as_memory(
         self,
         text: str,
@@ -749,7 +1011,8 @@ class EnhancedRAGService:
         query: str,
         conversation_id: UUID,
         user_id: UUID,
-        max_chunks: int = 20
+        max_chunks: int = 20,
+        token_budget: Optional[int] = None
     ) -> str:
         """
         Get relevant context for a query using LangChain similarity search
@@ -759,6 +1022,8 @@ class EnhancedRAGService:
             conversation_id: Conversation UUID
             user_id: User UUID
             max_chunks: Maximum number of chunks to include
+            token_budget: If set, keep the most similar non-duplicate chunks
+                that fit in this many tokens
 
         Returns:
             Formatted context string
@@ -779,7 +1044,10 @@ class EnhancedRAGService:
                     return ""
                 else:
                     logger.info(f"✅ Fallback retrieved {len(chunks)} recent chunks")
-            
+
+            if token_budget:
+                chunks = self.pack_chunks(chunks, token_budget)
+
             # Organize chunks by document and similarity
             documents = {}
             for chunk in chunks:
@@ -839,6 +1107,19 @@ class EnhancedRAGService:
             logger.error(f"❌ Error generating context: {e}")
             return ""
     
+    def pack_chunks(self, chunks: List[DocumentChunk], token_budget: int) -> List[DocumentChunk]:
+        """Keep the most similar, de-duplicated chunks that fit in `token_budget` tokens."""
+        packed = context_packer.pack(
+            [Snippet(c.content, relevance=c.similarity or 0.0, kind="chunk", meta={"chunk": c}) for c in chunks],
+            token_budget,
+        )
+        if packed.dropped or packed.deduped:
+            logger.info(
+                f"📦 Context packed to {packed.tokens} tokens: kept {len(packed.snippets)}/{len(chunks)} chunks "
+                f"({packed.deduped} near-duplicates)"
+            )
+        return [s.meta["chunk"] for s in packed.snippets]
+
     async def get_all_conversation_chunks(
         self, 
         conversation_id: UUID, 
@@ -881,6 +1162,7 @@ class EnhancedRAGService:
             result = self.db.table("document_chunks").delete().eq(
                 "conversation_id", str(conversation_id)
             ).eq("user_id", str(user_id)).execute()
+            await asyncio.to_thread(dataset_store.delete_conversation, conversation_id)
             
             logger.info(f"✅ Deleted documents for conversation {conversation_id}")
             return True
@@ -910,6 +1192,7 @@ class EnhancedRAGService:
             # or we assume 'metadata' column. 
             # A safer approach if filter syntax is unsure: verify 'filename' is in metadata
             result = query.filter("metadata->>filename", "eq", filename).execute()
+            await asyncio.to_thread(dataset_store.delete_file, conversation_id, filename)
             
             logger.info(f"✅ Deleted chunks for file {filename} in conversation {conversation_id}")
             return True
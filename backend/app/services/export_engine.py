@@ -0,0 +1,345 @@
+"""
+Export Engine
+
+Builds conversation DOCX / PDF / manuscript exports without holding the
+whole conversation, or the finished file, in memory on the event loop.
+
+- The active thread's message ids are resolved first, then content is paged
+  from the database in EXPORT_BATCH_SIZE batches.
+- Each batch's diagrams are rendered (see diagram_renderer) and the messages
+  are handed, through a small bounded queue, to a builder running in the
+  export worker pool. python-docx / xhtml2pdf never run on the event loop.
+- PDF HTML is accumulated in a spooled temp file, and every document is
+  written straight to disk. Endpoints stream the file back with
+  FileResponse.
+- Finished files are cached under a hash of (format, style, conversation
+  id, conversation updated_at, active-thread ids), so re-exporting an
+  unchanged conversation is a file read. Identical concurrent exports
+  share one build.
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import queue
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.services.diagram_renderer import diagram_renderer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_DIR = str(Path(__file__).resolve().parents[2] / ".cache" / "exports")
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", "2"))
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "50"))
+EXPORT_QUEUE_SIZE = int(os.environ.get("EXPORT_QUEUE_SIZE", "64"))
+EXPORT_SPOOL_BYTES = int(os.environ.get("EXPORT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+EXPORT_CACHE_MAX_FILES = int(os.environ.get("EXPORT_CACHE_MAX_FILES", "200"))
+
+# Bump when the rendered layout changes so cached files are not reused
+EXPORT_FORMAT_VERSION = "1"
+
+PDF_STYLE = """
+            body { font-family: Helvetica, Arial, sans-serif; line-height: 1.6; color: #333; }
+            h1 { color: #2c3e50; text-align: center; border-bottom: 2px solid #eee; padding-bottom: 10px; }
+            .message { margin-bottom: 20px; padding: 15px; border-radius: 8px; }
+            .user { background-color: #f8f9fa; border-left: 4px solid #0066cc; }
+            .assistant { background-color: #ffffff; border-left: 4px solid #00994c; border: 1px solid #eee; }
+            .role { font-weight: bold; margin-bottom: 8px; font-size: 0.9em; text-transform: uppercase; letter-spacing: 0.5px; }
+            .user .role { color: #0066cc; }
+            .assistant .role { color: #00994c; }
+            .content { white-space: pre-wrap; }
+"""
+
+_END = object()
+
+
+def clean_markdown_for_docx(text: str) -> str:
+    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.*?)\*', r'\1', text)
+    text = re.sub(r'#{1,6}\s', '', text)
+    text = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', text)
+    return text
+
+
+def _as_of(updated_at: Any) -> str:
+    """Conversation version stamp for the document header.
+
+    The header shows when the conversation last changed rather than when the
+    file was built: updated_at is part of the cache key, so a cached file
+    never carries a stale time.
+    """
+    if isinstance(updated_at, str):
+        try:
+            updated_at = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
+        except ValueError:
+            return updated_at
+    if isinstance(updated_at, datetime):
+        return updated_at.strftime('%Y-%m-%d %H:%M:%S')
+    return ""
+
+
+def _drain(q: "queue.Queue") -> Iterator[Tuple[str, List[Dict]]]:
+    """Builder-side iterator over (role, parts) items fed by the event loop."""
+    while True:
+        item = q.get()
+        if item is _END:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def build_conversation_docx(title: str, items: Iterator[Tuple[str, List[Dict]]], path: str,
+                            as_of: str = "") -> None:
+    """Write a conversation DOCX to `path` (runs in the export pool)."""
+    import io
+    from docx import Document
+    from docx.shared import Inches, RGBColor
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    doc = Document()
+    heading = doc.add_heading(title or "Chat Export", 0)
+    heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    if as_of:
+        doc.add_paragraph(f"Conversation as of: {as_of}")
+    doc.add_paragraph("_" * 50)
+
+    for role, parts in items:
+        p = doc.add_paragraph()
+        if role == 'user':
+            runner = p.add_run("User:\n")
+            runner.bold = True
+            runner.font.color.rgb = RGBColor(0, 102, 204)
+        else:
+            runner = p.add_run("AI Assistant:\n")
+            runner.bold = True
+            runner.font.color.rgb = RGBColor(0, 153, 76)
+
+        for part in parts:
+            if part["type"] == "text":
+                p.add_run(clean_markdown_for_docx(part["content"]) + "\n")
+            elif part["type"] == "image":
+                try:
+                    p.add_run("\n")
+                    doc.add_picture(io.BytesIO(part["data"]), width=Inches(6.0))  # Scale to fit doc width
+                    p = doc.add_paragraph()  # Start a new paragraph after image
+                except Exception as e:
+                    p.add_run(f"\n[Failed to insert image: {str(e)}]\n")
+
+    doc.save(path)
+
+
+def build_conversation_pdf(title: str, items: Iterator[Tuple[str, List[Dict]]], path: str,
+                           as_of: str = "") -> None:
+    """Write a conversation PDF to `path` (runs in the export pool)."""
+    import markdown
+    from xhtml2pdf import pisa
+
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode="w+b") as html:
+        def write(fragment: str):
+            html.write(fragment.encode("utf-8"))
+
+        write(f"""
+    <html>
+    <head>
+        <style>{PDF_STYLE}</style>
+    </head>
+    <body>
+        <h1>{title or 'Chat Export'}</h1>
+        <div style="text-align: right; color: #666; margin-bottom: 30px;">
+            {f"Conversation as of: {as_of}" if as_of else ""}
+        </div>
+    """)
+
+        for role, parts in items:
+            role_class = 'user' if role == 'user' else 'assistant'
+            role_label = 'User' if role == 'user' else 'AI Assistant'
+            write(f'<div class="message {role_class}"><div class="role">{role_label}</div>')
+            for part in parts:
+                if part["type"] == "text":
+                    safe_text = part["content"].replace('<', '&lt;').replace('>', '&gt;')
+                    if role == 'assistant':
+                        write(markdown.markdown(safe_text, extensions=['fenced_code', 'tables']))
+                    else:
+                        write(f"<div class='content'>{safe_text}</div>")
+                elif part["type"] == "image":
+                    # Embed image directly as base64 in HTML
+                    b64_img = base64.b64encode(part["data"]).decode('utf-8')
+                    write(f'<div style="text-align: center; margin: 20px 0;"><img src="data:image/png;base64,{b64_img}" style="max-width: 100%; border: 1px solid #ddd; padding: 5px; border-radius: 4px;" alt="diagram"></div>')
+            write("</div>")
+        write("</body></html>")
+
+        html.seek(0)
+        with open(path, "wb") as dest:
+            status = pisa.CreatePDF(html, dest=dest, encoding="utf-8")
+        if status.err:
+            raise RuntimeError("PDF generation failed")
+
+
+class ExportEngine:
+    """Paged, off-loop, cached document export."""
+
+    def __init__(self, cache_dir: str = DEFAULT_EXPORT_DIR, workers: int = EXPORT_WORKERS,
+                 batch_size: int = EXPORT_BATCH_SIZE, max_cache_files: int = EXPORT_CACHE_MAX_FILES):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_cache_files = max_cache_files
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ---- cache ----
+
+    def version_key(self, kind: str, conversation: Any, message_ids: List[str], style: str = "") -> str:
+        digest = hashlib.sha256()
+        for part in (EXPORT_FORMAT_VERSION, kind, style, str(conversation.id),
+                     str(conversation.updated_at), ",".join(str(m) for m in message_ids)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _cache_path(self, key: str, ext: str) -> Path:
+        return self.cache_dir / f"{key}.{ext}"
+
+    def _prune(self) -> None:
+        files = [p for p in self.cache_dir.glob("*.*") if ".tmp" not in p.name]
+        excess = len(files) - self.max_cache_files
+        if excess > 0:
+            files.sort(key=lambda p: p.stat().st_mtime)
+            for path in files[:excess]:
+                path.unlink(missing_ok=True)
+
+    async def _cached_build(self, key: str, ext: str, build: Callable[[str], Any]) -> Path:
+        """Return the cached file for `key`, building it once via `build(tmp_path)` if missing."""
+        path = self._cache_path(key, ext)
+        if path.exists():
+            os.utime(path)
+            return path
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{id(future)}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            await build(str(tmp))
+            os.replace(tmp, path)
+            await asyncio.to_thread(self._prune)
+            future.set_result(path)
+            return path
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            if tmp.exists():
+                tmp.unlink()
+
+    # ---- streaming build ----
+
+    async def _stream_build(self, builder: Callable, title: str, message_ids: List[str],
+                            user: Any, chat_service: Any, path: str, as_of: str = "") -> None:
+        """Page messages from the DB into `builder` running in the export pool."""
+        loop = asyncio.get_running_loop()
+        q: "queue.Queue" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        build = loop.run_in_executor(self._get_pool(), builder, title, _drain(q), path, as_of)
+
+        async def put(item) -> bool:
+            while not build.done():
+                try:
+                    q.put_nowait(item)
+                    return True
+                except queue.Full:
+                    await asyncio.sleep(0.01)
+            return False
+
+        try:
+            async for page in chat_service.iter_messages_by_id(message_ids, user, self.batch_size):
+                parts_list = await asyncio.gather(
+                    *(diagram_renderer.render_text_parts(msg.content) for msg in page)
+                )
+                for msg, parts in zip(page, parts_list):
+                    if not await put((msg.role, parts)):
+                        break
+                if build.done():
+                    break
+            await put(_END)
+        except BaseException as e:
+            # Unblock the builder so the worker thread is released
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+            q.put_nowait(e if isinstance(e, Exception) else RuntimeError("export cancelled"))
+            build.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise
+        await build
+
+    async def export_conversation(self, kind: str, conversation: Any, user: Any, chat_service: Any) -> Path:
+        """Export a conversation as "docx" or "pdf"; returns the path of the finished file."""
+        builder = {"docx": build_conversation_docx, "pdf": build_conversation_pdf}[kind]
+        message_ids = await chat_service.get_thread_message_ids(conversation.id, user)
+        key = self.version_key(kind, conversation, message_ids)
+
+        async def build(tmp_path: str):
+            await self._stream_build(builder, conversation.title, message_ids, user, chat_service, tmp_path,
+                                     _as_of(conversation.updated_at))
+
+        return await self._cached_build(key, kind, build)
+
+    async def export_manuscript(self, conversation: Any, user: Any, chat_service: Any,
+                                formatter: Any, style: str = "report") -> Path:
+        """Export an AI-structured manuscript DOCX; returns the path of the finished file."""
+        message_ids = await chat_service.get_thread_message_ids(conversation.id, user)
+        if not message_ids:
+            raise LookupError("No messages found")
+        key = self.version_key("manuscript", conversation, message_ids, style)
+
+        async def build(tmp_path: str):
+            messages = []
+            async for page in chat_service.iter_messages_by_id(message_ids, user, self.batch_size):
+                messages.extend(
+                    {
+                        "role": msg.role,
+                        "content": msg.content,
+                        "created_at": msg.created_at.isoformat() if msg.created_at else None
+                    }
+                    for msg in page
+                )
+            structured = await formatter.structure_content(messages, style=style)
+            del messages
+            diagrams = await diagram_renderer.render_sources(formatter.diagram_sources(structured))
+            await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(),
+                lambda: formatter.write_docx(structured, tmp_path, style=style, diagrams=diagrams)
+            )
+
+        return await self._cached_build(key, "docx", build)
+
+
+export_engine = ExportEngine()
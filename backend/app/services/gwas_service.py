@@ -12,10 +12,14 @@ APIs Used:
 
 """
 
+import asyncio
+import re
 import httpx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 
+from cachetools import TTLCache
+
 
 class GWASService:
     """
@@ -26,6 +30,8 @@ class GWASService:
     - Variant annotation (consequence, frequency, clinical significance)
     - Trait/disease associations
     - eQTL data from GTEx
+    - Batch annotation (Ensembl bulk POST + bounded per-variant queries)
+    - Size-bounded TTL cache with negative caching for unknown rsIDs
     - Free APIs - no key required
     """
     
@@ -33,9 +39,29 @@ class GWASService:
     GWAS_CATALOG_BASE = "https://www.ebi.ac.uk/gwas/rest/api"
     OPEN_TARGETS_BASE = "https://api.platform.opentargets.org/api/v0.4/graphql"
     
+    RSID_PATTERN = re.compile(r"^rs\d+$", re.IGNORECASE)
+    ENSEMBL_BATCH_SIZE = 200  # Ensembl POST /variation limit
+    MAX_CONCURRENT_VARIANTS = 8
+    
     def __init__(self):
         """Initialize GWASService"""
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        # Found variants live for a day; unknown rsIDs are retried after an hour
+        self._cache: TTLCache = TTLCache(maxsize=5000, ttl=86400)
+        self._negative_cache: TTLCache = TTLCache(maxsize=10000, ttl=3600)
+    
+    def _get_cached(self, rsid: str) -> Optional[Dict[str, Any]]:
+        key = rsid.lower()
+        return self._cache.get(key) or self._negative_cache.get(key)
+    
+    def _store(self, rsid: str, result: Dict[str, Any], answered: bool = True):
+        """
+        Cache a combined result. A not-found result is only cached when every
+        source answered; if any of them errored it may just have been down.
+        """
+        if result.get("found"):
+            self._cache[rsid.lower()] = result
+        elif answered:
+            self._negative_cache[rsid.lower()] = result
     
     async def lookup_variant(self, rsid: str) -> Optional[Dict[str, Any]]:
         """
@@ -47,9 +73,15 @@ class GWASService:
         Returns:
             Dict with combined variant information from all sources
         """
-        # Check cache first
-        if rsid.lower() in self._cache:
-            return self._cache[rsid.lower()]
+        # Check cache first (including known-missing variants)
+        cached = self._get_cached(rsid)
+        if cached is not None:
+            return cached
+        
+        if not self.RSID_PATTERN.match(rsid):
+            result = self._combine_results(rsid, None, None, None, None)
+            self._store(rsid, result)
+            return result
         
         # Query all databases in parallel
         async with httpx.AsyncClient(timeout=15.0) as client:
@@ -78,16 +110,97 @@ class GWASService:
         )
         
         # Cache result
-        self._cache[rsid.lower()] = combined
+        self._store(rsid, combined, answered=not any(isinstance(r, Exception) for r in results))
         
         return combined
     
+    async def lookup_variants(self, rsids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Annotate many variants, yielding each result as soon as it is ready.
+        
+        Ensembl annotations are fetched in bulk (POST, 200 IDs per request);
+        GWAS Catalog, Open Targets and ClinVar have no bulk mode, so they run
+        per variant with bounded concurrency over one shared client.
+        
+        Args:
+            rsids: dbSNP reference SNP IDs (duplicates and case are ignored)
+            
+        Yields:
+            Combined variant dicts (same shape as lookup_variant)
+        """
+        unique: Dict[str, str] = {}
+        for rsid in rsids:
+            if rsid and rsid.strip():
+                unique.setdefault(rsid.strip().lower(), rsid.strip())
+        
+        pending = []
+        for rsid in unique.values():
+            cached = self._get_cached(rsid)
+            if cached is not None:
+                yield cached
+            elif not self.RSID_PATTERN.match(rsid):
+                result = self._combine_results(rsid, None, None, None, None)
+                self._store(rsid, result)
+                yield result
+            else:
+                pending.append(rsid)
+        
+        if not pending:
+            return
+        
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_VARIANTS)
+        limits = httpx.Limits(max_connections=self.MAX_CONCURRENT_VARIANTS * 2)
+        
+        async with httpx.AsyncClient(timeout=15.0, limits=limits) as client:
+            # One bulk Ensembl request per batch, shared by all variant tasks
+            ensembl_batches = {}
+            for start in range(0, len(pending), self.ENSEMBL_BATCH_SIZE):
+                batch = pending[start:start + self.ENSEMBL_BATCH_SIZE]
+                task = asyncio.create_task(self._query_ensembl_batch(client, batch))
+                for rsid in batch:
+                    ensembl_batches[rsid] = task
+            
+            async def annotate(rsid: str) -> Dict[str, Any]:
+                async with semaphore:
+                    results = await asyncio.gather(
+                        self._query_gwas_catalog(client, rsid),
+                        self._query_open_targets(client, rsid),
+                        self._query_clinvar(client, rsid),
+                        return_exceptions=True
+                    )
+                gwas_data, open_targets_data, clinvar_data = [
+                    None if isinstance(r, Exception) else r for r in results
+                ]
+                answered = not any(isinstance(r, Exception) for r in results)
+                try:
+                    ensembl_data = (await ensembl_batches[rsid]).get(rsid.lower())
+                except Exception:
+                    ensembl_data = None
+                    answered = False
+                
+                combined = self._combine_results(
+                    rsid, ensembl_data, gwas_data, open_targets_data, clinvar_data
+                )
+                self._store(rsid, combined, answered)
+                return combined
+            
+            tasks = [asyncio.create_task(annotate(rsid)) for rsid in pending]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                # Client disconnected mid-stream: stop outstanding lookups
+                for task in tasks:
+                    task.cancel()
+                for task in set(ensembl_batches.values()):
+                    task.cancel()
+    
     async def _query_ensembl(
         self, 
         client: httpx.AsyncClient, 
         rsid: str
     ) -> Optional[Dict[str, Any]]:
-        """Query Ensembl for variant annotation"""
+        """Query Ensembl for variant annotation (None if unknown; raises on errors)"""
         try:
             # Get variant annotation
             response = await client.get(
@@ -95,29 +208,60 @@ class GWASService:
                 params={"content-type": "application/json"}
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "source": "ensembl",
-                    "rsid": data.get("name", rsid),
-                    "chromosome": data.get("seq_region_name"),
-                    "position": data.get("start"),
-                    "alleles": data.get("alleles", []),
-                    "minor_allele": data.get("minor_allele"),
-                    "minor_allele_freq": data.get("minor_allele_freq"),
-                    "synonyms": data.get("synonyms", []),
-                    "most_severe_consequence": data.get("most_severe_consequence")
-                }
+            # Ensembl answers 400 "No variation found" for unknown rsIDs
+            if response.status_code in (400, 404):
+                return None
+            response.raise_for_status()
+            return self._parse_ensembl(response.json(), rsid)
         except Exception as e:
             print(f"❌ Ensembl query failed for {rsid}: {e}")
-        return None
+            raise
+    
+    async def _query_ensembl_batch(
+        self,
+        client: httpx.AsyncClient,
+        rsids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Query Ensembl for up to 200 variants in one POST request (unknown IDs are absent)"""
+        try:
+            response = await client.post(
+                f"{self.ENSEMBL_BASE}/variation/homo_sapiens",
+                json={"ids": rsids},
+                headers={"Content-Type": "application/json", "Accept": "application/json"}
+            )
+            
+            response.raise_for_status()
+            return {
+                rsid.lower(): self._parse_ensembl(data, rsid)
+                for rsid, data in response.json().items()
+                if isinstance(data, dict)
+            }
+        except Exception as e:
+            print(f"❌ Ensembl batch query failed for {len(rsids)} variants: {e}")
+            raise
+    
+    def _parse_ensembl(self, data: Dict[str, Any], rsid: str) -> Dict[str, Any]:
+        """Normalize an Ensembl variation record"""
+        # Location lives on the primary mapping in current Ensembl responses
+        mapping = (data.get("mappings") or [{}])[0]
+        return {
+            "source": "ensembl",
+            "rsid": data.get("name", rsid),
+            "chromosome": data.get("seq_region_name") or mapping.get("seq_region_name"),
+            "position": data.get("start") or mapping.get("start"),
+            "alleles": data.get("alleles", []),
+            "minor_allele": data.get("minor_allele"),
+            "minor_allele_freq": data.get("minor_allele_freq"),
+            "synonyms": data.get("synonyms", []),
+            "most_severe_consequence": data.get("most_severe_consequence")
+        }
     
     async def _query_gwas_catalog(
         self, 
         client: httpx.AsyncClient, 
         rsid: str
     ) -> Optional[List[Dict[str, Any]]]:
-        """Query GWAS Catalog for trait associations"""
+        """Query GWAS Catalog for trait associations (None if unknown; raises on errors)"""
         try:
             # Search for variant associations
             response = await client.get(
@@ -128,35 +272,37 @@ class GWASService:
                 }
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                associations = []
-                
-                for item in data.get("_embedded", {}).get("associations", []):
-                    associations.append({
-                        "source": "gwas_catalog",
-                        "trait": item.get("reportedTrait", ""),
-                        "p_value": item.get("pValue"),
-                        "p_value_formatted": self._format_p_value(item.get("pValue")),
-                        "odds_ratio": item.get("orValue"),
-                        "beta": item.get("betaValue"),
-                        "risk_allele": item.get("riskAlleles"),
-                        "sample_size": item.get("initialSampleSize"),
-                        "study": item.get("_links", {}).get("study", {}).get("href"),
-                        "pubmed_id": item.get("_links", {}).get("publication", {}).get("href", "").split("/")[-1]
-                    })
-                
-                return associations
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            data = response.json()
+            associations = []
+            
+            for item in data.get("_embedded", {}).get("associations", []):
+                associations.append({
+                    "source": "gwas_catalog",
+                    "trait": item.get("reportedTrait", ""),
+                    "p_value": item.get("pValue"),
+                    "p_value_formatted": self._format_p_value(item.get("pValue")),
+                    "odds_ratio": item.get("orValue"),
+                    "beta": item.get("betaValue"),
+                    "risk_allele": item.get("riskAlleles"),
+                    "sample_size": item.get("initialSampleSize"),
+                    "study": item.get("_links", {}).get("study", {}).get("href"),
+                    "pubmed_id": item.get("_links", {}).get("publication", {}).get("href", "").split("/")[-1]
+                })
+            
+            return associations
         except Exception as e:
             print(f"❌ GWAS Catalog query failed for {rsid}: {e}")
-        return None
+            raise
     
     async def _query_open_targets(
         self, 
         client: httpx.AsyncClient, 
         rsid: str
     ) -> Optional[Dict[str, Any]]:
-        """Query Open Targets for variant-to-gene mapping"""
+        """Query Open Targets for variant-to-gene mapping (None if unknown; raises on errors)"""
         try:
             # GraphQL query for variant
             query = """
@@ -182,34 +328,33 @@ class GWASService:
                 }
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                variant = data.get("data", {}).get("variant")
-                
-                if variant:
-                    return {
-                        "source": "open_targets",
-                        "rsid": variant.get("id"),
-                        "consequence": variant.get("mostSevereConsequence"),
-                        "cadd_score": variant.get("caddPhredScore"),
-                        "genes": [
-                            {
-                                "symbol": g.get("symbol"),
-                                "biotype": g.get("biotype")
-                            }
-                            for g in variant.get("genes", [])
-                        ]
+            response.raise_for_status()
+            variant = (response.json().get("data") or {}).get("variant")
+            if not variant:
+                return None
+            return {
+                "source": "open_targets",
+                "rsid": variant.get("id"),
+                "consequence": variant.get("mostSevereConsequence"),
+                "cadd_score": variant.get("caddPhredScore"),
+                "genes": [
+                    {
+                        "symbol": g.get("symbol"),
+                        "biotype": g.get("biotype")
                     }
+                    for g in variant.get("genes", [])
+                ]
+            }
         except Exception as e:
             print(f"❌ Open Targets query failed for {rsid}: {e}")
-        return None
+            raise
     
     async def _query_clinvar(
         self, 
         client: httpx.AsyncClient, 
         rsid: str
     ) -> Optional[Dict[str, Any]]:
-        """Query ClinVar for clinical significance"""
+        """Query ClinVar for clinical significance (None if no records; raises on errors)"""
         try:
             # Search ClinVar via NCBI E-utilities
             response = await client.get(
@@ -222,43 +367,42 @@ class GWASService:
                 }
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                ids = data.get("esearchresult", {}).get("idlist", [])
-                
-                if ids:
-                    # Fetch summary for first result
-                    summary_response = await client.get(
-                        "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi",
-                        params={
-                            "db": "clinvar",
-                            "id": ",".join(ids[:3]),
-                            "retmode": "json"
-                        }
-                    )
-                    
-                    if summary_response.status_code == 200:
-                        summary_data = summary_response.json()
-                        clinvar_info = []
-                        
-                        for uid, item in summary_data.get("result", {}).items():
-                            if uid == "uids":
-                                continue
-                            clinvar_info.append({
-                                "clinvar_id": item.get("uid"),
-                                "condition": item.get("condition", {}).get("name"),
-                                "clinical_significance": item.get("clinical_significance"),
-                                "review_status": item.get("review_status"),
-                                "url": f"https://www.ncbi.nlm.nih.gov/clinvar/{item.get('uid')}"
-                            })
-                        
-                        return {
-                            "source": "clinvar",
-                            "records": clinvar_info
-                        }
+            response.raise_for_status()
+            ids = response.json().get("esearchresult", {}).get("idlist", [])
+            if not ids:
+                return None
+            
+            # Fetch summary for first result
+            summary_response = await client.get(
+                "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi",
+                params={
+                    "db": "clinvar",
+                    "id": ",".join(ids[:3]),
+                    "retmode": "json"
+                }
+            )
+            summary_response.raise_for_status()
+            summary_data = summary_response.json()
+            clinvar_info = []
+            
+            for uid, item in summary_data.get("result", {}).items():
+                if uid == "uids":
+                    continue
+                clinvar_info.append({
+                    "clinvar_id": item.get("uid"),
+                    "condition": item.get("condition", {}).get("name"),
+                    "clinical_significance": item.get("clinical_significance"),
+                    "review_status": item.get("review_status"),
+                    "url": f"https://www.ncbi.nlm.nih.gov/clinvar/{item.get('uid')}"
+                })
+            
+            return {
+                "source": "clinvar",
+                "records": clinvar_info
+            }
         except Exception as e:
             print(f"❌ ClinVar query failed for {rsid}: {e}")
-        return None
+            raise
     
     def _combine_results(
         self,
@@ -358,8 +502,5 @@ class GWASService:
         return "\n".join(lines)
 
 
-# Need to import asyncio at module level
-import asyncio
-
 # Singleton instance
 gwas_service = GWASService()
@@ -0,0 +1,315 @@
+"""
+Job Store
+
+Durable, bounded storage for background generation jobs (slides, documents).
+
+A job is a small metadata record, an append-only progress event log and,
+once finished, one artifact file. Artifacts are always written to disk and
+served from there, so finished PPTX/DOCX bytes never stay resident in the
+worker. The SSE status stream replays the persisted event log and then
+follows it, which lets any uvicorn worker answer /status and /download for
+a job started by another.
+
+Backends:
+- "filesystem" (default): one directory per job under JOB_STORE_DIR. Safe
+  for several workers sharing the directory.
+- "memory": metadata and events in-process (single worker / dev only);
+  artifacts still spill to disk.
+
+Both backends evict jobs older than JOB_TTL_SECONDS and keep at most
+JOB_MAX_JOBS jobs, dropping the oldest finished ones first. A running job
+that has published nothing for JOB_STALE_SECONDS (its worker died or was
+redeployed) is failed by the next follower instead of being polled forever.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_DIR = str(Path(__file__).resolve().parents[2] / ".cache" / "jobs")
+JOB_STORE_BACKEND = os.environ.get("JOB_STORE_BACKEND", "filesystem")
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", str(6 * 3600)))
+JOB_MAX_JOBS = int(os.environ.get("JOB_MAX_JOBS", "200"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "0.5"))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "600"))
+
+TERMINAL_STATUSES = {"complete", "error"}
+
+
+def _is_terminal(event: Dict[str, Any]) -> bool:
+    return event.get("status") in TERMINAL_STATUSES
+
+
+class MemoryJobBackend:
+    """In-process job records. Only visible to the worker that created them."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+
+    def create(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["job_id"]] = dict(job)
+        self._events[job["job_id"]] = []
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def update(self, job_id: str, **fields) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def append_event(self, job_id: str, event: Dict[str, Any]) -> None:
+        if job_id in self._events:
+            self._events[job_id].append(event)
+
+    def read_events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        return list(self._events.get(job_id, [])[after:])
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [dict(job) for job in self._jobs.values()]
+
+    def delete(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self._events.pop(job_id, None)
+
+
+class FilesystemJobBackend:
+    """
+    One directory per job: job.json (replaced atomically) and events.jsonl
+    (one JSON line per append). Works across processes sharing the root.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _dir(self, job_id: str) -> Path:
+        # job ids are uuid4 strings; reject anything that could escape the root
+        uuid.UUID(job_id)
+        return self.root / job_id
+
+    def _write_meta(self, job_id: str, job: Dict[str, Any]) -> None:
+        path = self._dir(job_id) / "job.json"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(job))
+        os.replace(tmp, path)
+
+    def create(self, job: Dict[str, Any]) -> None:
+        job_dir = self._dir(job["job_id"])
+        job_dir.mkdir(parents=True, exist_ok=True)
+        (job_dir / "events.jsonl").touch()
+        self._write_meta(job["job_id"], job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self._dir(job_id) / "job.json").read_text())
+        except (ValueError, OSError):
+            return None
+
+    def update(self, job_id: str, **fields) -> None:
+        job = self.get(job_id)
+        if job is None:
+            return
+        job.update(fields, updated_at=time.time())
+        self._write_meta(job_id, job)
+
+    def append_event(self, job_id: str, event: Dict[str, Any]) -> None:
+        line = (json.dumps(event) + "\n").encode()
+        try:
+            fd = os.open(self._dir(job_id) / "events.jsonl", os.O_WRONLY | os.O_APPEND)
+        except (ValueError, OSError):
+            return
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def read_events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        try:
+            lines = (self._dir(job_id) / "events.jsonl").read_text().splitlines()
+        except (ValueError, OSError):
+            return []
+        events = []
+        for line in lines[after:]:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # Partially written last line; picked up on the next read
+                break
+        return events
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        if not self.root.is_dir():
+            return jobs
+        for entry in self.root.iterdir():
+            if entry.is_dir():
+                job = self.get(entry.name) if _looks_like_uuid(entry.name) else None
+                if job:
+                    jobs.append(job)
+        return jobs
+
+    def delete(self, job_id: str) -> None:
+        try:
+            shutil.rmtree(self._dir(job_id), ignore_errors=True)
+        except ValueError:
+            pass
+
+
+def _looks_like_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except ValueError:
+        return False
+
+
+class JobStore:
+    """Job lifecycle, progress log and on-disk artifacts over a pluggable backend."""
+
+    def __init__(self, backend=None, artifact_dir: str = None,
+                 ttl_seconds: int = JOB_TTL_SECONDS, max_jobs: int = JOB_MAX_JOBS,
+                 poll_interval: float = JOB_POLL_INTERVAL, stale_seconds: float = JOB_STALE_SECONDS):
+        self.backend = backend or FilesystemJobBackend(DEFAULT_JOB_DIR)
+        self.artifact_dir = Path(artifact_dir or getattr(self.backend, "root", DEFAULT_JOB_DIR))
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        # Same-worker followers are woken immediately; others poll the log
+        self._signals: Dict[str, asyncio.Event] = {}
+
+    def create(self, kind: str, **fields) -> str:
+        """Register a new job and return its id."""
+        self.purge()
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self.backend.create({
+            "job_id": job_id,
+            "kind": kind,
+            "status": "started",
+            "message": "Initializing...",
+            "artifact": None,
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        })
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get(job_id)
+
+    async def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        """Append a progress event and mirror its counters onto the job record."""
+        self.backend.append_event(job_id, event)
+        fields = {k: event[k] for k in ("current", "total", "message") if k in event}
+        if _is_terminal(event):
+            fields["status"] = event["status"]
+            if event.get("error"):
+                fields["error"] = event["error"]
+        else:
+            fields["status"] = "running"
+        self.backend.update(job_id, **fields)
+        signal = self._signals.pop(job_id, None)
+        if signal:
+            signal.set()
+
+    async def complete(self, job_id: str, data: bytes, filename: str, media_type: str) -> None:
+        """Write the artifact to disk, then publish the terminal event."""
+        path = self.artifact_dir / job_id / "artifact.bin"
+        await asyncio.to_thread(self._write_artifact, path, data)
+        self.backend.update(job_id, artifact={
+            "path": str(path), "filename": filename, "media_type": media_type, "size": len(data)
+        })
+        await self.publish(job_id, {"status": "complete", "job_id": job_id})
+
+    async def fail(self, job_id: str, error: str) -> None:
+        await self.publish(job_id, {"status": "error", "error": error})
+
+    @staticmethod
+    def _write_artifact(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def artifact(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Artifact descriptor (path, filename, media_type) if the job finished and the file exists."""
+        job = self.backend.get(job_id)
+        artifact = (job or {}).get("artifact")
+        if not artifact or not os.path.exists(artifact["path"]):
+            return None
+        return artifact
+
+    async def follow(self, job_id: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Replay the job's event log from the start, then follow it until a
+        terminal event. A job whose last update is older than stale_seconds
+        is failed, which ends the stream.
+        """
+        seen = 0
+        while True:
+            signal = self._signals.setdefault(job_id, asyncio.Event())
+            events = self.backend.read_events(job_id, seen)
+            for event in events:
+                seen += 1
+                yield event
+                if _is_terminal(event):
+                    return
+            if not events:
+                job = self.backend.get(job_id)
+                if job is None:
+                    return
+                if job.get("status") in TERMINAL_STATUSES:
+                    # Terminal status without a terminal event (e.g. evicted log); synthesize one
+                    yield {"status": job["status"], "job_id": job_id, "error": job.get("error")}
+                    return
+                if time.time() - job.get("updated_at", 0) > self.stale_seconds:
+                    logger.warning(f"Job {job_id} has not reported progress for {self.stale_seconds:.0f}s; failing it")
+                    await self.fail(job_id, "Generation stopped responding, please try again")
+                    continue
+                try:
+                    await asyncio.wait_for(signal.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def purge(self) -> int:
+        """Evict expired jobs, then the oldest finished jobs beyond max_jobs."""
+        now = time.time()
+        jobs = self.backend.list_jobs()
+        doomed = {j["job_id"] for j in jobs if now - j.get("updated_at", 0) > self.ttl_seconds}
+        remaining = [j for j in jobs if j["job_id"] not in doomed]
+        overflow = len(remaining) - self.max_jobs + 1
+        if overflow > 0:
+            finished = sorted(
+                (j for j in remaining if j.get("status") in TERMINAL_STATUSES),
+                key=lambda j: j.get("updated_at", 0)
+            )
+            doomed.update(j["job_id"] for j in finished[:overflow])
+        for job_id in doomed:
+            self.delete(job_id)
+        if doomed:
+            logger.info(f"Evicted {len(doomed)} generation jobs")
+        return len(doomed)
+
+    def delete(self, job_id: str) -> None:
+        self.backend.delete(job_id)
+        shutil.rmtree(self.artifact_dir / job_id, ignore_errors=True)
+        self._signals.pop(job_id, None)
+
+
+def _build_default_store() -> JobStore:
+    if JOB_STORE_BACKEND == "memory":
+        return JobStore(MemoryJobBackend(), artifact_dir=os.path.join(DEFAULT_JOB_DIR, "artifacts"))
+    return JobStore(FilesystemJobBackend(os.environ.get("JOB_STORE_DIR", DEFAULT_JOB_DIR)))
+
+
+job_store = _build_default_store()
@@ -1,19 +1,44 @@
 """
 Lab Report Generation Service
 Generates structured lab reports from experimental data and methodology documents
+
+Sections are generated as a small dependency graph: independent sections run
+concurrently and each section starts as soon as its inputs are ready, so a
+report takes roughly as long as its longest chain (results → discussion →
+conclusion) rather than the sum of every call.
 """
 
+import asyncio
 import json
 import logging
 import httpx
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncGenerator
 from uuid import UUID
 from dataclasses import dataclass, field
 
 from app.core.config import settings
+from app.services.multi_provider import get_multi_provider
 
 logger = logging.getLogger(__name__)
 
+# Section -> sections whose output it reads
+SECTION_DEPENDENCIES: Dict[str, tuple] = {
+    "title": (),
+    "introduction": (),
+    "materials_methods": (),
+    "results": (),
+    "discussion": ("results",),
+    "conclusion": ("results", "discussion"),
+    # LLM fallback builds the list from citations in these two
+    "references": ("introduction", "discussion"),
+}
+
+# Document order used when compiling / streaming markdown
+SECTION_ORDER = ["title", "introduction", "materials_methods", "results", "discussion", "conclusion", "references"]
+
+SECTION_RETRIES = 2
+SECTION_RETRY_BACKOFF = 2.0  # seconds, doubled per attempt
+
 
 @dataclass
 class LabReportSection:
@@ -40,6 +65,7 @@ class LabReportState:
     conclusion: Optional[str] = None
     references: Optional[List[Dict[str, str]]] = None
     
+    failed_sections: List[str] = field(default_factory=list)
     error: Optional[str] = None
     status: str = "initialized"
 
@@ -59,6 +85,29 @@ class LabReportService:
         system_prompt: str, 
         user_prompt: str,
         json_mode: bool = False
+    ) -> str:
+        """Call the LLM via MultiProviderService, falling back to Mistral directly."""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        try:
+            return await get_multi_provider().generate(
+                messages=messages,
+                mode="detailed",
+                max_tokens=8000,
+                temperature=0.7,
+                json_mode=json_mode
+            )
+        except Exception as e:
+            logger.warning(f"MultiProvider call failed, using direct Mistral: {e}")
+        return await self._call_mistral(system_prompt, user_prompt, json_mode)
+
+    async def _call_mistral(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        json_mode: bool = False
     ) -> str:
         """Call Mistral LLM."""
         try:
@@ -115,31 +164,97 @@ class LabReportService:
         Returns:
             Dict containing all report sections and metadata
         """
+        report: Dict[str, Any] = {}
+        async for event in self.generate_report_stream(
+            experiment_type, data_context, methodology, user_instructions
+        ):
+            if event["type"] == "complete":
+                report = event["report"]
+        return report
+
+    async def generate_report_stream(
+        self,
+        experiment_type: str,
+        data_context: str,
+        methodology: str,
+        user_instructions: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Generate a lab report, yielding progress as sections finish.
+
+        Yields:
+            {"type": "section", "name", "ok"} as each section lands (completion order)
+            {"type": "markdown", "text"} whenever the next sections in document order are ready
+            {"type": "complete", "report"} once, with the formatted report
+        """
         state = LabReportState(
             experiment_type=experiment_type,
             data_context=data_context,
             methodology=methodology,
             user_instructions=user_instructions
         )
-        
+        state.status = "generating"
+
+        ready = {name: asyncio.Event() for name in SECTION_DEPENDENCIES}
+        landed: asyncio.Queue = asyncio.Queue()
+
+        async def run(name: str):
+            ok = False
+            try:
+                for dep in SECTION_DEPENDENCIES[name]:
+                    await ready[dep].wait()
+                ok = await self._run_section(name, state)
+            finally:
+                # Dependents proceed (with their own fallbacks) even if this section failed
+                ready[name].set()
+                landed.put_nowait((name, ok))
+
+        tasks = [asyncio.create_task(run(name)) for name in SECTION_DEPENDENCIES]
+        finished = set()
+        next_index = 0
         try:
-            # Generate all sections
-            state = await self._generate_title(state)
-            state = await self._generate_introduction(state)
-            state = await self._generate_materials_methods(state)
-            state = await self._generate_results(state)
-            state = await self._generate_discussion(state)
-            state = await self._generate_conclusion(state)
-            state = await self._generate_references(state)
-            
-            state.status = "complete"
-            
-        except Exception as e:
-            state.error = str(e)
+            for _ in tasks:
+                name, ok = await landed.get()
+                finished.add(name)
+                yield {"type": "section", "name": name, "ok": ok}
+
+                # Flush the longest in-order prefix so clients can render progressively
+                chunk = []
+                while next_index < len(SECTION_ORDER) and SECTION_ORDER[next_index] in finished:
+                    chunk.append(self._section_markdown(SECTION_ORDER[next_index], state))
+                    next_index += 1
+                if chunk:
+                    text = "\n".join(chunk)
+                    if next_index < len(SECTION_ORDER):
+                        text += "\n"
+                    yield {"type": "markdown", "text": text}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        state.status = "complete"
+        if len(state.failed_sections) == len(SECTION_DEPENDENCIES):
             state.status = "error"
-            logger.error(f"Report generation failed: {e}")
-        
-        return self._format_report(state)
+            state.error = "All report sections failed to generate"
+        logger.info(f"Lab report finished ({len(state.failed_sections)} failed sections)")
+        yield {"type": "complete", "report": self._format_report(state)}
+
+    async def _run_section(self, name: str, state: LabReportState) -> bool:
+        """Run one section generator with retries; returns False if it never produced output."""
+        generator = getattr(self, f"_generate_{name}")
+        for attempt in range(SECTION_RETRIES + 1):
+            try:
+                await generator(state)
+                if getattr(state, name):
+                    return True
+                logger.warning(f"Lab report section '{name}' came back empty (attempt {attempt + 1})")
+            except Exception as e:
+                logger.warning(f"Lab report section '{name}' failed (attempt {attempt + 1}): {e}")
+            if attempt < SECTION_RETRIES:
+                await asyncio.sleep(SECTION_RETRY_BACKOFF * 2 ** attempt)
+
+        state.failed_sections.append(name)
+        return False
     
     async def _generate_title(self, state: LabReportState) -> LabReportState:
         """Generate the report title."""
@@ -298,14 +413,14 @@ The conclusion should:
         """Generate references list using Serper API for real academic sources."""
         state.status = "generating_references"
 
-        # Lazy load Serper service - avoid direct instantiation
-        from app.core.container import container
-        serper = container.get('serper_service')
-
         # Build search query from experiment type and key terms
         search_query = f"{state.experiment_type} pharmacology methodology"
 
         try:
+            # Lazy load Serper service - avoid direct instantiation
+            from app.core.container import container
+            serper = container.get('serper_service')
+
             # Fetch real academic references from Google Scholar
             references_data = await serper.get_references_for_topic(
                 topic=search_query,
@@ -377,30 +492,30 @@ Format each reference on a new line. Include 5-8 references total."""
                 "conclusion": state.conclusion
             },
             "references": state.references or [],
+            "failed_sections": state.failed_sections,
             "error": state.error,
             # Full markdown report
             "full_report": self._compile_markdown(state)
         }
     
+    def _section_markdown(self, name: str, state: LabReportState) -> str:
+        """Markdown block for one section (blocks joined by newlines form the report)."""
+        headings = {
+            "introduction": "## 1. Introduction\n",
+            "materials_methods": "\n## 2. Materials and Methods\n",
+            "results": "\n## 3. Results\n",
+            "discussion": "\n## 4. Discussion\n",
+            "conclusion": "\n## 5. Conclusion\n",
+        }
+        if name == "title":
+            return f"# {state.title or 'Lab Report'}\n"
+        if name == "references":
+            parts = ["\n## 6. References\n"]
+            for i, ref in enumerate(state.references or [], 1):
+                parts.append(f"{i}. {ref.get('text', '')}\n")
+            return "\n".join(parts)
+        return "\n".join([headings[name], getattr(state, name) or ""])
+    
     def _compile_markdown(self, state: LabReportState) -> str:
         """Compile all sections into a complete markdown document."""
-        sections = [
-            f"# {state.title or 'Lab Report'}\n",
-            "## 1. Introduction\n",
-            state.introduction or "",
-            "\n## 2. Materials and Methods\n",
-            state.materials_methods or "",
-            "\n## 3. Results\n",
-            state.results or "",
-            "\n## 4. Discussion\n",
-            state.discussion or "",
-            "\n## 5. Conclusion\n",
-            state.conclusion or "",
-            "\n## 6. References\n"
-        ]
-        
-        if state.references:
-            for i, ref in enumerate(state.references, 1):
-                sections.append(f"{i}. {ref.get('text', '')}\n")
-        
-        return "\n".join(sections)
+        return "\n".join(self._section_markdown(name, state) for name in SECTION_ORDER)
@@ -5,89 +5,327 @@ Serializes requests to local BitNet model.
 Prevents VPS overload from concurrent local inference.
 
 Features:
-- Semaphore-based concurrency control
-- Queue size limits with 503 rejection
+- One request generating at a time, the rest wait in the queue
+- Priority classes by mode (fast before default before detailed), with
+  aging so long-waiting requests are not starved
+- Per-user fair queuing: users in a class take turns, each with a cap
+- Wait-time estimate from observed generation throughput (tokens/s),
+  measured on the tokens each request actually generated
+- Queue size limits and deadline-aware admission with 503 rejection
 - Queue position tracking
 """
 
 import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
 from fastapi import HTTPException
 
+from app.services.context_packer import count_tokens
+
+# Priority class per mode; lower is served first
+MODE_PRIORITY = {"fast": 0, "default": 1, "detailed": 2}
+
+# Output tokens assumed for a request when the caller doesn't give max_tokens
+MODE_EXPECTED_TOKENS = {"fast": 128, "default": 256, "detailed": 1024}
+
+# Longest estimated wait a mode accepts before the request is better sent remote
+MODE_MAX_WAIT_SECONDS = {
+    "fast": float(os.environ.get("LOCAL_QUEUE_FAST_MAX_WAIT", "10")),
+    "default": float(os.environ.get("LOCAL_QUEUE_DEFAULT_MAX_WAIT", "30")),
+    "detailed": float(os.environ.get("LOCAL_QUEUE_DETAILED_MAX_WAIT", "120")),
+}
+
+# Running + waiting requests one user may hold
+LOCAL_QUEUE_MAX_PER_USER = int(os.environ.get("LOCAL_QUEUE_MAX_PER_USER", "2"))
+
+# A waiting request moves up one priority class per this many seconds
+LOCAL_QUEUE_AGING_SECONDS = float(os.environ.get("LOCAL_QUEUE_AGING_SECONDS", "30"))
+
+# Throughput assumed until the first request completes
+LOCAL_QUEUE_INITIAL_TOKENS_PER_SEC = float(os.environ.get("LOCAL_QUEUE_INITIAL_TOKENS_PER_SEC", "20"))
+
+_THROUGHPUT_SMOOTHING = 0.2
+
+
+@dataclass
+class _Ticket:
+    """One admitted request."""
+    mode: str
+    user_id: Optional[str]
+    tokens: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    granted: Optional[asyncio.Future] = None
+
 
 class LocalInferenceQueue:
     """
     Queue for local BitNet inference requests.
-    
+
     Features:
-    - 1 concurrent request (semaphore)
-    - Max 5 queued requests
-    - 503 error when queue full
+    - 1 concurrent request
+    - Max 5 admitted requests, max LOCAL_QUEUE_MAX_PER_USER per user
+    - Next request: best priority class (after aging), then the user whose
+      turn it is in that class
+    - 503 error when full or when the estimated wait exceeds the deadline
     """
-    
+
     def __init__(self, max_queue_size: int = 5):
         """
         Initialize queue.
-        
+
         Args:
             max_queue_size: Maximum concurrent queued requests
         """
-        self._semaphore = asyncio.Semaphore(1)  # 1 concurrent request
         self._queue_size = 0
         self._max_queue = max_queue_size
-    
-    async def submit(self, request_fn):
+        self._running: Optional[_Ticket] = None
+        # priority -> user -> that user's waiting tickets; dict order is the turn order
+        self._waiting: Dict[int, "OrderedDict[Optional[str], Deque[_Ticket]]"] = {
+            priority: OrderedDict() for priority in sorted(set(MODE_PRIORITY.values()))
+        }
+        self._per_user: Dict[str, int] = {}
+        self._tokens_per_sec = LOCAL_QUEUE_INITIAL_TOKENS_PER_SEC
+        self.stats = {"completed": 0, "rejected_full": 0, "rejected_user": 0, "rejected_deadline": 0}
+
+    @staticmethod
+    def _mode(mode: Optional[str]) -> str:
+        return mode if mode in MODE_PRIORITY else "default"
+
+    def max_wait_for(self, mode: Optional[str]) -> float:
+        """Longest acceptable wait (seconds) for a mode."""
+        return MODE_MAX_WAIT_SECONDS[self._mode(mode)]
+
+    async def submit(
+        self,
+        request_fn: Callable[[], Awaitable[Any]],
+        mode: str = "default",
+        user_id: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        max_wait: Optional[float] = None
+    ):
         """
         Submit request to queue.
-        
+
         Args:
             request_fn: Async function to execute
-            
+            mode: Request mode; picks the priority class
+            user_id: Requesting user, for fair queuing and the per-user cap
+            max_tokens: Expected output tokens (defaults per mode)
+            max_wait: Reject if the estimated wait is longer (defaults per mode)
+
         Returns:
             Result from request_fn
-            
+
         Raises:
-            HTTPException: 503 if queue is full
+            HTTPException: 503 if queue is full, the user has too many
+                requests queued, or the wait would exceed max_wait
         """
+        mode = self._mode(mode)
+
         if self._queue_size >= self._max_queue:
+            self.stats["rejected_full"] += 1
             raise HTTPException(
                 status_code=503,
                 detail="Local model queue full, try remote mode"
             )
-        
+
+        if user_id is not None and self._per_user.get(user_id, 0) >= LOCAL_QUEUE_MAX_PER_USER:
+            self.stats["rejected_user"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many local requests in progress for this user, try remote mode"
+            )
+
+        deadline = self.max_wait_for(mode) if max_wait is None else max_wait
+        wait = self.estimate_wait(mode)
+        if self._queue_size > 0 and wait > deadline:
+            self.stats["rejected_deadline"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Local model busy (~{wait:.0f}s wait), try remote mode"
+            )
+
+        ticket = _Ticket(mode=mode, user_id=user_id, tokens=max_tokens or MODE_EXPECTED_TOKENS[mode])
         self._queue_size += 1
+        if user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+
         try:
-            async with self._semaphore:
-                return await request_fn()
+            await self._acquire(ticket)
+            ticket.started_at = time.monotonic()
+            result = await request_fn()
+            self._record_throughput(ticket, self._completion_tokens(result))
+            return result
         finally:
             self._queue_size -= 1
-    
+            if user_id is not None:
+                self._per_user[user_id] -= 1
+                if not self._per_user[user_id]:
+                    del self._per_user[user_id]
+            if self._running is ticket:
+                self._running = None
+                self._dispatch()
+
+    async def _acquire(self, ticket: _Ticket):
+        """Wait until the ticket is the running request."""
+        if self._running is None and not self._has_waiting():
+            self._running = ticket
+            return
+
+        ticket.granted = asyncio.get_running_loop().create_future()
+        queue = self._waiting[MODE_PRIORITY[ticket.mode]].setdefault(ticket.user_id, deque())
+        queue.append(ticket)
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            # If the slot was handed over just before cancellation, submit()
+            # releases it; otherwise leave the queue
+            if self._running is not ticket:
+                self._remove(ticket)
+            raise
+
+    def _remove(self, ticket: _Ticket):
+        users = self._waiting[MODE_PRIORITY[ticket.mode]]
+        queue = users.get(ticket.user_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del users[ticket.user_id]
+
+    def _has_waiting(self) -> bool:
+        return any(self._waiting.values())
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Pop the next request: best aged priority class, then round robin over its users."""
+        now = time.monotonic()
+        best = None
+        for priority, users in self._waiting.items():
+            if not users:
+                continue
+            oldest = min(queue[0].enqueued_at for queue in users.values())
+            effective = priority - int((now - oldest) / LOCAL_QUEUE_AGING_SECONDS)
+            if best is None or effective < best[0]:
+                best = (effective, priority)
+        if best is None:
+            return None
+
+        users = self._waiting[best[1]]
+        user_id, queue = next(iter(users.items()))
+        ticket = queue.popleft()
+        if queue:
+            users.move_to_end(user_id)  # the user waits for its next turn
+        else:
+            del users[user_id]
+        return ticket
+
+    def _dispatch(self):
+        """Hand the free slot to the next waiting request."""
+        while self._running is None:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            if ticket.granted.done():  # cancelled while waiting
+                continue
+            self._running = ticket
+            ticket.granted.set_result(None)
+
+    @staticmethod
+    def _completion_tokens(result: Any) -> Optional[int]:
+        """
+        Tokens a request generated: the OpenAI-style usage.completion_tokens
+        of its result, else the token count of a text result. None if unknown.
+        """
+        usage = result.get("usage") if isinstance(result, dict) else getattr(result, "usage", None)
+        tokens = usage.get("completion_tokens") if isinstance(usage, dict) else getattr(usage, "completion_tokens", None)
+        if isinstance(tokens, int) and tokens > 0:
+            return tokens
+        if isinstance(result, str) and result:
+            return count_tokens(result)
+        return None
+
+    def _record_throughput(self, ticket: _Ticket, tokens: Optional[int]):
+        """Fold a finished request into the tokens/s estimate (max_tokens is only an upper bound, so skip unknowns)."""
+        elapsed = time.monotonic() - ticket.started_at
+        self.stats["completed"] += 1
+        if elapsed <= 0 or not tokens:
+            return
+        observed = tokens / elapsed
+        self._tokens_per_sec += _THROUGHPUT_SMOOTHING * (observed - self._tokens_per_sec)
+
+    def estimate_wait(self, mode: str = "default") -> float:
+        """
+        Estimate how long a new request would wait before it starts.
+
+        Counts the rest of the running request plus every waiting request
+        in the same or a higher priority class, at observed throughput.
+
+        Args:
+            mode: Mode of the new request
+
+        Returns:
+            Estimated wait in seconds
+        """
+        priority = MODE_PRIORITY[self._mode(mode)]
+        tokens = 0.0
+        if self._running is not None and self._running.started_at is not None:
+            generated = (time.monotonic() - self._running.started_at) * self._tokens_per_sec
+            tokens += max(0.0, self._running.tokens - generated)
+        elif self._running is not None:
+            tokens += self._running.tokens
+        for class_priority, users in self._waiting.items():
+            if class_priority <= priority:
+                tokens += sum(ticket.tokens for queue in users.values() for ticket in queue)
+        return tokens / self._tokens_per_sec
+
     def is_busy(self) -> bool:
         """
         Check if queue has pending requests.
-        
+
         Returns:
             True if queue is processing or has queued requests
         """
         return self._queue_size > 0
-    
+
     def queue_position(self) -> int:
         """
         Return current queue position.
-        
+
         Returns:
             Number of requests in queue
         """
         return self._queue_size
-    
+
     def available_slots(self) -> int:
         """
         Return available queue slots.
-        
+
         Returns:
             Number of available slots
         """
         return self._max_queue - self._queue_size
 
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Return queue statistics.
+
+        Returns:
+            Counters, queue depth per mode and current throughput estimate
+        """
+        return {
+            **self.stats,
+            "queued": self._queue_size,
+            "waiting_by_mode": {
+                mode: sum(len(queue) for queue in self._waiting[priority].values())
+                for mode, priority in MODE_PRIORITY.items()
+            },
+            "tokens_per_sec": round(self._tokens_per_sec, 2),
+        }
+
 
 # Singleton instance
 local_queue = LocalInferenceQueue(max_queue_size=5)
@@ -181,7 +181,19 @@ Rules:
             ]
         }
     
-    def build_docx(self, structured: Dict[str, Any], style: str = "report") -> bytes:
+    def diagram_sources(self, structured: Dict[str, Any]) -> List[str]:
+        """Mermaid sources found in section and subsection content, for pre-rendering."""
+        from app.services.diagram_renderer import MERMAID_BLOCK
+
+        sources = []
+        for section in structured.get("sections", []):
+            blocks = [section.get("content", "")] + [s.get("content", "") for s in section.get("subsections", [])]
+            for block in blocks:
+                sources.extend(m.group(1).strip() for m in MERMAID_BLOCK.finditer(block or ""))
+        return sources
+
+    def _build_document(self, structured: Dict[str, Any], style: str = "report",
+                        diagrams: Optional[Dict[str, bytes]] = None):
         """
         Build DOCX document from structured content.
         
@@ -195,9 +207,11 @@ Rules:
         Args:
             structured: Dict from structure_content()
             style: Manuscript style
+            diagrams: Optional Mermaid source -> PNG map (see diagram_sources());
+                rendered blocks are embedded as pictures, others stay as text
             
         Returns:
-            DOCX file as bytes
+            python-docx Document
         """
         if not DOCX_AVAILABLE:
             raise ImportError("python-docx is not installed")
@@ -222,17 +236,29 @@ Rules:
         
         # Main content
         for section in structured.get("sections", []):
-            self._add_section(doc, section)
+            self._add_section(doc, section, diagrams or {})
         
         # Footer with watermark
         self._add_footer(doc)
         
+        return doc
+
+    def build_docx(self, structured: Dict[str, Any], style: str = "report",
+                   diagrams: Optional[Dict[str, bytes]] = None) -> bytes:
+        """Build the manuscript DOCX and return it as bytes (see _build_document)."""
+        doc = self._build_document(structured, style, diagrams)
+        
         # Save to bytes
         output = io.BytesIO()
         doc.save(output)
         output.seek(0)
         
         return output.getvalue()
+
+    def write_docx(self, structured: Dict[str, Any], path: str, style: str = "report",
+                   diagrams: Optional[Dict[str, bytes]] = None) -> None:
+        """Build the manuscript DOCX straight to a file, without an in-memory copy."""
+        self._build_document(structured, style, diagrams).save(path)
     
     def _set_document_styles(self, doc):
         """Set professional document styles."""
@@ -315,7 +341,7 @@ Rules:
         toc_run.font.color.rgb = RGBColor(0x7F, 0x8C, 0x8D)
         toc_run.font.italic = True
 
-    def _add_section(self, doc, section: Dict[str, Any]):
+    def _add_section(self, doc, section: Dict[str, Any], diagrams: Optional[Dict[str, bytes]] = None):
         """Add a section with content and subsections."""
         heading = section.get("heading", "Section")
         content = section.get("content", "")
@@ -325,12 +351,7 @@ Rules:
         doc.add_heading(heading, level=1)
         
         # Add content as paragraphs
-        # Split by double newlines for paragraph breaks
-        paragraphs = content.split('\n\n')
-        for para in paragraphs:
-            if para.strip():
-                p = doc.add_paragraph(para.strip())
-                p.paragraph_format.space_after = Pt(12)
+        self._add_content(doc, content, diagrams or {})
         
         # Add subsections
         for subsection in subsections:
@@ -341,11 +362,32 @@ Rules:
                 doc.add_heading(sub_heading, level=2)
             
             if sub_content:
-                sub_paragraphs = sub_content.split('\n\n')
-                for para in sub_paragraphs:
-                    if para.strip():
-                        p = doc.add_paragraph(para.strip())
-                        p.paragraph_format.space_after = Pt(12)
+                self._add_content(doc, sub_content, diagrams or {})
+
+    def _add_content(self, doc, content: str, diagrams: Dict[str, bytes]):
+        """Add paragraphs, embedding pre-rendered Mermaid diagrams as pictures."""
+        from app.services.diagram_renderer import MERMAID_BLOCK
+
+        last_end = 0
+        pieces = []
+        for match in MERMAID_BLOCK.finditer(content):
+            pieces.append(("text", content[last_end:match.start()]))
+            pieces.append(("diagram", match))
+            last_end = match.end()
+        pieces.append(("text", content[last_end:]))
+
+        for kind, piece in pieces:
+            if kind == "diagram":
+                png = diagrams.get(piece.group(1).strip())
+                if png:
+                    doc.add_picture(io.BytesIO(png), width=Inches(6.0))
+                    continue
+                piece = piece.group(0)
+            # Split by double newlines for paragraph breaks
+            for para in piece.split('\n\n'):
+                if para.strip():
+                    p = doc.add_paragraph(para.strip())
+                    p.paragraph_format.space_after = Pt(12)
     
     def _add_footer(self, doc):
         """Add footer with page numbers and watermark."""
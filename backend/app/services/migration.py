@@ -1,20 +1,83 @@
 """
 Embedding Migration Service
 Handles gradual migration from hash-based to Mistral embeddings
+
+run_migration is a three-stage pipeline:
+1. a reader pages through document_chunks with a keyset cursor (by id),
+2. embedders send each page to the provider as one batch call, with
+   concurrency that backs off on rate limits and grows while calls succeed,
+3. a writer stores each page with one bulk statement and persists the cursor
+   (embedding_migration_runs), so an interrupted run resumes where it stopped.
+
+With dual_write the new vectors are staged next to the old ones and swapped
+in by cutover(), so search keeps working throughout the backfill.
 """
 
 import asyncio
 import logging
+import os
 import time
+from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from uuid import UUID
 from supabase import Client
 
 from app.core.config import settings
+from app.core.database import async_db_execute
 from app.services.embeddings import embeddings_service
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on concurrent provider calls; the adaptive limit starts at
+# MIGRATION_PARALLEL_WORKERS and moves between 1 and this value
+MIGRATION_MAX_CONCURRENCY = int(os.environ.get("MIGRATION_MAX_CONCURRENCY", "8"))
+
+LEGACY_EMBEDDING_VERSIONS = ["hash-v1", "pending-migration", "hash-fallback"]
+DEFAULT_TARGET_VERSION = "mistral-v1"
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight provider calls.
+
+    Every rate-limited call halves the limit; a full window of successful
+    calls raises it by one.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = min(max(initial, minimum), self.maximum)
+        self.in_flight = 0
+        self.peak = self.limit
+        self._successes = 0
+        self._changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    async def record(self, throttled: bool):
+        """Feed back the outcome of one provider call"""
+        async with self._changed:
+            if throttled:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.peak = max(self.peak, self.limit)
+                    self._successes = 0
+            self._changed.notify_all()
+
 
 class EmbeddingMigrationService:
     """Service for managing gradual migration to Mistral embeddings"""
@@ -51,9 +114,11 @@ class EmbeddingMigrationService:
                     "migration_percentage": progress.get("migration_percentage", 0),
                     "embedding_versions": progress.get("embedding_versions", []),
                     "runtime_stats": self.migration_stats,
+                    "runs": self._get_runs(),
                     "configuration": {
                         "batch_size": settings.EMBEDDING_BATCH_SIZE,
                         "parallel_workers": settings.MIGRATION_PARALLEL_WORKERS,
+                        "max_concurrency": MIGRATION_MAX_CONCURRENCY,
                         "use_mistral_embeddings": settings.USE_MISTRAL_EMBEDDINGS
                     }
                 }
@@ -72,6 +137,14 @@ class EmbeddingMigrationService:
                 "runtime_stats": self.migration_stats
             }
     
+    def _get_runs(self) -> List[Dict[str, Any]]:
+        """Persisted migration runs (empty before migration 021)"""
+        try:
+            result = self.db.table("embedding_migration_runs").select("*").order("updated_at", desc=True).execute()
+            return result.data or []
+        except Exception:
+            return []
+    
     async def get_pending_chunks(self, limit: int = None) -> List[Dict[str, Any]]:
         """Get chunks that need embedding migration"""
         try:
@@ -79,7 +152,7 @@ class EmbeddingMigrationService:
                 "id, content, metadata, embedding_version, created_at"
             ).in_(
                 "embedding_version", 
-                ["hash-v1", "pending-migration", "hash-fallback"]
+                LEGACY_EMBEDDING_VERSIONS
             ).order("created_at")
             
             if limit:
@@ -139,12 +212,19 @@ class EmbeddingMigrationService:
             logger.error(f"❌ {error_msg} for chunk {chunk_id}")
             return False, error_msg
     
-    async def migrate_batch(self, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def migrate_batch(
+        self,
+        chunks: List[Dict[str, Any]],
+        target_version: str = DEFAULT_TARGET_VERSION,
+        dual_write: bool = False
+    ) -> Dict[str, Any]:
         """
-        Migrate a batch of chunks
+        Migrate a batch of chunks with one embedding call and one bulk write
         
         Args:
             chunks: List of chunk data dictionaries
+            target_version: embedding_version to record for the new vectors
+            dual_write: Stage vectors in embedding_next instead of replacing
             
         Returns:
             Batch migration results
@@ -154,44 +234,18 @@ class EmbeddingMigrationService:
         
         logger.info(f"Migrating batch of {len(chunks)} chunks")
         
-        # Use semaphore to limit concurrent migrations
-        semaphore = asyncio.Semaphore(settings.MIGRATION_PARALLEL_WORKERS)
-        
-        async def migrate_single_chunk(chunk: Dict[str, Any]) -> Tuple[bool, str, str]:
-            async with semaphore:
-                chunk_id = chunk["id"]
-                content = chunk["content"]
-                
-                success, message = await self.migrate_chunk_embedding(chunk_id, content)
-                return success, message, chunk_id
-        
-        # Process chunks concurrently
-        tasks = [migrate_single_chunk(chunk) for chunk in chunks]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Analyze results
-        batch_results = {
-            "success": 0,
-            "failed": 0,
-            "errors": [],
-            "successful_ids": [],
-            "failed_ids": []
-        }
-        
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                batch_results["failed"] += 1
-                batch_results["errors"].append(f"Chunk {i}: {str(result)}")
-                batch_results["failed_ids"].append(chunks[i]["id"])
-            else:
-                success, message, chunk_id = result
-                if success:
-                    batch_results["success"] += 1
-                    batch_results["successful_ids"].append(chunk_id)
-                else:
-                    batch_results["failed"] += 1
-                    batch_results["errors"].append(f"Chunk {chunk_id}: {message}")
-                    batch_results["failed_ids"].append(chunk_id)
+        vectors, _ = await self._embed_page(chunks)
+        try:
+            batch_results = await self._write_page(chunks, vectors, target_version, dual_write)
+        except Exception as e:
+            logger.error(f"❌ Bulk embedding write failed: {e}")
+            batch_results = {
+                "success": 0,
+                "failed": len(chunks),
+                "errors": [f"{len(chunks)} chunks: database write failed: {e}"],
+                "successful_ids": [],
+                "failed_ids": [chunk["id"] for chunk in chunks]
+            }
         
         # Update migration stats
         self.migration_stats["total_processed"] += len(chunks)
@@ -205,17 +259,126 @@ class EmbeddingMigrationService:
         
         return batch_results
     
+    async def _fetch_page(
+        self,
+        after_id: Optional[str],
+        limit: int,
+        target_version: str,
+        dual_write: bool
+    ) -> List[Dict[str, Any]]:
+        """Next page of chunks to migrate, by id after the keyset cursor"""
+        def run():
+            query = self.db.table("document_chunks").select("id, content")
+            if dual_write:
+                query = query.or_(
+                    f"embedding_next_version.is.null,embedding_next_version.neq.{target_version}"
+                )
+            else:
+                query = query.in_("embedding_version", LEGACY_EMBEDDING_VERSIONS)
+            if after_id:
+                query = query.gt("id", after_id)
+            return query.order("id").limit(limit).execute()
+        
+        result = await async_db_execute(run)
+        return result.data or []
+    
+    async def _embed_page(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Optional[List[float]]], bool]:
+        """
+        Embed a page in one batch call
+        
+        Returns:
+            Tuple of (vectors with None for failures, whether the provider rate-limited us)
+        """
+        stats = getattr(self.embeddings_service, "cache_stats", {})
+        limited_before = stats.get("rate_limited", 0)
+        dimensions = getattr(self.embeddings_service, "embedding_dimensions", settings.MISTRAL_EMBED_DIMENSIONS)
+        
+        try:
+            vectors = await self.embeddings_service.generate_embeddings_batch(
+                [chunk["content"] for chunk in chunks]
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Batch embedding failed: {e}")
+            vectors = [None] * len(chunks)
+        
+        throttled = stats.get("rate_limited", 0) > limited_before
+        return [v if v and len(v) == dimensions else None for v in vectors], throttled
+    
+    async def _write_page(
+        self,
+        chunks: List[Dict[str, Any]],
+        vectors: List[Optional[List[float]]],
+        target_version: str,
+        dual_write: bool
+    ) -> Dict[str, Any]:
+        """
+        Store one page of vectors with a single bulk update
+        
+        Chunks without a vector are reported as failed; a database error is
+        raised so a run stops before moving its cursor past the page.
+        """
+        rows = [
+            {"id": chunk["id"], "embedding": vector}
+            for chunk, vector in zip(chunks, vectors)
+            if vector
+        ]
+        results = {
+            "success": 0,
+            "failed": 0,
+            "errors": [],
+            "successful_ids": [],
+            "failed_ids": [chunk["id"] for chunk, vector in zip(chunks, vectors) if not vector]
+        }
+        if results["failed_ids"]:
+            results["errors"].append(f"{len(results['failed_ids'])} chunks: embedding generation failed")
+        
+        if rows:
+            await async_db_execute(
+                lambda: self.db.rpc("write_chunk_embeddings", {
+                    "p_rows": rows,
+                    "p_version": target_version,
+                    "p_dual_write": dual_write
+                }).execute()
+            )
+            results["successful_ids"] = [row["id"] for row in rows]
+        
+        results["success"] = len(results["successful_ids"])
+        results["failed"] = len(results["failed_ids"])
+        return results
+    
+    async def _load_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Persisted progress of a migration run"""
+        result = await async_db_execute(
+            lambda: self.db.table("embedding_migration_runs").select("*").eq("run_id", run_id).execute()
+        )
+        return result.data[0] if result.data else None
+    
+    async def _save_run(self, run: Dict[str, Any]) -> None:
+        """Persist cursor and counters after each written page"""
+        run["updated_at"] = datetime.utcnow().isoformat()
+        await async_db_execute(
+            lambda: self.db.table("embedding_migration_runs").upsert(dict(run), on_conflict="run_id").execute()
+        )
+    
     async def run_migration(
         self, 
         max_chunks: Optional[int] = None,
-        batch_size: Optional[int] = None
+        batch_size: Optional[int] = None,
+        run_id: str = "default",
+        target_version: str = DEFAULT_TARGET_VERSION,
+        dual_write: bool = False,
+        reset: bool = False
     ) -> Dict[str, Any]:
         """
         Run the embedding migration process
         
         Args:
-            max_chunks: Maximum number of chunks to migrate (None for all)
-            batch_size: Size of each batch (None for default)
+            max_chunks: Maximum number of chunks to migrate in this call (None for all)
+            batch_size: Chunks per page / provider call (None for default)
+            run_id: Name of the persisted run to start or resume
+            target_version: embedding_version recorded for the new vectors
+            dual_write: Stage new vectors in embedding_next (see cutover)
+            reset: Ignore the saved cursor and start from the first chunk
             
         Returns:
             Migration results
@@ -237,58 +400,98 @@ class EmbeddingMigrationService:
         batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
         self.migration_stats["start_time"] = time.time()
         
-        logger.info(f"🚀 Starting embedding migration (batch_size={batch_size})")
-        
+        run = None
         try:
-            # Get initial status
             initial_status = await self.get_migration_status()
-            total_pending = initial_status.get("pending_migration", 0) + initial_status.get("old_embeddings", 0)
             
-            if total_pending == 0:
-                return {
-                    "success": True,
-                    "message": "No chunks need migration",
-                    "stats": self.migration_stats
+            run = None if reset else await self._load_run(run_id)
+            if run and run["status"] != "done" and run["target_version"] == target_version:
+                logger.info(f"🔁 Resuming migration run '{run_id}' after chunk {run['cursor_id']} ({run['processed']} processed)")
+            else:
+                run = {
+                    "run_id": run_id,
+                    "target_version": target_version,
+                    "dual_write": dual_write,
+                    "cursor_id": None,
+                    "processed": 0,
+                    "failed": 0,
+                    "started_at": datetime.utcnow().isoformat()
                 }
+            dual_write = run["dual_write"]
+            run.update(status="running", last_error=None)
+            await self._save_run(run)
+            
+            logger.info(f"🚀 Starting embedding migration (batch_size={batch_size}, dual_write={dual_write})")
+            
+            limiter = AdaptiveConcurrency(settings.MIGRATION_PARALLEL_WORKERS, MIGRATION_MAX_CONCURRENCY)
+            pages: asyncio.Queue = asyncio.Queue(maxsize=MIGRATION_MAX_CONCURRENCY)
+            embedded: asyncio.Queue = asyncio.Queue(maxsize=MIGRATION_MAX_CONCURRENCY)
+            all_errors: List[str] = []
+            reader_state = {"exhausted": False}
+            
+            async def read():
+                cursor, fetched, seq = run["cursor_id"], 0, 0
+                while max_chunks is None or fetched < max_chunks:
+                    limit = batch_size if max_chunks is None else min(batch_size, max_chunks - fetched)
+                    page = await self._fetch_page(cursor, limit, target_version, dual_write)
+                    if page:
+                        await pages.put((seq, page))
+                        seq, fetched, cursor = seq + 1, fetched + len(page), page[-1]["id"]
+                    if len(page) < limit:
+                        reader_state["exhausted"] = True
+                        break
+                for _ in range(MIGRATION_MAX_CONCURRENCY):
+                    await pages.put(None)
+            
+            async def embed():
+                while (item := await pages.get()) is not None:
+                    seq, page = item
+                    async with limiter:
+                        vectors, throttled = await self._embed_page(page)
+                    await limiter.record(throttled)
+                    await embedded.put((seq, page, vectors))
+            
+            async def write():
+                # Pages finish embedding out of order; the cursor only moves
+                # past a page once every page before it is written too
+                finished, next_seq = {}, 0
+                while (item := await embedded.get()) is not None:
+                    seq, page, vectors = item
+                    page_results = await self._write_page(page, vectors, target_version, dual_write)
+                    all_errors.extend(page_results["errors"])
+                    run["processed"] += len(page)
+                    run["failed"] += page_results["failed"]
+                    self.migration_stats["total_processed"] += len(page)
+                    self.migration_stats["successful_migrations"] += page_results["success"]
+                    self.migration_stats["failed_migrations"] += page_results["failed"]
+                    
+                    finished[seq] = page[-1]["id"]
+                    while next_seq in finished:
+                        run["cursor_id"] = finished.pop(next_seq)
+                        next_seq += 1
+                    await self._save_run(run)
+                    logger.info(
+                        f"Progress: {run['processed']} chunks processed, {run['failed']} failed "
+                        f"(concurrency {limiter.limit})"
+                    )
+            
+            reader = asyncio.create_task(read())
+            embedders = [asyncio.create_task(embed()) for _ in range(MIGRATION_MAX_CONCURRENCY)]
+            writer = asyncio.create_task(write())
+            
+            async def produce():
+                await asyncio.gather(reader, *embedders)
+                await embedded.put(None)
             
-            logger.info(f"Found {total_pending} chunks needing migration")
-            
-            # Process chunks in batches
-            processed_total = 0
-            all_errors = []
+            try:
+                # A failing stage cancels the others (no embedding past a dead writer)
+                await asyncio.gather(produce(), writer)
+            finally:
+                for task in (reader, *embedders, writer):
+                    task.cancel()
             
-            while True:
-                # Check if we've reached the limit
-                if max_chunks and processed_total >= max_chunks:
-                    logger.info(f"Reached maximum chunk limit: {max_chunks}")
-                    break
-                
-                # Get next batch
-                remaining_limit = None
-                if max_chunks:
-                    remaining_limit = min(batch_size, max_chunks - processed_total)
-                else:
-                    remaining_limit = batch_size
-                
-                pending_chunks = await self.get_pending_chunks(remaining_limit)
-                
-                if not pending_chunks:
-                    logger.info("No more chunks to migrate")
-                    break
-                
-                # Migrate batch
-                batch_results = await self.migrate_batch(pending_chunks)
-                processed_total += len(pending_chunks)
-                all_errors.extend(batch_results["errors"])
-                
-                # Log progress
-                logger.info(
-                    f"Progress: {processed_total}/{total_pending} chunks processed "
-                    f"({(processed_total/total_pending)*100:.1f}%)"
-                )
-                
-                # Small delay between batches to avoid overwhelming the API
-                await asyncio.sleep(0.5)
+            run["status"] = "done" if reader_state["exhausted"] else "running"
+            await self._save_run(run)
             
             self.migration_stats["end_time"] = time.time()
             migration_duration = self.migration_stats["end_time"] - self.migration_stats["start_time"]
@@ -298,8 +501,10 @@ class EmbeddingMigrationService:
             
             result = {
                 "success": True,
-                "message": f"Migration completed in {migration_duration:.2f} seconds",
+                "message": f"Migration {'completed' if run['status'] == 'done' else 'paused'} in {migration_duration:.2f} seconds",
                 "stats": self.migration_stats,
+                "run": run,
+                "concurrency": {"final": limiter.limit, "peak": limiter.peak},
                 "initial_status": initial_status,
                 "final_status": final_status,
                 "errors": all_errors[:10] if all_errors else []  # Limit error list
@@ -315,6 +520,12 @@ class EmbeddingMigrationService:
             self.migration_stats["end_time"] = time.time()
             error_msg = f"Migration failed: {str(e)}"
             logger.error(f"❌ {error_msg}")
+            if run is not None:
+                run.update(status="failed", last_error=str(e))
+                try:
+                    await self._save_run(run)
+                except Exception:
+                    pass
             
             return {
                 "success": False,
@@ -322,6 +533,27 @@ class EmbeddingMigrationService:
                 "stats": self.migration_stats
             }
     
+    async def cutover(self, target_version: str = DEFAULT_TARGET_VERSION) -> Dict[str, Any]:
+        """
+        Swap dual-written embeddings into place in one transaction
+        
+        Args:
+            target_version: Version staged by a dual_write run
+            
+        Returns:
+            Number of chunks switched to the new vectors
+        """
+        try:
+            result = await async_db_execute(
+                lambda: self.db.rpc("cutover_chunk_embeddings", {"p_version": target_version}).execute()
+            )
+            swapped = result.data or 0
+            logger.info(f"✅ Cut over {swapped} chunks to {target_version}")
+            return {"success": True, "swapped": swapped, "target_version": target_version}
+        except Exception as e:
+            logger.error(f"❌ Embedding cutover failed: {e}")
+            return {"success": False, "message": f"Cutover failed: {str(e)}"}
+    
     async def migrate_conversation_chunks(
         self, 
         conversation_id: UUID, 
@@ -1,6 +1,7 @@
 """
 Mistral Embeddings Service
 Handles embedding generation using Mistral API via direct HTTP calls with caching
+(persistent, shared across workers via the embedding store)
 """
 
 import asyncio
@@ -11,27 +12,19 @@ import logging
 import time
 import threading
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-from cachetools import TTLCache
 
 from app.core.config import settings
+from app.services.embedding_store import embedding_store
 from app.utils.rate_limiter import mistral_limiter
 
 logger = logging.getLogger(__name__)
 
 
-class EmbeddingCacheEntry:
-    """Cache entry for embeddings"""
-    def __init__(self, embedding: List[float], model_version: str):
-        self.embedding = embedding
-        self.model_version = model_version
-        self.created_at = datetime.utcnow()
-        self.expires_at = self.created_at + timedelta(seconds=settings.EMBEDDING_CACHE_TTL)
-
-
 class MistralEmbeddingsService:
     """Service for generating embeddings using Mistral API via direct HTTP calls"""
     
+    provider = "mistral"
+    
     def __init__(self):
         self.mistral_api_key = settings.MISTRAL_API_KEY
         self.mistral_base_url = "https://api.mistral.ai/v1"
@@ -43,7 +36,8 @@ class MistralEmbeddingsService:
             "misses": 0,
             "errors": 0,
             "api_calls": 0,
-            "total_requests": 0
+            "total_requests": 0,
+            "rate_limited": 0  # 429 responses; read by the migration engine to back off
         }
         # Rate limiting: Mistral free tier - conservative approach
         self.last_api_call_time = 0
@@ -57,48 +51,35 @@ class MistralEmbeddingsService:
         else:
             logger.warning("⚠️  Mistral API key not configured")
         
-        # Initialize cache if enabled
+        # Persistent embedding store (shared by all workers) if caching is enabled
         if settings.ENABLE_EMBEDDING_CACHE:
-            self.cache = TTLCache(
-                maxsize=settings.EMBEDDING_CACHE_MAX_SIZE,
-                ttl=settings.EMBEDDING_CACHE_TTL
-            )
-            logger.info(f"✅ Embedding cache initialized (max_size={settings.EMBEDDING_CACHE_MAX_SIZE}, ttl={settings.EMBEDDING_CACHE_TTL}s)")
-    
-    def _generate_cache_key(self, text: str) -> str:
-        """Generate cache key for text"""
-        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
-        return f"{self.model_name}:{text_hash}"
+            self.cache = embedding_store
+            logger.info(f"✅ Embedding cache initialized (persistent store: {embedding_store.path})")
     
-    def _get_from_cache(self, cache_key: str) -> Optional[List[float]]:
-        """Get embedding from cache"""
+    async def _get_many_from_cache(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Batch lookup in the embedding store"""
         if not self.cache:
-            return None
+            return [None] * len(texts)
         
         try:
-            entry = self.cache.get(cache_key)
-            if entry and isinstance(entry, EmbeddingCacheEntry):
-                if datetime.utcnow() < entry.expires_at:
-                    self.cache_stats["hits"] += 1
-                    return entry.embedding
-                else:
-                    del self.cache[cache_key]
-            
-            self.cache_stats["misses"] += 1
-            return None
+            found = await self.cache.aget_many(self.provider, self.model_name, self.embedding_dimensions, texts)
         except Exception as e:
             logger.error(f"❌ Cache retrieval error: {e}")
             self.cache_stats["errors"] += 1
-            return None
+            return [None] * len(texts)
+        
+        hits = sum(1 for embedding in found if embedding is not None)
+        self.cache_stats["hits"] += hits
+        self.cache_stats["misses"] += len(texts) - hits
+        return found
     
-    def _store_in_cache(self, cache_key: str, embedding: List[float]) -> None:
-        """Store embedding in cache"""
+    async def _store_many_in_cache(self, texts: List[str], embeddings: List[Optional[List[float]]]) -> None:
+        """Batch write to the embedding store"""
         if not self.cache:
             return
         
         try:
-            entry = EmbeddingCacheEntry(embedding, self.model_name)
-            self.cache[cache_key] = entry
+            await self.cache.aput_many(self.provider, self.model_name, self.embedding_dimensions, texts, embeddings)
         except Exception as e:
             logger.error(f"❌ Cache storage error: {e}")
             self.cache_stats["errors"] += 1
@@ -153,6 +134,7 @@ class MistralEmbeddingsService:
                     
                     elif response.status_code == 429:
                         # Rate limit exceeded - exponential backoff
+                        self.cache_stats["rate_limited"] += 1
                         if attempt < max_retries - 1:
                             retry_delay = base_delay * (2 ** attempt)
                             logger.warning(f"⚠️  Rate limit hit (429), retrying in {retry_delay:.1f}s (attempt {attempt + 1}/{max_retries})")
@@ -233,8 +215,7 @@ class MistralEmbeddingsService:
             logger.warning(f"⚠️  Text truncated to 8000 characters for embedding")
         
         # Check cache first
-        cache_key = self._generate_cache_key(clean_text)
-        cached_embedding = self._get_from_cache(cache_key)
+        [cached_embedding] = await self._get_many_from_cache([clean_text])
         if cached_embedding:
             logger.debug("✅ Embedding retrieved from cache")
             return cached_embedding
@@ -243,21 +224,13 @@ class MistralEmbeddingsService:
         if self.mistral_api_key:
             embedding = await self._generate_embedding_with_api(clean_text)
             if embedding:
-                self._store_in_cache(cache_key, embedding)
+                await self._store_many_in_cache([clean_text], [embedding])
                 logger.debug("✅ Embedding generated via Mistral API")
                 return embedding
         
-        # Fallback to hash-based embedding
+        # Fallback to hash-based embedding (never persisted: it is not a real vector)
         if settings.FALLBACK_TO_HASH_EMBEDDINGS:
             embedding = self._generate_fallback_embedding(clean_text)
-            if self.cache:
-                try:
-                    entry = EmbeddingCacheEntry(embedding, "hash-fallback")
-                    entry.expires_at = datetime.utcnow() + timedelta(seconds=300)
-                    self.cache[cache_key] = entry
-                except Exception as e:
-                    logger.error(f"❌ Error caching fallback embedding: {e}")
-            
             logger.warning("⚠️  Using fallback hash-based embedding")
             return embedding
         
@@ -312,6 +285,7 @@ class MistralEmbeddingsService:
                             return [None] * len(texts)
                     
                     elif response.status_code == 429:
+                        self.cache_stats["rate_limited"] += 1
                         if attempt < max_retries - 1:
                             retry_delay = base_delay * (2 ** attempt)
                             logger.warning(f"⚠️  Rate limit hit, retrying in {retry_delay:.1f}s")
@@ -340,20 +314,10 @@ class MistralEmbeddingsService:
         
         logger.info(f"Generating embeddings for {len(texts)} texts")
         
-        # Check cache first
-        embeddings = []
-        uncached_indices = []
-        uncached_texts = []
-        
-        for i, text in enumerate(texts):
-            cache_key = self._generate_cache_key(text)
-            cached_embedding = self._get_from_cache(cache_key)
-            if cached_embedding:
-                embeddings.append(cached_embedding)
-            else:
-                embeddings.append(None)
-                uncached_indices.append(i)
-                uncached_texts.append(text)
+        # Check cache first (one batch lookup)
+        embeddings = await self._get_many_from_cache(texts)
+        uncached_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        uncached_texts = [texts[i] for i in uncached_indices]
         
         if not uncached_texts:
             logger.info(f"✅ All {len(texts)} embeddings retrieved from cache")
@@ -371,12 +335,10 @@ class MistralEmbeddingsService:
             batch_embeddings = await self._generate_embeddings_batch_with_api(batch_texts)
             
             # Store in cache and results
+            await self._store_many_in_cache(batch_texts, batch_embeddings)
             for i, embedding in enumerate(batch_embeddings):
-                global_idx = batch_indices[i]
                 if embedding:
-                    cache_key = self._generate_cache_key(batch_texts[i])
-                    self._store_in_cache(cache_key, embedding)
-                    embeddings[global_idx] = embedding
+                    embeddings[batch_indices[i]] = embedding
         
         success_count = sum(1 for emb in embeddings if emb is not None)
         logger.info(f"✅ Generated {success_count}/{len(texts)} embeddings successfully")
@@ -393,8 +355,9 @@ class MistralEmbeddingsService:
             stats["cache_hit_rate"] = 0.0
         
         if self.cache:
-            stats["cache_size"] = len(self.cache)
-            stats["cache_max_size"] = self.cache.maxsize
+            stats["cache_size"] = self.cache.size()
+            stats["cache_max_size"] = self.cache.max_entries
+            stats["store"] = self.cache.get_stats()
         else:
             stats["cache_size"] = 0
             stats["cache_max_size"] = 0
@@ -406,9 +369,9 @@ class MistralEmbeddingsService:
         return stats
     
     def clear_cache(self) -> None:
-        """Clear the embedding cache"""
+        """Clear the in-process embedding cache (the persistent store is shared and kept)"""
         if self.cache:
-            self.cache.clear()
+            self.cache.clear_memory()
             logger.info("✅ Embedding cache cleared")
     
     async def health_check(self) -> Dict[str, Any]:
@@ -0,0 +1,236 @@
+"""
+Molecule Standardizer
+
+Local SMILES standardization ("washing") built on RDKit MolStandardize.
+Replaces the per-call ADMETlab wash API with an in-process pipeline:
+
+1. Cleanup (normalize functional groups, disconnect metals, reionize)
+2. Salt / solvent stripping via largest-fragment selection
+3. Charge neutralization
+4. Tautomer canonicalization
+
+Small requests run in a thread; large batches fan out across a process pool
+so wash throughput scales with cores. Results are memoized per SMILES.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from cachetools import LRUCache
+
+
+# Per-process RDKit standardizer objects (built lazily, reused across calls)
+_tools = None
+
+
+def _get_tools():
+    """Build the MolStandardize helpers once per process."""
+    global _tools
+    if _tools is None:
+        from rdkit.Chem.MolStandardize import rdMolStandardize
+
+        params = rdMolStandardize.CleanupParameters()
+        # Bound tautomer enumeration so large macrocycles can't stall a worker
+        params.maxTautomers = 200
+        # By default the enumerator strips stereo from every atom/bond a
+        # tautomer could touch, which turns L-alanine into racemic alanine
+        params.tautomerRemoveSp3Stereo = False
+        params.tautomerRemoveBondStereo = False
+        _tools = {
+            "params": params,
+            "fragment": rdMolStandardize.LargestFragmentChooser(preferOrganic=True),
+            "uncharger": rdMolStandardize.Uncharger(),
+            "tautomer": rdMolStandardize.TautomerEnumerator(params),
+        }
+    return _tools
+
+
+def standardize_smiles(smiles: str) -> Optional[str]:
+    """
+    Standardize a single SMILES string.
+
+    Module-level so it can be pickled into process-pool workers.
+
+    Args:
+        smiles: Input SMILES
+
+    Returns:
+        Canonical standardized SMILES, or None if the input can't be parsed
+    """
+    from rdkit import Chem
+    from rdkit.Chem.MolStandardize import rdMolStandardize
+
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        return None
+
+    tools = _get_tools()
+    mol = rdMolStandardize.Cleanup(mol, tools["params"])
+    mol = tools["fragment"].choose(mol)
+    mol = tools["uncharger"].uncharge(mol)
+    try:
+        mol = tools["tautomer"].Canonicalize(mol)
+    except Exception:
+        # Tautomer canonicalization is best-effort; keep the neutral parent
+        pass
+
+    return Chem.MolToSmiles(mol, canonical=True)
+
+
+def _standardize_chunk(smiles_list: List[str]) -> List[Optional[str]]:
+    """Standardize a chunk of SMILES inside a worker process."""
+    results = []
+    for smiles in smiles_list:
+        try:
+            results.append(standardize_smiles(smiles))
+        except Exception:
+            results.append(None)
+    return results
+
+
+class MoleculeStandardizer:
+    """
+    Batch SMILES standardizer with memoization and a process-pool path.
+
+    Features:
+    - RDKit MolStandardize pipeline (no network round trip)
+    - LRU memo cache keyed on the raw input SMILES
+    - Thread offload for small requests, process pool for large batches
+    - Unparseable SMILES are returned unchanged
+    """
+
+    CACHE_SIZE = int(os.environ.get("MOL_STANDARDIZE_CACHE_SIZE", "20000"))
+    PROCESS_THRESHOLD = int(os.environ.get("MOL_STANDARDIZE_PROCESS_THRESHOLD", "64"))
+    MAX_WORKERS = int(os.environ.get("MOL_STANDARDIZE_WORKERS", "0")) or (os.cpu_count() or 1)
+    CHUNK_SIZE = 32
+
+    def __init__(self):
+        self._cache: LRUCache = LRUCache(maxsize=self.CACHE_SIZE)
+        self._cache_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Lazily start the worker pool on first large batch."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.MAX_WORKERS)
+        return self._pool
+
+    def shutdown(self):
+        """Stop the worker pool (called on application shutdown)."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _lookup(self, smiles_list: List[str]) -> Dict[str, str]:
+        """Return cached results for the given SMILES."""
+        found = {}
+        with self._cache_lock:
+            for smiles in smiles_list:
+                washed = self._cache.get(smiles)
+                if washed is not None:
+                    found[smiles] = washed
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(smiles_list) - len(found)
+        return found
+
+    def _store(self, pairs: Dict[str, str]):
+        with self._cache_lock:
+            for smiles, washed in pairs.items():
+                self._cache[smiles] = washed
+
+    def standardize(self, smiles: str) -> str:
+        """
+        Standardize one SMILES synchronously (cached).
+
+        Returns the original SMILES if it can't be parsed.
+        """
+        return self.standardize_batch([smiles])[0]
+
+    def standardize_batch(self, smiles_list: List[str]) -> List[str]:
+        """
+        Standardize a list of SMILES in the current thread (cached).
+
+        Args:
+            smiles_list: Input SMILES
+
+        Returns:
+            Standardized SMILES in input order
+        """
+        unique = list(dict.fromkeys(smiles_list))
+        resolved = self._lookup(unique)
+        misses = [s for s in unique if s not in resolved]
+        if misses:
+            computed = {
+                smiles: washed or smiles
+                for smiles, washed in zip(misses, _standardize_chunk(misses))
+            }
+            self._store(computed)
+            resolved.update(computed)
+        return [resolved[s] for s in smiles_list]
+
+    async def astandardize(self, smiles: str) -> str:
+        """Standardize one SMILES without blocking the event loop."""
+        return (await self.astandardize_batch([smiles]))[0]
+
+    async def astandardize_batch(self, smiles_list: List[str]) -> List[str]:
+        """
+        Standardize a list of SMILES without blocking the event loop.
+
+        Cache misses below PROCESS_THRESHOLD run in a thread; larger sets
+        are chunked across the process pool.
+
+        Args:
+            smiles_list: Input SMILES
+
+        Returns:
+            Standardized SMILES in input order
+        """
+        unique = list(dict.fromkeys(smiles_list))
+        resolved = self._lookup(unique)
+        misses = [s for s in unique if s not in resolved]
+
+        if misses:
+            if len(misses) < self.PROCESS_THRESHOLD:
+                washed = await asyncio.to_thread(_standardize_chunk, misses)
+            else:
+                washed = await self._run_in_pool(misses)
+
+            computed = {
+                smiles: result or smiles
+                for smiles, result in zip(misses, washed)
+            }
+            self._store(computed)
+            resolved.update(computed)
+
+        return [resolved[s] for s in smiles_list]
+
+    async def _run_in_pool(self, smiles_list: List[str]) -> List[Optional[str]]:
+        """Fan chunks out across the process pool, falling back to a thread."""
+        chunks = [
+            smiles_list[i:i + self.CHUNK_SIZE]
+            for i in range(0, len(smiles_list), self.CHUNK_SIZE)
+        ]
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(pool, _standardize_chunk, chunk)
+                for chunk in chunks
+            ])
+            return [washed for chunk in results for washed in chunk]
+        except Exception as e:
+            print(f"⚠️ Standardizer process pool failed, using thread: {e}")
+            # Drop a broken pool so the next large batch starts a fresh one
+            self.shutdown()
+            return await asyncio.to_thread(_standardize_chunk, smiles_list)
+
+
+# Singleton instance
+mol_standardizer = MoleculeStandardizer()
@@ -272,11 +272,16 @@ class MultiProviderService:
         """
         Generate streaming response with automatic provider rotation and fallback.
 
+        Falls back to the next provider only until the first chunk has been
+        yielded; a stream that breaks after that raises, since restarting on
+        another provider would repeat the text the caller already has.
+
         Args:
             exclude_providers: Set of provider names to skip (e.g., {"groq"} if payload too large)
         """
         last_error = None
         attempted_providers = set(exclude_providers) if exclude_providers else set()
+        streamed = False
 
         for attempt in range(len(self.providers)):
             provider = await self.get_provider_for_mode(mode, exclude_providers=attempted_providers)
@@ -351,6 +356,7 @@ class MultiProviderService:
                                     chunk = json.loads(data)
                                     content = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
                                     if content:
+                                        streamed = True
                                         yield content
                                 except Exception:
                                     pass
@@ -358,6 +364,9 @@ class MultiProviderService:
                         
             except Exception as e:
                 self.mark_error(provider)
+                if streamed:
+                    print(f"❌ {provider.name.value} failed mid-stream: {e}")
+                    raise Exception(f"{provider.name.value} stream interrupted: {e}") from e
                 last_error = f"{provider.name.value}: {str(e)}"
                 print(f"❌ {provider.name.value} failed: {e}")
                 continue
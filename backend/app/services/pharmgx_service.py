@@ -5,6 +5,8 @@ Analyzes direct-to-consumer genetic data files (23andMe, AncestryDNA)
 and generates pharmacogenomic reports based on CPIC guidelines.
 
 All data is embedded - no external API calls required.
+Raw data files (plain, gzip or zip) are scanned for the target rsIDs only,
+so parsing cost does not depend on the 600k+ untargeted lines.
 Based on ClawBio PharmGx Reporter skill.
 
 Genes covered: 12 major PGx genes
@@ -12,10 +14,21 @@ SNPs covered: 31+ clinically relevant variants
 Drugs covered: 51+ medications with CPIC guidance
 """
 
-import re
-from typing import List, Dict, Any, Optional
+import asyncio
+import gzip
+import hashlib
+import io
+import mmap
+import threading
+import zipfile
+from typing import List, Dict, Any, Optional, Union, BinaryIO
 from datetime import datetime
 
+from cachetools import TTLCache
+
+
+GeneticSource = Union[bytes, str, BinaryIO]
+
 
 class PharmGxService:
     """
@@ -260,9 +273,20 @@ class PharmGxService:
         },
     }
     
+    # Every target rsID across all genes (built once, used for line matching)
+    ALL_SNPS = frozenset(
+        rsid for gene_data in PGX_GENES.values() for rsid in gene_data["snps"]
+    )
+    _ALL_SNPS_BYTES = frozenset(rsid.encode("ascii") for rsid in ALL_SNPS)
+
+    CHUNK_SIZE = 1 << 20  # 1MB read size for compressed/streamed uploads
+    NO_CALLS = {"--", "00", "II", "DD"}
+
     def __init__(self):
         """Initialize PharmGxService"""
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        # Parsed genotypes keyed by upload content hash
+        self._cache: TTLCache = TTLCache(maxsize=128, ttl=3600)
+        self._cache_lock = threading.Lock()
     
     async def generate_report(
         self, 
@@ -273,32 +297,24 @@ class PharmGxService:
         Generate pharmacogenomic report from genetic data file.
         
         Args:
-            file_content: Raw file content (23andMe/AncestryDNA format)
+            file_content: Raw file bytes or binary file object
+                (23andMe/AncestryDNA format, optionally gzip/zip compressed)
             filename: Original filename
             
         Returns:
             Dict with complete PGx report
         """
-        # Parse file content
-        file_text = file_content.decode('utf-8', errors='ignore')
-        genotypes = self._parse_genetic_file(file_text, filename)
+        # Parse file content (off-loop, cached by content hash)
+        genotypes = await self.load_genotypes(file_content, filename)
         
         if not genotypes:
-            return {
-                "success": False,
-                "error": "Could not parse genetic data file",
-                "format_hint": "Supported formats: 23andMe, AncestryDNA raw data"
-            }
+            return self._parse_failure()
         
         # Generate patient ID
         patient_id = f"PGx-{datetime.now().strftime('%Y%m%d%H%M%S')}"
         
         # Analyze each gene
-        gene_results = []
-        for gene_name, gene_data in self.PGX_GENES.items():
-            result = self._analyze_gene(gene_name, gene_data, genotypes)
-            if result:
-                gene_results.append(result)
+        gene_results = self._analyze_genes(genotypes)
         
         # Generate drug recommendations
         drug_recommendations = self._generate_drug_recommendations(gene_results)
@@ -339,14 +355,17 @@ class PharmGxService:
         Returns:
             Dict with drug-specific guidance
         """
-        full_report = await self.generate_report(file_content, filename)
+        # Reuses the cached genotype when the same file was already reported on
+        genotypes = await self.load_genotypes(file_content, filename)
         
-        if not full_report.get("success"):
-            return full_report
+        if not genotypes:
+            return self._parse_failure()
+        
+        gene_results = self._analyze_genes(genotypes)
         
         # Find drug in recommendations
         drug_rec = None
-        for rec in full_report.get("drug_recommendations", []):
+        for rec in self._generate_drug_recommendations(gene_results):
             if drug_name.lower() in rec.get("drug", "").lower():
                 drug_rec = rec
                 break
@@ -356,7 +375,7 @@ class PharmGxService:
                 "success": True,
                 "drug": drug_name,
                 "message": f"No PGx data available for {drug_name}",
-                "genes_tested": full_report["genes_analyzed"]
+                "genes_tested": len(gene_results)
             }
         
         return {
@@ -368,42 +387,220 @@ class PharmGxService:
             "recommendation": drug_rec["recommendation"]
         }
     
+    async def load_genotypes(
+        self,
+        file_content: GeneticSource,
+        filename: str
+    ) -> Dict[str, str]:
+        """
+        Parse target genotypes from an upload without blocking the event loop.
+        
+        Results are cached by content hash, so a report followed by drug
+        lookups on the same file only parses once.
+        """
+        return await asyncio.to_thread(self._load_genotypes_sync, file_content, filename)
+    
+    def _load_genotypes_sync(self, file_content: GeneticSource, filename: str) -> Dict[str, str]:
+        """Cached wrapper around _parse_genetic_file (runs in a worker thread)"""
+        key = self._fingerprint(file_content)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        genotypes = self._parse_genetic_file(file_content, filename)
+        with self._cache_lock:
+            self._cache[key] = genotypes
+        return genotypes
+    
+    @staticmethod
+    def _parse_failure() -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": "Could not parse genetic data file",
+            "format_hint": "Supported formats: 23andMe, AncestryDNA raw data (.txt, .csv, .gz, .zip)"
+        }
+    
+    def _fingerprint(self, source: GeneticSource) -> str:
+        """Content hash of an upload (bytes, text or seekable file object)"""
+        hasher = hashlib.blake2b(digest_size=16)
+        if isinstance(source, str):
+            source = source.encode("utf-8", errors="ignore")
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            hasher.update(source)
+            return hasher.hexdigest()
+        
+        mapped = self._mmap_file(source)
+        if mapped is not None:
+            with mapped:
+                hasher.update(mapped)
+            return hasher.hexdigest()
+        
+        source.seek(0)
+        for chunk in iter(lambda: source.read(self.CHUNK_SIZE), b""):
+            hasher.update(chunk)
+        source.seek(0)
+        return hasher.hexdigest()
+    
+    @staticmethod
+    def _mmap_file(source: BinaryIO) -> Optional[mmap.mmap]:
+        """Memory-map a disk-backed upload read-only, or None if not possible"""
+        try:
+            return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            return None
+    
     def _parse_genetic_file(
         self, 
-        file_text: str, 
+        source: GeneticSource, 
         filename: str
     ) -> Dict[str, str]:
-        """Parse 23andMe/AncestryDNA raw data file"""
-        genotypes = {}
+        """
+        Parse 23andMe/AncestryDNA raw data for the target SNPs only.
         
-        # Detect format
-        is_23andme = "23andMe" in file_text[:500] or "# rsid" in file_text[:100]
-        is_ancestry = "Ancestry" in filename or "ancestry" in filename.lower()
+        Index-driven: instead of splitting every line, each remaining target
+        rsID is located with a direct byte search, either over the whole
+        buffer (bytes / memory-mapped upload) or chunk by chunk for gzip/zip
+        streams. Scanning stops as soon as every target has been found.
         
-        lines = file_text.split('\n')
+        Args:
+            source: File bytes, decoded text, or a binary file object
+            filename: Original filename (unused; format is detected from content)
         
-        for line in lines:
-            # Skip comments and headers
-            if line.startswith('#') or line.startswith('rsid'):
+        Returns:
+            Dict of rsID -> genotype (e.g. "AG") for matched PGx SNPs
+        """
+        if isinstance(source, str):
+            source = source.encode("utf-8", errors="ignore")
+        
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            data = source if isinstance(source, bytes) else bytes(source)
+            if data[:2] == b"\x1f\x8b" or data[:4] == b"PK\x03\x04":
+                with self._open_compressed(io.BytesIO(data)) as stream:
+                    return self._scan_stream(stream)
+            return self._scan_buffer(data, set(self._ALL_SNPS_BYTES), {})
+        
+        source.seek(0)
+        magic = source.read(4)
+        source.seek(0)
+        if magic[:2] == b"\x1f\x8b" or magic == b"PK\x03\x04":
+            with self._open_compressed(source) as stream:
+                return self._scan_stream(stream)
+        
+        mapped = self._mmap_file(source)
+        if mapped is not None:
+            with mapped:
+                return self._scan_buffer(mapped, set(self._ALL_SNPS_BYTES), {})
+        return self._scan_stream(source)
+    
+    def _open_compressed(self, fileobj: BinaryIO) -> BinaryIO:
+        """Open a gzip or zip upload as a decompressing byte stream"""
+        magic = fileobj.read(2)
+        fileobj.seek(0)
+        if magic == b"\x1f\x8b":
+            return gzip.GzipFile(fileobj=fileobj, mode="rb")
+        
+        archive = zipfile.ZipFile(fileobj)
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if not members:
+            return io.BytesIO(b"")
+        # Raw-data exports ship as a single text file; take the largest member
+        member = max(members, key=lambda info: info.file_size)
+        return archive.open(member)
+    
+    def _scan_stream(self, stream: BinaryIO) -> Dict[str, str]:
+        """Scan a byte stream in fixed-size chunks, keeping memory flat"""
+        remaining = set(self._ALL_SNPS_BYTES)
+        genotypes: Dict[str, str] = {}
+        carry = b""
+        while remaining:
+            chunk = stream.read(self.CHUNK_SIZE)
+            if not chunk:
+                if carry:
+                    self._scan_buffer(carry, remaining, genotypes)
+                break
+            buffer = carry + chunk
+            cut = buffer.rfind(b"\n")
+            if cut < 0:
+                carry = buffer
                 continue
-            
-            parts = line.strip().split('\t')
-            if len(parts) >= 3:
-                rsid = parts[0]
-                genotype = parts[2] if is_23andme else parts[1]
-                
-                # Only store SNPs we care about
-                if rsid in self._get_all_snps():
-                    genotypes[rsid] = genotype
-        
+            # Keep the trailing partial line for the next chunk
+            self._scan_buffer(buffer[:cut + 1], remaining, genotypes)
+            carry = buffer[cut + 1:]
+        return genotypes
+    
+    def _scan_buffer(
+        self,
+        buffer: Union[bytes, mmap.mmap],
+        remaining: set,
+        genotypes: Dict[str, str]
+    ) -> Dict[str, str]:
+        """Find remaining target rsIDs in a buffer of whole lines"""
+        separator = self._detect_separator(buffer)
+        for rsid in list(remaining):
+            needle = rsid + separator
+            if buffer[:len(needle)] == needle:
+                start = 0
+            else:
+                start = buffer.find(b"\n" + needle)
+                if start < 0:
+                    continue
+                start += 1
+            end = buffer.find(b"\n", start)
+            line = buffer[start:end if end >= 0 else len(buffer)]
+            genotype = self._genotype_from_line(line, separator)
+            remaining.discard(rsid)
+            if genotype:
+                genotypes[rsid.decode("ascii")] = genotype
         return genotypes
     
-    def _get_all_snps(self) -> set:
+    @staticmethod
+    def _detect_separator(buffer: Union[bytes, mmap.mmap]) -> bytes:
+        """Tab for 23andMe/AncestryDNA .txt, comma for CSV re-exports"""
+        if buffer[:2] == b"rs":
+            start = 0
+        else:
+            start = buffer.find(b"\nrs")
+            if start < 0:
+                return b"\t"
+            start += 1
+        end = buffer.find(b"\n", start)
+        sample = buffer[start:end if end >= 0 else start + 200]
+        return b"\t" if b"\t" in sample or b"," not in sample else b","
+    
+    def _genotype_from_line(self, line: bytes, separator: bytes) -> Optional[str]:
+        """
+        Extract the genotype column from a raw data line.
+        
+        23andMe:     rsid, chromosome, position, genotype
+        AncestryDNA: rsid, chromosome, position, allele1, allele2
+        Minimal:     rsid, genotype
+        """
+        parts = line.decode("ascii", errors="ignore").strip().split(separator.decode())
+        if len(parts) < 2:
+            return None
+        if len(parts) >= 5:
+            genotype = parts[3].strip() + parts[4].strip()
+        else:
+            genotype = parts[-1].strip()
+        
+        genotype = genotype.upper()
+        if len(genotype) < 2 or genotype in self.NO_CALLS:
+            return None
+        return genotype
+    
+    def _get_all_snps(self) -> frozenset:
         """Get all SNPs in database"""
-        snps = set()
-        for gene_data in self.PGX_GENES.values():
-            snps.update(gene_data["snps"].keys())
-        return snps
+        return self.ALL_SNPS
+    
+    def _analyze_genes(self, genotypes: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Analyze every gene with data in the genotype map"""
+        gene_results = []
+        for gene_name, gene_data in self.PGX_GENES.items():
+            result = self._analyze_gene(gene_name, gene_data, genotypes)
+            if result:
+                gene_results.append(result)
+        return gene_results
     
     def _analyze_gene(
         self, 
@@ -2,15 +2,247 @@
 Plotting Service
 Generates charts and visualizations using Matplotlib/Seaborn.
 Returns Base64-encoded PNG images.
+
+LLM-written plotting code never runs in the API process. It goes to a pool
+of pre-started worker processes (app/services/chart_worker.py) that already
+have matplotlib / seaborn / numpy imported and run under CPU, memory and
+wall-clock limits. A worker that hangs or breaches a limit is killed and
+replaced. Rendered PNGs are cached by a hash of the code, so repeated
+charts skip the pool.
 """
 
-import io
+import asyncio
 import base64
+import hashlib
 import logging
-from typing import Dict, Any
+import os
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from app.services.chart_worker import CODE, FRAME_HEADER, OK, READY, validate_chart_code
 
 logger = logging.getLogger(__name__)
 
+BACKEND_DIR = str(Path(__file__).resolve().parents[2])
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHART_TIMEOUT = float(os.environ.get("CHART_TIMEOUT", "20"))
+CHART_CPU_SECONDS = int(os.environ.get("CHART_CPU_SECONDS", "15"))
+CHART_MEMORY_MB = int(os.environ.get("CHART_MEMORY_MB", "1024"))
+CHART_WORKER_START_TIMEOUT = float(os.environ.get("CHART_WORKER_START_TIMEOUT", "60"))
+CHART_CACHE_MAX_ENTRIES = int(os.environ.get("CHART_CACHE_MAX_ENTRIES", "256"))
+CHART_RESPAWN_BACKOFF = float(os.environ.get("CHART_RESPAWN_BACKOFF", "1"))
+CHART_RESPAWN_MAX_BACKOFF = float(os.environ.get("CHART_RESPAWN_MAX_BACKOFF", "30"))
+
+# Bump when render_chart's styling changes so cached PNGs are not reused
+CHART_RENDER_VERSION = "1"
+
+
+class ChartRenderError(Exception):
+    """Chart code failed, or its worker timed out / was killed."""
+
+
+class _Worker:
+    """One chart worker subprocess and its framed stdin/stdout channel."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+
+    async def send(self, code: str) -> None:
+        payload = code.encode("utf-8")
+        self.process.stdin.write(FRAME_HEADER.pack(CODE, len(payload)) + payload)
+        await self.process.stdin.drain()
+
+    async def receive(self) -> Tuple[bytes, bytes]:
+        header = await self.process.stdout.readexactly(FRAME_HEADER.size)
+        status, length = FRAME_HEADER.unpack(header)
+        return status, await self.process.stdout.readexactly(length)
+
+    def kill(self) -> None:
+        if self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+
+
+class ChartWorkerPool:
+    """
+    Fixed-size pool of sandboxed chart worker processes.
+
+    Workers are fresh interpreters (`python -m app.services.chart_worker`),
+    so they never inherit the API process's event loop, sockets or DB
+    clients. Each render checks out an idle worker, so throughput scales
+    with `size` and a slow chart only ever occupies its own worker.
+    """
+
+    def __init__(self, size: int = CHART_WORKERS, timeout: float = CHART_TIMEOUT,
+                 cpu_seconds: int = CHART_CPU_SECONDS, memory_mb: int = CHART_MEMORY_MB,
+                 start_timeout: float = CHART_WORKER_START_TIMEOUT,
+                 respawn_backoff: float = CHART_RESPAWN_BACKOFF):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.start_timeout = start_timeout
+        self.respawn_backoff = respawn_backoff
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_Worker] = []
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+        self._replacing: Set[asyncio.Task] = set()
+        self._home: Optional[str] = None
+        self.stats = {"renders": 0, "errors": 0, "timeouts": 0, "restarts": 0}
+
+    def _worker_env(self) -> Dict[str, str]:
+        """
+        Environment for chart workers: no inherited variables, so server
+        secrets (Supabase keys, API keys) are never visible to chart code.
+        """
+        if self._home is None:
+            self._home = tempfile.mkdtemp(prefix="chart-worker-")
+        return {
+            "PATH": os.environ.get("PATH", os.defpath),
+            "HOME": self._home,
+            "MPLCONFIGDIR": self._home,
+            "MPLBACKEND": "Agg",
+            "LANG": "C.UTF-8",
+        }
+
+    async def _spawn(self) -> _Worker:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.services.chart_worker",
+            "--cpu-seconds", str(self.cpu_seconds),
+            "--memory-mb", str(self.memory_mb),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=BACKEND_DIR,
+            env=self._worker_env(),
+        )
+        worker = _Worker(process)
+        try:
+            status, _ = await asyncio.wait_for(worker.receive(), self.start_timeout)
+            if status != READY:
+                raise ChartRenderError("Chart worker failed to start")
+        except asyncio.TimeoutError:
+            worker.kill()
+            raise ChartRenderError("Chart worker did not start in time")
+        except (asyncio.IncompleteReadError, ConnectionError, ChartRenderError):
+            worker.kill()
+            raise ChartRenderError("Chart worker failed to start")
+        except asyncio.CancelledError:
+            worker.kill()
+            raise
+        self._workers.append(worker)
+        return worker
+
+    async def _replace(self, worker: _Worker) -> None:
+        """Kill a worker and put a fresh one in its place, retrying with backoff until one starts."""
+        worker.kill()
+        await worker.process.wait()
+        if worker in self._workers:
+            self._workers.remove(worker)
+        if self._closed:
+            return
+        self.stats["restarts"] += 1
+        delay = self.respawn_backoff
+        while True:
+            try:
+                replacement = await self._spawn()
+                break
+            except Exception as e:
+                logger.error(f"❌ Chart worker restart failed, retrying in {delay:g}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CHART_RESPAWN_MAX_BACKOFF)
+            if self._closed:
+                return
+        if self._closed:
+            # Shut down while the replacement was starting
+            self._workers.remove(replacement)
+            replacement.kill()
+            await replacement.process.wait()
+        else:
+            self._idle.put_nowait(replacement)
+
+    async def start(self) -> None:
+        """Start all workers (idempotent). Called at app start-up and on first use."""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            self._closed = False
+            idle = asyncio.Queue()
+            workers = await asyncio.gather(*(self._spawn() for _ in range(self.size)), return_exceptions=True)
+            for worker in workers:
+                if isinstance(worker, Exception):
+                    logger.error(f"❌ Chart worker failed to start: {worker}")
+                else:
+                    idle.put_nowait(worker)
+            if idle.empty():
+                raise ChartRenderError("No chart workers could be started")
+            self._idle = idle
+            logger.info(f"✅ Chart worker pool started ({idle.qsize()} workers)")
+
+    async def render(self, code: str) -> bytes:
+        """Render plotting code in a worker and return PNG bytes."""
+        await self.start()
+        if not self._workers:
+            # Every worker died and none could be restarted yet; fail instead of queueing forever
+            self.stats["errors"] += 1
+            raise ChartRenderError("No chart workers are running")
+        worker = await self._idle.get()
+        healthy = False
+        try:
+            try:
+                await worker.send(code)
+                status, payload = await asyncio.wait_for(worker.receive(), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise ChartRenderError(f"Chart rendering timed out after {self.timeout:g}s")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                raise ChartRenderError("Chart worker was terminated (CPU or memory limit exceeded)")
+            healthy = True
+            if status != OK:
+                raise ChartRenderError(payload.decode("utf-8", "replace"))
+            self.stats["renders"] += 1
+            return payload
+        except ChartRenderError:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            if healthy:
+                self._idle.put_nowait(worker)
+            else:
+                # Replace in the background so the caller gets its error now
+                if worker in self._workers:
+                    self._workers.remove(worker)
+                task = asyncio.create_task(self._replace(worker))
+                self._replacing.add(task)
+                task.add_done_callback(self._replacing.discard)
+
+    async def shutdown(self) -> None:
+        """Stop all workers, including any replacement still starting or backing off."""
+        self._closed = True
+        self._idle = None
+        if self._replacing:
+            for task in self._replacing:
+                task.cancel()
+            await asyncio.gather(*self._replacing, return_exceptions=True)
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.kill()
+        await asyncio.gather(*(w.process.wait() for w in workers), return_exceptions=True)
+        if self._home is not None:
+            shutil.rmtree(self._home, ignore_errors=True)
+            self._home = None
+
+
+chart_pool = ChartWorkerPool()
+
 
 class PlottingService:
     """
@@ -18,106 +250,73 @@ class PlottingService:
     and returns the result as a base64-encoded PNG image.
     """
 
-    ALLOWED_IMPORTS = {
-        'matplotlib', 'matplotlib.pyplot', 'matplotlib.figure',
-        'seaborn', 'numpy', 'math',
-    }
+    # Shared by every PlottingService instance (container and endpoints)
+    _cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def __init__(self, pool: Optional[ChartWorkerPool] = None,
+                 cache_max_entries: int = CHART_CACHE_MAX_ENTRIES):
+        self.pool = pool or chart_pool
+        self.cache_max_entries = cache_max_entries
+
+    @staticmethod
+    def _cache_key(code: str) -> str:
+        return hashlib.sha256(f"{CHART_RENDER_VERSION}\0{code.strip()}".encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        png = self._cache.get(key)
+        if png is not None:
+            self._cache.move_to_end(key)
+        return png
+
+    def _cache_put(self, key: str, png: bytes) -> None:
+        self._cache[key] = png
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
 
     async def generate_chart(self, code: str) -> Dict[str, Any]:
         """
         Execute plotting code and return the resulting figure as base64 PNG.
-        
+
         The code MUST create a matplotlib figure. We capture it automatically.
-        
+
         Args:
             code: Python code string that uses matplotlib/seaborn to create a plot.
-            
+
         Returns:
             Dict with 'image_base64' (str) and 'status' (str).
         """
-        import matplotlib
-        matplotlib.use('Agg')  # Non-interactive backend
-        import matplotlib.pyplot as plt
-
         logger.info(f"📊 Generating chart from code ({len(code)} chars)")
 
-        # Security: Basic validation
-        forbidden = ['import os', 'import sys', 'subprocess', 'exec(', 'eval(', 
-                      '__import__', 'open(', 'file(', 'input(', 'breakpoint',
-                      'shutil', 'pathlib', 'glob', 'socket', 'requests', 'urllib']
-        for term in forbidden:
-            if term in code:
-                logger.warning(f"⚠️ Blocked forbidden term in chart code: {term}")
-                return {
-                    "status": "error",
-                    "error": f"Security: '{term}' is not allowed in chart code.",
-                    "image_base64": None,
-                }
-
         try:
-            # Close any existing figures
-            plt.close('all')
-
-            # Create a restricted namespace for execution
-            namespace = {}
-            
-            # Pre-import allowed modules into namespace
-            import numpy as np
-            namespace['np'] = np
-            namespace['plt'] = plt
-            
-            try:
-                import seaborn as sns
-                namespace['sns'] = sns
-            except ImportError:
-                pass
-
-            # Execute the plotting code
-            exec(code, namespace)
+            validate_chart_code(code)
+        except ValueError as e:
+            logger.warning(f"⚠️ Blocked chart code: {e}")
+            return {
+                "status": "error",
+                "error": f"Security: {e}.",
+                "image_base64": None,
+            }
 
-            # Capture the current figure
-            fig = plt.gcf()
-            if not fig.get_axes():
+        key = self._cache_key(code)
+        png = self._cache_get(key)
+        if png is None:
+            try:
+                png = await self.pool.render(code)
+            except ChartRenderError as e:
+                logger.error(f"❌ Chart generation failed: {e}")
                 return {
                     "status": "error",
-                    "error": "Code did not produce a plot. Make sure to call plt.plot(), plt.bar(), etc.",
+                    "error": str(e),
                     "image_base64": None,
                 }
+            self._cache_put(key, png)
+        else:
+            logger.info("📊 Chart served from cache")
 
-            # Style it nicely
-            fig.set_facecolor('#0a0a0a')
-            for ax in fig.get_axes():
-                ax.set_facecolor('#0a0a0a')
-                ax.tick_params(colors='#999')
-                ax.xaxis.label.set_color('#ccc')
-                ax.yaxis.label.set_color('#ccc')
-                ax.title.set_color('#fff')
-                for spine in ax.spines.values():
-                    spine.set_color('#333')
-
-            fig.tight_layout()
-
-            # Save to buffer
-            buf = io.BytesIO()
-            fig.savefig(buf, format='png', dpi=150, bbox_inches='tight',
-                        facecolor=fig.get_facecolor(), edgecolor='none')
-            buf.seek(0)
-            image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-            buf.close()
-            plt.close('all')
-
-            logger.info("✅ Chart generated successfully")
-            return {
-                "status": "success",
-                "image_base64": image_base64,
-                "error": None,
-            }
-
-        except Exception as e:
-            plt.close('all')
-            logger.error(f"❌ Chart generation failed: {e}")
-            return {
-                "status": "error",
-                "error": str(e),
-                "image_base64": None,
-            }
+        logger.info("✅ Chart generated successfully")
+        return {
+            "status": "success",
+            "image_base64": base64.b64encode(png).decode('utf-8'),
+            "error": None,
+        }
@@ -1,9 +1,34 @@
+"""
+Background Research Tasks
+
+`research_tasks` is a leased work queue:
+
+- Claiming is atomic. `claim_research_task` (migration 018) picks the oldest
+  claimable row with FOR UPDATE SKIP LOCKED and marks it RUNNING with a lease
+  in one UPDATE ... RETURNING, so two workers can never claim the same task.
+  A worker only claims when it has a free concurrency slot.
+- The lease is renewed while the task runs. If the worker crashes or is
+  redeployed, the lease expires and another worker claims the task again
+  (up to RESEARCH_MAX_ATTEMPTS times).
+- After each graph node (planner, researcher, reviewer, each report section)
+  the ResearchState is saved to `checkpoint`, so a reclaimed task resumes
+  mid-graph instead of re-running every search.
+- Idle workers wait on a wakeup signal instead of polling: create_task()
+  wakes workers in this process, and with RESEARCH_QUEUE_DSN set a LISTEN
+  on the `research_tasks` channel (NOTIFY trigger on insert) wakes workers
+  in other processes. RESEARCH_POLL_INTERVAL is only a safety net, e.g.
+  for picking up expired leases.
+"""
+
 import asyncio
 import logging
-import json
-from datetime import datetime
-from typing import List, Optional, Dict, Any
-from uuid import UUID
+import os
+import select
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Set
+from uuid import UUID, uuid4
 from supabase import Client
 
 from app.core.container import container
@@ -12,19 +37,96 @@ from app.core.database import async_db_execute
 
 logger = logging.getLogger(__name__)
 
+RESEARCH_WORKER_CONCURRENCY = int(os.environ.get("RESEARCH_WORKER_CONCURRENCY", "5"))
+RESEARCH_TASK_LEASE_SECONDS = int(os.environ.get("RESEARCH_TASK_LEASE_SECONDS", "300"))
+RESEARCH_MAX_ATTEMPTS = int(os.environ.get("RESEARCH_MAX_ATTEMPTS", "3"))
+RESEARCH_POLL_INTERVAL = float(os.environ.get("RESEARCH_POLL_INTERVAL", "60"))
+RESEARCH_QUEUE_DSN = os.environ.get("RESEARCH_QUEUE_DSN", "")  # direct Postgres URL, enables LISTEN
+RESEARCH_NOTIFY_CHANNEL = "research_tasks"
+
+# Wakeup events of the worker loops running in this process
+_wakeups: Set[asyncio.Event] = set()
+
+
+def notify_task_available() -> None:
+    """Wake idle worker loops in this process."""
+    for event in list(_wakeups):
+        event.set()
+
+
+class LeaseLostError(Exception):
+    """The task's lease expired and was claimed by another worker."""
+
+
+class _NotifyListener:
+    """
+    LISTENs on the research_tasks channel over a direct Postgres connection
+    (the Supabase REST client cannot) and wakes the worker loop on NOTIFY.
+    Runs in a daemon thread and reconnects on errors.
+    """
+
+    def __init__(self, dsn: str, loop: asyncio.AbstractEventLoop, channel: str = RESEARCH_NOTIFY_CHANNEL):
+        self.dsn = dsn
+        self.loop = loop
+        self.channel = channel
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="research-task-listener", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _wake(self) -> None:
+        self.loop.call_soon_threadsafe(notify_task_available)
+
+    def _run(self) -> None:
+        import psycopg2
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {self.channel};")
+                logger.info(f"👂 Listening for research tasks on '{self.channel}'")
+                self._wake()  # catch anything queued while disconnected
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self._wake()
+            except Exception as e:
+                logger.warning(f"⚠️ Research task listener error, reconnecting: {e}")
+                self._stopped.wait(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
 class BackgroundResearchService:
     """
     Manages background research tasks, providing concurrency control
     and task queue management via Supabase.
-    
+
     Uses ServiceContainer for all dependencies - NO direct instantiation.
     """
 
-    def __init__(self, db=None, max_concurrent: int = 5):
+    def __init__(self, db=None, max_concurrent: int = RESEARCH_WORKER_CONCURRENCY,
+                 lease_seconds: int = RESEARCH_TASK_LEASE_SECONDS,
+                 max_attempts: int = RESEARCH_MAX_ATTEMPTS,
+                 poll_interval: float = RESEARCH_POLL_INTERVAL):
         self._container = None
         self._db = db
         self.semaphore = asyncio.Semaphore(max_concurrent)
-    
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._running: Set[asyncio.Task] = set()
+
     @property
     def container(self):
         """Get container - should be initialized at app startup"""
@@ -32,12 +134,12 @@ class BackgroundResearchService:
             # Don't try to initialize - should already be initialized at app startup
             self._container = container
         return self._container
-    
+
     @property
     def research_service(self):
         """Get deep research service from container"""
         return self.container.get('deep_research_service')
-    
+
     @property
     def chat_service(self):
         """Get chat service from container"""
@@ -45,7 +147,9 @@ class BackgroundResearchService:
 
     @property
     def db(self):
-        """Get database connection from container"""
+        """Get database connection (the one passed in, else the container's)"""
+        if self._db is not None:
+            return self._db
         return self.container.get_db()
 
     async def create_task(self, user_id: UUID, conversation_id: UUID, question: str, metadata: Dict[str, Any] = None) -> str:
@@ -57,23 +161,24 @@ class BackgroundResearchService:
             "status": "PENDING",
             "metadata": metadata or {}
         }
-        
+
         result = await async_db_execute(
             lambda: self.db.table("research_tasks").insert(task_data).execute()
         )
-        
+
         if not result.data:
             raise Exception("Failed to create research task")
-            
+
+        notify_task_available()
         return result.data[0]["id"]
-        
+
     async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Fetch task status and results"""
         result = await async_db_execute(
             lambda: self.db.table("research_tasks").select("*").eq("id", task_id).single().execute()
         )
         return result.data if result and result.data else None
-        
+
     async def get_user_tasks(self, user_id: UUID, limit: int = 10) -> List[Dict[str, Any]]:
         """Fetch recent tasks for a user"""
         result = await async_db_execute(
@@ -86,75 +191,156 @@ class BackgroundResearchService:
         )
         return result.data if result and result.data else []
 
+    # ------------------------------------------------------------------
+    # Queue operations
+    # ------------------------------------------------------------------
+
+    async def claim_task(self) -> Optional[Dict[str, Any]]:
+        """Atomically lease the next claimable task to this worker, if any."""
+        result = await async_db_execute(
+            lambda: self.db.rpc("claim_research_task", {
+                "p_worker_id": self.worker_id,
+                "p_lease_seconds": self.lease_seconds,
+                "p_max_attempts": self.max_attempts,
+            }).execute()
+        )
+        rows = result.data if result and result.data else []
+        if isinstance(rows, dict):
+            rows = [rows]
+        return rows[0] if rows else None
+
+    async def _update_leased(self, task_id: str, fields: Dict[str, Any]) -> bool:
+        """Update a task only while this worker still holds its lease."""
+        result = await async_db_execute(
+            lambda: self.db.table("research_tasks")
+                .update(fields)
+                .eq("id", task_id)
+                .eq("lease_owner", self.worker_id)
+                .execute()
+        )
+        return bool(result and result.data)
+
+    def _lease_expiry(self) -> str:
+        return (datetime.utcnow() + timedelta(seconds=self.lease_seconds)).isoformat()
+
+    async def _renew_lease(self, task_id: str, lost: asyncio.Event) -> None:
+        """Extend the lease every third of its length until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self._update_leased(task_id, {"lease_expires_at": self._lease_expiry()}):
+                    logger.warning(f"⚠️ Lost lease on research task {task_id}")
+                    lost.set()
+                    return
+            except Exception as e:
+                # Transient DB error; the lease has slack for the next attempt
+                logger.warning(f"⚠️ Lease renewal failed for research task {task_id}: {e}")
+
     async def worker_loop(self):
         """
-        Background worker that polls for PENDING tasks and executes them.
+        Background worker that claims tasks as concurrency slots free up.
         Managed by the main application lifecycle or scheduler.
         """
-        logger.info("👷 Research worker loop started")
-        while True:
-            try:
-                # 1. Poll for a pending task
-                result = await async_db_execute(
-                    lambda: self.db.table("research_tasks")
-                        .select("*")
-                        .eq("status", "PENDING")
-                        .order("created_at", desc=False)
-                        .limit(1)
-                        .execute()
-                )
-                
-                if not result.data:
-                    # No tasks, sleep and retry
-                    await asyncio.sleep(10)
+        logger.info(f"👷 Research worker loop started ({self.worker_id})")
+        wakeup = asyncio.Event()
+        _wakeups.add(wakeup)
+        listener = None
+        if RESEARCH_QUEUE_DSN:
+            listener = _NotifyListener(RESEARCH_QUEUE_DSN, asyncio.get_running_loop())
+            listener.start()
+        try:
+            while True:
+                # Only claim when a slot is free, so a leased task always starts right away
+                await self.semaphore.acquire()
+                try:
+                    # Clear before claiming so a task queued meanwhile still wakes us
+                    wakeup.clear()
+                    task = await self.claim_task()
+                except Exception as e:
+                    self.semaphore.release()
+                    logger.error(f"❌ Worker loop error: {e}")
+                    await asyncio.sleep(30)  # Longer sleep on error
+                    continue
+
+                if task is None:
+                    self.semaphore.release()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
                     continue
-                    
-                task = result.data[0]
-                task_id = task["id"]
-                
-                # 2. Execute task with concurrency limit
-                # We don't 'await' the process_task here to allow the worker 
-                # to pick up multiple tasks up to the semaphore limit.
-                asyncio.create_task(self._run_task_with_semaphore(task))
-                
-                # Small delay before picking next task to avoid tight loop
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"❌ Worker loop error: {e}")
-                await asyncio.sleep(30) # Longer sleep on error
 
-    async def _run_task_with_semaphore(self, task: Dict[str, Any]):
-        """Run a task constrained by the global semaphore"""
-        async with self.semaphore:
+                running = asyncio.create_task(self._run_claimed_task(task))
+                self._running.add(running)
+                running.add_done_callback(self._running.discard)
+        finally:
+            _wakeups.discard(wakeup)
+            if listener:
+                listener.stop()
+
+    async def shutdown(self) -> None:
+        """Stop running tasks, handing their leases back so another worker resumes them."""
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run_claimed_task(self, task: Dict[str, Any]):
+        """Run a claimed task in its semaphore slot (acquired by worker_loop)"""
+        try:
             await self._process_task(task)
+        finally:
+            self.semaphore.release()
 
     async def _process_task(self, task: Dict[str, Any]):
-        """Execute the actual research for a task"""
+        """Execute the actual research for a task, renewing its lease and checkpointing"""
         task_id = task["id"]
         user_id = task["user_id"]
         conversation_id = task["conversation_id"]
         question = task["research_question"]
-        
-        logger.info(f"🧪 Processing research task {task_id} for user {user_id}")
-        
+        checkpoint = task.get("checkpoint")
+        attempts = task.get("attempts") or 1
+
+        if checkpoint:
+            logger.info(f"♻️ Resuming research task {task_id} after '{task.get('checkpoint_node')}' (attempt {attempts})")
+        else:
+            logger.info(f"🧪 Processing research task {task_id} for user {user_id}")
+
+        lease_lost = asyncio.Event()
+        renewer = asyncio.create_task(self._renew_lease(task_id, lease_lost))
+
+        async def save_checkpoint(node: str, state) -> None:
+            if lease_lost.is_set():
+                raise LeaseLostError(task_id)
+            try:
+                saved = await self._update_leased(task_id, {
+                    "checkpoint": state.to_checkpoint(),
+                    "checkpoint_node": node,
+                    "checkpointed_at": datetime.utcnow().isoformat(),
+                    "lease_expires_at": self._lease_expiry(),
+                })
+            except Exception as e:
+                # Losing one checkpoint only costs re-running that node on resume
+                logger.warning(f"⚠️ Checkpoint '{node}' for research task {task_id} not saved: {e}")
+                return
+            if not saved:
+                lease_lost.set()
+                raise LeaseLostError(task_id)
+
         try:
-            # 1. Mark as RUNNING
-            await async_db_execute(
-                lambda: self.db.table("research_tasks")
-                    .update({"status": "RUNNING", "started_at": datetime.utcnow().isoformat()})
-                    .eq("id", task_id)
-                    .execute()
-            )
-            
-            # 2. Execute Research
-            # We use the service's non-streaming run_research
             state = await self.research_service.run_research(
                 question=question,
-                user_id=UUID(user_id)
+                user_id=UUID(user_id),
+                checkpoint=checkpoint,
+                on_checkpoint=save_checkpoint,
             )
-            
-            # 3. Save result to conversation
+            if lease_lost.is_set():
+                logger.warning(f"⚠️ Research task {task_id} was taken over by another worker; dropping result")
+                return
+            if state.status == "error":
+                raise Exception(state.error_message or "Deep research failed")
+
+            # Save result to conversation
             if state.final_report and conversation_id:
                 try:
                     assistant_message = MessageCreate(
@@ -171,29 +357,39 @@ class BackgroundResearchService:
                 except Exception as msg_err:
                     logger.error(f"⚠️ Failed to save task result to conversation: {msg_err}")
 
-            # 4. Mark as COMPLETED
-            await async_db_execute(
-                lambda: self.db.table("research_tasks")
-                    .update({
-                        "status": "COMPLETED", 
-                        "result_report": state.final_report,
-                        "finished_at": datetime.utcnow().isoformat()
-                    })
-                    .eq("id", task_id)
-                    .execute()
-            )
+            await self._update_leased(task_id, {
+                "status": "COMPLETED",
+                "result_report": state.final_report,
+                "finished_at": datetime.utcnow().isoformat(),
+                "checkpoint": None,
+                "lease_owner": None,
+                "lease_expires_at": None,
+            })
             logger.info(f"✅ Research task {task_id} completed successfully")
-            
+
+        except asyncio.CancelledError:
+            # Shutting down: hand the task back so another worker resumes it now
+            await asyncio.shield(self._release(task_id, "PENDING", None))
+            raise
         except Exception as e:
-            logger.error(f"❌ Research task {task_id} failed: {e}")
-            # Mark as FAILED
-            await async_db_execute(
-                lambda: self.db.table("research_tasks")
-                    .update({
-                        "status": "FAILED", 
-                        "error_detail": str(e),
-                        "finished_at": datetime.utcnow().isoformat()
-                    })
-                    .eq("id", task_id)
-                    .execute()
-            )
+            if attempts < self.max_attempts:
+                logger.warning(f"⚠️ Research task {task_id} failed (attempt {attempts}/{self.max_attempts}), requeueing: {e}")
+                await self._release(task_id, "PENDING", str(e))
+            else:
+                logger.error(f"❌ Research task {task_id} failed: {e}")
+                await self._release(task_id, "FAILED", str(e))
+        finally:
+            renewer.cancel()
+
+    async def _release(self, task_id: str, status: str, error: Optional[str]) -> None:
+        """Give up the lease, returning the task to the queue or finishing it as FAILED."""
+        fields = {"status": status, "lease_owner": None, "lease_expires_at": None, "error_detail": error}
+        if status == "FAILED":
+            fields["finished_at"] = datetime.utcnow().isoformat()
+        try:
+            await self._update_leased(task_id, fields)
+        except Exception as e:
+            logger.error(f"❌ Failed to release research task {task_id}: {e}")
+            return
+        if status == "PENDING":
+            notify_task_available()
@@ -22,7 +22,7 @@ class RouterService:
     Features:
     - Complexity-based routing
     - Privacy-aware routing (local for sensitive data)
-    - Queue status awareness
+    - Queue wait-time awareness (estimated from local throughput)
     - Mode-specific routing strategies
     """
     
@@ -54,7 +54,7 @@ class RouterService:
         """
         complexity = prompt_processor.score_complexity(prompt, token_count)
         is_private = prompt_processor.detect_privacy(prompt)
-        queue_busy = self.queue.is_busy() if self.queue else False
+        queue_busy = self._local_wait_too_long(mode)
         
         if mode == "fast":
             return self._route_fast(complexity, queue_busy)
@@ -65,6 +65,20 @@ class RouterService:
         else:
             return self._route_default(complexity, queue_busy)
     
+    def _local_wait_too_long(self, mode: str) -> bool:
+        """
+        Check if the local queue would make this request wait too long.
+
+        Args:
+            mode: Request mode (sets the acceptable wait)
+
+        Returns:
+            True if the estimated local wait exceeds the mode's budget
+        """
+        if not self.queue:
+            return False
+        return self.queue.estimate_wait(mode) > self.queue.max_wait_for(mode)
+    
     def _route_fast(self, complexity: float, queue_busy: bool) -> str:
         """
         Route for fast mode.
@@ -3,16 +3,18 @@ Scheduler Service for Background Tasks
 Runs periodic jobs like sending re-engagement emails to inactive users.
 """
 
-import asyncio
+import os
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
-from app.core.config import settings
 from app.core.database import get_db
 from app.services.email import EmailService
 
+# How often the admin dashboard's daily activity view is refreshed
+ADMIN_STATS_REFRESH_MINUTES = int(os.environ.get("ADMIN_STATS_REFRESH_MINUTES", "15"))
+
 
 class SchedulerService:
     """Background task scheduler for Benchside"""
@@ -45,9 +47,29 @@ class SchedulerService:
             replace_existing=True
         )
         
+        # Add job: Refresh admin dashboard aggregates
+        self.scheduler.add_job(
+            self.refresh_admin_stats,
+            IntervalTrigger(minutes=ADMIN_STATS_REFRESH_MINUTES),
+            id="admin_stats_refresh",
+            name="Refresh admin dashboard aggregates",
+            replace_existing=True
+        )
+        
+        # Add job: Re-derive admin counters nightly to correct any drift
+        self.scheduler.add_job(
+            self.refresh_admin_stats,
+            CronTrigger(hour=3, minute=30),  # 3:30 AM UTC daily
+            kwargs={"reconcile": True},
+            id="admin_stats_reconcile",
+            name="Reconcile admin dashboard counters",
+            replace_existing=True
+        )
+        
         self.scheduler.start()
         self._is_running = True
         print("✅ Scheduler started - Re-engagement emails scheduled for 9 AM UTC daily")
+        print(f"✅ Admin stats refresh every {ADMIN_STATS_REFRESH_MINUTES} min, counters reconciled at 3:30 AM UTC")
     
     def stop(self):
         """Stop the scheduler"""
@@ -126,6 +148,15 @@ class SchedulerService:
             import traceback
             traceback.print_exc()
     
+    async def refresh_admin_stats(self, reconcile: bool = False):
+        """Refresh the admin dashboard's materialized aggregates"""
+        try:
+            from app.services.admin import AdminService
+            await AdminService(get_db()).refresh_aggregates(reconcile=reconcile)
+            print(f"📊 Admin stats refreshed{' and counters reconciled' if reconcile else ''}")
+        except Exception as e:
+            print(f"❌ Admin stats refresh failed: {e}")
+    
     async def trigger_reengagement_now(self):
         """Manually trigger re-engagement emails (for testing)"""
         await self.send_reengagement_emails()
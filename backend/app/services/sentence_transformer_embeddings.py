@@ -1,38 +1,154 @@
 """
 Sentence Transformer Embeddings Service
 Local embeddings - no API calls, no rate limits, instant processing
-Uses all-MiniLM-L6-v2 model (384 dimensions)
+Uses nomic-embed-text-v1.5 (768 dimensions)
+
+Inference never runs on the event loop: every request goes through a
+micro-batcher that coalesces concurrent texts (chat queries and document
+ingest alike) into one encode call on a dedicated worker thread. Queries
+are batched ahead of queued document chunks, so a large upload only delays
+a query by one micro-batch. Set LOCAL_EMBED_BACKEND=onnx (or onnx-int8) to
+run the exported ONNX model with onnxruntime instead of PyTorch.
 """
 
+import asyncio
 import logging
-import hashlib
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-from cachetools import TTLCache
-from sentence_transformers import SentenceTransformer
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
 
 from app.core.config import settings
+from app.services.embedding_store import embedding_store
 
 logger = logging.getLogger(__name__)
 
+# Largest number of texts encoded in one model call
+LOCAL_EMBED_MAX_BATCH = int(os.environ.get("LOCAL_EMBED_MAX_BATCH", "32"))
+# How long a lone request waits for company before it is encoded
+LOCAL_EMBED_MAX_WAIT_MS = int(os.environ.get("LOCAL_EMBED_MAX_WAIT_MS", "5"))
+# "torch" (sentence-transformers), "onnx" or "onnx-int8" (onnxruntime)
+LOCAL_EMBED_BACKEND = os.environ.get("LOCAL_EMBED_BACKEND", "torch").lower()
+
+# ONNX exports shipped in the model repository
+ONNX_MODEL_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quantized.onnx",
+}
+
+
+class OnnxEncoder:
+    """Mean-pooled sentence embeddings from an ONNX export via onnxruntime"""
+
+    def __init__(self, model_name: str, model_file: str, max_length: int = 512):
+        import numpy as np
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from transformers import AutoTokenizer
+
+        self._np = np
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            hf_hub_download(model_name, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+
+    def encode(self, texts: List[str], **kwargs):
+        np = self._np
+        tokens = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+        hidden = self.session.run(None, feeds)[0]
+        mask = tokens["attention_mask"][..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+class _EncodeBatcher:
+    """Coalesces concurrent embedding requests into micro-batches on one worker thread"""
+
+    def __init__(self, encode_fn, max_batch_size: int, max_wait_ms: int):
+        self._encode = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-embed")
+        self._queries: deque = deque()
+        self._documents: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self.stats = {"batches": 0, "items": 0, "largest_batch": 0}
+
+    async def submit(self, texts: List[str], query: bool = False) -> List[Any]:
+        """Queue texts for encoding and wait for their vectors"""
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        (self._queries if query else self._documents).extend(zip(texts, futures))
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return await asyncio.gather(*futures)
+
+    def _take_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = []
+        for pending in (self._queries, self._documents):
+            while pending and len(batch) < self.max_batch_size:
+                text, future = pending.popleft()
+                if not future.cancelled():
+                    batch.append((text, future))
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._queries and not self._documents:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if len(self._queries) + len(self._documents) < self.max_batch_size:
+                # Give concurrent callers a moment to join this batch
+                await asyncio.sleep(self.max_wait)
+
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._encode, [t for t, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
 
-class EmbeddingCacheEntry:
-    """Cache entry for embeddings"""
-    def __init__(self, embedding: List[float], model_version: str):
-        self.embedding = embedding
-        self.model_version = model_version
-        self.created_at = datetime.utcnow()
-        self.expires_at = self.created_at + timedelta(seconds=settings.EMBEDDING_CACHE_TTL)
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def close(self):
+        if self._runner is not None:
+            self._runner.cancel()
+        self._executor.shutdown(wait=False)
 
 
 class SentenceTransformerEmbeddingsService:
     """Service for generating embeddings using local Sentence Transformers"""
     
+    provider = "sentence-transformers"
 
     def __init__(self):
         self.model_name = "nomic-ai/nomic-embed-text-v1.5"
         self.embedding_dimensions = 768  # Nomic default
         self.model = None
+        self.backend = LOCAL_EMBED_BACKEND
+        self._batcher: Optional[_EncodeBatcher] = None
+        self._batcher_loop = None
         self.cache = None
         self.cache_stats = {
             "hits": 0,
@@ -44,58 +160,70 @@ class SentenceTransformerEmbeddingsService:
         
         # Initialize cache if enabled
         if settings.ENABLE_EMBEDDING_CACHE:
-            self.cache = TTLCache(
-                maxsize=settings.EMBEDDING_CACHE_MAX_SIZE,
-                ttl=settings.EMBEDDING_CACHE_TTL
-            )
-            logger.info(f"✅ Embedding cache initialized (max_size={settings.EMBEDDING_CACHE_MAX_SIZE}, ttl={settings.EMBEDDING_CACHE_TTL}s)")
+            self.cache = embedding_store
+            logger.info(f"✅ Embedding cache initialized (persistent store: {embedding_store.path})")
         
         # Load model lazily on first use
         logger.info(f"📦 Nomic Embed service initialized (model will load on first use)")
     
     def _load_model(self):
-        """Load the sentence transformer model"""
-        if self.model is None:
-            logger.info(f"🔄 Loading Nomic model: {self.model_name}")
+        """Load the embedding model (runs on the worker thread)"""
+        if self.model is not None:
+            return
+        if self.backend in ONNX_MODEL_FILES:
+            logger.info(f"🔄 Loading Nomic model ({self.backend}): {self.model_name}")
             try:
-                self.model = SentenceTransformer(self.model_name, trust_remote_code=True)
-                logger.info(f"✅ Model loaded successfully")
+                self.model = OnnxEncoder(self.model_name, ONNX_MODEL_FILES[self.backend])
+                logger.info(f"✅ ONNX model loaded successfully")
+                return
             except Exception as e:
-                logger.error(f"❌ Failed to load model: {e}")
-                raise
+                logger.warning(f"⚠️ ONNX backend unavailable ({e}), falling back to PyTorch")
+                self.backend = "torch"
+        logger.info(f"🔄 Loading Nomic model: {self.model_name}")
+        try:
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(self.model_name, trust_remote_code=True)
+            logger.info(f"✅ Model loaded successfully")
+        except Exception as e:
+            logger.error(f"❌ Failed to load model: {e}")
+            raise
+    
+    def _encode_sync(self, texts: List[str]) -> List[List[float]]:
+        """Encode one micro-batch; called only on the batcher's worker thread"""
+        self._load_model()
+        self.cache_stats["model_calls"] += 1
+        vectors = self.model.encode(
+            texts, batch_size=len(texts), convert_to_tensor=False, show_progress_bar=False
+        )
+        return [vector.tolist() for vector in vectors]
     
-    def _get_cache_key(self, text: str) -> str:
-        """Generate cache key for text"""
-        text_hash = hashlib.sha256(text.encode()).hexdigest()
-        return f"st:{self.model_name}:{text_hash}"
+    def _get_batcher(self) -> _EncodeBatcher:
+        """The batcher bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._batcher is None or self._batcher_loop is not loop:
+            if self._batcher is not None:
+                self._batcher.close()
+            self._batcher = _EncodeBatcher(self._encode_sync, LOCAL_EMBED_MAX_BATCH, LOCAL_EMBED_MAX_WAIT_MS)
+            self._batcher_loop = loop
+        return self._batcher
     
-    def _get_from_cache(self, text: str) -> Optional[List[float]]:
-        """Get embedding from cache if available"""
+    async def _get_many_from_cache(self, inputs: List[str]) -> List[Optional[List[float]]]:
+        """Batch lookup of prefixed model inputs in the embedding store"""
         if not self.cache:
-            return None
-        
-        cache_key = self._get_cache_key(text)
-        entry = self.cache.get(cache_key)
+            return [None] * len(inputs)
         
-        if entry and isinstance(entry, EmbeddingCacheEntry):
-            if datetime.utcnow() < entry.expires_at:
-                self.cache_stats["hits"] += 1
-                return entry.embedding
-            else:
-                # Expired entry
-                del self.cache[cache_key]
-        
-        self.cache_stats["misses"] += 1
-        return None
+        found = await self.cache.aget_many(self.provider, self.model_name, self.embedding_dimensions, inputs)
+        hits = sum(1 for embedding in found if embedding is not None)
+        self.cache_stats["hits"] += hits
+        self.cache_stats["misses"] += len(inputs) - hits
+        return found
     
-    def _save_to_cache(self, text: str, embedding: List[float]):
-        """Save embedding to cache"""
+    async def _save_many_to_cache(self, inputs: List[str], embeddings: List[Optional[List[float]]]):
+        """Batch write of prefixed model inputs to the embedding store"""
         if not self.cache:
             return
         
-        cache_key = self._get_cache_key(text)
-        entry = EmbeddingCacheEntry(embedding, self.model_name)
-        self.cache[cache_key] = entry
+        await self.cache.aput_many(self.provider, self.model_name, self.embedding_dimensions, inputs, embeddings)
     
     async def generate_embedding(self, text: str) -> List[float]:
         """
@@ -109,32 +237,29 @@ class SentenceTransformerEmbeddingsService:
         """
         self.cache_stats["total_requests"] += 1
         
+        # Add prefix for Nomic (search_query: for queries); the prefix is part
+        # of the cache key since query and document vectors differ
+        input_text = f"search_query: {text}"
+        
         # Check cache first
-        cached_embedding = self._get_from_cache(text)
+        [cached_embedding] = await self._get_many_from_cache([input_text])
         if cached_embedding:
             logger.debug(f"✅ Cache hit for text (length={len(text)})")
             return cached_embedding
         
-        # Load model if not loaded
-        self._load_model()
-        
         try:
             # Generate embedding locally (no API call!)
-            self.cache_stats["model_calls"] += 1
             logger.debug(f"🔄 Generating local embedding for text (length={len(text)})")
             
-            # Add prefix for Nomic (search_query: for queries)
-            input_text = f"search_query: {text}"
-            
-            # Encode returns numpy array, convert to list
-            embedding = self.model.encode(input_text, convert_to_tensor=False).tolist()
+            # Queries jump ahead of queued document chunks
+            [embedding] = await self._get_batcher().submit([input_text], query=True)
             
             # Validate embedding
             if not embedding or len(embedding) != self.embedding_dimensions:
                 raise ValueError(f"Invalid embedding dimensions: expected {self.embedding_dimensions}, got {len(embedding) if embedding else 0}")
             
             # Cache the result
-            self._save_to_cache(text, embedding)
+            await self._save_many_to_cache([input_text], [embedding])
             
             logger.debug(f"✅ Generated local embedding (dimensions={len(embedding)})")
             return embedding
@@ -157,38 +282,26 @@ class SentenceTransformerEmbeddingsService:
         if not texts:
             return []
         
-        # Load model if not loaded
-        self._load_model()
+        # Add prefix for Nomic (search_document: for documents)
+        inputs = [f"search_document: {text}" for text in texts]
         
-        # Check cache for all texts
-        embeddings = []
-        texts_to_process = []
-        text_indices = []
-        
-        for i, text in enumerate(texts):
-            cached = self._get_from_cache(text)
-            if cached:
-                embeddings.append(cached)
-            else:
-                embeddings.append(None)  # Placeholder
-                # Add prefix for Nomic (search_document: for documents)
-                texts_to_process.append(f"search_document: {text}")
-                text_indices.append(i)
+        # Check cache for all texts (one batch lookup)
+        embeddings = await self._get_many_from_cache(inputs)
+        text_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        texts_to_process = [inputs[i] for i in text_indices]
         
         # Process uncached texts in batch
         if texts_to_process:
             try:
                 logger.info(f"🔄 Batch processing {len(texts_to_process)} embeddings")
-                self.cache_stats["model_calls"] += 1
                 
-                # Batch encode is much faster than individual encodes
-                batch_embeddings = self.model.encode(texts_to_process, convert_to_tensor=False, show_progress_bar=False)
+                # Split into micro-batches on the worker thread, interleaved with queries
+                batch_embeddings = await self._get_batcher().submit(texts_to_process)
                 
                 # Store results and cache
-                for idx, embedding in zip(text_indices, batch_embeddings):
-                    embedding_list = embedding.tolist()
+                for idx, embedding_list in zip(text_indices, batch_embeddings):
                     embeddings[idx] = embedding_list
-                    self._save_to_cache(texts[idx], embedding_list)
+                await self._save_many_to_cache(texts_to_process, batch_embeddings)
                 
                 logger.info(f"✅ Batch processed {len(texts_to_process)} embeddings")
                 
@@ -208,8 +321,13 @@ class SentenceTransformerEmbeddingsService:
         stats = self.cache_stats.copy()
         
         if self.cache:
-            stats["cache_size"] = len(self.cache)
-            stats["cache_max_size"] = self.cache.maxsize
+            stats["cache_size"] = self.cache.size()
+            stats["cache_max_size"] = self.cache.max_entries
+            stats["store"] = self.cache.get_stats()
+        
+        if self._batcher is not None:
+            stats["backend"] = self.backend
+            stats["batcher"] = dict(self._batcher.stats)
         
         if stats["total_requests"] > 0:
             stats["cache_hit_rate"] = stats["hits"] / stats["total_requests"]
@@ -219,9 +337,9 @@ class SentenceTransformerEmbeddingsService:
         return stats
     
     def clear_cache(self):
-        """Clear the embedding cache"""
+        """Clear the in-process embedding cache (the persistent store is shared and kept)"""
         if self.cache:
-            self.cache.clear()
+            self.cache.clear_memory()
             logger.info("🗑️  Embedding cache cleared")
 
 
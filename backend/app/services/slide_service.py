@@ -8,6 +8,7 @@ Step 4: assemble_pptx()     — Design Engine builds the file with technical dia
 """
 
 import json
+import os
 import asyncio
 from typing import Optional, Callable, Dict, List, Any
 from app.services.multi_provider import MultiProviderService
@@ -15,6 +16,10 @@ from app.services.image_gen import ImageGenerationService
 from app.services.design_engine import DesignEngine
 from app.services.deep_research import ResearchTools
 
+# Upper bounds on in-flight LLM refinements and Pollinations fetches per deck
+SLIDE_REFINE_CONCURRENCY = int(os.environ.get("SLIDE_REFINE_CONCURRENCY", "4"))
+SLIDE_IMAGE_CONCURRENCY = int(os.environ.get("SLIDE_IMAGE_CONCURRENCY", "4"))
+
 # Phase 1: Premium Quality - Art Direction Styles
 ART_DIRECTION_STYLES = {
     "corporate": "Professional corporate vector illustration, minimalist, flat design, white background, unified color palette, clean lines. No text.",
@@ -370,136 +375,191 @@ EXAMPLE BAD SLIDE (DO NOT CREATE):
         Reports progress via on_progress callback (for SSE).
         Returns PPTX file as bytes.
 
-        Phase 1 Improvements:
-        - Contextual Memory: Pass previous slide summary to prevent repetition
-        - Global Art Direction: Wrap all image prompts with style definition
+        Slides are refined concurrently: each slide's "previous slide" memory
+        comes from the outline itself, so no slide waits on the one before it.
+        Image fetches start immediately (their prompts are already in the
+        outline) and overlap content refinement. Assembly runs in a worker
+        thread so the event loop stays free to deliver progress events.
         """
         # Phase 1: Reset context tracking for new presentation
         self._slide_context = []
 
-        total_slides = len(outline["slides"])
+        slides = outline["slides"]
+        total_slides = len(slides)
         theme = self.design.get_theme(outline.get("theme", "ocean_gradient"))
-        content_results = []
-        image_results = {}
 
-        # Step 2: Generate full content per slide (parallel where possible)
-        for i, slide in enumerate(outline["slides"]):
+        async def report(data: dict):
             if on_progress:
-                await on_progress({
-                    "step": "content",
-                    "current": i + 1,
-                    "total": total_slides,
-                    "message": f"Writing slide {i+1}: {slide['title']}"
-                })
-
-            # Phase 1: Get previous slide summary for contextual memory
-            prev_summary = None
-            if self._slide_context:
-                prev_summary = self._slide_context[-1]["summary"]
-
-            # Refine bullet points into fuller content with contextual memory
-            refined = await self._refine_slide_content(slide, outline["title"], prev_summary)
-            content_results.append(refined)
-        
-        # Step 2.5: Retry empty slides
-        for i, slide in enumerate(outline["slides"]):
-            refined = content_results[i]
-            # Check if slide is effectively empty
-            has_no_content = (
-                not refined.get("bullets") or 
-                len(refined.get("bullets", [])) == 0 or
-                all(not bullet.strip() for bullet in refined.get("bullets", []))
-            ) and not refined.get("chart_data") and not refined.get("mermaid_code")
-            
-            if has_no_content and slide.get("layout") != "title":
-                print(f"⚠️ Slide {i+1} is empty. Retrying content generation...")
-                if on_progress:
-                    await on_progress({
+                await on_progress(data)
+
+        # Step 3 (started first): Images via Pollinations with Global Art Direction Wrapper
+        image_jobs = []
+        if generate_images:
+            image_jobs = [(i, slide["image_prompt"]) for i, slide in enumerate(slides) if slide.get("image_prompt")]
+        image_semaphore = asyncio.Semaphore(SLIDE_IMAGE_CONCURRENCY)
+        images_done = 0
+
+        async def image_job(slide_idx: int, prompt: str):
+            nonlocal images_done
+            async with image_semaphore:
+                img_bytes = await self._fetch_slide_image(slide_idx, prompt, outline.get("vibe", "corporate"))
+            images_done += 1
+            await report({
+                "step": "images",
+                "current": images_done,
+                "total": len(image_jobs),
+                "message": f"Generating image {images_done}/{len(image_jobs)}"
+            })
+            return slide_idx, img_bytes
+
+        image_tasks = [asyncio.create_task(image_job(i, prompt)) for i, prompt in image_jobs]
+
+        # Step 2: Refine content per slide, bounded, with rolling context from the outline
+        summaries = self._outline_summaries(slides)
+        refine_semaphore = asyncio.Semaphore(SLIDE_REFINE_CONCURRENCY)
+        slides_done = 0
+
+        async def content_job(i: int, slide: dict) -> dict:
+            nonlocal slides_done
+            prev_summary = summaries[i - 1] if i > 0 else None
+            async with refine_semaphore:
+                refined = await self._refine_slide_content(slide, outline["title"], prev_summary)
+                # Step 2.5: Retry empty slides right away instead of after the whole deck
+                if self._is_empty_slide(refined) and slide.get("layout") != "title":
+                    print(f"⚠️ Slide {i+1} is empty. Retrying content generation...")
+                    await report({
                         "step": "content_retry",
                         "current": i + 1,
                         "total": total_slides,
                         "message": f"Retrying slide {i+1} (empty content detected)"
                     })
-                
-                # Force retry with stronger prompt
-                retry_slide = slide.copy()
-                retry_slide["title"] = slide["title"] + " (RETRY)"
-                prev_summary = self._slide_context[-1]["summary"] if self._slide_context else None
-                refined_retry = await self._refine_slide_content(retry_slide, outline["title"], prev_summary)
-                
-                # If retry succeeded, use it
-                if refined_retry.get("bullets") and len(refined_retry.get("bullets", [])) > 0:
-                    content_results[i] = refined_retry
-                    print(f"✅ Slide {i+1} retry successful")
-                else:
-                    print(f"❌ Slide {i+1} retry failed - will be removed during assembly")
-
-        # Step 3: Generate images via Pollinations with Global Art Direction Wrapper
-        if generate_images:
-            image_tasks = []
-            for i, slide in enumerate(outline["slides"]):
-                if slide.get("image_prompt"):
-                    image_tasks.append((i, slide["image_prompt"]))
-
-            for idx, (slide_idx, prompt) in enumerate(image_tasks):
-                if on_progress:
-                    await on_progress({
-                        "step": "images",
-                        "current": idx + 1,
-                        "total": len(image_tasks),
-                        "message": f"Generating image {idx+1}/{len(image_tasks)}"
-                    })
-
-                try:
-                    # Phase 1: Global Art Direction Wrapper
-                    # Wrap user prompt with strict style definition
-                    wrapped_prompt = self._wrap_image_prompt(prompt, outline.get("vibe", "corporate"))
-                    
-                    # BAN: Skip image generation for diagram/flowchart/text-heavy prompts
-                    # FLUX cannot generate readable text or logical diagrams
-                    if self._is_diagram_prompt(prompt):
-                        print(f"⚠️ Skipping image generation for slide {slide_idx}: Diagram/flowchart detected (FLUX cannot render text)")
-                        image_results[slide_idx] = None
-                        continue
-
-                    img_bytes = await self.image_gen.fetch_image_from_pollinations(
-                        prompt=wrapped_prompt,
-                        model="flux",
-                        width=1024,
-                        height=768,
-                        seed=42 + slide_idx
-                    )
-                    image_results[slide_idx] = img_bytes
-                except Exception as e:
-                    # Image failure is non-fatal — slide works without image
-                    print(f"⚠️ Image generation failed for slide {slide_idx}: {e}")
-                    image_results[slide_idx] = None
-
-        # Step 4: Assemble PPTX with Design Engine
-        if on_progress:
-            await on_progress({
-                "step": "assembly",
-                "current": total_slides,
+                    # Force retry with stronger prompt
+                    retry_slide = slide.copy()
+                    retry_slide["title"] = slide["title"] + " (RETRY)"
+                    refined_retry = await self._refine_slide_content(retry_slide, outline["title"], prev_summary)
+                    if refined_retry.get("bullets") and len(refined_retry.get("bullets", [])) > 0:
+                        refined = refined_retry
+                        print(f"✅ Slide {i+1} retry successful")
+                    else:
+                        print(f"❌ Slide {i+1} retry failed - will be removed during assembly")
+            slides_done += 1
+            await report({
+                "step": "content",
+                "current": slides_done,
                 "total": total_slides,
-                "message": "Assembling presentation..."
+                "message": f"Wrote slide {i+1}: {slide['title']}"
             })
+            return refined
 
-        pptx_bytes = self.design.assemble_pptx(
-            outline=outline,
-            content=content_results,
-            images=image_results,
-            theme=theme
+        try:
+            content_results = list(await asyncio.gather(
+                *(content_job(i, slide) for i, slide in enumerate(slides))
+            ))
+            image_results = dict(await asyncio.gather(*image_tasks))
+        finally:
+            for task in image_tasks:
+                task.cancel()
+
+        # Step 4: Assemble PPTX with Design Engine (off the event loop)
+        await report({
+            "step": "assembly",
+            "current": 0,
+            "total": total_slides,
+            "message": "Assembling presentation..."
+        })
+
+        pptx_bytes = await self._assemble_in_thread(outline, content_results, image_results, theme, report)
+
+        await report({
+            "step": "complete",
+            "current": total_slides,
+            "total": total_slides,
+            "message": "Presentation ready!"
+        })
+
+        return pptx_bytes
+
+    def _outline_summaries(self, slides: List[dict]) -> List[str]:
+        """One-line summary per outline slide, used as the next slide's contextual memory."""
+        summaries = []
+        for slide in slides:
+            takeaway = slide.get("subtitle_takeaway") or ""
+            if not takeaway:
+                supporting = slide.get("supporting_data") or []
+                bullets = [item.get("bullet", "") for item in supporting] if supporting else slide.get("bullets", [])
+                takeaway = next((b for b in bullets if b and b.strip()), "")
+            summaries.append(f"Slide '{slide.get('title', '')}': {takeaway[:200]}")
+        return summaries
+
+    @staticmethod
+    def _is_empty_slide(refined: dict) -> bool:
+        bullets = refined.get("bullets") or []
+        return (
+            all(not bullet.strip() for bullet in bullets)
+            and not refined.get("chart_data")
+            and not refined.get("mermaid_code")
         )
 
-        if on_progress:
-            await on_progress({
-                "step": "complete",
-                "current": total_slides,
-                "total": total_slides,
-                "message": "Presentation ready!"
+    async def _fetch_slide_image(self, slide_idx: int, prompt: str, vibe: str) -> Optional[bytes]:
+        """Fetch one slide image; failures and diagram prompts yield None."""
+        # BAN: Skip image generation for diagram/flowchart/text-heavy prompts
+        # FLUX cannot generate readable text or logical diagrams
+        if self._is_diagram_prompt(prompt):
+            print(f"⚠️ Skipping image generation for slide {slide_idx}: Diagram/flowchart detected (FLUX cannot render text)")
+            return None
+
+        try:
+            # Phase 1: Global Art Direction Wrapper
+            wrapped_prompt = self._wrap_image_prompt(prompt, vibe)
+            return await self.image_gen.fetch_image_from_pollinations(
+                prompt=wrapped_prompt,
+                model="flux",
+                width=1024,
+                height=768,
+                seed=42 + slide_idx
+            )
+        except Exception as e:
+            # Image failure is non-fatal — slide works without image
+            print(f"⚠️ Image generation failed for slide {slide_idx}: {e}")
+            return None
+
+    async def _assemble_in_thread(self, outline: dict, content: List, images: Dict,
+                                  theme: Dict, report: Callable) -> bytes:
+        """Run DesignEngine.assemble_pptx in a worker thread, relaying per-slide progress."""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def on_slide(built: int, total: int):
+            loop.call_soon_threadsafe(events.put_nowait, (built, total))
+
+        assembly = asyncio.ensure_future(asyncio.to_thread(
+            self.design.assemble_pptx,
+            outline=outline,
+            content=content,
+            images=images,
+            theme=theme,
+            on_slide=on_slide
+        ))
+
+        async def relay(built: int, total: int):
+            await report({
+                "step": "assembly",
+                "current": built,
+                "total": total,
+                "message": f"Assembling slide {built}/{total}"
             })
 
-        return pptx_bytes
+        while not assembly.done():
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({assembly, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                await relay(*getter.result())
+            else:
+                getter.cancel()
+        while not events.empty():
+            await relay(*events.get_nowait())
+
+        return assembly.result()
 
     def _wrap_image_prompt(self, prompt: str, vibe: str = "corporate") -> str:
         """
@@ -2,22 +2,50 @@
 Translation Service
 Handles background translation of messages to all supported languages
 Uses async background tasks to respect rate limits (1 req/s)
+
+Translations are requested in bulk so they do not eat the Mistral budget
+shared with chat and embeddings:
+
+- One structured-output (JSON) call returns every target language at once.
+- Short strings (titles, UI snippets) are packed together, many per call,
+  up to TRANSLATION_PACK_MAX_ITEMS and the output-token budget.
+- A translation memory keyed by (sha256(source language + text), target
+  language) is checked first - in process, then in the `translation_memory`
+  table - so repeated strings never reach the API.
+- TranslationBackfill translates existing rows page by page and stores its
+  cursor, so an interrupted backfill resumes where it stopped.
 """
 
 import asyncio
+import hashlib
 import json
 import logging
-from typing import Dict, Optional, List, Set
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, List, Sequence, Set, Tuple
 from uuid import UUID
 import httpx
 from supabase import Client
 
 from app.core.config import settings
 from app.core.database import async_db_execute
+from app.services.context_packer import count_tokens
 from app.utils.rate_limiter import mistral_limiter
 
 logger = logging.getLogger(__name__)
 
+TRANSLATION_MODEL = os.environ.get("TRANSLATION_MODEL", "mistral-large-latest")
+TRANSLATION_MAX_OUTPUT_TOKENS = int(os.environ.get("TRANSLATION_MAX_OUTPUT_TOKENS", "8000"))
+TRANSLATION_PACK_MAX_ITEMS = int(os.environ.get("TRANSLATION_PACK_MAX_ITEMS", "40"))
+TRANSLATION_PACK_MAX_TOKENS = int(os.environ.get("TRANSLATION_PACK_MAX_TOKENS", "200"))  # longer texts go alone
+TRANSLATION_MEMORY_CACHE_ENTRIES = int(os.environ.get("TRANSLATION_MEMORY_CACHE_ENTRIES", "4096"))
+TRANSLATION_BACKFILL_PAGE_SIZE = int(os.environ.get("TRANSLATION_BACKFILL_PAGE_SIZE", "50"))
+
+# Translations run longer than their source; also covers JSON keys and escaping
+_OUTPUT_TOKEN_FACTOR = 1.4
+_AUTO_SOURCE = "auto"
+
 # Bounded concurrency for translation tasks (critical for 2vCPU VPS)
 _translation_semaphore = asyncio.Semaphore(3)
 # Store task references to prevent GC and observe exceptions
@@ -36,6 +64,95 @@ LANGUAGE_NAMES = {
 }
 
 
+def _needs_translation(text: Optional[str]) -> bool:
+    return bool(text and text.strip() and "No response generated" not in text)
+
+
+class TranslationMemory:
+    """
+    Translations keyed by (source hash, target language).
+
+    Entries live in a shared in-process LRU and, when a db client is given,
+    in the `translation_memory` table (migration 019). Database errors are
+    logged and treated as misses, so a missing table only costs API calls.
+    """
+
+    _cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+    def __init__(self, db: Optional[Client] = None, cache_max_entries: int = TRANSLATION_MEMORY_CACHE_ENTRIES):
+        self.db = db
+        self.cache_max_entries = cache_max_entries
+
+    @staticmethod
+    def source_hash(text: str, source_language: str) -> str:
+        return hashlib.sha256(f"{source_language}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: Tuple[str, str], translation: str) -> None:
+        self._cache[key] = translation
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    async def get_many(self, hashes: Sequence[str], targets: Sequence[str]) -> Dict[Tuple[str, str], str]:
+        """Known translations for every (hash, target) pair that has one."""
+        found: Dict[Tuple[str, str], str] = {}
+        missing_hashes = set()
+        for h in hashes:
+            for target in targets:
+                translation = self._cache.get((h, target))
+                if translation is not None:
+                    self._cache.move_to_end((h, target))
+                    found[(h, target)] = translation
+                else:
+                    missing_hashes.add(h)
+
+        if self.db is None or not missing_hashes:
+            return found
+        try:
+            result = await async_db_execute(
+                lambda: self.db.table("translation_memory")
+                    .select("source_hash,target_language,translated_text")
+                    .in_("source_hash", list(missing_hashes))
+                    .in_("target_language", list(targets))
+                    .execute()
+            )
+        except Exception as e:
+            logger.warning(f"Translation memory lookup failed: {e}")
+            return found
+        for row in result.data or []:
+            key = (row["source_hash"], row["target_language"])
+            found[key] = row["translated_text"]
+            self._remember(key, row["translated_text"])
+        return found
+
+    async def put_many(self, entries: Dict[Tuple[str, str], str], source_language: str) -> None:
+        """Store new translations (keyed by (hash, target))."""
+        if not entries:
+            return
+        for key, translation in entries.items():
+            self._remember(key, translation)
+        if self.db is None:
+            return
+        rows = [
+            {
+                "source_hash": h,
+                "source_language": source_language,
+                "target_language": target,
+                "translated_text": translation,
+                "model": TRANSLATION_MODEL,
+            }
+            for (h, target), translation in entries.items()
+        ]
+        try:
+            await async_db_execute(
+                lambda: self.db.table("translation_memory")
+                    .upsert(rows, on_conflict="source_hash,target_language")
+                    .execute()
+            )
+        except Exception as e:
+            logger.warning(f"Translation memory write failed: {e}")
+
+
 class TranslationService:
     """Service for translating messages to all supported languages"""
     
@@ -43,6 +160,8 @@ class TranslationService:
         self.db = db
         self.mistral_api_key = settings.MISTRAL_API_KEY
         self.mistral_base_url = "https://api.mistral.ai/v1"
+        self.memory = TranslationMemory(db)
+        self.stats = {"memory_hits": 0, "api_calls": 0, "translated": 0}
     
     async def translate_text(self, text: str, target_language: str, source_language: str = 'en') -> Optional[str]:
         """
@@ -174,7 +293,7 @@ class TranslationService:
         exclude_source: bool = True
     ) -> Dict[str, str]:
         """
-        Translate text to all supported languages sequentially (rate limited)
+        Translate text to all supported languages in one structured call
         
         Args:
             text: Text to translate
@@ -184,17 +303,214 @@ class TranslationService:
         Returns:
             Dict mapping language codes to translations
         """
-        translations = {source_language: text}  # Original text
-        
-        target_languages = [lang for lang in SUPPORTED_LANGUAGES if lang != source_language]
-        
-        for target_lang in target_languages:
-            translated = await self.translate_text(text, target_lang, source_language)
-            if translated:
-                translations[target_lang] = translated
-            # Rate limiting is handled inside translate_text
-            
-        return translations
+        return (await self.translate_many([text], source_language))[0]
+
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source_language: Optional[str] = 'en',
+        targets: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Translate many texts into many languages with as few API calls as possible
+
+        Args:
+            texts: Texts to translate
+            source_language: Source language code, or None to let the model detect it
+            targets: Target language codes (default: all supported but the source)
+
+        Returns:
+            One dict per input text mapping language codes to translations
+            (the source language maps to the original text). Languages that
+            could not be translated are left out.
+        """
+        source = source_language or _AUTO_SOURCE
+        if targets is None:
+            targets = SUPPORTED_LANGUAGES
+        targets = [t for t in dict.fromkeys(targets) if t != source]
+
+        results: List[Dict[str, str]] = []
+        unique: Dict[str, str] = {}  # hash -> text
+        for text in texts:
+            result = {source_language: text} if source_language else {}
+            if not _needs_translation(text):
+                result.update({t: text for t in targets})
+            else:
+                unique.setdefault(TranslationMemory.source_hash(text, source), text)
+            results.append(result)
+
+        translations: Dict[Tuple[str, str], str] = {}
+        if unique and targets:
+            translations = await self.memory.get_many(list(unique), targets)
+            self.stats["memory_hits"] += len(translations)
+
+            missing = {
+                h: [t for t in targets if (h, t) not in translations]
+                for h in unique
+            }
+            missing = {h: langs for h, langs in missing.items() if langs}
+            if missing:
+                fresh = await self._translate_missing(
+                    {h: unique[h] for h in missing}, missing, source_language
+                )
+                await self.memory.put_many(fresh, source)
+                translations.update(fresh)
+
+        for text, result in zip(texts, results):
+            if _needs_translation(text):
+                h = TranslationMemory.source_hash(text, source)
+                for target in targets:
+                    if (h, target) in translations:
+                        result[target] = translations[(h, target)]
+        return results
+
+    def _plan_requests(
+        self, texts: Dict[str, str], missing: Dict[str, List[str]]
+    ) -> List[Tuple[List[str], List[str]]]:
+        """
+        Group (text, targets) work into requests: short texts that need the
+        same languages are packed together; long texts go alone, with their
+        languages split if all of them would not fit in one response.
+        """
+        requests: List[Tuple[List[str], List[str]]] = []
+        packs: Dict[Tuple[str, ...], List[Tuple[List[str], int]]] = {}
+        for h, langs in missing.items():
+            tokens = count_tokens(texts[h])
+            per_language = int(tokens * _OUTPUT_TOKEN_FACTOR) + 20
+            if tokens > TRANSLATION_PACK_MAX_TOKENS:
+                step = max(1, TRANSLATION_MAX_OUTPUT_TOKENS // per_language)
+                requests.extend(([h], langs[i:i + step]) for i in range(0, len(langs), step))
+                continue
+            cost = per_language * len(langs)
+            bins = packs.setdefault(tuple(langs), [])
+            if (not bins or len(bins[-1][0]) >= TRANSLATION_PACK_MAX_ITEMS
+                    or bins[-1][1] + cost > TRANSLATION_MAX_OUTPUT_TOKENS):
+                bins.append(([], 0))
+            hashes, used = bins[-1]
+            hashes.append(h)
+            bins[-1] = (hashes, used + cost)
+        for langs, bins in packs.items():
+            requests.extend((hashes, list(langs)) for hashes, _ in bins)
+        return requests
+
+    async def _translate_missing(
+        self, texts: Dict[str, str], missing: Dict[str, List[str]], source_language: Optional[str]
+    ) -> Dict[Tuple[str, str], str]:
+        """Call the API for everything the memory did not have."""
+        requests = self._plan_requests(texts, missing)
+        outcomes = await asyncio.gather(*(
+            self._translate_request([texts[h] for h in hashes], langs, source_language)
+            for hashes, langs in requests
+        ))
+
+        fresh: Dict[Tuple[str, str], str] = {}
+        retry: Dict[str, List[str]] = {}
+        for (hashes, langs), outcome in zip(requests, outcomes):
+            for i, h in enumerate(hashes):
+                for lang in langs:
+                    translated = outcome.get(i, {}).get(lang)
+                    if translated:
+                        fresh[(h, lang)] = translated
+                    elif len(hashes) > 1:
+                        retry.setdefault(h, []).append(lang)
+
+        # Items a packed response dropped or garbled get one request of their own
+        if retry:
+            retried = await asyncio.gather(*(
+                self._translate_request([texts[h]], langs, source_language)
+                for h, langs in retry.items()
+            ))
+            for (h, langs), outcome in zip(retry.items(), retried):
+                for lang in langs:
+                    translated = outcome.get(0, {}).get(lang)
+                    if translated:
+                        fresh[(h, lang)] = translated
+
+        self.stats["translated"] += len(fresh)
+        return fresh
+
+    async def _translate_request(
+        self, texts: List[str], targets: List[str], source_language: Optional[str]
+    ) -> Dict[int, Dict[str, str]]:
+        """One structured-output call: every text into every target language."""
+        if not self.mistral_api_key:
+            logger.warning("Translation skipped: No Mistral API key")
+            return {}
+
+        source_name = LANGUAGE_NAMES.get(source_language, source_language) if source_language else "the language it is written in"
+        languages = ", ".join(f'"{t}" ({LANGUAGE_NAMES.get(t, t)})' for t in targets)
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    f"You are a professional medical translator. Translate each text from {source_name} "
+                    f"into each of these languages: {languages}. Preserve all formatting, markdown, "
+                    "special characters and medical accuracy exactly. The input is a JSON object mapping "
+                    "ids to texts. Respond with a JSON object mapping each id to an object whose keys are "
+                    "exactly the language codes above and whose values are the translations. "
+                    "Output only the JSON."
+                ),
+            },
+            {
+                "role": "user",
+                "content": json.dumps({str(i): text for i, text in enumerate(texts)}, ensure_ascii=False),
+            },
+        ]
+        max_tokens = min(
+            TRANSLATION_MAX_OUTPUT_TOKENS,
+            int(sum(count_tokens(t) for t in texts) * len(targets) * _OUTPUT_TOKEN_FACTOR) + 50 * len(texts) + 100,
+        )
+        parsed = await self._complete_json(messages, max_tokens)
+        if not isinstance(parsed, dict):
+            return {}
+
+        outcome: Dict[int, Dict[str, str]] = {}
+        for key, value in parsed.items():
+            if not isinstance(value, dict) or not str(key).isdigit() or int(key) >= len(texts):
+                continue
+            outcome[int(key)] = {
+                lang: text for lang, text in value.items()
+                if lang in targets and isinstance(text, str) and text.strip()
+            }
+        return outcome
+
+    async def _complete_json(self, messages: List[Dict[str, str]], max_tokens: int) -> Optional[Any]:
+        """Run a JSON-mode chat completion and return the parsed object."""
+        try:
+            # Wait for rate limiter
+            await mistral_limiter.wait_for_slot()
+            self.stats["api_calls"] += 1
+
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                response = await client.post(
+                    f"{self.mistral_base_url}/chat/completions",
+                    headers={
+                        "Authorization": f"Bearer {self.mistral_api_key}",
+                        "Content-Type": "application/json"
+                    },
+                    json={
+                        "model": TRANSLATION_MODEL,
+                        "messages": messages,
+                        "temperature": 0.1,
+                        "max_tokens": max_tokens,
+                        "response_format": {"type": "json_object"},
+                    }
+                )
+
+            if response.status_code != 200:
+                logger.error(f"Translation API error: {response.status_code}")
+                return None
+            result = response.json()
+            if not result.get("choices"):
+                return None
+            return json.loads(result["choices"][0]["message"]["content"])
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Translation response was not valid JSON: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Translation error: {e}")
+            return None
     
     async def queue_message_translation(
         self,
@@ -223,10 +539,9 @@ class TranslationService:
                 translations = await self.translate_to_all_languages(content, source_language)
                 
                 msg_id = str(message_id)
-                translations_json = json.dumps(translations)
                 await async_db_execute(
                     lambda: self.db.table("messages").update({
-                        "translations": translations_json
+                        "translations": translations
                     }).eq("id", msg_id).execute()
                 )
                 
@@ -262,10 +577,9 @@ class TranslationService:
                 translations = await self.translate_to_all_languages(title, source_language)
                 
                 conv_id = str(conversation_id)
-                translations_json = json.dumps(translations)
                 await async_db_execute(
                     lambda: self.db.table("conversations").update({
-                        "title_translations": translations_json
+                        "title_translations": translations
                     }).eq("id", conv_id).execute()
                 )
                 
@@ -301,3 +615,95 @@ class TranslationService:
         except Exception as e:
             logger.error(f"Error getting message translation: {e}")
             return None
+
+
+class TranslationBackfill:
+    """
+    Resumable bulk translation of existing messages and conversation titles.
+
+    Untranslated rows are read in id order, a page at a time. Each page goes
+    through translate_many (so short strings are packed and the translation
+    memory is reused), and the cursor is saved to
+    `translation_backfill_progress` after every page. Running the job again
+    continues after the last saved id; reset=True starts from the beginning
+    (e.g. to retry rows that failed).
+    """
+
+    JOBS = {
+        "messages": ("messages", "content", "translations"),
+        "titles": ("conversations", "title", "title_translations"),
+    }
+
+    def __init__(self, service: TranslationService, page_size: int = TRANSLATION_BACKFILL_PAGE_SIZE,
+                 source_language: str = 'en'):
+        self.service = service
+        self.db = service.db
+        self.page_size = page_size
+        self.source_language = source_language
+
+    async def _load_progress(self, job: str) -> Dict[str, Any]:
+        result = await async_db_execute(
+            lambda: self.db.table("translation_backfill_progress").select("*").eq("job", job).execute()
+        )
+        if result.data:
+            return dict(result.data[0])
+        return {"job": job, "last_id": None, "processed": 0, "failed": 0, "status": "running"}
+
+    async def _save_progress(self, progress: Dict[str, Any]) -> None:
+        progress["updated_at"] = datetime.utcnow().isoformat()
+        await async_db_execute(
+            lambda: self.db.table("translation_backfill_progress")
+                .upsert(progress, on_conflict="job")
+                .execute()
+        )
+
+    async def run(self, job: str, reset: bool = False, max_pages: Optional[int] = None) -> Dict[str, Any]:
+        """Translate untranslated rows of `job` ("messages" or "titles") and return its progress."""
+        table, text_column, translations_column = self.JOBS[job]
+        if reset:
+            progress = {"job": job, "last_id": None, "processed": 0, "failed": 0}
+        else:
+            progress = await self._load_progress(job)
+        progress["status"] = "running"
+        pages = 0
+
+        while max_pages is None or pages < max_pages:
+            last_id = progress.get("last_id")
+
+            def fetch_page():
+                query = self.db.table(table).select(f"id,{text_column}").is_(translations_column, "null")
+                if last_id:
+                    query = query.gt("id", last_id)
+                return query.order("id").limit(self.page_size).execute()
+
+            rows = (await async_db_execute(fetch_page)).data or []
+            if not rows:
+                progress["status"] = "done"
+                await self._save_progress(progress)
+                break
+
+            texts = [row.get(text_column) or "" for row in rows]
+            results = await self.service.translate_many(texts, self.source_language)
+
+            updates = []
+            for row, translations in zip(rows, results):
+                if len(translations) < len(SUPPORTED_LANGUAGES):
+                    # Left untranslated; picked up again by a reset run
+                    progress["failed"] += 1
+                    continue
+                row_id = row["id"]
+                updates.append(async_db_execute(
+                    lambda row_id=row_id, translations=translations: self.db.table(table)
+                        .update({translations_column: translations})
+                        .eq("id", row_id)
+                        .execute()
+                ))
+            await asyncio.gather(*updates)
+
+            progress["last_id"] = rows[-1]["id"]
+            progress["processed"] += len(rows)
+            await self._save_progress(progress)
+            pages += 1
+            logger.info(f"Translation backfill '{job}': {progress['processed']} rows ({progress['failed']} failed)")
+
+        return progress
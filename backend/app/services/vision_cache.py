@@ -0,0 +1,195 @@
+"""
+Vision Description Cache
+
+Content-addressed store for VLM image descriptions used by the hybrid
+PDF/PPTX pipeline. Re-uploading the same lecture deck, or decks that share
+figures, resolves descriptions locally instead of paying for another
+vision call.
+
+- Key: SHA-256 of the normalized image payload (the RGB, <=1280px JPEG
+  actually sent to the model) plus the prompt version
+- Storage: SQLite file, so entries survive restarts
+- Eviction: least-recently-used rows beyond VISION_CACHE_MAX_ENTRIES
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = str(
+    Path(__file__).resolve().parents[2] / ".cache" / "vision_descriptions.sqlite"
+)
+
+
+def prompt_version(model: str, prompt: str) -> str:
+    """Short fingerprint of the model + prompt that produced a description."""
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+def image_key(payload: str, version: str) -> str:
+    """Content hash for a normalized (base64 JPEG) image payload."""
+    digest = hashlib.sha256(version.encode("utf-8"))
+    digest.update(payload.encode("ascii"))
+    return digest.hexdigest()
+
+
+class VisionDescriptionCache:
+    """
+    Persistent, size-bounded cache of image descriptions.
+
+    Features:
+    - SQLite backing file (WAL mode) shared by all workers on the host
+    - LRU eviction by last access time
+    - Hit/miss counters for upload stats
+    - Degrades to a no-op if the database can't be opened
+    """
+
+    MAX_ENTRIES = int(os.environ.get("VISION_CACHE_MAX_ENTRIES", "20000"))
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or os.environ.get("VISION_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the database lazily on first use."""
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions ("
+                "key TEXT PRIMARY KEY, "
+                "description TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_descriptions_last_used "
+                "ON descriptions (last_used)"
+            )
+            conn.commit()
+            self._conn = conn
+        except Exception as e:
+            logger.warning(f"⚠️ Vision cache unavailable ({self.path}): {e}")
+            self._disabled = True
+        return self._conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """
+        Look up descriptions for the given keys and bump their access time.
+
+        Args:
+            keys: Image content keys
+
+        Returns:
+            Dict of key -> description for the keys that were found
+        """
+        unique = list(dict.fromkeys(keys))
+        if not unique:
+            return {}
+
+        found: Dict[str, str] = {}
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                try:
+                    # SQLite caps bound parameters; look up in slices
+                    for i in range(0, len(unique), 500):
+                        chunk = unique[i:i + 500]
+                        placeholders = ",".join("?" * len(chunk))
+                        rows = conn.execute(
+                            f"SELECT key, description FROM descriptions WHERE key IN ({placeholders})",
+                            chunk,
+                        ).fetchall()
+                        found.update(rows)
+                    if found:
+                        now = time.time()
+                        conn.executemany(
+                            "UPDATE descriptions SET last_used = ? WHERE key = ?",
+                            [(now, key) for key in found],
+                        )
+                        conn.commit()
+                except Exception as e:
+                    logger.warning(f"⚠️ Vision cache read failed: {e}")
+                    found = {}
+
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(unique) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a single description."""
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, description: str):
+        """Store a description and evict the oldest rows past the size bound."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                now = time.time()
+                conn.execute(
+                    "INSERT OR REPLACE INTO descriptions (key, description, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, description, now, now),
+                )
+                self.stats["stores"] += 1
+
+                (count,) = conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM descriptions WHERE key IN ("
+                        "SELECT key FROM descriptions ORDER BY last_used ASC LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.stats["evictions"] += overflow
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Vision cache write failed: {e}")
+
+    def size(self) -> int:
+        """Number of cached descriptions."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            try:
+                return conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+            except Exception:
+                return 0
+
+    def get_stats(self) -> Dict[str, float]:
+        """Counters plus overall hit rate."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": self.size(),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self):
+        """Close the database connection (called on application shutdown)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Singleton instance
+vision_cache = VisionDescriptionCache()
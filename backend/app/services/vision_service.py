@@ -12,7 +12,10 @@ import subprocess
 import tempfile
 import logging
 import asyncio
+import threading
 import time as _time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from typing import List, Any, Dict, Tuple, Optional
 
 try:
@@ -30,6 +33,8 @@ except ImportError:
 
 import httpx
 
+from app.services.vision_cache import vision_cache, prompt_version, image_key
+
 logger = logging.getLogger(__name__)
 
 # --- CONFIGURATION ---
@@ -60,15 +65,27 @@ If it's a chemical structure: describe the molecular structure.
 If it's a table: convert to Markdown table format.
 If it's a diagram: describe all components and relationships."""
 
+# Cached descriptions are only reused for the same model + prompt
+PROMPT_VERSION = prompt_version(VISION_MODEL, IMAGE_DESCRIPTION_PROMPT)
+
 # ============================================================
 # PUBLIC API — Called by smart_loader.py
 # ============================================================
 
 async def process_pdf_hybrid(
     content: bytes, filename: str, user_prompt: str, api_key: str,
-    mode: str = "detailed", chunk_callback: Any = None
+    mode: str = "detailed", chunk_callback: Any = None,
+    stats: Optional[Dict[str, Any]] = None
 ) -> str:
-    """Hybrid PDF processing: text extraction + VLM only for images."""
+    """
+    Hybrid PDF processing: text extraction + VLM only for images.
+
+    Page ranges are extracted in worker processes; each range's images are
+    sent to the VLM as soon as that range finishes, so vision calls overlap
+    with extraction of the rest of the document.
+
+    If ``stats`` is given it is filled with VLM image / cache-hit counts.
+    """
     t0 = _time.time()
     logger.info(f"📄 [Hybrid PDF] Processing {filename}...")
 
@@ -76,91 +93,53 @@ async def process_pdf_hybrid(
         logger.warning("⚠️ PyMuPDF not available, falling back to full-vision pipeline")
         return await process_visual_document(content, filename, user_prompt, api_key, mode, chunk_callback)
 
-    doc = fitz.open(stream=content, filetype="pdf")
-    pages_content = []
-    images_to_analyze = []  # List of (page_idx, image_bytes, context_label, xref)
-    seen_xrefs = set()  # Deduplicate repeated images (templates)
-    xref_page_count = {}  # Track how many pages each image appears on
-
     t_extract = _time.time()
-    for page_idx in range(len(doc)):
-        page = doc[page_idx]
-        text = page.get_text("text").strip()
-
-        # Extract embedded images from this page (deduplicate by xref)
-        page_images = page.get_images(full=True)
-        for img_idx, img_info in enumerate(page_images):
-            try:
-                xref = img_info[0]
-                if xref in seen_xrefs:
-                    # Track how many pages this image appears on (for template detection)
-                    xref_page_count[xref] = xref_page_count.get(xref, 1) + 1
+    total_pages, assignments, template_count = await asyncio.to_thread(_plan_pdf_images, content)
+    if template_count:
+        logger.info(f"📊 Filtered {template_count} template images (appeared on >50% of pages)")
+
+    pages_content = []
+    semaphore = asyncio.Semaphore(VISION_CONCURRENCY)
+    vision_tasks = []
+    range_stats = []
+    queued = 0
+    skipped = 0
+
+    async for range_pages in _extract_pdf_pages(content, total_pages, assignments):
+        items, encoded = [], []
+        for page in range_pages:
+            if page["text"] is not None:
+                pages_content.append((page["page"], page["text"]))
+            for label, b64 in page["images"]:
+                # Cap images to avoid excessive VLM calls
+                if queued >= MAX_IMAGES_PER_DOC:
+                    skipped += 1
                     continue
-                seen_xrefs.add(xref)
-                xref_page_count[xref] = 1
-                
-                img_data = doc.extract_image(xref)
-                if img_data and img_data.get("image"):
-                    img_bytes = img_data["image"]
-                    if len(img_bytes) > MIN_IMAGE_BYTES:
-                        w = img_data.get("width", 0)
-                        h = img_data.get("height", 0)
-                        if w >= MIN_IMAGE_DIM and h >= MIN_IMAGE_DIM:
-                            images_to_analyze.append((
-                                page_idx,
-                                img_bytes,
-                                f"Page {page_idx+1}, Image {img_idx+1}",
-                                xref
-                            ))
-            except Exception as e:
-                logger.debug(f"Could not extract image from page {page_idx+1}: {e}")
-
-        if len(text) >= MIN_TEXT_CHARS:
-            # Text-rich page — use extracted text directly
-            pages_content.append((page_idx, f"## Page {page_idx+1}\n{text}"))
-            logger.debug(f"📝 Page {page_idx+1}: text extraction ({len(text)} chars)")
-        else:
-            # Scanned/image-only page — render to image for VLM
-            logger.debug(f"👁️ Page {page_idx+1}: scanned page, queuing for VLM")
-            try:
-                pix = page.get_pixmap(dpi=150)
-                img_bytes = pix.tobytes("jpeg")
-                # Use None for xref since this is a full-page render, not an embedded image
-                images_to_analyze.append((page_idx, img_bytes, f"Page {page_idx+1} (full page scan)", None))
-            except Exception as e:
-                logger.error(f"Could not render page {page_idx+1}: {e}")
-                pages_content.append((page_idx, f"## Page {page_idx+1}\n[Could not extract content]"))
-
-    # Filter out template images (appear on >50% of pages = likely decoration)
-    total_pages = len(doc)
-    doc.close()
-    
-    if images_to_analyze:
-        before_filter = len(images_to_analyze)
-        images_to_analyze = [
-            img for img in images_to_analyze
-            # Keep if: no xref (full page scan) OR xref appears on <50% of pages
-            if img[3] is None or xref_page_count.get(img[3], 1) < total_pages * 0.5
-        ]
-        if len(images_to_analyze) < before_filter:
-            logger.info(f"📊 Filtered {before_filter - len(images_to_analyze)} template images (appeared on >50% of pages)")
-    
-    t_extract_done = _time.time()
-    # Cap images to avoid excessive VLM calls
-    if len(images_to_analyze) > MAX_IMAGES_PER_DOC:
-        logger.info(f"📊 Capping images from {len(images_to_analyze)} to {MAX_IMAGES_PER_DOC}")
-        # Keep the largest images (most likely to be charts/diagrams)
-        images_to_analyze.sort(key=lambda x: len(x[1]), reverse=True)
-        images_to_analyze = images_to_analyze[:MAX_IMAGES_PER_DOC]
+                items.append((page["page"], None, label))
+                encoded.append(b64)
+                queued += 1
 
+        if items:
+            batch_stats = {}
+            range_stats.append(batch_stats)
+            vision_tasks.append(asyncio.create_task(
+                _batch_vision_analyze(items, pre_encoded=encoded, stats=batch_stats, semaphore=semaphore)
+            ))
+
+    t_extract_done = _time.time()
+    if skipped:
+        logger.info(f"📊 Capping images from {queued + skipped} to {MAX_IMAGES_PER_DOC}")
     logger.info(f"⏱️ [Hybrid PDF] Text extraction: {t_extract_done - t_extract:.1f}s, "
-                f"{len(pages_content)} text pages, {len(images_to_analyze)} images queued")
+                f"{len(pages_content)} text pages, {queued} images queued")
 
-    # Send only queued images to VLM
+    # Collect VLM results (ranges started as soon as their pages were extracted)
     image_descriptions = {}
-    if images_to_analyze:
-        image_descriptions = await _batch_vision_analyze(images_to_analyze)
+    for batch in await asyncio.gather(*vision_tasks):
+        image_descriptions.update(batch)
+    if vision_tasks:
         logger.info(f"📊 [Hybrid PDF] VLM returned {len(image_descriptions)} image descriptions")
+    if stats is not None and range_stats:
+        stats.update(_merge_vision_stats(range_stats))
 
     # Combine text pages + image descriptions, sorted by page order
     all_content = list(pages_content)
@@ -173,16 +152,16 @@ async def process_pdf_hybrid(
     # Log warning if no content extracted
     if not full_text.strip():
         logger.error(f"❌ [Hybrid PDF] {filename}: No content extracted! "
-                    f"Text pages: {len(pages_content)}, Images analyzed: {len(images_to_analyze)}, "
+                    f"Text pages: {len(pages_content)}, Images analyzed: {queued}, "
                     f"Image descriptions: {len(image_descriptions)}")
         # Return a placeholder to avoid 0 chunks
         return f"[PDF Processing Error: Could not extract content from {filename}. " \
                f"This may be a scanned/image-based PDF that requires OCR. " \
-               f"Pages: {total_pages}, Text pages: {len(pages_content)}, Images: {len(images_to_analyze)}]"
+               f"Pages: {total_pages}, Text pages: {len(pages_content)}, Images: {queued}]"
 
     t_done = _time.time()
     logger.info(f"⏱️ [Hybrid PDF] Total: {t_done - t0:.1f}s (extract={t_extract_done - t_extract:.1f}s, "
-                f"vision={t_done - t_extract_done:.1f}s for {len(images_to_analyze)} images), "
+                f"vision={t_done - t_extract_done:.1f}s for {queued} images), "
                 f"extracted {len(full_text)} chars")
 
     return full_text
@@ -190,9 +169,14 @@ async def process_pdf_hybrid(
 
 async def process_pptx_hybrid(
     content: bytes, filename: str, user_prompt: str, api_key: str,
-    mode: str = "detailed", chunk_callback: Any = None
+    mode: str = "detailed", chunk_callback: Any = None,
+    stats: Optional[Dict[str, Any]] = None
 ) -> str:
-    """Hybrid PPTX processing: text from python-pptx + VLM for embedded images."""
+    """
+    Hybrid PPTX processing: text from python-pptx + VLM for embedded images.
+
+    If ``stats`` is given it is filled with VLM image / cache-hit counts.
+    """
     t0 = _time.time()
     logger.info(f"📄 [Hybrid PPTX] Processing {filename}...")
 
@@ -260,7 +244,7 @@ async def process_pptx_hybrid(
     # Send images to VLM
     image_descriptions = {}
     if images_to_analyze:
-        image_descriptions = await _batch_vision_analyze(images_to_analyze)
+        image_descriptions = await _batch_vision_analyze(images_to_analyze, stats=stats)
 
     # Combine slide text + image descriptions
     all_content = list(slides_content)
@@ -321,6 +305,218 @@ async def process_visual_document(
     return full_text
 
 
+# ============================================================
+# PAGE-PARALLEL PDF EXTRACTION
+# ============================================================
+
+PDF_PAGES_PER_RANGE = int(os.environ.get("PDF_PAGES_PER_RANGE", "16"))
+PDF_PROCESS_THRESHOLD_PAGES = int(os.environ.get("PDF_PROCESS_THRESHOLD_PAGES", "24"))
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Lazily start the extraction pool on the first large PDF."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+    return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    """Stop the extraction pool (called on application shutdown)."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+
+def _plan_pdf_images(content: bytes) -> Tuple[int, Dict[int, List[Tuple[int, int]]], int]:
+    """
+    Cheap metadata pass deciding which embedded images get described.
+
+    Reads only the image tables (no decoding): deduplicates by xref, drops
+    small and template images, and keeps the largest MAX_IMAGES_PER_DOC by
+    pixel area. Each kept image is owned by the first page it appears on.
+
+    Returns:
+        (total_pages, {page_idx: [(img_idx, xref), ...]}, template_count)
+    """
+    doc = fitz.open(stream=content, filetype="pdf")
+    try:
+        total_pages = len(doc)
+        first_seen = {}  # xref -> (page_idx, img_idx, width, height)
+        xref_page_count = {}
+        for page_idx in range(total_pages):
+            for img_idx, img_info in enumerate(doc.get_page_images(page_idx, full=True)):
+                xref = img_info[0]
+                xref_page_count[xref] = xref_page_count.get(xref, 0) + 1
+                if xref not in first_seen:
+                    first_seen[xref] = (page_idx, img_idx, img_info[2], img_info[3])
+    finally:
+        doc.close()
+
+    candidates = []
+    template_count = 0
+    for xref, (page_idx, img_idx, w, h) in first_seen.items():
+        if w < MIN_IMAGE_DIM or h < MIN_IMAGE_DIM:
+            continue
+        count = xref_page_count[xref]
+        # Repeated on >50% of pages = likely decoration (logos, backgrounds)
+        if count > 1 and count >= total_pages * 0.5:
+            template_count += 1
+            continue
+        candidates.append((w * h, page_idx, img_idx, xref))
+
+    # Keep the largest images (most likely to be charts/diagrams)
+    candidates.sort(reverse=True)
+    assignments: Dict[int, List[Tuple[int, int]]] = {}
+    for _, page_idx, img_idx, xref in candidates[:MAX_IMAGES_PER_DOC]:
+        assignments.setdefault(page_idx, []).append((img_idx, xref))
+    for page_images in assignments.values():
+        page_images.sort()
+
+    return total_pages, assignments, template_count
+
+
+def _extract_page_range(
+    source: Any, start: int, end: int,
+    assignments: Dict[int, List[Tuple[int, int]]]
+) -> List[Dict[str, Any]]:
+    """
+    Extract text and VLM-ready image payloads for pages [start, end).
+
+    Module-level so it can be pickled into process-pool workers. ``source``
+    is either the PDF bytes or a (shared-memory name, size) pair, in which
+    case the document is opened directly from the shared buffer.
+
+    Returns:
+        One dict per page: {"page", "text", "images": [(label, b64), ...]}
+    """
+    shm = view = None
+    if isinstance(source, tuple):
+        shm_name, size = source
+        shm = shared_memory.SharedMemory(name=shm_name)
+        view = shm.buf[:size]
+        doc = fitz.open(stream=view, filetype="pdf")
+    else:
+        doc = fitz.open(stream=source, filetype="pdf")
+
+    pages = []
+    try:
+        for page_idx in range(start, end):
+            page = doc[page_idx]
+            text = page.get_text("text").strip()
+            entry = {"page": page_idx, "text": None, "images": []}
+
+            for img_idx, xref in assignments.get(page_idx, []):
+                try:
+                    img_data = doc.extract_image(xref)
+                    img_bytes = img_data.get("image") if img_data else None
+                    if img_bytes and len(img_bytes) > MIN_IMAGE_BYTES and Image:
+                        b64 = _optimize_and_encode(Image.open(io.BytesIO(img_bytes)))
+                        if b64:
+                            entry["images"].append((f"Page {page_idx+1}, Image {img_idx+1}", b64))
+                except Exception as e:
+                    logger.debug(f"Could not extract image from page {page_idx+1}: {e}")
+
+            if len(text) >= MIN_TEXT_CHARS:
+                # Text-rich page — use extracted text directly
+                entry["text"] = f"## Page {page_idx+1}\n{text}"
+            else:
+                # Scanned/image-only page — render to image for VLM
+                try:
+                    pix = page.get_pixmap(dpi=150)
+                    b64 = _optimize_and_encode(Image.open(io.BytesIO(pix.tobytes("jpeg")))) if Image else ""
+                    if not b64:
+                        raise ValueError("Pillow unavailable for page render")
+                    entry["images"].append((f"Page {page_idx+1} (full page scan)", b64))
+                except Exception as e:
+                    logger.error(f"Could not render page {page_idx+1}: {e}")
+                    entry["text"] = f"## Page {page_idx+1}\n[Could not extract content]"
+
+            pages.append(entry)
+    finally:
+        doc.close()
+        if shm is not None:
+            view.release()
+            shm.close()
+    return pages
+
+
+async def _extract_pdf_pages(
+    content: bytes, total_pages: int,
+    assignments: Dict[int, List[Tuple[int, int]]]
+):
+    """
+    Yield extracted page ranges as they complete.
+
+    Small documents run in a single thread. Larger ones are split into
+    PDF_PAGES_PER_RANGE-page ranges across the process pool, with the PDF
+    placed once in shared memory rather than pickled to every worker.
+    """
+    ranges = [
+        (start, min(start + PDF_PAGES_PER_RANGE, total_pages))
+        for start in range(0, total_pages, PDF_PAGES_PER_RANGE)
+    ]
+    if total_pages < PDF_PROCESS_THRESHOLD_PAGES or len(ranges) < 2:
+        yield await asyncio.to_thread(_extract_page_range, content, 0, total_pages, assignments)
+        return
+
+    def owned(start, end):
+        return {p: assignments[p] for p in range(start, end) if p in assignments}
+
+    done = set()
+    futures = []
+    shm = None
+    try:
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=len(content))
+            shm.buf[:len(content)] = content
+            loop = asyncio.get_running_loop()
+            pool = _get_pdf_pool()
+            futures = {
+                loop.run_in_executor(
+                    pool, _extract_page_range, (shm.name, len(content)), start, end, owned(start, end)
+                ): (start, end)
+                for start, end in ranges
+            }
+            pending = set(futures)
+            while pending:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in finished:
+                    pages = fut.result()
+                    done.add(futures[fut])
+                    yield pages
+        except Exception as e:
+            logger.warning(f"⚠️ PDF extraction pool failed, using thread: {e}")
+            # Drop a broken pool so the next large PDF starts a fresh one
+            shutdown_pdf_pool()
+            for start, end in ranges:
+                if (start, end) not in done:
+                    yield await asyncio.to_thread(_extract_page_range, content, start, end, owned(start, end))
+    finally:
+        for fut in futures:
+            fut.cancel()
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+def _merge_vision_stats(batches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum per-batch VLM stats into one upload-level summary."""
+    merged = {"images": 0, "cache_hits": 0, "vlm_calls": 0}
+    for batch in batches:
+        for key in merged:
+            merged[key] += batch.get(key, 0)
+    merged["cache_hit_rate"] = round(merged["cache_hits"] / merged["images"], 3) if merged["images"] else 0.0
+    return merged
+
+
 # ============================================================
 # SHARED VLM CALLER
 # ============================================================
@@ -328,15 +524,23 @@ async def process_visual_document(
 async def _batch_vision_analyze(
     items: List[Tuple[int, Optional[bytes], str]],
     pre_encoded: List[str] = None,
-    api_key: str = None
+    api_key: str = None,
+    stats: Optional[Dict[str, Any]] = None,
+    semaphore: Optional[asyncio.Semaphore] = None
 ) -> Dict[int, str]:
     """
     Analyze multiple images via VLM with concurrency control.
 
+    Descriptions are looked up in the content-addressed vision cache before
+    any request is queued, and identical images within a batch share a
+    single VLM call.
+
     Args:
         items: List of (page_idx, image_bytes, label). image_bytes can be None if pre_encoded.
         pre_encoded: Optional list of pre-encoded base64 strings (same length as items).
         api_key: Optional API key (uses global MISTRAL_API_KEY if not provided).
+        stats: Optional dict that receives image / cache-hit / VLM-call counts.
+        semaphore: Optional shared limiter when several batches run concurrently.
 
     Returns:
         Dict mapping page_idx -> description text
@@ -347,12 +551,32 @@ async def _batch_vision_analyze(
     # Use provided API key or fall back to global
     effective_api_key = api_key or MISTRAL_API_KEY
 
-    semaphore = asyncio.Semaphore(VISION_CONCURRENCY)
+    semaphore = semaphore or asyncio.Semaphore(VISION_CONCURRENCY)
     results = {}
 
-    if not effective_api_key:
+    # Normalize + hash off the event loop, then resolve cache hits up front
+    payloads = await asyncio.to_thread(_encode_items, items, pre_encoded)
+    keys = [image_key(b64, PROMPT_VERSION) if b64 else None for b64 in payloads]
+    cached = await asyncio.to_thread(vision_cache.get_many, [k for k in keys if k])
+
+    pending = {}  # key -> (b64, first label) for images the VLM still has to see
+    for key, b64, item in zip(keys, payloads, items):
+        if key and key not in cached and key not in pending:
+            pending[key] = (b64, item[2])
+
+    cache_hits = sum(1 for k in keys if k and k in cached)
+    if stats is not None:
+        stats.update({
+            "images": len(items),
+            "cache_hits": cache_hits,
+            "vlm_calls": len(pending) if effective_api_key else 0,
+            "cache_hit_rate": round(cache_hits / len(items), 3),
+        })
+
+    if pending and not effective_api_key:
         logger.error("❌ MISTRAL_API_KEY not set — cannot analyze images")
-        return {}
+        if not cached:
+            return {}
 
     headers = {
         "Authorization": f"Bearer {effective_api_key}",
@@ -360,19 +584,8 @@ async def _batch_vision_analyze(
         "Accept": "application/json"
     }
 
-    async def analyze_single(idx, item_idx, label, http_client):
-        b64 = None
-        if pre_encoded and item_idx < len(pre_encoded):
-            b64 = pre_encoded[item_idx]
-        else:
-            img_bytes = items[item_idx][1]
-            if img_bytes and Image:
-                img = Image.open(io.BytesIO(img_bytes))
-                b64 = _optimize_and_encode(img)
-
-        if not b64:
-            return idx, f"[Could not encode image for {label}]"
-
+    async def describe(key, b64, label, http_client):
+        """Call the VLM for one unique image; returns (description, error)."""
         async with semaphore:
             max_retries = 3
             for attempt in range(max_retries):
@@ -396,7 +609,8 @@ async def _batch_vision_analyze(
                         data = resp.json()
                         desc = data['choices'][0]['message']['content']
                         logger.info(f"✅ {label}: {len(desc)} chars")
-                        return idx, f"### {label}\n{desc}"
+                        await asyncio.to_thread(vision_cache.put, key, desc)
+                        return key, desc, None
 
                     elif resp.status_code == 429:
                         wait = 2 ** (attempt + 1)
@@ -405,28 +619,41 @@ async def _batch_vision_analyze(
                         continue
                     else:
                         logger.error(f"❌ {label}: API error {resp.status_code}")
-                        return idx, f"[{label}: API Error {resp.status_code}]"
+                        return key, None, f"API Error {resp.status_code}"
 
                 except Exception as e:
                     if attempt < max_retries - 1:
                         await asyncio.sleep(2 ** (attempt + 1))
                         continue
                     logger.error(f"❌ {label}: {e}")
-                    return idx, f"[{label}: Error - {str(e)[:100]}]"
+                    return key, None, f"Error - {str(e)[:100]}"
 
-            return idx, f"[{label}: Max retries exceeded]"
+            return key, None, "Max retries exceeded"
 
     t0 = _time.time()
-    logger.info(f"👁️ [VLM] Sending {len(items)} images to {VISION_MODEL} (concurrency={VISION_CONCURRENCY})...")
-
-    async with httpx.AsyncClient() as http_client:
-        tasks = [
-            analyze_single(items[i][0], i, items[i][2], http_client)
-            for i in range(len(items))
-        ]
-        raw_results = await asyncio.gather(*tasks)
+    logger.info(f"👁️ [VLM] {len(items)} images: {cache_hits} cached, "
+                f"{len(pending)} unique sent to {VISION_MODEL} (concurrency={VISION_CONCURRENCY})...")
+
+    described = {key: (desc, None) for key, desc in cached.items()}
+    if pending and effective_api_key:
+        async with httpx.AsyncClient() as http_client:
+            tasks = [
+                describe(key, b64, label, http_client)
+                for key, (b64, label) in pending.items()
+            ]
+            for key, desc, error in await asyncio.gather(*tasks):
+                described[key] = (desc, error)
+
+    for key, item in zip(keys, items):
+        page_idx, label = item[0], item[2]
+        if key is None:
+            desc = f"[Could not encode image for {label}]"
+        elif key not in described:
+            continue
+        else:
+            text, error = described[key]
+            desc = f"### {label}\n{text}" if text is not None else f"[{label}: {error}]"
 
-    for page_idx, desc in raw_results:
         if page_idx in results:
             results[page_idx] += "\n\n" + desc
         else:
@@ -436,6 +663,27 @@ async def _batch_vision_analyze(
     return results
 
 
+def _encode_items(
+    items: List[Tuple[int, Optional[bytes], str]],
+    pre_encoded: Optional[List[str]]
+) -> List[Optional[str]]:
+    """Normalize each item to the base64 JPEG payload sent to the VLM."""
+    payloads = []
+    for item_idx, item in enumerate(items):
+        b64 = None
+        if pre_encoded and item_idx < len(pre_encoded):
+            b64 = pre_encoded[item_idx]
+        else:
+            img_bytes = item[1]
+            if img_bytes and Image:
+                try:
+                    b64 = _optimize_and_encode(Image.open(io.BytesIO(img_bytes)))
+                except Exception as e:
+                    logger.debug(f"Could not decode image for {item[2]}: {e}")
+        payloads.append(b64 or None)
+    return payloads
+
+
 # ============================================================
 # HELPERS
 # ============================================================
@@ -49,22 +49,51 @@ async def lifespan(app: FastAPI):
         print(f"⚠️ Warmup embedding failed (non-critical): {e}")
 
     # Start the Deep Research background worker
+    research_worker = None
+    research_worker_task = None
     try:
         from app.services.research_tasks import BackgroundResearchService
         from app.core.database import db as db_manager
         research_worker = BackgroundResearchService(db_manager.get_client())
         # Run worker loop in the background
-        asyncio.create_task(research_worker.worker_loop())
+        research_worker_task = asyncio.create_task(research_worker.worker_loop())
         print("✅ Deep Research background worker started")
     except Exception as worker_err:
         print(f"❌ Failed to start research worker: {worker_err}")
 
+    # Pre-start the sandboxed chart workers so the first chart skips the import cost
+    from app.services.plotting import chart_pool
+
+    async def _start_chart_pool():
+        try:
+            await chart_pool.start()
+            print("✅ Chart worker pool started")
+        except Exception as e:
+            print(f"⚠️ Chart worker pool start failed (non-critical): {e}")
+
+    asyncio.create_task(_start_chart_pool())
+
 
     yield
     # Shutdown
     stop_scheduler()
     # Shutdown
     stop_scheduler()
+    from app.services.mol_standardizer import mol_standardizer
+    mol_standardizer.shutdown()
+    from app.services.vision_cache import vision_cache
+    vision_cache.close()
+    from app.services.embedding_store import embedding_store
+    embedding_store.close()
+    from app.services.vision_service import shutdown_pdf_pool
+    shutdown_pdf_pool()
+    from app.services.export_engine import export_engine
+    export_engine.shutdown()
+    await chart_pool.shutdown()
+    if research_worker_task is not None:
+        research_worker_task.cancel()
+    if research_worker is not None:
+        await research_worker.shutdown()
     print("🛑 Shutting down Benchside Backend API...")
 
 
@@ -0,0 +1,88 @@
+-- Migration 018: Turn research_tasks into a leased work queue
+-- Workers claim tasks atomically (FOR UPDATE SKIP LOCKED) and hold a lease
+-- they renew while running. A task whose lease expires (crashed or
+-- redeployed worker) is claimed again and resumes from its checkpoint.
+
+ALTER TABLE public.research_tasks
+    ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS attempts INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS checkpoint JSONB,          -- serialized ResearchState
+    ADD COLUMN IF NOT EXISTS checkpoint_node TEXT,      -- last completed graph node
+    ADD COLUMN IF NOT EXISTS checkpointed_at TIMESTAMPTZ;
+
+-- Tasks left RUNNING by the old in-process runner have no lease; expire
+-- them now so the first worker picks them up
+UPDATE public.research_tasks
+SET lease_expires_at = now()
+WHERE status = 'RUNNING' AND lease_expires_at IS NULL;
+
+-- Claimable tasks: pending, or running with a lease that may have expired
+CREATE INDEX IF NOT EXISTS idx_research_tasks_claim
+    ON public.research_tasks(created_at)
+    WHERE status IN ('PENDING', 'RUNNING');
+
+-- Atomically claim the oldest claimable task for p_worker_id.
+-- Returns the claimed row, or no rows if the queue is empty.
+CREATE OR REPLACE FUNCTION public.claim_research_task(
+    p_worker_id TEXT,
+    p_lease_seconds INT DEFAULT 300,
+    p_max_attempts INT DEFAULT 3
+)
+RETURNS SETOF public.research_tasks
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Tasks that keep killing their worker are failed instead of retried forever
+    UPDATE public.research_tasks
+    SET status = 'FAILED',
+        error_detail = COALESCE(error_detail, 'Worker lease expired too many times'),
+        finished_at = now(),
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE status = 'RUNNING'
+      AND (lease_expires_at IS NULL OR lease_expires_at < now())
+      AND attempts >= p_max_attempts;
+
+    RETURN QUERY
+    UPDATE public.research_tasks t
+    SET status = 'RUNNING',
+        lease_owner = p_worker_id,
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+        attempts = t.attempts + 1,
+        started_at = COALESCE(t.started_at, now())
+    WHERE t.id = (
+        SELECT id FROM public.research_tasks
+        WHERE status = 'PENDING'
+           OR (status = 'RUNNING' AND (lease_expires_at IS NULL OR lease_expires_at < now()))
+        ORDER BY created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING t.*;
+END;
+$$;
+
+-- Wake idle workers (LISTEN research_tasks) when a task becomes pending
+CREATE OR REPLACE FUNCTION public.notify_research_task()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('research_tasks', NEW.id::text);
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS research_tasks_notify ON public.research_tasks;
+CREATE TRIGGER research_tasks_notify
+    AFTER INSERT OR UPDATE OF status ON public.research_tasks
+    FOR EACH ROW
+    WHEN (NEW.status = 'PENDING')
+    EXECUTE FUNCTION public.notify_research_task();
+
+-- Leasing tasks is the backend worker's job; keep it off the public RPC API
+REVOKE EXECUTE ON FUNCTION public.claim_research_task(TEXT, INT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_research_task(TEXT, INT, INT) TO service_role;
+
+COMMENT ON FUNCTION public.claim_research_task IS 'Lease the next research task to a worker (SKIP LOCKED)';
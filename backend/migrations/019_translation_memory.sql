@@ -0,0 +1,33 @@
+-- Migration 019: Translation memory and resumable translation backfill
+-- Translations are keyed by a hash of (source language, source text) and the
+-- target language, so repeated strings are only ever translated once.
+
+CREATE TABLE IF NOT EXISTS public.translation_memory (
+    source_hash TEXT NOT NULL,          -- sha256(source_language || '\0' || text)
+    target_language TEXT NOT NULL,
+    source_language TEXT NOT NULL,      -- 'auto' when the model detected it
+    translated_text TEXT NOT NULL,
+    model TEXT,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (source_hash, target_language)
+);
+
+-- Cursor of each bulk backfill job ('messages', 'titles')
+CREATE TABLE IF NOT EXISTS public.translation_backfill_progress (
+    job TEXT PRIMARY KEY,
+    last_id UUID,
+    processed INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'running', -- running, done
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+COMMENT ON TABLE translation_memory IS 'Translation memory: reused translations keyed by source text hash and target language';
+COMMENT ON TABLE translation_backfill_progress IS 'Resume cursors for bulk translation backfill jobs';
+
+-- Both tables hold user message text and are only used by the backend.
+-- No policies: only the service role can read or write them.
+ALTER TABLE public.translation_memory ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.translation_backfill_progress ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.translation_memory FROM anon, authenticated;
+REVOKE ALL ON public.translation_backfill_progress FROM anon, authenticated;
@@ -0,0 +1,437 @@
+-- Migration 020: Server-side aggregates for the admin dashboard
+-- Totals come from counter rows kept up to date by statement-level triggers,
+-- "new this month" and the activity chart come from a daily materialized
+-- view refreshed by the scheduler, and the admin user/conversation lists get
+-- their per-row counts from one joined query instead of one query per row.
+
+-- ============================================
+-- 1. Incrementally maintained counters
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS public.admin_counters (
+    name TEXT PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- No policies: only the service role (and the SECURITY DEFINER functions
+-- below) can read or write the counters
+ALTER TABLE public.admin_counters ENABLE ROW LEVEL SECURITY;
+
+-- Generic insert/delete counters: one UPDATE per statement, not per row,
+-- so bulk chunk inserts don't serialize on the counter row.
+CREATE OR REPLACE FUNCTION public.admin_count_inserted()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    UPDATE public.admin_counters
+    SET value = value + (SELECT count(*) FROM new_rows), updated_at = now()
+    WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.admin_count_deleted()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    UPDATE public.admin_counters
+    SET value = value - (SELECT count(*) FROM old_rows), updated_at = now()
+    WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$;
+
+-- Flag counters (active users, open support requests) also move on UPDATE
+CREATE OR REPLACE FUNCTION public.admin_count_users_active()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    delta BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        delta := delta + (SELECT count(*) FROM new_rows WHERE COALESCE(is_active, TRUE));
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        delta := delta - (SELECT count(*) FROM old_rows WHERE COALESCE(is_active, TRUE));
+    END IF;
+    IF delta <> 0 THEN
+        UPDATE public.admin_counters SET value = value + delta, updated_at = now()
+        WHERE name = 'users_active';
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.admin_count_support_open()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    delta BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        delta := delta + (SELECT count(*) FROM new_rows WHERE status = 'open');
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        delta := delta - (SELECT count(*) FROM old_rows WHERE status = 'open');
+    END IF;
+    IF delta <> 0 THEN
+        UPDATE public.admin_counters SET value = value + delta, updated_at = now()
+        WHERE name = 'support_open';
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Transition tables allow only one event per trigger, hence one trigger each
+DO $$
+DECLARE
+    t RECORD;
+BEGIN
+    FOR t IN SELECT * FROM (VALUES
+        ('users', 'users'),
+        ('conversations', 'conversations'),
+        ('messages', 'messages'),
+        ('document_chunks', 'documents'),
+        ('support_requests', 'support')
+    ) AS v(tbl, counter)
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS admin_count_ins ON public.%I', t.tbl);
+        EXECUTE format(
+            'CREATE TRIGGER admin_count_ins AFTER INSERT ON public.%I '
+            'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT '
+            'EXECUTE FUNCTION public.admin_count_inserted(%L)', t.tbl, t.counter);
+        EXECUTE format('DROP TRIGGER IF EXISTS admin_count_del ON public.%I', t.tbl);
+        EXECUTE format(
+            'CREATE TRIGGER admin_count_del AFTER DELETE ON public.%I '
+            'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT '
+            'EXECUTE FUNCTION public.admin_count_deleted(%L)', t.tbl, t.counter);
+    END LOOP;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS admin_count_active_ins ON public.users;
+CREATE TRIGGER admin_count_active_ins AFTER INSERT ON public.users
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION public.admin_count_users_active();
+DROP TRIGGER IF EXISTS admin_count_active_upd ON public.users;
+CREATE TRIGGER admin_count_active_upd AFTER UPDATE ON public.users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION public.admin_count_users_active();
+DROP TRIGGER IF EXISTS admin_count_active_del ON public.users;
+CREATE TRIGGER admin_count_active_del AFTER DELETE ON public.users
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION public.admin_count_users_active();
+
+DROP TRIGGER IF EXISTS admin_count_open_ins ON public.support_requests;
+CREATE TRIGGER admin_count_open_ins AFTER INSERT ON public.support_requests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION public.admin_count_support_open();
+DROP TRIGGER IF EXISTS admin_count_open_upd ON public.support_requests;
+CREATE TRIGGER admin_count_open_upd AFTER UPDATE ON public.support_requests
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION public.admin_count_support_open();
+DROP TRIGGER IF EXISTS admin_count_open_del ON public.support_requests;
+CREATE TRIGGER admin_count_open_del AFTER DELETE ON public.support_requests
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION public.admin_count_support_open();
+
+-- Recompute every counter exactly (seeding, and nightly drift correction).
+-- The counts and the current counter values are read in one statement, so
+-- they share a snapshot; the difference is then applied as a delta. Writes
+-- committed after that snapshot have already moved the counters and are
+-- kept, and nothing is locked while the tables are counted.
+CREATE OR REPLACE FUNCTION public.reconcile_admin_counters()
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    deltas JSONB;
+BEGIN
+    SELECT jsonb_object_agg(exact.name, exact.value - COALESCE(c.value, 0))
+    INTO deltas
+    FROM (VALUES
+        ('users',         (SELECT count(*) FROM public.users)),
+        ('users_active',  (SELECT count(*) FROM public.users WHERE COALESCE(is_active, TRUE))),
+        ('conversations', (SELECT count(*) FROM public.conversations)),
+        ('messages',      (SELECT count(*) FROM public.messages)),
+        ('documents',     (SELECT count(*) FROM public.document_chunks)),
+        ('support',       (SELECT count(*) FROM public.support_requests)),
+        ('support_open',  (SELECT count(*) FROM public.support_requests WHERE status = 'open'))
+    ) AS exact(name, value)
+    LEFT JOIN public.admin_counters c ON c.name = exact.name;
+
+    INSERT INTO public.admin_counters (name, value, updated_at)
+    SELECT d.key, d.value::bigint, now()
+    FROM jsonb_each_text(deltas) AS d
+    ON CONFLICT (name) DO UPDATE
+        SET value = public.admin_counters.value + EXCLUDED.value,
+            updated_at = EXCLUDED.updated_at;
+END;
+$$;
+
+SELECT public.reconcile_admin_counters();
+
+-- ============================================
+-- 2. Daily activity materialized view
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON public.users(created_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON public.conversations(created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON public.messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_document_chunks_created_at ON public.document_chunks(created_at);
+
+DROP MATERIALIZED VIEW IF EXISTS public.admin_daily_activity;
+CREATE MATERIALIZED VIEW public.admin_daily_activity AS
+WITH buckets AS (
+    SELECT date_trunc('day', created_at) AS day, 'users' AS kind, count(*) AS n
+    FROM public.users GROUP BY 1
+    UNION ALL
+    SELECT date_trunc('day', created_at), 'conversations', count(*)
+    FROM public.conversations GROUP BY 1
+    UNION ALL
+    SELECT date_trunc('day', created_at), 'messages', count(*)
+    FROM public.messages GROUP BY 1
+    UNION ALL
+    SELECT date_trunc('day', created_at), 'documents', count(*)
+    FROM public.document_chunks GROUP BY 1
+)
+SELECT
+    day::date AS day,
+    COALESCE(sum(n) FILTER (WHERE kind = 'users'), 0)::bigint AS users,
+    COALESCE(sum(n) FILTER (WHERE kind = 'conversations'), 0)::bigint AS conversations,
+    COALESCE(sum(n) FILTER (WHERE kind = 'messages'), 0)::bigint AS messages,
+    COALESCE(sum(n) FILTER (WHERE kind = 'documents'), 0)::bigint AS documents,
+    now() AS refreshed_at
+FROM buckets
+WHERE day IS NOT NULL
+GROUP BY day;
+
+-- Required for REFRESH ... CONCURRENTLY (dashboard reads never block)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_admin_daily_activity_day
+    ON public.admin_daily_activity(day);
+
+-- Materialized views have no RLS; keep the activity series off the public API
+REVOKE ALL ON public.admin_daily_activity FROM PUBLIC, anon, authenticated;
+GRANT SELECT ON public.admin_daily_activity TO service_role;
+
+CREATE OR REPLACE FUNCTION public.refresh_admin_stats(p_reconcile BOOLEAN DEFAULT FALSE)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY public.admin_daily_activity;
+    IF p_reconcile THEN
+        PERFORM public.reconcile_admin_counters();
+    END IF;
+END;
+$$;
+
+-- ============================================
+-- 3. Dashboard RPCs
+-- ============================================
+
+-- Day buckets for the last p_days days. Days since the last refresh are
+-- counted live (index range scans on created_at) so the series is current.
+CREATE OR REPLACE FUNCTION public.admin_activity_by_day(p_days INT DEFAULT 30)
+RETURNS TABLE (
+    day DATE,
+    users BIGINT,
+    conversations BIGINT,
+    messages BIGINT,
+    documents BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH fresh_from AS (
+        SELECT COALESCE(max(a.day), '-infinity'::date) AS day FROM public.admin_daily_activity a
+    ),
+    live AS (
+        SELECT date_trunc('day', u.created_at)::date AS day, 'users' AS kind, count(*) AS n
+        FROM public.users u WHERE u.created_at >= (SELECT day FROM fresh_from) GROUP BY 1
+        UNION ALL
+        SELECT date_trunc('day', c.created_at)::date, 'conversations', count(*)
+        FROM public.conversations c WHERE c.created_at >= (SELECT day FROM fresh_from) GROUP BY 1
+        UNION ALL
+        SELECT date_trunc('day', m.created_at)::date, 'messages', count(*)
+        FROM public.messages m WHERE m.created_at >= (SELECT day FROM fresh_from) GROUP BY 1
+        UNION ALL
+        SELECT date_trunc('day', d.created_at)::date, 'documents', count(*)
+        FROM public.document_chunks d WHERE d.created_at >= (SELECT day FROM fresh_from) GROUP BY 1
+    ),
+    live_days AS (
+        SELECT l.day,
+               COALESCE(sum(l.n) FILTER (WHERE l.kind = 'users'), 0)::bigint AS users,
+               COALESCE(sum(l.n) FILTER (WHERE l.kind = 'conversations'), 0)::bigint AS conversations,
+               COALESCE(sum(l.n) FILTER (WHERE l.kind = 'messages'), 0)::bigint AS messages,
+               COALESCE(sum(l.n) FILTER (WHERE l.kind = 'documents'), 0)::bigint AS documents
+        FROM live l GROUP BY l.day
+    )
+    SELECT a.day, a.users, a.conversations, a.messages, a.documents
+    FROM public.admin_daily_activity a, fresh_from f
+    WHERE a.day < f.day AND a.day > current_date - p_days
+    UNION ALL
+    SELECT l.day, l.users, l.conversations, l.messages, l.documents
+    FROM live_days l
+    WHERE l.day > current_date - p_days
+    ORDER BY 1;
+$$;
+
+CREATE OR REPLACE FUNCTION public.admin_system_stats(p_days INT DEFAULT 30)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    WITH c AS (
+        SELECT jsonb_object_agg(name, value) AS v FROM public.admin_counters
+    ),
+    recent AS (
+        SELECT COALESCE(sum(users), 0) AS users,
+               COALESCE(sum(conversations), 0) AS conversations,
+               COALESCE(sum(messages), 0) AS messages,
+               COALESCE(sum(documents), 0) AS documents
+        FROM public.admin_activity_by_day(p_days)
+    )
+    SELECT jsonb_build_object(
+        'users', jsonb_build_object(
+            'total', COALESCE((c.v->>'users')::bigint, 0),
+            'active', COALESCE((c.v->>'users_active')::bigint, 0),
+            'new_this_month', recent.users),
+        'conversations', jsonb_build_object(
+            'total', COALESCE((c.v->>'conversations')::bigint, 0),
+            'new_this_month', recent.conversations),
+        'messages', jsonb_build_object(
+            'total', COALESCE((c.v->>'messages')::bigint, 0),
+            'new_this_month', recent.messages),
+        'documents', jsonb_build_object(
+            'total', COALESCE((c.v->>'documents')::bigint, 0),
+            'new_this_month', recent.documents),
+        'support', jsonb_build_object(
+            'total', COALESCE((c.v->>'support')::bigint, 0),
+            'open', COALESCE((c.v->>'support_open')::bigint, 0))
+    )
+    FROM c, recent;
+$$;
+
+-- One page of users with their conversation counts in a single query
+CREATE OR REPLACE FUNCTION public.admin_list_users(
+    p_limit INT DEFAULT NULL,
+    p_offset INT DEFAULT 0,
+    p_search TEXT DEFAULT NULL,
+    p_user_id UUID DEFAULT NULL
+)
+RETURNS TABLE (user_data JSONB, conversation_count BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH page AS (
+        SELECT u.*
+        FROM public.users u
+        WHERE (p_user_id IS NULL OR u.id = p_user_id)
+          AND (p_search IS NULL
+               OR u.email ILIKE '%' || p_search || '%'
+               OR u.first_name ILIKE '%' || p_search || '%'
+               OR u.last_name ILIKE '%' || p_search || '%')
+        ORDER BY u.created_at DESC
+        LIMIT p_limit OFFSET p_offset
+    ),
+    counts AS (
+        SELECT c.user_id, count(*) AS n
+        FROM public.conversations c
+        WHERE c.user_id IN (SELECT id FROM page)
+        GROUP BY c.user_id
+    )
+    SELECT to_jsonb(page) - 'password_hash' - 'verification_code',
+           COALESCE(counts.n, 0)
+    FROM page
+    LEFT JOIN counts ON counts.user_id = page.id
+    ORDER BY page.created_at DESC;
+$$;
+
+-- One page of conversations with owner and message/document counts
+CREATE OR REPLACE FUNCTION public.admin_list_conversations(
+    p_limit INT DEFAULT NULL,
+    p_offset INT DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    user_id UUID,
+    user_email TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    message_count BIGINT,
+    document_count BIGINT,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH page AS (
+        SELECT c.id, c.title, c.user_id, c.created_at, c.updated_at
+        FROM public.conversations c
+        ORDER BY c.updated_at DESC
+        LIMIT p_limit OFFSET p_offset
+    ),
+    msg AS (
+        SELECT m.conversation_id, count(*) AS n
+        FROM public.messages m
+        WHERE m.conversation_id IN (SELECT page.id FROM page)
+        GROUP BY m.conversation_id
+    ),
+    docs AS (
+        SELECT d.conversation_id, count(*) AS n
+        FROM public.document_chunks d
+        WHERE d.conversation_id IN (SELECT page.id FROM page)
+        GROUP BY d.conversation_id
+    )
+    SELECT page.id, page.title::text, page.user_id,
+           u.email::text, u.first_name::text, u.last_name::text,
+           COALESCE(msg.n, 0), COALESCE(docs.n, 0),
+           page.created_at, page.updated_at
+    FROM page
+    LEFT JOIN public.users u ON u.id = page.user_id
+    LEFT JOIN msg ON msg.conversation_id = page.id
+    LEFT JOIN docs ON docs.conversation_id = page.id
+    ORDER BY page.updated_at DESC;
+$$;
+
+-- ============================================
+-- 4. Access: admin endpoints call these with the service role only
+-- ============================================
+
+REVOKE ALL ON FUNCTION public.reconcile_admin_counters() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.refresh_admin_stats(BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.admin_activity_by_day(INT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.admin_system_stats(INT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.admin_list_users(INT, INT, TEXT, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.admin_list_conversations(INT, INT) FROM PUBLIC, anon, authenticated;
+
+GRANT EXECUTE ON FUNCTION public.reconcile_admin_counters() TO service_role;
+GRANT EXECUTE ON FUNCTION public.refresh_admin_stats(BOOLEAN) TO service_role;
+GRANT EXECUTE ON FUNCTION public.admin_activity_by_day(INT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.admin_system_stats(INT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.admin_list_users(INT, INT, TEXT, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION public.admin_list_conversations(INT, INT) TO service_role;
+
+COMMENT ON TABLE public.admin_counters IS 'Trigger-maintained row counts for the admin dashboard';
+COMMENT ON MATERIALIZED VIEW public.admin_daily_activity IS 'Per-day new users/conversations/messages/chunks, refreshed by the scheduler';
+COMMENT ON FUNCTION public.admin_system_stats IS 'Admin dashboard totals and recent activity from counters and daily buckets';
@@ -0,0 +1,93 @@
+-- Migration 021: Resumable, bulk embedding migration
+-- The migration engine reads document_chunks with a keyset cursor, embeds a
+-- whole page per provider call and writes each page back with one statement.
+-- Its cursor and counters live in embedding_migration_runs so a crashed or
+-- redeployed run continues where it stopped.
+--
+-- Dual-write mode stores the new vectors next to the old ones
+-- (embedding_next) while search keeps using `embedding`; once the backfill
+-- is done, cutover_chunk_embeddings() swaps them in one transaction.
+
+ALTER TABLE public.document_chunks
+    ADD COLUMN IF NOT EXISTS embedding_next vector,             -- staged vector (dual-write)
+    ADD COLUMN IF NOT EXISTS embedding_next_version VARCHAR(50);
+
+CREATE TABLE IF NOT EXISTS public.embedding_migration_runs (
+    run_id TEXT PRIMARY KEY,
+    target_version VARCHAR(50) NOT NULL,
+    dual_write BOOLEAN NOT NULL DEFAULT FALSE,
+    cursor_id UUID,                      -- last chunk id fully written
+    processed BIGINT NOT NULL DEFAULT 0,
+    failed BIGINT NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'running',   -- running | done | failed
+    last_error TEXT,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- No policies: only the service role (the migration engine) reads or writes runs
+ALTER TABLE public.embedding_migration_runs ENABLE ROW LEVEL SECURITY;
+
+-- Write one page of embeddings. p_rows is [{"id": uuid, "embedding": [..]}, ...].
+-- Returns the number of chunks updated.
+CREATE OR REPLACE FUNCTION public.write_chunk_embeddings(
+    p_rows JSONB,
+    p_version TEXT,
+    p_dual_write BOOLEAN DEFAULT FALSE
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INT;
+BEGIN
+    IF p_dual_write THEN
+        UPDATE public.document_chunks d
+        SET embedding_next = r.embedding::vector,
+            embedding_next_version = p_version
+        FROM jsonb_to_recordset(p_rows) AS r(id UUID, embedding TEXT)
+        WHERE d.id = r.id;
+    ELSE
+        UPDATE public.document_chunks d
+        SET embedding = r.embedding::vector,
+            embedding_version = p_version,
+            updated_at = now()
+        FROM jsonb_to_recordset(p_rows) AS r(id UUID, embedding TEXT)
+        WHERE d.id = r.id;
+    END IF;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$;
+
+-- Promote staged vectors in one transaction. The new model must have the
+-- column's dimensions (change the column type first, see 012/013, if not).
+CREATE OR REPLACE FUNCTION public.cutover_chunk_embeddings(p_version TEXT)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    n INT;
+BEGIN
+    UPDATE public.document_chunks
+    SET embedding = embedding_next,
+        embedding_version = embedding_next_version,
+        embedding_next = NULL,
+        embedding_next_version = NULL,
+        updated_at = now()
+    WHERE embedding_next_version = p_version;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$;
+
+-- Both functions rewrite every chunk's vectors; keep them off the public RPC API
+REVOKE EXECUTE ON FUNCTION public.write_chunk_embeddings(JSONB, TEXT, BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.cutover_chunk_embeddings(TEXT) FROM PUBLIC, anon, authenticated;
+
+GRANT EXECUTE ON FUNCTION public.write_chunk_embeddings(JSONB, TEXT, BOOLEAN) TO service_role;
+GRANT EXECUTE ON FUNCTION public.cutover_chunk_embeddings(TEXT) TO service_role;
+
+COMMENT ON TABLE public.embedding_migration_runs IS 'Keyset cursor and counters of resumable embedding migrations';
+COMMENT ON FUNCTION public.write_chunk_embeddings IS 'Bulk write of one page of migrated chunk embeddings';
+COMMENT ON FUNCTION public.cutover_chunk_embeddings IS 'Swap dual-written embeddings into place atomically';
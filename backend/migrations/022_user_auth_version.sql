@@ -0,0 +1,32 @@
+-- Migration 022: Auth version stamp on users
+-- Workers cache users in memory to keep database lookups off the
+-- authentication path. auth_version is stored with the user and copied into
+-- every issued token ("ver" claim). It changes whenever something that
+-- affects authentication changes, so:
+--   * a token newer than a worker's cached copy makes that worker reload it
+--   * a token older than the user's current version (issued before a password
+--     reset, deactivation or role change) is rejected.
+
+ALTER TABLE public.users
+    ADD COLUMN IF NOT EXISTS auth_version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION public.bump_user_auth_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.password_hash IS DISTINCT FROM OLD.password_hash
+       OR NEW.is_active IS DISTINCT FROM OLD.is_active
+       OR NEW.is_admin IS DISTINCT FROM OLD.is_admin
+       OR NEW.email IS DISTINCT FROM OLD.email THEN
+        NEW.auth_version := OLD.auth_version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bump_users_auth_version ON public.users;
+CREATE TRIGGER bump_users_auth_version BEFORE UPDATE ON public.users
+    FOR EACH ROW EXECUTE FUNCTION public.bump_user_auth_version();
+
+COMMENT ON COLUMN public.users.auth_version IS 'Bumped on password/role/activation/email changes; tokens carry it as "ver"';
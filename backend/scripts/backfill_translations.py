@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import os
 import sys
@@ -8,78 +9,36 @@ backend_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(backend_dir))
 
 from app.core.database import db, init_db
-from app.services.translation_service import TranslationService
+from app.services.translation_service import TranslationBackfill, TranslationService
 
-async def backfill_translations():
+async def backfill_translations(jobs, reset: bool = False, page_size: int = 50):
     print("🚀 Starting Translation Backfill...")
     
     # Initialize DB connection
     await init_db()
     
     translation_service = TranslationService(db.get_client())
-    
-    # 1. Backfill Messages
-    print("\n📦 Checking Messages...")
-    try:
-        # Fetch messages directly using Supabase client
-        # Note: "is" null syntax might vary depending on client, usually .is_("translations", "null")
-        response = db.get_client().table("messages").select("id, content, role").is_("translations", "null").execute()
-        messages = response.data
-        
-        print(f"Found {len(messages)} messages needing translation.")
-        
-        for i, msg in enumerate(messages):
-            if not msg.get("content"):
-                continue
-                
-            print(f"Processing message {i+1}/{len(messages)}: {msg['id']}")
-            
-            try:
-                # Default source is 'en' for now, or infer? 
-                # Ideally we'd store source language, but for backfill 'en' is safest guess for old data
-                await translation_service._translate_and_store_message(
-                    message_id=msg['id'],
-                    content=msg['content'],
-                    source_language='en' 
-                )
-                # Sleep reduced as Kimi/Mistral has higher throughput
-                # await asyncio.sleep(0.5) 
-                
-            except Exception as e:
-                print(f"Failed to process message {msg['id']}: {e}")
-                
-    except Exception as e:
-        print(f"❌ Error querying messages (maybe column missing?): {e}")
+    backfill = TranslationBackfill(translation_service, page_size=page_size)
 
-    # 2. Backfill Conversations (Titles)
-    print("\n🗂️ Checking Conversations...")
-    try:
-        response = db.get_client().table("conversations").select("id, title").is_("title_translations", "null").execute()
-        conversations = response.data
-        
-        print(f"Found {len(conversations)} conversations needing title translation.")
-        
-        for i, conv in enumerate(conversations):
-            if not conv.get("title"):
-                continue
-                
-            print(f"Processing conversation {i+1}/{len(conversations)}: {conv['id']}")
-            
-            try:
-                await translation_service._translate_and_store_title(
-                    conversation_id=conv['id'],
-                    title=conv['title'],
-                    source_language='en'
-                )
-                # await asyncio.sleep(0.5)
-                
-            except Exception as e:
-                print(f"Failed to process conversation {conv['id']}: {e}")
-                
-    except Exception as e:
-        print(f"❌ Error querying conversations: {e}")
+    # Each job saves its cursor after every page, so an interrupted run
+    # picks up where it stopped when started again
+    for job in jobs:
+        print(f"\n📦 Backfilling {job}{' (from the start)' if reset else ''}...")
+        try:
+            progress = await backfill.run(job, reset=reset)
+            print(f"✅ {job}: {progress['processed']} rows processed, {progress['failed']} failed")
+        except Exception as e:
+            print(f"❌ Error backfilling {job} (maybe migration 019 missing?): {e}")
 
+    stats = translation_service.stats
+    print(f"\n📊 API calls: {stats['api_calls']}, memory hits: {stats['memory_hits']}, "
+          f"new translations: {stats['translated']}")
     print("\n✅ Backfill Complete!")
 
 if __name__ == "__main__":
-    asyncio.run(backfill_translations())
+    parser = argparse.ArgumentParser(description="Translate existing messages and conversation titles")
+    parser.add_argument("--jobs", nargs="+", choices=list(TranslationBackfill.JOBS), default=["titles", "messages"])
+    parser.add_argument("--reset", action="store_true", help="Start over instead of resuming (retries failed rows)")
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(backfill_translations(args.jobs, reset=args.reset, page_size=args.page_size))
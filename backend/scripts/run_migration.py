@@ -92,13 +92,18 @@ class MigrationRunner:
     async def run_migration_with_monitoring(
         self, 
         max_chunks: Optional[int] = None,
-        batch_size: Optional[int] = None
+        batch_size: Optional[int] = None,
+        run_id: str = "default",
+        dual_write: bool = False,
+        reset: bool = False
     ) -> Dict[str, Any]:
         """Run migration with progress monitoring"""
         
-        print(f"🚀 Starting embedding migration...")
+        print(f"🚀 Starting embedding migration (run '{run_id}')...")
         if max_chunks:
             print(f"   Limited to {max_chunks} chunks")
+        if dual_write:
+            print("   Dual-write: new embeddings are staged until --cutover")
         
         self.start_time = time.time()
         
@@ -113,7 +118,10 @@ class MigrationRunner:
             # Run migration
             result = await self.migration_service.run_migration(
                 max_chunks=max_chunks,
-                batch_size=batch_size
+                batch_size=batch_size,
+                run_id=run_id,
+                dual_write=dual_write,
+                reset=reset
             )
             
             # Get final status
@@ -231,6 +239,26 @@ async def main():
         default=None, 
         help="Batch size for migration"
     )
+    parser.add_argument(
+        "--run-id", 
+        default="default", 
+        help="Name of the run; an interrupted run resumes from its saved cursor"
+    )
+    parser.add_argument(
+        "--dual-write", 
+        action="store_true", 
+        help="Write new embeddings next to the old ones instead of replacing them"
+    )
+    parser.add_argument(
+        "--reset", 
+        action="store_true", 
+        help="Ignore the saved cursor and start the run over"
+    )
+    parser.add_argument(
+        "--cutover", 
+        action="store_true", 
+        help="Swap dual-written embeddings into place and exit"
+    )
     parser.add_argument(
         "--non-interactive", 
         action="store_true", 
@@ -256,6 +284,12 @@ async def main():
         validation_passed = await runner.validate_migration_results()
         sys.exit(0 if validation_passed else 1)
     
+    # Cutover only mode
+    if args.cutover:
+        result = await runner.migration_service.cutover()
+        print(f"{'✅' if result.get('success') else '❌'} {result}")
+        sys.exit(0 if result.get('success') else 1)
+    
     # Run migration
     if args.non_interactive:
         # Non-interactive mode
@@ -264,7 +298,10 @@ async def main():
         
         result = await runner.run_migration_with_monitoring(
             max_chunks=args.max_chunks,
-            batch_size=args.batch_size
+            batch_size=args.batch_size,
+            run_id=args.run_id,
+            dual_write=args.dual_write,
+            reset=args.reset
         )
         
         success = result.get('success', False)
@@ -256,6 +256,168 @@ class TestLocalInferenceQueue:
         assert queue.available_slots() == 3
 
 
+class TestLocalQueueScheduling:
+    """Test priority classes, per-user fairness and wait-time estimates"""
+
+    @staticmethod
+    def _job(order, name, gate=None):
+        async def run():
+            if gate is not None:
+                await gate.wait()
+            order.append(name)
+            return name
+        return run
+
+    @pytest.mark.asyncio
+    async def test_fast_requests_overtake_detailed(self):
+        """Queued fast-mode requests start before queued detailed ones"""
+        from app.services.local_queue import LocalInferenceQueue
+
+        queue = LocalInferenceQueue(max_queue_size=10)
+        order, gate = [], asyncio.Event()
+
+        running = asyncio.create_task(queue.submit(self._job(order, "long", gate), mode="detailed", max_tokens=1))
+        await asyncio.sleep(0)
+        detailed = asyncio.create_task(queue.submit(self._job(order, "detailed"), mode="detailed", max_tokens=1))
+        await asyncio.sleep(0)
+        fast = asyncio.create_task(queue.submit(self._job(order, "fast"), mode="fast", max_tokens=1))
+        await asyncio.sleep(0)
+
+        gate.set()
+        await asyncio.gather(running, detailed, fast)
+        assert order == ["long", "fast", "detailed"]
+
+    @pytest.mark.asyncio
+    async def test_users_take_turns_within_a_class(self):
+        """A heavy user's backlog is interleaved with other users"""
+        from app.services.local_queue import LocalInferenceQueue
+
+        queue = LocalInferenceQueue(max_queue_size=10)
+        order, gate = [], asyncio.Event()
+
+        tasks = [asyncio.create_task(queue.submit(self._job(order, "c", gate), user_id="c", max_tokens=1))]
+        await asyncio.sleep(0)
+        for name, user in (("a1", "a"), ("a2", "a"), ("b1", "b")):
+            tasks.append(asyncio.create_task(queue.submit(self._job(order, name), user_id=user, max_tokens=1)))
+            await asyncio.sleep(0)
+
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert order == ["c", "a1", "b1", "a2"]
+
+    @pytest.mark.asyncio
+    async def test_per_user_cap_raises_503(self):
+        """One user cannot take every queue slot"""
+        from app.services.local_queue import LocalInferenceQueue, LOCAL_QUEUE_MAX_PER_USER
+        from fastapi import HTTPException
+
+        queue = LocalInferenceQueue(max_queue_size=10)
+        gate = asyncio.Event()
+        tasks = [
+            asyncio.create_task(queue.submit(self._job([], i, gate), user_id="heavy", max_tokens=1))
+            for i in range(LOCAL_QUEUE_MAX_PER_USER)
+        ]
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await queue.submit(self._job([], "extra"), user_id="heavy", max_tokens=1)
+        assert exc_info.value.status_code == 503
+
+        # Another user is still admitted
+        other = asyncio.create_task(queue.submit(self._job([], "other"), user_id="light", max_tokens=1))
+        gate.set()
+        await asyncio.gather(*tasks, other)
+        assert queue.stats["rejected_user"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deadline_admission_uses_observed_throughput(self):
+        """Requests are rejected when the estimated wait exceeds their deadline"""
+        from app.services.local_queue import LocalInferenceQueue
+        from fastapi import HTTPException
+
+        queue = LocalInferenceQueue(max_queue_size=10)
+
+        async def generate():
+            await asyncio.sleep(0.1)
+            return {"content": "...", "usage": {"completion_tokens": 100}}
+
+        await queue.submit(generate, max_tokens=100)
+        # 100 tokens in ~0.1s moves the estimate up from the 20 tokens/s default
+        assert queue.get_stats()["tokens_per_sec"] > 100
+
+        queue._tokens_per_sec = 10.0
+        gate = asyncio.Event()
+        running = asyncio.create_task(queue.submit(self._job([], "long", gate), max_tokens=100))
+        await asyncio.sleep(0)
+
+        assert queue.estimate_wait("fast") == pytest.approx(10.0, rel=0.05)
+        with pytest.raises(HTTPException):
+            await queue.submit(self._job([], "late"), mode="fast", max_wait=5)
+        assert queue.stats["rejected_deadline"] == 1
+
+        gate.set()
+        await running
+
+    @pytest.mark.asyncio
+    async def test_throughput_uses_generated_tokens_not_max_tokens(self):
+        """A short answer to a large max_tokens request must not inflate tokens/s"""
+        from app.services.local_queue import LocalInferenceQueue
+
+        queue = LocalInferenceQueue(max_queue_size=10)
+
+        async def short_answer():
+            await asyncio.sleep(0.1)
+            return {"content": "Yes.", "usage": {"completion_tokens": 1}}
+
+        async def no_usage():
+            await asyncio.sleep(0.1)
+
+        await queue.submit(short_answer, max_tokens=1000)
+        assert queue.get_stats()["tokens_per_sec"] < 20
+
+        before = queue._tokens_per_sec
+        await queue.submit(no_usage, max_tokens=1000)
+        assert queue._tokens_per_sec == before
+        assert queue.stats["completed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_block_queue(self):
+        """A request cancelled while waiting is skipped"""
+        from app.services.local_queue import LocalInferenceQueue
+
+        queue = LocalInferenceQueue(max_queue_size=10)
+        order, gate = [], asyncio.Event()
+
+        running = asyncio.create_task(queue.submit(self._job(order, "first", gate), max_tokens=1))
+        await asyncio.sleep(0)
+        abandoned = asyncio.create_task(queue.submit(self._job(order, "abandoned"), max_tokens=1))
+        waiting = asyncio.create_task(queue.submit(self._job(order, "second"), max_tokens=1))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+
+        gate.set()
+        await asyncio.gather(running, waiting)
+        assert order == ["first", "second"]
+        assert not queue.is_busy()
+
+    def test_router_uses_wait_estimate(self):
+        """Router keeps simple prompts local only while the wait fits the mode"""
+        from app.services.router_service import RouterService
+
+        router = RouterService()
+        router._queue = MagicMock()
+        router._queue.max_wait_for.return_value = 10.0
+
+        with patch.object(RouterService, '_is_local_available', return_value=True):
+            router._queue.estimate_wait.return_value = 2.0
+            assert router.route("What is aspirin?", 10, "fast") == "local"
+
+            router._queue.estimate_wait.return_value = 45.0
+            assert router.route("What is aspirin?", 10, "fast") == "groq"
+
+        router._queue.estimate_wait.assert_called_with("fast")
+
+
 class TestServiceContainerIntegration:
     """Test services are registered in container"""
 
@@ -0,0 +1,153 @@
+"""
+Test Suite — Admin Aggregate Statistics
+
+Tests that admin stats and list pages are served by aggregate RPCs in one
+round trip, and that the fallback without migration 020 only issues
+server-side COUNT queries.
+
+Usage:
+    pytest tests/test_admin_aggregates.py -v
+"""
+
+import asyncio
+import importlib
+import types
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOW = datetime.utcnow().isoformat()
+
+
+def _user(**fields):
+    return {"id": str(uuid4()), "email": f"{uuid4().hex[:8]}@example.org", "first_name": "Ada",
+            "last_name": "Lovelace", "is_active": True, "created_at": NOW, "updated_at": NOW, **fields}
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.count = None
+        self.head = False
+        self.filters = []
+
+    def select(self, *columns, count=None, head=None):
+        self.count, self.head = count, head
+        return self
+
+    def __getattr__(self, op):
+        def add(*args, **kwargs):
+            self.filters.append((op, args))
+            return self
+        return add
+
+    def execute(self):
+        self.db.queries.append(self)
+        return SimpleNamespace(data=[] if self.head else self.db.rows.get(self.table, []),
+                               count=self.db.counts.get(self.table) if self.count else None)
+
+
+class FakeDB:
+    def __init__(self, rpc_results=None, rows=None, counts=None):
+        self.rpc_results = rpc_results
+        self.rows = rows or {}
+        self.counts = counts or {}
+        self.rpcs = []
+        self.queries = []
+
+    def rpc(self, name, params):
+        self.rpcs.append((name, params))
+        if self.rpc_results is None:
+            raise Exception("Could not find the function public.%s in the schema cache" % name)
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self.rpc_results[name]))
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def admin_module():
+    fake_database = types.ModuleType("app.core.database")
+
+    async def async_db_execute(func, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    fake_database.async_db_execute = async_db_execute
+    with patch.dict(sys.modules, {"app.core.database": fake_database}):
+        sys.modules.pop("app.services.admin", None)
+        yield importlib.import_module("app.services.admin")
+    sys.modules.pop("app.services.admin", None)
+
+
+class TestAggregateRPCs:
+
+    @pytest.mark.asyncio
+    async def test_system_stats_is_one_rpc(self, admin_module):
+        stats = {"users": {"total": 2_000_000, "active": 1_900_000, "new_this_month": 5000},
+                 "messages": {"total": 80_000_000, "new_this_month": 900_000}}
+        db = FakeDB(rpc_results={"admin_system_stats": stats})
+
+        result = await admin_module.AdminService(db).get_system_stats()
+
+        assert db.rpcs == [("admin_system_stats", {"p_days": admin_module.ADMIN_STATS_WINDOW_DAYS})]
+        assert db.queries == []
+        assert result["messages"]["total"] == 80_000_000
+        assert "last_updated" in result
+
+    @pytest.mark.asyncio
+    async def test_user_page_counts_come_from_one_query(self, admin_module):
+        rows = [{"user_data": _user(), "conversation_count": n} for n in (3, 0, 12)]
+        db = FakeDB(rpc_results={"admin_list_users": rows})
+
+        users = await admin_module.AdminService(db).get_all_users(limit=3, offset=6, search="ada")
+
+        assert db.rpcs == [("admin_list_users", {"p_limit": 3, "p_offset": 6, "p_search": "ada"})]
+        assert db.queries == []
+        assert [u.conversation_count for u in users] == [3, 0, 12]
+
+    @pytest.mark.asyncio
+    async def test_conversation_page_counts_come_from_one_query(self, admin_module):
+        row = {"id": str(uuid4()), "title": "Statin dosing", "user_id": str(uuid4()),
+               "user_email": "ada@example.org", "first_name": "Ada", "last_name": None,
+               "message_count": 41, "document_count": 7, "created_at": NOW, "updated_at": NOW}
+        db = FakeDB(rpc_results={"admin_list_conversations": [row]})
+
+        conversations = await admin_module.AdminService(db).get_all_conversations(limit=50)
+
+        assert len(db.rpcs) == 1 and db.queries == []
+        assert conversations[0]["user_name"] == "Ada"
+        assert (conversations[0]["message_count"], conversations[0]["document_count"]) == (41, 7)
+
+
+class TestFallbackWithoutMigration:
+
+    @pytest.mark.asyncio
+    async def test_stats_fallback_only_counts_server_side(self, admin_module):
+        db = FakeDB(counts={"users": 10, "conversations": 20, "messages": 300,
+                            "document_chunks": 4000, "support_requests": 5})
+
+        stats = await admin_module.AdminService(db).get_system_stats()
+
+        assert stats["documents"]["total"] == 4000
+        # Every table read is a head COUNT, so no rows are transferred
+        assert db.queries and all(q.head and q.count == "exact" for q in db.queries)
+
+    @pytest.mark.asyncio
+    async def test_user_list_fallback_filters_in_the_database(self, admin_module):
+        db = FakeDB(rows={"users": [_user(), _user()]}, counts={"conversations": 4})
+
+        users = await admin_module.AdminService(db).get_all_users(limit=2, search="ada,(x)")
+
+        page_query = next(q for q in db.queries if not q.head)
+        or_filter = next(args[0] for op, args in page_query.filters if op == "or_")
+        assert "ada  x" in or_filter and "(" not in or_filter
+        assert [u.conversation_count for u in users] == [4, 4]
+        assert sum(1 for q in db.queries if not q.head) == 1
@@ -0,0 +1,189 @@
+"""
+Test Suite — Authentication Fast Path
+
+Tests that per-request user resolution is served from the per-worker cache,
+that concurrent misses share one database query, that the auth_version
+stamp refreshes stale entries and rejects superseded tokens, and that
+bcrypt runs off the event loop.
+
+Usage:
+    pytest tests/test_auth_fast_path.py -v
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOW = datetime.utcnow().isoformat()
+
+
+class FakeUsersTable:
+    """Blocking users table that counts queries and records their threads."""
+
+    def __init__(self, db):
+        self.db = db
+        self.email = None
+
+    def select(self, *columns):
+        return self
+
+    def eq(self, column, value):
+        self.email = value
+        return self
+
+    def execute(self):
+        self.db.queries += 1
+        self.db.threads.add(threading.current_thread().name)
+        time.sleep(self.db.delay)
+        row = self.db.users.get(self.email)
+        return SimpleNamespace(data=[dict(row)] if row else [])
+
+
+class FakeDB:
+    def __init__(self, delay=0.0):
+        self.users = {}
+        self.queries = 0
+        self.threads = set()
+        self.delay = delay
+
+    def add_user(self, email, **fields):
+        self.users[email] = {"id": str(uuid4()), "email": email, "first_name": "Ada", "is_active": True,
+                             "is_verified": True, "is_admin": False, "password_hash": "x",
+                             "created_at": NOW, "updated_at": NOW, "auth_version": 1, **fields}
+        return self.users[email]
+
+    def table(self, name):
+        return FakeUsersTable(self)
+
+
+@pytest.fixture
+def auth():
+    from app.services import auth as module
+    fake_settings = SimpleNamespace(SECRET_KEY="test-secret", ALGORITHM="HS256",
+                                    ACCESS_TOKEN_EXPIRE_MINUTES=30, REFRESH_TOKEN_EXPIRE_DAYS=7)
+    module._user_cache.clear()
+    with patch.object(module, "settings", fake_settings):
+        yield module
+    module._user_cache.clear()
+
+
+def _token_data(auth, db, email, version):
+    user = auth.UserInDB(**db.users[email])
+    claims = {"sub": str(user.id), "email": email, "is_admin": False}
+    if version is not None:
+        claims["ver"] = version
+    token = auth.AuthService(db).create_access_token(claims)
+    return auth.AuthService(db).verify_token(token)
+
+
+class TestUserCache:
+
+    @pytest.mark.asyncio
+    async def test_hot_path_makes_no_queries(self, auth):
+        db = FakeDB()
+        db.add_user("ada@example.org")
+        service = auth.AuthService(db)
+        token_data = _token_data(auth, db, "ada@example.org", 1)
+
+        first = await service.get_user_for_token(token_data)
+        second = await service.get_user_for_token(token_data)
+
+        assert first.email == second.email == "ada@example.org"
+        assert db.queries == 1
+        # The miss was served from a worker thread, not the event loop
+        assert threading.main_thread().name not in db.threads
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_query(self, auth):
+        db = FakeDB(delay=0.05)
+        db.add_user("ada@example.org")
+        service = auth.AuthService(db)
+        token_data = _token_data(auth, db, "ada@example.org", 1)
+
+        users = await asyncio.gather(*(service.get_user_for_token(token_data) for _ in range(20)))
+
+        assert db.queries == 1
+        assert all(user is not None for user in users)
+        assert auth._user_lookups == {}
+
+    @pytest.mark.asyncio
+    async def test_newer_token_refreshes_stale_entry(self, auth):
+        db = FakeDB()
+        db.add_user("ada@example.org")
+        service = auth.AuthService(db)
+        await service.get_user_for_token(_token_data(auth, db, "ada@example.org", 1))
+
+        # Another worker promoted the user; the new token carries the new version
+        db.users["ada@example.org"].update(is_admin=True, auth_version=2)
+        user = await service.get_user_for_token(_token_data(auth, db, "ada@example.org", 2))
+
+        assert user.is_admin
+        assert db.queries == 2
+
+    @pytest.mark.asyncio
+    async def test_superseded_token_is_rejected(self, auth):
+        db = FakeDB()
+        db.add_user("ada@example.org", auth_version=3)  # password was reset twice
+        service = auth.AuthService(db)
+
+        assert await service.get_user_for_token(_token_data(auth, db, "ada@example.org", 2)) is None
+        assert await service.get_user_for_token(_token_data(auth, db, "ada@example.org", 3)) is not None
+        # Tokens from before the version claim existed count as version 1
+        assert await service.get_user_for_token(_token_data(auth, db, "ada@example.org", None)) is None
+
+    @pytest.mark.asyncio
+    async def test_unversioned_token_works_until_first_security_change(self, auth):
+        db = FakeDB()
+        db.add_user("ada@example.org")
+        service = auth.AuthService(db)
+
+        assert await service.get_user_for_token(_token_data(auth, db, "ada@example.org", None)) is not None
+
+        db.users["ada@example.org"]["auth_version"] = 2  # password reset
+        auth._user_cache.clear()
+        assert await service.get_user_for_token(_token_data(auth, db, "ada@example.org", None)) is None
+
+    @pytest.mark.asyncio
+    async def test_issued_tokens_carry_auth_version(self, auth):
+        db = FakeDB()
+        db.add_user("ada@example.org", auth_version=4)
+        service = auth.AuthService(db)
+
+        tokens = await service.create_tokens(auth.UserInDB(**db.users["ada@example.org"]))
+
+        assert service.verify_token(tokens.access_token).auth_version == 4
+
+
+class TestPasswordHashing:
+
+    @pytest.mark.asyncio
+    async def test_bcrypt_runs_off_the_event_loop(self, auth):
+        service = auth.AuthService(FakeDB())
+        hashed = await service.hash_password_async("Correct-horse-9")
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        results = await asyncio.gather(
+            service.verify_password_async("Correct-horse-9", hashed),
+            service.verify_password_async("wrong", hashed),
+        )
+        beat.cancel()
+
+        assert results == [True, False]
+        assert ticks >= 5
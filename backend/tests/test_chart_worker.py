@@ -0,0 +1,270 @@
+"""
+Test Suite — Sandboxed Chart Worker Pool
+
+Tests that chart code renders in pre-started worker processes with
+time limits, restarts, caching and concurrent throughput.
+
+Usage:
+    pytest tests/test_chart_worker.py -v
+"""
+
+import asyncio
+import base64
+import os
+import sys
+import time
+import pytest
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("matplotlib")
+pytest.importorskip("numpy")
+
+BAR_CHART = "plt.bar(['a', 'b', 'c'], [1, 3, 2])\nplt.title('Doses')"
+SLOW_CHART = "x = 0\nwhile True:\n    x += 1"
+
+
+@pytest.fixture
+async def pool():
+    from app.services.plotting import ChartWorkerPool
+    p = ChartWorkerPool(size=2, timeout=15, cpu_seconds=30, memory_mb=0)
+    yield p
+    await p.shutdown()
+
+
+@pytest.fixture
+def service(pool):
+    from app.services.plotting import PlottingService
+    PlottingService._cache.clear()
+    yield PlottingService(pool=pool)
+    PlottingService._cache.clear()
+
+
+class TestChartWorkerPool:
+
+    @pytest.mark.asyncio
+    async def test_renders_png_in_worker_process(self, service, pool):
+        result = await service.generate_chart(BAR_CHART)
+
+        assert result["status"] == "success", result["error"]
+        assert base64.b64decode(result["image_base64"])[:4] == b"\x89PNG"
+        assert all(w.process.pid != os.getpid() for w in pool._workers)
+        assert pool.stats["renders"] == 1
+
+    @pytest.mark.asyncio
+    async def test_repeated_chart_is_cached(self, service, pool):
+        first = await service.generate_chart(BAR_CHART)
+        second = await service.generate_chart(BAR_CHART + "\n")
+
+        assert first == second
+        assert pool.stats["renders"] == 1
+
+    @pytest.mark.asyncio
+    async def test_code_errors_keep_worker(self, service, pool):
+        await pool.start()
+        pids = {w.process.pid for w in pool._workers}
+
+        no_plot = await service.generate_chart("x = 1")
+        bad_import = await service.generate_chart("import json\nplt.plot([1])")
+
+        assert no_plot["status"] == "error" and "did not produce a plot" in no_plot["error"]
+        assert bad_import["status"] == "error" and "not allowed" in bad_import["error"]
+        assert {w.process.pid for w in pool._workers} == pids
+
+    @pytest.mark.asyncio
+    async def test_forbidden_terms_never_reach_pool(self, service, pool):
+        result = await service.generate_chart("import os\nplt.plot([1])")
+        assert result["status"] == "error" and "Security" in result["error"]
+        assert pool._idle is None
+
+    @pytest.mark.asyncio
+    async def test_hung_chart_is_killed_and_worker_replaced(self, service, pool):
+        pool.timeout = 1
+        await pool.start()
+
+        result = await service.generate_chart(SLOW_CHART)
+        assert result["status"] == "error" and "timed out" in result["error"]
+
+        # The replacement comes up in the background and the pool keeps serving
+        for _ in range(300):
+            if pool.stats["restarts"] and pool._idle.qsize() == pool.size:
+                break
+            await asyncio.sleep(0.1)
+        assert pool.stats["restarts"] == 1
+        assert len(pool._workers) == pool.size
+        pool.timeout = 15
+        assert (await service.generate_chart(BAR_CHART))["status"] == "success"
+
+    @pytest.mark.asyncio
+    async def test_slow_chart_does_not_block_event_loop(self, service, pool):
+        pool.timeout = 2
+        await pool.start()
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            end = time.monotonic() + 1.5
+            while time.monotonic() < end:
+                await asyncio.sleep(0.05)
+                ticks += 1
+
+        slow, fast, _ = await asyncio.gather(
+            service.generate_chart(SLOW_CHART),
+            service.generate_chart(BAR_CHART),
+            ticker(),
+        )
+        assert slow["status"] == "error"
+        assert fast["status"] == "success"
+        assert ticks > 20
+
+    @pytest.mark.asyncio
+    async def test_failed_restart_is_retried(self, pool, monkeypatch):
+        from app.services.plotting import ChartRenderError
+        pool.size = 1
+        pool.respawn_backoff = 0.05
+        await pool.start()
+        spawn = pool._spawn
+        recovered = asyncio.Event()
+        failures = []
+
+        async def flaky_spawn():
+            if not recovered.is_set():
+                failures.append(1)
+                raise ChartRenderError("Chart worker failed to start")
+            return await spawn()
+
+        monkeypatch.setattr(pool, "_spawn", flaky_spawn)
+        pool._workers[0].kill()
+        with pytest.raises(ChartRenderError):
+            await pool.render(BAR_CHART)
+
+        # No live worker while the restart is failing: fail fast instead of queueing
+        with pytest.raises(ChartRenderError, match="No chart workers"):
+            await asyncio.wait_for(pool.render(BAR_CHART), 5)
+
+        for _ in range(100):
+            if len(failures) >= 2:
+                break
+            await asyncio.sleep(0.05)
+        recovered.set()
+        for _ in range(300):
+            if pool._idle.qsize() == 1:
+                break
+            await asyncio.sleep(0.1)
+        assert len(failures) >= 2
+        assert (await pool.render(BAR_CHART))[:4] == b"\x89PNG"
+
+
+class TestSandbox:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("code", [
+        "plt.plot([1])\n().__class__.__mro__[-1].__subclasses__()",
+        "plt.plot([1])\nx = [c for c in ().__class__.__base__.__subclasses__()]",
+        "plt.plot([1])\nf = plt.plot.__globals__",
+        "plt.plot([1])\n__builtins__",
+    ])
+    async def test_dunder_escapes_are_rejected(self, service, pool, code):
+        result = await service.generate_chart(code)
+
+        assert result["status"] == "error" and "Security" in result["error"]
+        assert pool._idle is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("code", [
+        "plt.matplotlib.os.system('id > /tmp/chart_escape_probe'); plt.plot([1, 2])",
+        "np.lib.npyio.os.system('id > /tmp/chart_escape_probe')\nplt.plot([1])",
+        "p = plt.matplotlib.Path('/tmp/chart_escape_probe')\nplt.plot([1])",
+        "def g():\n    yield 1\nf = g().gi_frame.f_back\nplt.plot([1])",
+        "from matplotlib import os\nplt.plot([1])",
+        "import os\nplt.plot([1])",
+        "plt.plot([1])\nnp.sum = print",
+    ])
+    async def test_module_escapes_are_rejected(self, service, pool, code):
+        if os.path.exists("/tmp/chart_escape_probe"):
+            os.remove("/tmp/chart_escape_probe")
+
+        result = await service.generate_chart(code)
+
+        assert result["status"] == "error" and "not allowed" in result["error"]
+        assert not os.path.exists("/tmp/chart_escape_probe")
+
+    @pytest.mark.asyncio
+    async def test_common_chart_apis_still_work(self, service):
+        code = (
+            "import pandas as pd\n"
+            "plt.style.use('ggplot')\n"
+            "df = pd.DataFrame({'x': [1, 2, 3], 'y': [3, 1, 2]})\n"
+            "fig, axes = plt.subplots(1, 2)\n"
+            "axes[0].plot(df['x'], df['y'])\n"
+            "axes[1].scatter(df['x'], np.random.default_rng(0).normal(size=3), c=df['y'], cmap=plt.cm.viridis)\n"
+            "fig.suptitle('Doses', fontweight='bold')"
+        )
+        result = await service.generate_chart(code)
+
+        assert result["status"] == "success", result["error"]
+
+    def test_confined_worker_cannot_write_read_or_connect(self):
+        import subprocess
+        probe = (
+            "import os, socket\n"
+            "from app.services.chart_worker import confine, confined_read_paths\n"
+            "confine(confined_read_paths())\n"
+            "print(os.geteuid() != 0 or os.path.exists('/proc/self/uid_map'))\n"
+            "for attempt in (lambda: open('/tmp/chart_escape_probe', 'w'),\n"
+            "                lambda: open('/etc/hostname').read(),\n"
+            "                lambda: socket.create_connection(('127.0.0.1', 8000), timeout=1)):\n"
+            "    try:\n"
+            "        attempt()\n"
+            "        print('allowed')\n"
+            "    except OSError:\n"
+            "        print('blocked')\n"
+        )
+        backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-c", probe], cwd=backend, env={"PATH": os.defpath},
+                                capture_output=True, text=True, timeout=60)
+
+        lines = result.stdout.split()
+        assert lines[0] == "True"
+        if "allowed" in lines:
+            pytest.skip("kernel without Landlock / namespaces")
+        assert lines[1:] == ["blocked", "blocked", "blocked"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("code", [
+        "import pandas as pd\ndf = pd.read_csv('/etc/passwd')\nplt.plot([1])",
+        "import pandas as pd\npd.DataFrame({'a': [1]}).to_csv('/tmp/leak.csv')\nplt.plot([1])",
+        "from pandas import read_pickle\nplt.plot([1])",
+        "x = np.load('/tmp/data.npy')\nplt.plot(x)",
+        "np.save('/tmp/out.npy', np.arange(3))\nplt.plot([1])",
+        "np.arange(3).tofile('/tmp/out.bin')\nplt.plot([1])",
+        "plt.plot([1])\nplt.savefig('/tmp/out.png')",
+    ])
+    async def test_file_io_is_rejected(self, service, pool, code):
+        result = await service.generate_chart(code)
+
+        assert result["status"] == "error" and "Security" in result["error"]
+        assert pool._idle is None
+
+    def test_worker_validates_code_itself(self):
+        from app.services.chart_worker import render_chart
+
+        with pytest.raises(ValueError):
+            render_chart("().__class__.__mro__[-1].__subclasses__()")
+
+    @pytest.mark.asyncio
+    async def test_worker_does_not_inherit_server_environment(self, pool, monkeypatch):
+        monkeypatch.setenv("SUPABASE_SERVICE_KEY", "server-secret")
+        await pool.start()
+
+        for worker in pool._workers:
+            environ_path = f"/proc/{worker.process.pid}/environ"
+            if not os.path.exists(environ_path):
+                pytest.skip("needs /proc")
+            with open(environ_path, "rb") as f:
+                names = {entry.split(b"=", 1)[0] for entry in f.read().split(b"\0") if entry}
+            assert b"SUPABASE_SERVICE_KEY" not in names
+            assert names <= {b"PATH", b"HOME", b"MPLCONFIGDIR", b"MPLBACKEND", b"LANG"}
+        assert (await pool.render(BAR_CHART))[:4] == b"\x89PNG"
@@ -0,0 +1,240 @@
+"""
+Test Suite — Cohere Batch Embeddings
+
+Tests that Cohere text, image and multimodal embeddings are sent with the
+API's multi-input request shape in concurrent, rate-limited batches, and
+that the embedding store is applied to the whole batch.
+
+Usage:
+    pytest tests/test_cohere_batch_embeddings.py -v
+"""
+
+import asyncio
+import importlib
+import time
+import types
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+DIMS = 1024
+
+
+class FakeCohere:
+    """Records /embed requests and answers them like the v1/v2 APIs."""
+
+    def __init__(self, delay=0.02, fail_on_call=None):
+        self.requests = []
+        self.delay = delay
+        self.fail_on_call = fail_on_call
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def client(self, *args, **kwargs):
+        fake = self
+
+        class Client:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def post(self, url, headers=None, json=None):
+                fake.requests.append((url, json, time.monotonic()))
+                call = len(fake.requests)
+                fake.in_flight += 1
+                fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                await asyncio.sleep(fake.delay)
+                fake.in_flight -= 1
+                request = httpx.Request("POST", url)
+                if call == fake.fail_on_call:
+                    return httpx.Response(429, text="rate limited", request=request)
+                inputs = json.get("texts") or json.get("inputs") or json.get("images")
+                vectors = [[float(call)] * DIMS for _ in inputs]
+                body = {"embeddings": {"float": vectors} if "inputs" in json else vectors}
+                return httpx.Response(200, json=body, request=request)
+
+        return Client()
+
+
+@pytest.fixture
+def store(tmp_path):
+    from app.services.embedding_store import EmbeddingStore
+    s = EmbeddingStore(path=str(tmp_path / "embeddings.sqlite"))
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def cohere(store):
+    # patch.dict restores sys.modules afterwards, dropping everything imported here
+    with patch.dict(sys.modules):
+        if not isinstance(sys.modules.get("app.core.config"), types.ModuleType):
+            sys.modules.pop("app.core.config", None)  # replaced by a mock in another test module
+        sys.modules.pop("app.services.cohere_embeddings", None)
+        module = importlib.import_module("app.services.cohere_embeddings")
+        fake_settings = SimpleNamespace(COHERE_API_KEY="test-key", ENABLE_EMBEDDING_CACHE=True)
+        with patch.object(module, "settings", fake_settings), \
+             patch.object(module, "embedding_store", store):
+            yield module
+
+
+def _service(module, api):
+    service = module.CohereEmbeddingsService()
+    service.min_time_between_calls = 0.0
+    patcher = patch.object(module.httpx, "AsyncClient", api.client)
+    patcher.start()
+    return service, patcher
+
+
+class TestTextBatches:
+
+    @pytest.mark.asyncio
+    async def test_misses_go_out_in_concurrent_multi_input_requests(self, cohere):
+        api = FakeCohere()
+        service, patcher = _service(cohere, api)
+        try:
+            texts = [f"chunk {i}" for i in range(250)]
+            embeddings = await service.generate_embeddings_batch(texts)
+        finally:
+            patcher.stop()
+
+        assert sorted(len(body["texts"]) for _, body, _ in api.requests) == [58, 96, 96]
+        assert api.max_in_flight > 1
+        assert len(embeddings) == 250 and all(len(e) == DIMS for e in embeddings)
+        # Results keep input order across batches
+        first_batch = next(i for i, (_, body, _) in enumerate(api.requests, 1) if body["texts"][0] == "chunk 0")
+        assert embeddings[0][0] == float(first_batch)
+
+    @pytest.mark.asyncio
+    async def test_cache_applies_to_the_whole_batch(self, cohere):
+        api = FakeCohere()
+        service, patcher = _service(cohere, api)
+        try:
+            await service.embed_texts(["aspirin", "warfarin"])
+            embeddings = await service.embed_texts(["warfarin", "heparin", "heparin", "aspirin"])
+        finally:
+            patcher.stop()
+
+        assert [body["texts"] for _, body, _ in api.requests] == [["aspirin", "warfarin"], ["heparin"]]
+        assert embeddings[1] == embeddings[2]
+        assert service.cache_stats["hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_raises_but_keeps_successful_batches(self, cohere, store):
+        api = FakeCohere(fail_on_call=2)
+        service, patcher = _service(cohere, api)
+        try:
+            with patch.object(cohere, "COHERE_EMBED_BATCH_SIZE", 2):
+                with pytest.raises(httpx.HTTPStatusError):
+                    await service.embed_texts(["a", "b", "c", "d"])
+        finally:
+            patcher.stop()
+
+        assert service.cache_stats["rate_limited"] == 1
+        cached = store.get_many("cohere", service.text_model_name, DIMS, ["a", "b", "c", "d"])
+        assert sum(1 for e in cached if e is not None) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_batches_share_the_rate_limit(self, cohere):
+        api = FakeCohere(delay=0.0)
+        service, patcher = _service(cohere, api)
+        service.min_time_between_calls = 0.05
+        try:
+            with patch.object(cohere, "COHERE_EMBED_BATCH_SIZE", 1):
+                await service.embed_texts(["a", "b", "c", "d"])
+        finally:
+            patcher.stop()
+
+        sent = sorted(at for _, _, at in api.requests)
+        assert all(b - a >= 0.045 for a, b in zip(sent, sent[1:]))
+
+
+class TestImageBatches:
+
+    @pytest.mark.asyncio
+    async def test_v4_images_and_multimodal_are_batched_and_cached_by_content(self, cohere, tmp_path):
+        figure = tmp_path / "figure.png"
+        figure.write_bytes(b"\x89PNG figure-1")
+        copy = tmp_path / "copy.png"
+        copy.write_bytes(b"\x89PNG figure-1")
+        other = tmp_path / "other.jpg"
+        other.write_bytes(b"\xff\xd8 figure-2")
+
+        api = FakeCohere()
+        service, patcher = _service(cohere, api)
+        service.multimodal_model_name = "embed-v4.0"
+        try:
+            images = await service.embed_images([str(figure), str(other)])
+            mixed = await service.embed_multimodal_batch([
+                ("Figure 1: dose response", str(figure)),
+                ("plain caption", None),
+                (None, str(copy)),
+            ])
+        finally:
+            patcher.stop()
+
+        v2_requests = [body for url, body, _ in api.requests if url.endswith("/v2/embed")]
+        assert len(v2_requests[0]["inputs"]) == 2
+        assert v2_requests[0]["inputs"][1]["content"][0]["image_url"]["url"].startswith("data:image/jpeg;base64,")
+        # Only the text+image pair is new; the identical copy is a cache hit
+        assert [len(body["inputs"]) for body in v2_requests] == [2, 1]
+        assert v2_requests[1]["inputs"][0]["content"][0] == {"type": "text", "text": "Figure 1: dose response"}
+        assert mixed[2] == images[0]
+        assert len(mixed[1]) == DIMS
+        assert v2_requests[0]["output_dimension"] == DIMS
+
+    @pytest.mark.asyncio
+    async def test_v3_sends_one_image_per_request_and_never_fuses_text(self, cohere, tmp_path):
+        # embed-english-v3.0 rejects several images, or text and an image, in one request
+        figure = tmp_path / "figure.png"
+        figure.write_bytes(b"\x89PNG figure-1")
+        other = tmp_path / "other.png"
+        other.write_bytes(b"\x89PNG figure-2")
+
+        api = FakeCohere()
+        service, patcher = _service(cohere, api)
+        try:
+            mixed = await service.embed_multimodal_batch([
+                ("Figure 1: dose response", str(figure)),
+                (None, str(other)),
+            ])
+        finally:
+            patcher.stop()
+
+        bodies = [body for _, body, _ in api.requests]
+        image_requests = [body for body in bodies if "images" in body]
+        assert service.multimodal_model_name == "embed-english-v3.0"
+        assert len(image_requests) == 2
+        assert all(len(body["images"]) == 1 and "texts" not in body for body in image_requests)
+        assert all(body["input_type"] == "image" for body in image_requests)
+        assert [body["texts"] for body in bodies if "texts" in body] == [["Figure 1: dose response"]]
+        assert not any("inputs" in body for body in bodies)
+        # The caption is folded in as the normalized mean of both vectors
+        assert sum(x * x for x in mixed[0]) == pytest.approx(1.0)
+        assert len(mixed[1]) == DIMS
+
+    @pytest.mark.asyncio
+    async def test_single_image_uses_batch_path(self, cohere, tmp_path):
+        figure = tmp_path / "figure.png"
+        figure.write_bytes(b"\x89PNG figure")
+
+        api = FakeCohere()
+        service, patcher = _service(cohere, api)
+        try:
+            embedding = await service.embed_image(str(figure))
+            with pytest.raises(FileNotFoundError):
+                await service.embed_image(str(tmp_path / "missing.png"))
+        finally:
+            patcher.stop()
+
+        assert len(embedding) == DIMS
+        assert service.cache_stats["image_requests"] == 2
@@ -0,0 +1,132 @@
+"""
+Test Suite — Context Packer
+
+Tests token counting, near-duplicate removal and budgeted, relevance /
+recency-scored packing of prompt context.
+
+Usage:
+    pytest tests/test_context_packer.py -v
+"""
+
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.context_packer import (
+    ContextPacker, Snippet, context_budget, count_tokens, truncate_to_tokens
+)
+
+
+def _passage(topic, n=40):
+    return " ".join(f"{topic} word{i}" for i in range(n))
+
+
+@pytest.fixture
+def packer():
+    return ContextPacker(granularity=1)
+
+
+class TestTokens:
+
+    def test_count_and_truncate(self):
+        text = _passage("metformin", 200)
+        assert count_tokens("") == 0
+        assert count_tokens(text) > count_tokens(text[:100]) > 0
+
+        cut = truncate_to_tokens(text, 50)
+        assert text.startswith(cut)
+        assert 0 < count_tokens(cut) <= 50
+
+    def test_budget_per_mode_and_provider(self):
+        assert context_budget("fast") < context_budget("detailed")
+        # The smaller of the mode and provider budgets wins
+        assert context_budget("detailed", provider="groq") == 5000
+        assert context_budget("fast", provider="groq") == context_budget("fast")
+        assert context_budget("detailed", reserve_tokens=1000) == context_budget("detailed") - 1000
+        with patch.dict(os.environ, {"CONTEXT_BUDGET_DETAILED": "1234"}):
+            assert context_budget("detailed") == 1234
+
+
+    def test_fallback_estimate_without_tiktoken(self):
+        from app.services import context_packer
+
+        text = _passage("metformin", 200)
+        with patch.object(context_packer, "_encoding", None):
+            estimate = count_tokens(text)
+            cut = truncate_to_tokens(text, 50)
+
+        assert estimate >= len(text) // 4
+        assert text.startswith(cut) and 0 < len(cut) < len(text)
+
+
+class TestPacking:
+
+    def test_respects_budget_and_keeps_input_order(self, packer):
+        snippets = [Snippet(_passage(f"topic{i}"), relevance=r) for i, r in enumerate([0.2, 0.9, 0.1, 0.8])]
+        budget = snippets[1].tokens + snippets[3].tokens + 10
+
+        result = packer.pack(snippets, budget)
+
+        assert [s.relevance for s in result.snippets] == [0.9, 0.8]
+        assert result.tokens <= budget
+        assert result.dropped == 2
+
+    def test_knapsack_beats_greedy(self, packer):
+        big = Snippet("big", relevance=0.9, tokens=600)
+        small_a = Snippet("small a", relevance=0.6, tokens=480)
+        small_b = Snippet("small b", relevance=0.6, tokens=480)
+
+        result = packer.pack([big, small_a, small_b], 1000)
+
+        # Greedy by score would take `big` alone (0.9); the two smaller ones score 1.2
+        assert [s.text for s in result.snippets] == ["small a", "small b"]
+
+    def test_near_duplicates_are_removed(self, packer):
+        original = _passage("ibuprofen", 60)
+        copy = original + " (retrieved twice)"
+        other = _passage("warfarin", 60)
+
+        result = packer.pack([Snippet(copy, relevance=0.4), Snippet(original, relevance=0.7), Snippet(other, relevance=0.5)], 10_000)
+
+        assert result.deduped == 1
+        assert [s.text for s in result.snippets] == [original, other]
+
+    def test_recency_breaks_ties(self, packer):
+        turns = [Snippet(_passage(f"turn{i}"), recency=(i + 1) / 3) for i in range(3)]
+        result = packer.pack(turns, turns[2].tokens + 5)
+        assert result.snippets == [turns[2]]
+
+    def test_pinned_snippets_are_truncated_not_dropped(self, packer):
+        pinned = Snippet(_passage("fda label", 400), pinned=True)
+        optional = Snippet(_passage("history"), relevance=1.0)
+
+        result = packer.pack([optional, pinned], 200)
+
+        assert result.snippets == [pinned]
+        assert pinned.tokens <= 200
+        assert result.tokens <= 200
+
+
+class TestHistory:
+
+    def test_keeps_newest_turns_that_fit(self, packer):
+        turns = [Snippet(_passage(f"turn{i}", 20 + 20 * (i % 2))) for i in range(6)]
+        budget = turns[5].tokens + turns[4].tokens + turns[3].tokens + 6
+
+        result = packer.pack_history(turns, budget)
+
+        assert result.snippets == turns[3:]
+        assert result.tokens <= budget
+        assert result.dropped == 3
+
+    def test_history_stays_contiguous(self, packer):
+        # A long middle turn ends the history there, even if older turns would still fit
+        old, long, new = Snippet("short old turn"), Snippet(_passage("long", 400)), Snippet("latest turn")
+
+        result = packer.pack_history([old, long, new], new.tokens + old.tokens + 10)
+
+        assert result.snippets == [new]
@@ -0,0 +1,209 @@
+"""
+Test Suite — Columnar Dataset Store
+
+Tests Parquet ingest of uploaded CSV/XLSX files, the sandboxed aggregate
+query engine, and the LLM plan parsing helpers.
+
+Usage:
+    pytest tests/test_dataset_store.py -v
+"""
+
+import io
+import pytest
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("pyarrow")
+
+import pandas as pd
+
+
+CSV = (
+    b"compound,IC50,dose,target\n"
+    b"aspirin,12.5,1,COX1\n"
+    b"aspirin,10.5,2,COX2\n"
+    b"ibuprofen,3.0,1,COX1\n"
+    b"ibuprofen,5.0,2,COX2\n"
+    b"celecoxib,0.5,1,COX2\n"
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    from app.services.dataset_store import DatasetStore
+    return DatasetStore(root=str(tmp_path))
+
+
+@pytest.fixture
+def conversation_id():
+    return uuid4()
+
+
+class TestIngest:
+
+    def test_csv_ingest_writes_parquet_and_profile(self, store, conversation_id):
+        manifests = store.ingest(CSV, "assay results.csv", conversation_id)
+
+        assert len(manifests) == 1
+        manifest = manifests[0]
+        assert manifest["dataset_id"] == "assay_results"
+        assert manifest["rows"] == 5
+        assert manifest["column_count"] == 4
+        ic50 = next(c for c in manifest["columns"] if c["name"] == "IC50")
+        assert ic50["min"] == 0.5 and ic50["max"] == 12.5
+        assert (store.root / str(conversation_id) / "assay_results.parquet").exists()
+        assert store.list_datasets(conversation_id)[0]["dataset_id"] == "assay_results"
+
+    def test_xlsx_sheets_become_datasets(self, store, conversation_id):
+        buf = io.BytesIO()
+        with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+            pd.DataFrame({"a": [1, 2]}).to_excel(writer, sheet_name="Plate 1", index=False)
+            pd.DataFrame({"b": ["x"]}).to_excel(writer, sheet_name="Plate 2", index=False)
+
+        manifests = store.ingest(buf.getvalue(), "plates.xlsx", conversation_id)
+        assert [m["dataset_id"] for m in manifests] == ["plates__plate_1", "plates__plate_2"]
+
+    def test_same_stem_different_extension_keeps_both(self, store, conversation_id):
+        buf = io.BytesIO()
+        with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+            pd.DataFrame({"a": [1, 2]}).to_excel(writer, sheet_name="Sheet1", index=False)
+
+        csv_id = store.ingest(CSV, "assay.csv", conversation_id)[0]["dataset_id"]
+        xlsx_id = store.ingest(buf.getvalue(), "assay.xlsx", conversation_id)[0]["dataset_id"]
+        other_id = store.ingest(CSV, "assay!.csv", conversation_id)[0]["dataset_id"]
+
+        assert csv_id == "assay" and xlsx_id == "assay_xlsx"
+        assert len({csv_id, xlsx_id, other_id}) == 3
+        assert {m["filename"] for m in store.list_datasets(conversation_id)} == {"assay.csv", "assay.xlsx", "assay!.csv"}
+        # Re-uploading keeps the file's id
+        assert store.ingest(buf.getvalue(), "assay.xlsx", conversation_id)[0]["dataset_id"] == "assay_xlsx"
+
+    def test_reupload_replaces_and_delete_removes(self, store, conversation_id):
+        store.ingest(CSV, "assay.csv", conversation_id)
+        store.ingest(CSV, "assay.csv", conversation_id)
+        assert len(store.list_datasets(conversation_id)) == 1
+
+        store.delete_file(conversation_id, "assay.csv")
+        assert store.list_datasets(conversation_id) == []
+
+        store.ingest(CSV, "assay.csv", conversation_id)
+        store.delete_conversation(conversation_id)
+        assert store.list_datasets(conversation_id) == []
+
+    def test_render_profile_has_no_row_dump(self, store, conversation_id):
+        from app.services.dataset_store import render_profile
+
+        manifest = store.ingest(CSV, "assay.csv", conversation_id)[0]
+        text = render_profile(manifest)
+        assert "5 rows × 4 columns" in text
+        assert "| IC50 | float64 | 0 | min 0.5, max 12.5" in text
+        assert "Dataset ID:** assay" in text
+
+
+class TestQuery:
+
+    def test_group_aggregate_sort(self, store, conversation_id):
+        store.ingest(CSV, "assay.csv", conversation_id)
+        result = store.query(conversation_id, {
+            "group_by": ["compound"],
+            "aggregations": [{"fn": "mean", "column": "IC50"}, {"fn": "count"}],
+            "sort": [{"column": "mean_IC50", "direction": "desc"}],
+        })
+
+        assert result["columns"] == ["compound", "mean_IC50", "count"]
+        assert result["rows"][0] == ["aspirin", 11.5, 2]
+        assert result["rows"][-1] == ["celecoxib", 0.5, 1]
+
+    def test_filters_and_row_limit(self, store, conversation_id):
+        store.ingest(CSV, "assay.csv", conversation_id)
+        result = store.query(conversation_id, {
+            "filters": [
+                {"column": "target", "op": "==", "value": "COX2"},
+                {"column": "IC50", "op": "<", "value": "6"},
+            ],
+            "select": ["compound", "IC50"],
+            "sort": [{"column": "IC50"}],
+            "limit": 1,
+        })
+
+        assert result["rows"] == [["celecoxib", 0.5]]
+        assert result["row_count"] == 2
+        assert result["truncated"] is True
+
+    def test_contains_and_scalar_aggregate(self, store, conversation_id):
+        store.ingest(CSV, "assay.csv", conversation_id)
+        result = store.query(conversation_id, {
+            "filters": [{"column": "compound", "op": "contains", "value": "PROFEN"}],
+            "aggregations": [{"fn": "sum", "column": "IC50"}],
+        })
+        assert result["rows"] == [[8.0]]
+
+    @pytest.mark.parametrize("plan", [
+        {"filters": [{"column": "missing", "op": "==", "value": 1}]},
+        {"filters": [{"column": "IC50", "op": "__import__", "value": 1}]},
+        {"aggregations": [{"fn": "eval", "column": "IC50"}]},
+        {"aggregations": [{"fn": "sum", "column": "compound"}]},
+        {"filters": [{"column": "dose", "op": ">", "value": "abc"}]},
+        {"dataset": "../../etc"},
+        {"sort": [{"column": "nope"}]},
+    ])
+    def test_invalid_plans_rejected(self, store, conversation_id, plan):
+        from app.services.dataset_store import DatasetQueryError
+
+        store.ingest(CSV, "assay.csv", conversation_id)
+        with pytest.raises(DatasetQueryError):
+            store.query(conversation_id, plan)
+
+
+class TestPlanning:
+
+    def test_parse_query_plan(self):
+        from app.services.dataset_store import parse_query_plan
+
+        assert parse_query_plan('```json\n{"dataset": "assay", "limit": 5}\n```') == {"dataset": "assay", "limit": 5}
+        assert parse_query_plan('{"dataset": null}') is None
+        assert parse_query_plan("not json") is None
+
+    @pytest.mark.asyncio
+    async def test_ai_service_dataset_context(self, store, conversation_id):
+        from app.services import ai as ai_module
+        from app.services.ai import AIService
+
+        store.ingest(CSV, "assay.csv", conversation_id)
+        provider = AsyncMock()
+        provider.generate = AsyncMock(return_value='{"dataset": "assay", "aggregations": [{"fn": "max", "column": "IC50"}]}')
+
+        with patch.object(ai_module, "dataset_store", store), \
+             patch.object(ai_module, "get_multi_provider", return_value=provider):
+            context = await AIService().get_dataset_context("What is the highest IC50?", conversation_id)
+            empty = await AIService().get_dataset_context("hello", uuid4())
+
+        assert "[SYSTEM: DATASET QUERY RESULT]" in context
+        assert "| max_IC50 |" in context and "| 12.5 |" in context
+        assert empty == ""
+        assert provider.generate.await_count == 1
+
+
+class TestLoaderIntegration:
+
+    @pytest.mark.asyncio
+    async def test_load_document_routes_tabular_uploads_to_store(self, store, conversation_id):
+        from app.services import document_loaders
+
+        loader = document_loaders.EnhancedDocumentLoader()
+        with patch.object(document_loaders, "dataset_store", store):
+            docs = await loader.load_document(
+                CSV, "assay.csv",
+                additional_metadata={"conversation_id": str(conversation_id), "user_id": str(uuid4())}
+            )
+
+        assert len(docs) == 1
+        assert docs[0].metadata["loader"] == "ColumnarDatasetStore"
+        assert docs[0].metadata["dataset_id"] == "assay"
+        assert "aspirin | 12.5" in docs[0].page_content
+        assert store.list_datasets(conversation_id)
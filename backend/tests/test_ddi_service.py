@@ -185,24 +185,48 @@ class TestInteractionChecking:
         assert result == cached
         assert result["severity"] == "Major"
 
+    @pytest.mark.asyncio
+    async def test_ai_unavailable_result_is_not_cached(self):
+        """A transient AI failure is returned but retried on the next call"""
+        from app.services.ddi_service import DDIService
+
+        service = DDIService()
+
+        with patch.object(service, 'resolve_drug', AsyncMock(return_value=None)), \
+             patch.object(service, '_check_interaction_ai', AsyncMock(
+                 side_effect=lambda a, b: service._unavailable_result(a, b))) as mock_ai:
+            first = await service.check_interaction("aspirin", "warfarin")
+            await service.check_interaction("aspirin", "warfarin")
+
+        assert service._is_unavailable(first)
+        assert service._cache == {}
+        assert mock_ai.await_count == 2
+
 
 class TestPolypharmacy:
     """Test multi-drug interaction checking"""
 
     @pytest.mark.asyncio
     async def test_check_polypharmacy_basic(self):
-        """Test polypharmacy check with 3 drugs"""
+        """Test polypharmacy check with 3 drugs uses one RxNav map and one AI batch"""
         from app.services.ddi_service import DDIService
         
         service = DDIService()
+        rxcuis = {"warfarin": "11289", "aspirin": "1191", "omeprazole": "7646"}
+        
+        async def mock_resolve(drug):
+            return rxcuis[drug]
+        
+        rxnav_pair = {"severity": "major", "description": "Increased risk of bleeding"}
         
-        # Mock check_interaction to return different results
-        async def mock_check(drug_a, drug_b):
-            if "warfarin" in drug_a.lower() and "aspirin" in drug_b.lower():
-                return {"severity": "Major", "pair": f"{drug_a} + {drug_b}"}
-            return {"severity": "None", "pair": f"{drug_a} + {drug_b}"}
+        async def mock_ai_batch(pairs):
+            return [{"severity": "None", "interaction_found": False} for _ in pairs]
         
-        with patch.object(service, 'check_interaction', side_effect=mock_check):
+        with patch.object(service, 'resolve_drug', side_effect=mock_resolve), \
+             patch.object(service, '_fetch_interaction_map', new_callable=AsyncMock) as mock_map, \
+             patch.object(service, '_check_interactions_ai_batch', side_effect=mock_ai_batch) as mock_ai:
+            mock_map.return_value = {tuple(sorted(("11289", "1191"))): rxnav_pair}
+            
             drugs = ["warfarin", "aspirin", "omeprazole"]
             interactions = await service.check_polypharmacy(drugs)
             
@@ -210,6 +234,11 @@ class TestPolypharmacy:
             assert len(interactions) == 3
             # Major should be first
             assert interactions[0]["severity"] == "Major"
+            assert interactions[0]["pair"] == "warfarin + aspirin"
+            # One RxNav request and one AI call for the two remaining pairs
+            mock_map.assert_awaited_once()
+            mock_ai.assert_called_once()
+            assert len(mock_ai.call_args.args[0]) == 2
 
     @pytest.mark.asyncio
     async def test_check_polypharmacy_two_drugs(self):
@@ -218,14 +247,59 @@ class TestPolypharmacy:
         
         service = DDIService()
         
-        with patch.object(service, 'check_interaction') as mock_check:
-            mock_check.return_value = {"severity": "Moderate"}
+        with patch.object(service, 'resolve_drug', new_callable=AsyncMock) as mock_resolve, \
+             patch.object(service, '_fetch_interaction_map', new_callable=AsyncMock) as mock_map, \
+             patch.object(service, '_check_interactions_ai_batch', new_callable=AsyncMock) as mock_ai:
+            mock_resolve.return_value = None
+            mock_map.return_value = {}
+            mock_ai.return_value = [{"severity": "Moderate"}]
             
             drugs = ["drug_a", "drug_b"]
             interactions = await service.check_polypharmacy(drugs)
             
             assert len(interactions) == 1
 
+    @pytest.mark.asyncio
+    async def test_check_polypharmacy_cache_is_order_independent(self):
+        """Test a cached A+B result answers B+A without new lookups"""
+        from app.services.ddi_service import DDIService
+        
+        service = DDIService()
+        service._cache[service._pair_key("aspirin", "warfarin")] = {
+            "drug_a": "aspirin", "drug_b": "warfarin",
+            "rxcui_a": "1191", "rxcui_b": "11289",
+            "severity": "Major", "interaction_found": True
+        }
+        
+        with patch.object(service, 'resolve_drug') as mock_resolve:
+            interactions = await service.check_polypharmacy(["Warfarin", "Aspirin"])
+        
+        mock_resolve.assert_not_called()
+        assert interactions[0]["drug_a"] == "warfarin"
+        assert interactions[0]["rxcui_a"] == "11289"
+        assert interactions[0]["pair"] == "Warfarin + Aspirin"
+
+    @pytest.mark.asyncio
+    async def test_ai_batch_maps_results_by_pair_index(self):
+        """Test the batched AI prompt result is matched back to each pair"""
+        from app.services.ddi_service import DDIService
+        
+        service = DDIService()
+        service._ai_service = MagicMock()
+        service._ai_service.generate_response = AsyncMock(return_value="""```json
+[{"pair_index": 2, "interaction_found": true, "severity": "moderate", "description": "B"},
+ {"pair_index": 1, "interaction_found": false, "severity": "None", "description": "A"}]
+```""")
+        
+        results = await service._check_interactions_ai_batch([("a", "b"), ("c", "d"), ("e", "f")])
+        
+        service._ai_service.generate_response.assert_awaited_once()
+        assert results[0]["description"] == "A"
+        assert results[1]["severity"] == "Moderate"
+        assert results[1]["drug_a"] == "c"
+        # Missing entry falls back to the safe default
+        assert service._is_unavailable(results[2])
+
     @pytest.mark.asyncio
     async def test_check_polypharmacy_single_drug(self):
         """Test polypharmacy with 1 drug (should return empty)"""
@@ -0,0 +1,243 @@
+"""
+Test Suite — Deep Research Section Writer
+
+Tests the section-by-section streaming report writer: per-section source
+selection, in-order section events, and resuming failed sections.
+
+Usage:
+    pytest tests/test_deep_research_writer.py -v
+"""
+
+import json
+import re
+import pytest
+from unittest.mock import AsyncMock, patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _heading_of(messages):
+    return re.search(r'Write ONLY the section "## (.+?)"', messages[0]["content"]).group(1)
+
+
+class FakeMultiProvider:
+    """
+    Streams canned sections; can drop the stream part-way for chosen headings.
+
+    Like MultiProviderService.generate_streaming, a stream that breaks after
+    yielding text raises instead of restarting on another provider.
+    """
+
+    def __init__(self, break_once=(), always_fail=False):
+        self.break_once = set(break_once)
+        self.always_fail = always_fail
+        self.calls = []
+
+    async def generate_streaming(self, messages, **kwargs):
+        heading = _heading_of(messages)
+        self.calls.append((heading, messages))
+        if self.always_fail:
+            raise Exception("All AI providers failed")
+        if heading in self.break_once:
+            self.break_once.discard(heading)
+            yield f"## {heading}\n\nFirst half (Smith, 2020). "
+            raise Exception("stream dropped")
+        if len(messages) > 2:
+            yield "Second half."
+            return
+        for chunk in (f"## {heading}\n\n", f"Body of {heading} ", "(Smith, 2020)."):
+            yield chunk
+
+
+def _state():
+    from app.services.deep_research import Citation, Finding, ResearchState
+
+    state = ResearchState(research_question="Artemisinin in lung cancer")
+    topics = [
+        ("Artemisinin ferroptosis pathway inhibition in A549", "mechanism pathway signaling inhibition"),
+        ("Hepatotoxicity and adverse events of artesunate", "safety adverse events toxicity"),
+        ("Randomized trial of artesunate efficacy versus docetaxel", "efficacy randomized trial survival"),
+        ("Market access and pricing of antimalarial repurposing", "cost economic pricing market"),
+    ]
+    for i, (title, content) in enumerate(topics):
+        state.findings.append(Finding(title=title, url=f"https://example.org/{i}", source="PubMed",
+                                      raw_content=f"{title}. {content}. " * 5))
+        state.citations.append(Citation(id=i + 1, title=title, authors="Smith, J", source="PubMed",
+                                        url=f"https://example.org/{i}", year="2020"))
+    return state
+
+
+@pytest.fixture
+def module():
+    from app.services import deep_research
+    with patch.object(deep_research, "DEEP_RESEARCH_WRITER_MODE", "sections"), \
+         patch.object(deep_research, "WRITER_SECTION_RETRY_BACKOFF", 0):
+        yield deep_research
+
+
+@pytest.fixture
+def service(module):
+    svc = module.DeepResearchService.__new__(module.DeepResearchService)
+    svc._container = None
+    return svc
+
+
+def _patch_provider(fake):
+    return patch("app.services.multi_provider.get_multi_provider", return_value=fake)
+
+
+class TestSectionWriter:
+
+    @pytest.mark.asyncio
+    async def test_sections_stream_in_order(self, service, module):
+        fake = FakeMultiProvider()
+        state = _state()
+        with _patch_provider(fake):
+            events = [e async for e in service._node_writer_streaming(state)]
+
+        headings = [s["heading"] for s in module.REPORT_SECTIONS]
+        assert [e["type"] for e in events] == ["report_section"] * len(headings)
+        assert [e["heading"] for e in events] == headings
+        assert events[-1]["progress"] == 98
+        assert state.status == "complete"
+        assert state.final_report.startswith("# Artemisinin in lung cancer\n")
+        positions = [state.final_report.index(f"## {h}") for h in headings]
+        assert positions == sorted(positions)
+
+    @pytest.mark.asyncio
+    async def test_each_section_gets_relevant_sources(self, service, module):
+        fake = FakeMultiProvider()
+        with _patch_provider(fake), patch.object(module, "WRITER_SECTION_SOURCES", 1):
+            await service._node_writer(_state())
+
+        prompts = {heading: messages[1]["content"] for heading, messages in fake.calls}
+        assert "Hepatotoxicity" in prompts["Safety Profiles and Adverse Events"]
+        assert "ferroptosis" in prompts["Mechanisms of Action and Pharmacodynamics"]
+        assert "Market access" in prompts["Economic Impact and Market Access"]
+        assert "Hepatotoxicity" not in prompts["Mechanisms of Action and Pharmacodynamics"]
+
+    @pytest.mark.asyncio
+    async def test_dropped_stream_resumes_from_partial_text(self, service, module):
+        fake = FakeMultiProvider(break_once={"Safety Profiles and Adverse Events"})
+        state = _state()
+        with _patch_provider(fake):
+            await service._node_writer(state)
+
+        safety_calls = [m for h, m in fake.calls if h == "Safety Profiles and Adverse Events"]
+        assert len(safety_calls) == 2
+        assert safety_calls[1][2]["role"] == "assistant"
+        assert "First half" in safety_calls[1][2]["content"]
+        assert "First half (Smith, 2020). Second half." in state.report_sections["Safety Profiles and Adverse Events"]
+        # Other sections were not rewritten
+        assert len(fake.calls) == len(module.REPORT_SECTIONS) + 1
+
+    @pytest.mark.asyncio
+    async def test_rerun_only_writes_missing_sections(self, service, module):
+        state = _state()
+        done = {s["heading"]: f"## {s['heading']}\n\nCached." for s in module.REPORT_SECTIONS[:-1]}
+        state.report_sections.update(done)
+        fake = FakeMultiProvider()
+        with _patch_provider(fake):
+            events = [e async for e in service._node_writer_streaming(state)]
+
+        assert [h for h, _ in fake.calls] == ["Conclusion and Future Directions"]
+        assert all(e["resumed"] for e in events[:-1]) and not events[-1]["resumed"]
+
+    @pytest.mark.asyncio
+    async def test_all_sections_failing_falls_back_to_single_pass(self, service, module):
+        fake = FakeMultiProvider(always_fail=True)
+        service._call_llm = AsyncMock(return_value="# Title\n\n## Executive Summary\n\nSingle pass (Smith, 2020).")
+        state = _state()
+        with _patch_provider(fake):
+            events = [e async for e in service._node_writer_streaming(state)]
+
+        assert {e["type"] for e in events} == {"report_section_error"}
+        assert len(state.failed_sections) == len(module.REPORT_SECTIONS)
+        service._call_llm.assert_awaited_once()
+        assert "Single pass" in state.final_report
+
+
+class FakeProviderAPI:
+    """OpenAI-style streaming endpoint per provider; the first one drops mid-stream."""
+
+    def __init__(self):
+        self.requests = []
+
+    def client(self, *args, **kwargs):
+        api = self
+
+        class Response:
+            status_code = 200
+
+            def __init__(self, url, payload):
+                self.url = url
+                self.payload = payload
+
+            async def aiter_lines(self):
+                def line(text):
+                    return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]})
+                if self.url.startswith("https://first"):
+                    yield line("## Safety\n\nFirst half (Smith, 2020). ")
+                    raise ConnectionError("stream dropped")
+                if len(self.payload["messages"]) > 2:
+                    yield line("Second half.")
+                else:
+                    yield line("## Safety\n\nFirst half (Smith, 2020). Second half.")
+                yield "data: [DONE]"
+
+        class Stream:
+            def __init__(self, url, payload):
+                self.response = Response(url, payload)
+
+            async def __aenter__(self):
+                return self.response
+
+            async def __aexit__(self, *exc):
+                return False
+
+        class Client:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def stream(self, method, url, headers=None, json=None):
+                api.requests.append((url, json))
+                return Stream(url, json)
+
+        return Client()
+
+
+class TestProviderFailover:
+
+    @pytest.mark.asyncio
+    async def test_mid_stream_failure_resumes_without_repeating_text(self, service, module):
+        from app.services import multi_provider
+        from app.services.multi_provider import MultiProviderService, Provider, ProviderConfig
+
+        providers = [
+            ProviderConfig(name=name, api_key="k", base_url=f"https://{host}.example", headers={},
+                           models={"detailed": "m", "deep_research": "m"})
+            for name, host in ((Provider.NVIDIA, "first"), (Provider.GROQ, "second"))
+        ]
+        mp = MultiProviderService.__new__(MultiProviderService)
+        mp.providers = providers
+
+        async def get_provider_for_mode(mode, exclude_providers=None):
+            healthy = [p for p in providers if not p.error_count and p.name.name not in (exclude_providers or ())]
+            return healthy[0] if healthy else None
+
+        mp.get_provider_for_mode = get_provider_for_mode
+        api = FakeProviderAPI()
+        section = next(s for s in module.REPORT_SECTIONS if s["heading"] == "Safety Profiles and Adverse Events")
+        with _patch_provider(mp), patch.object(multi_provider.httpx, "AsyncClient", api.client):
+            text = await service._write_section(_state(), section, [])
+
+        assert text.count("First half") == 1
+        assert text.endswith("First half (Smith, 2020). Second half.")
+        # The second provider was asked to continue, not to start over
+        assert api.requests[-1][1]["messages"][2]["role"] == "assistant"
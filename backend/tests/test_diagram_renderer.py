@@ -0,0 +1,161 @@
+"""
+Test Suite — Diagram Renderer
+
+Tests concurrent, cached Mermaid rendering shared by the DOCX / PDF /
+manuscript exports.
+
+Usage:
+    pytest tests/test_diagram_renderer.py -v
+"""
+
+import asyncio
+import io
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+
+def _png(color=(255, 255, 255)):
+    out = io.BytesIO()
+    Image.new("RGB", (120, 60), color).save(out, format="PNG")
+    return out.getvalue()
+
+
+class FakeBackend:
+    """Stand-in renderer that records calls and peak concurrency."""
+
+    name = "fake"
+
+    def __init__(self, delay=0.05, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def render(self, client, source, diagram_type="mermaid"):
+        from app.services.diagram_renderer import DiagramRenderError
+
+        self.calls.append(source)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.fail_on and self.fail_on in source:
+            raise DiagramRenderError("Diagram rendering failed: 400", status=400)
+        return _png()
+
+
+def _text(*diagrams):
+    return "\n".join(f"Intro {i}\n```mermaid\n{d}\n```" for i, d in enumerate(diagrams)) + "\nOutro"
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+@pytest.fixture
+def renderer(backend, tmp_path):
+    from app.services.diagram_renderer import DiagramRenderer
+    return DiagramRenderer(backend=backend, cache_dir=str(tmp_path), concurrency=3)
+
+
+class TestRenderTextParts:
+
+    @pytest.mark.asyncio
+    async def test_parts_keep_order_and_fetches_are_bounded(self, renderer, backend):
+        text = _text(*[f"graph TD; A{i}-->B{i}" for i in range(6)])
+        parts = await renderer.render_text_parts(text)
+
+        kinds = [p["type"] for p in parts]
+        assert kinds == ["text", "image"] * 6 + ["text"]
+        assert parts[0]["content"].startswith("Intro 0")
+        assert parts[-1]["content"] == "\nOutro"
+        assert 1 < backend.peak <= 3
+        # Watermarked output is still a PNG, and differs from the raw render
+        assert parts[1]["data"][:4] == b"\x89PNG"
+        assert parts[1]["data"] != _png()
+
+    @pytest.mark.asyncio
+    async def test_cache_and_duplicate_diagrams(self, renderer, backend, tmp_path):
+        from app.services.diagram_renderer import DiagramRenderer
+
+        text = _text("graph TD; A-->B", "graph TD; A-->B")
+        first = await renderer.render_text_parts(text)
+        assert len(backend.calls) == 1
+        assert first[1]["data"] == first[3]["data"]
+
+        # A fresh renderer (e.g. another worker or a restart) reuses the disk cache
+        other_backend = FakeBackend()
+        other = DiagramRenderer(backend=other_backend, cache_dir=str(tmp_path))
+        second = await other.render_text_parts(text)
+        assert other_backend.calls == []
+        assert second[1]["data"] == first[1]["data"]
+        assert other.stats["cache_hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_failures_become_text_and_are_not_cached(self, tmp_path):
+        from app.services.diagram_renderer import DiagramRenderer
+
+        backend = FakeBackend(fail_on="broken")
+        renderer = DiagramRenderer(backend=backend, cache_dir=str(tmp_path))
+        parts = await renderer.render_text_parts(_text("graph TD; broken", "graph TD; ok"))
+
+        assert parts[1] == {"type": "text", "content": "\n[Diagram rendering failed: 400]\n"}
+        assert parts[3]["type"] == "image"
+
+        await renderer.render_text_parts(_text("graph TD; broken"))
+        assert backend.calls.count(backend.calls[0]) == 2
+
+    @pytest.mark.asyncio
+    async def test_plain_text_passthrough(self, renderer, backend):
+        assert await renderer.render_text_parts("no diagrams") == [{"type": "text", "content": "no diagrams"}]
+        assert backend.calls == []
+
+
+class TestManuscriptDiagrams:
+
+    @pytest.mark.asyncio
+    async def test_manuscript_embeds_rendered_diagrams(self, renderer):
+        pytest.importorskip("docx")
+        from docx import Document
+        from app.services.manuscript_formatter import ManuscriptFormatter
+
+        formatter = ManuscriptFormatter()
+        structured = {
+            "title": "Report",
+            "sections": [{
+                "heading": "Findings",
+                "content": "Pathway below.\n\n```mermaid\ngraph TD; A-->B\n```\n\nAfter.",
+                "subsections": [{"heading": "Detail", "content": "```mermaid\ngraph TD; C-->D\n```"}],
+            }],
+        }
+
+        sources = formatter.diagram_sources(structured)
+        assert sources == ["graph TD; A-->B", "graph TD; C-->D"]
+        diagrams = await renderer.render_sources(sources)
+
+        doc = Document(io.BytesIO(formatter.build_docx(structured, diagrams=diagrams)))
+        assert len(doc.inline_shapes) == 2
+        text = "\n".join(p.text for p in doc.paragraphs)
+        assert "```mermaid" not in text
+        assert "Pathway below." in text and "After." in text
+
+    def test_unrendered_diagram_stays_as_text(self):
+        pytest.importorskip("docx")
+        from docx import Document
+        from app.services.manuscript_formatter import ManuscriptFormatter
+
+        structured = {"title": "Report", "sections": [{"heading": "S", "content": "```mermaid\ngraph TD; A-->B\n```"}]}
+        doc = Document(io.BytesIO(ManuscriptFormatter().build_docx(structured)))
+        assert len(doc.inline_shapes) == 0
+        assert any("graph TD; A-->B" in p.text for p in doc.paragraphs)
@@ -0,0 +1,271 @@
+"""
+Test Suite — Embedding Migration Engine
+
+Tests that the migration embeds whole pages per provider call, writes each
+page with one bulk RPC, resumes from its persisted keyset cursor, backs off
+when the provider rate-limits, and supports dual-write with cutover.
+
+Usage:
+    pytest tests/test_embedding_migration_engine.py -v
+"""
+
+import asyncio
+import importlib
+import types
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import UUID
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIMS = 4
+
+
+def _chunk_id(i):
+    return str(UUID(int=i + 1))
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.row_limit = None
+        self.payload = None
+
+    def select(self, *columns, **kwargs):
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def or_(self, expression):
+        # Only the dual-write filter is used: "next is null or next != target"
+        target = expression.rsplit(".", 1)[-1]
+        self.filters.append(lambda row: row["embedding_next_version"] != target)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        self.payload = row
+        return self
+
+    def execute(self):
+        if self.table == "embedding_migration_runs":
+            if self.payload is not None:
+                self.db.runs[self.payload["run_id"]] = dict(self.payload)
+                return SimpleNamespace(data=[self.payload])
+            rows = [r for r in self.db.runs.values() if all(f(r) for f in self.filters)]
+            return SimpleNamespace(data=[dict(r) for r in rows])
+        if self.table != "document_chunks":
+            return SimpleNamespace(data=[])
+        rows = sorted((r for r in self.db.chunks.values() if all(f(r) for f in self.filters)),
+                      key=lambda r: r["id"])
+        self.db.pages.append(len(rows[:self.row_limit]))
+        return SimpleNamespace(data=[{"id": r["id"], "content": r["content"]} for r in rows[:self.row_limit]])
+
+
+class FakeDB:
+    def __init__(self, n_chunks, fail_writes_after=None):
+        self.chunks = {
+            _chunk_id(i): {"id": _chunk_id(i), "content": f"chunk {i}", "embedding": None,
+                           "embedding_version": "hash-v1", "embedding_next": None,
+                           "embedding_next_version": None}
+            for i in range(n_chunks)
+        }
+        self.runs = {}
+        self.pages = []
+        self.writes = []
+        self.fail_writes_after = fail_writes_after
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        def execute():
+            if name == "write_chunk_embeddings":
+                if self.fail_writes_after is not None and len(self.writes) >= self.fail_writes_after:
+                    raise ConnectionError("database went away")
+                self.writes.append(len(params["p_rows"]))
+                column = "embedding_next" if params["p_dual_write"] else "embedding"
+                for row in params["p_rows"]:
+                    chunk = self.chunks[row["id"]]
+                    chunk[column] = row["embedding"]
+                    chunk[column + "_version" if params["p_dual_write"] else "embedding_version"] = params["p_version"]
+                return SimpleNamespace(data=len(params["p_rows"]))
+            if name == "cutover_chunk_embeddings":
+                swapped = 0
+                for chunk in self.chunks.values():
+                    if chunk["embedding_next_version"] == params["p_version"]:
+                        chunk.update(embedding=chunk["embedding_next"], embedding_version=params["p_version"],
+                                     embedding_next=None, embedding_next_version=None)
+                        swapped += 1
+                return SimpleNamespace(data=swapped)
+            raise Exception(f"unknown function {name}")
+        return SimpleNamespace(execute=execute)
+
+
+class FakeEmbeddings:
+    """Batch embedder that can answer a number of calls with HTTP 429."""
+
+    def __init__(self, rate_limit_calls=0, delay=0.0):
+        self.calls = []
+        self.rate_limit_calls = rate_limit_calls
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cache_stats = {"rate_limited": 0}
+
+    async def generate_embeddings_batch(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        self.calls.append(list(texts))
+        if len(self.calls) <= self.rate_limit_calls:
+            self.cache_stats["rate_limited"] += 1
+            return [None] * len(texts)
+        return [[float(len(self.calls))] * DIMS for _ in texts]
+
+
+@pytest.fixture
+def migration():
+    fake_database = types.ModuleType("app.core.database")
+
+    async def async_db_execute(func, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    fake_database.async_db_execute = async_db_execute
+    # patch.dict restores sys.modules afterwards, dropping everything imported here
+    with patch.dict(sys.modules, {"app.core.database": fake_database}):
+        if not isinstance(sys.modules.get("app.core.config"), types.ModuleType):
+            sys.modules.pop("app.core.config", None)  # replaced by a mock in another test module
+        sys.modules.pop("app.services.migration", None)
+        module = importlib.import_module("app.services.migration")
+        fake_settings = SimpleNamespace(EMBEDDING_MIGRATION_ENABLED=True, USE_MISTRAL_EMBEDDINGS=True,
+                                        EMBEDDING_BATCH_SIZE=10, MIGRATION_PARALLEL_WORKERS=2,
+                                        MISTRAL_EMBED_DIMENSIONS=DIMS)
+        with patch.object(module, "settings", fake_settings), \
+             patch.object(module, "MIGRATION_MAX_CONCURRENCY", 4):
+            yield module
+
+
+def _service(module, db, embeddings):
+    service = module.EmbeddingMigrationService(db)
+    service.embeddings_service = embeddings
+    return service
+
+
+class TestBulkPipeline:
+
+    @pytest.mark.asyncio
+    async def test_one_provider_call_and_one_write_per_page(self, migration):
+        db = FakeDB(25)
+        embeddings = FakeEmbeddings()
+
+        result = await _service(migration, db, embeddings).run_migration()
+
+        assert result["success"]
+        assert sorted(len(call) for call in embeddings.calls) == [5, 10, 10]
+        assert sorted(db.writes) == [5, 10, 10]
+        assert all(c["embedding_version"] == "mistral-v1" for c in db.chunks.values())
+        assert db.runs["default"]["status"] == "done"
+        assert db.runs["default"]["processed"] == 25
+
+    @pytest.mark.asyncio
+    async def test_resumes_from_persisted_cursor(self, migration):
+        db = FakeDB(30, fail_writes_after=1)
+
+        crashed = await _service(migration, db, FakeEmbeddings()).run_migration(batch_size=10)
+
+        assert not crashed["success"]
+        assert db.runs["default"]["status"] == "failed"
+        cursor = db.runs["default"]["cursor_id"]
+        assert cursor == _chunk_id(9)
+        assert crashed["stats"]["total_processed"] == 10
+
+        # A new process picks the run up after the last written page
+        db.fail_writes_after = None
+        embeddings = FakeEmbeddings()
+        resumed = await _service(migration, db, embeddings).run_migration(batch_size=10)
+
+        assert resumed["success"]
+        assert all(text not in {f"chunk {i}" for i in range(10)} for call in embeddings.calls for text in call)
+        assert all(c["embedding_version"] == "mistral-v1" for c in db.chunks.values())
+        assert db.runs["default"]["status"] == "done"
+
+    @pytest.mark.asyncio
+    async def test_max_chunks_pauses_the_run(self, migration):
+        db = FakeDB(30)
+
+        first = await _service(migration, db, FakeEmbeddings()).run_migration(max_chunks=12, batch_size=10)
+
+        assert first["success"] and "paused" in first["message"]
+        assert db.runs["default"]["status"] == "running"
+        assert sum(1 for c in db.chunks.values() if c["embedding_version"] == "mistral-v1") == 12
+        assert db.runs["default"]["cursor_id"] == _chunk_id(11)
+
+
+class TestAdaptiveConcurrency:
+
+    @pytest.mark.asyncio
+    async def test_backs_off_on_rate_limits(self, migration):
+        db = FakeDB(20)
+        embeddings = FakeEmbeddings(rate_limit_calls=2, delay=0.01)
+
+        result = await _service(migration, db, embeddings).run_migration(batch_size=5)
+
+        assert result["concurrency"]["final"] <= 2
+        assert embeddings.max_in_flight <= 4
+        assert result["stats"]["failed_migrations"] == 10
+        # Throttled chunks stay on the legacy version for the next pass
+        assert sum(1 for c in db.chunks.values() if c["embedding_version"] == "hash-v1") == 10
+
+    @pytest.mark.asyncio
+    async def test_limit_grows_while_calls_succeed(self, migration):
+        limiter = migration.AdaptiveConcurrency(initial=2, maximum=4)
+
+        for _ in range(5):
+            await limiter.record(throttled=False)
+        assert limiter.limit == 4
+
+        await limiter.record(throttled=True)
+        assert limiter.limit == 2 and limiter.peak == 4
+
+
+class TestDualWrite:
+
+    @pytest.mark.asyncio
+    async def test_dual_write_keeps_old_vectors_until_cutover(self, migration):
+        db = FakeDB(12)
+        service = _service(migration, db, FakeEmbeddings())
+
+        result = await service.run_migration(dual_write=True, run_id="next")
+
+        assert result["success"]
+        assert all(c["embedding"] is None and c["embedding_version"] == "hash-v1" for c in db.chunks.values())
+        assert all(c["embedding_next_version"] == "mistral-v1" for c in db.chunks.values())
+
+        cutover = await service.cutover()
+
+        assert cutover["swapped"] == 12
+        assert all(c["embedding"] and c["embedding_version"] == "mistral-v1" for c in db.chunks.values())
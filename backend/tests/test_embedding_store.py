@@ -0,0 +1,139 @@
+"""
+Test Suite — Persistent Embedding Store
+
+Tests the content-addressed embedding store (persistence, key separation,
+front cache, eviction) and its use by the embedding services' batch paths.
+
+Usage:
+    pytest tests/test_embedding_store.py -v
+"""
+
+import asyncio
+import importlib
+import time
+import types
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def store(tmp_path):
+    from app.services.embedding_store import EmbeddingStore
+    s = EmbeddingStore(path=str(tmp_path / "embeddings.sqlite"), max_entries=10, memory_entries=2)
+    yield s
+    s.close()
+
+
+class TestEmbeddingStore:
+    """Persistence, key separation, front cache and eviction"""
+
+    def test_batch_roundtrip_preserves_order(self, store):
+        store.put_many("mistral", "mistral-embed", 3, ["a", "b"], [[0.5, 0.25, 1.0], [1.0, 2.0, 3.0]])
+
+        found = store.get_many("mistral", "mistral-embed", 3, ["b", "missing", "a"])
+
+        assert found == [[1.0, 2.0, 3.0], None, [0.5, 0.25, 1.0]]
+        assert store.stats["hits"] == 2 and store.stats["misses"] == 1
+
+    def test_persists_across_instances(self, tmp_path):
+        from app.services.embedding_store import EmbeddingStore
+        path = str(tmp_path / "embeddings.sqlite")
+
+        first = EmbeddingStore(path=path)
+        first.put_many("cohere", "embed-english-v3.0", 2, ["aspirin"], [[0.1, 0.2]])
+        first.close()
+
+        second = EmbeddingStore(path=path)
+        [vector] = second.get_many("cohere", "embed-english-v3.0", 2, ["aspirin"])
+        assert vector == pytest.approx([0.1, 0.2])
+        assert second.size() == 1
+        second.close()
+
+    def test_keys_are_scoped_to_the_embedding_space(self, store):
+        store.put_many("mistral", "mistral-embed", 2, ["text"], [[1.0, 1.0]])
+
+        assert store.get_many("cohere", "mistral-embed", 2, ["text"]) == [None]
+        assert store.get_many("mistral", "mistral-embed-v2", 2, ["text"]) == [None]
+        assert store.get_many("mistral", "mistral-embed", 3, ["text"]) == [None]
+
+    def test_front_cache_serves_hot_keys(self, store):
+        store.put_many("p", "m", 1, ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+        store.clear_memory()
+
+        store.get_many("p", "m", 1, ["a"])
+        store.get_many("p", "m", 1, ["a"])
+
+        assert store.stats["memory_hits"] == 1
+        assert len(store._memory) == 1
+
+    def test_evicts_least_recently_used(self, store):
+        for i in range(10):
+            store.put_many("p", "m", 1, [f"t{i}"], [[float(i)]])
+            time.sleep(0.002)
+        store.clear_memory()
+        store.get_many("p", "m", 1, ["t0"])  # t0 becomes most recently used
+
+        store.put_many("p", "m", 1, ["new"], [[99.0]])
+
+        store.clear_memory()
+        assert store.size() < 10
+        assert store.get_many("p", "m", 1, ["t0", "new"]) == [[0.0], [99.0]]
+        assert store.get_many("p", "m", 1, ["t1"]) == [None]
+
+    @pytest.mark.asyncio
+    async def test_front_cache_and_stats_do_not_wait_for_sqlite(self, store):
+        store.put_many("p", "m", 1, ["hot"], [[1.0]])
+
+        # A put_many in a worker thread holds the SQLite lock for its whole write
+        with store._db_lock:
+            found = await asyncio.wait_for(store.aget_many("p", "m", 1, ["hot"]), 1)
+            stats = store.get_stats()
+
+        assert found == [[1.0]]
+        assert stats["entries"] == 1 and stats["memory_hits"] == 1
+
+
+class TestServiceIntegration:
+    """Embedding services read and write the store in batches"""
+
+    @pytest.fixture
+    def mistral(self, store):
+        # patch.dict restores sys.modules afterwards, dropping everything imported here
+        with patch.dict(sys.modules):
+            if not isinstance(sys.modules.get("app.core.config"), types.ModuleType):
+                sys.modules.pop("app.core.config", None)  # replaced by a mock in another test module
+            sys.modules.pop("app.services.mistral_embeddings", None)
+            module = importlib.import_module("app.services.mistral_embeddings")
+            fake_settings = SimpleNamespace(MISTRAL_API_KEY="test-key", ENABLE_EMBEDDING_CACHE=True,
+                                            FALLBACK_TO_HASH_EMBEDDINGS=False)
+            with patch.object(module, "settings", fake_settings), \
+                 patch.object(module, "embedding_store", store):
+                yield module
+
+    @pytest.mark.asyncio
+    async def test_batch_only_sends_misses_and_persists_results(self, mistral, store):
+        calls = []
+
+        async def fake_api(texts):
+            calls.append(list(texts))
+            return [[float(len(t))] * 1024 for t in texts]
+
+        service = mistral.MistralEmbeddingsService()
+        service._generate_embeddings_batch_with_api = fake_api
+        await service.generate_embeddings_batch(["alpha", "beta"])
+
+        # A fresh worker process shares the persistent store
+        store.clear_memory()
+        other = mistral.MistralEmbeddingsService()
+        other._generate_embeddings_batch_with_api = fake_api
+        result = await other.generate_embeddings_batch(["beta", "gamma!", "alpha"])
+
+        assert calls == [["alpha", "beta"], ["gamma!"]]
+        assert [v[0] for v in result] == [4.0, 6.0, 5.0]
+        assert other.cache_stats["hits"] == 2
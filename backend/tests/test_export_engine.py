@@ -0,0 +1,158 @@
+"""
+Test Suite — Conversation Export Engine
+
+Tests paged, off-loop DOCX / PDF / manuscript export with the
+conversation-version file cache.
+
+Usage:
+    pytest tests/test_export_engine.py -v
+"""
+
+import threading
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+docx = pytest.importorskip("docx")
+
+
+class FakeChatService:
+    """Serves a synthetic thread in pages and records how it was read."""
+
+    def __init__(self, count=120):
+        self.messages = [
+            SimpleNamespace(
+                id=str(uuid4()),
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"Message {i} about **pharmacokinetics**",
+                created_at=datetime(2026, 1, 1),
+            )
+            for i in range(count)
+        ]
+        self.page_sizes = []
+
+    async def get_thread_message_ids(self, conversation_id, user):
+        return [m.id for m in self.messages]
+
+    async def iter_messages_by_id(self, ids, user, batch_size=100):
+        by_id = {m.id: m for m in self.messages}
+        for i in range(0, len(ids), batch_size):
+            page = [by_id[m] for m in ids[i:i + batch_size]]
+            self.page_sizes.append(len(page))
+            yield page
+
+
+class FakeRenderer:
+    async def render_text_parts(self, text):
+        return [{"type": "text", "content": text}]
+
+    async def render_sources(self, sources):
+        return {}
+
+
+@pytest.fixture
+def conversation():
+    return SimpleNamespace(id=uuid4(), title="PK study", updated_at="2026-01-01T00:00:00")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    from app.services.export_engine import ExportEngine
+    eng = ExportEngine(cache_dir=str(tmp_path), batch_size=25)
+    with patch("app.services.export_engine.diagram_renderer", FakeRenderer()):
+        yield eng
+    eng.shutdown()
+
+
+class TestConversationExport:
+
+    @pytest.mark.asyncio
+    async def test_docx_is_paged_and_written_to_disk(self, engine, conversation):
+        chat = FakeChatService(120)
+        path = await engine.export_conversation("docx", conversation, None, chat)
+
+        assert chat.page_sizes == [25, 25, 25, 25, 20]
+        doc = docx.Document(str(path))
+        text = "\n".join(p.text for p in doc.paragraphs)
+        assert doc.paragraphs[0].text == "PK study"
+        # The header is the conversation version, not the build time, so cached files stay correct
+        assert doc.paragraphs[1].text == "Conversation as of: 2026-01-01 00:00:00"
+        assert "Message 0 about pharmacokinetics" in text
+        assert "Message 119 about pharmacokinetics" in text
+        assert text.index("Message 5 ") < text.index("Message 60 ")
+
+    @pytest.mark.asyncio
+    async def test_builder_runs_in_export_pool(self, engine, conversation):
+        from app.services import export_engine as module
+
+        seen = []
+        original = module.build_conversation_docx
+
+        def spy(title, items, path, as_of):
+            seen.append(threading.current_thread().name)
+            return original(title, items, path, as_of)
+
+        with patch.dict(module.__dict__, {"build_conversation_docx": spy}):
+            await engine.export_conversation("docx", conversation, None, FakeChatService(3))
+
+        assert seen and seen[0].startswith("export")
+
+    @pytest.mark.asyncio
+    async def test_unchanged_conversation_is_served_from_cache(self, engine, conversation):
+        chat = FakeChatService(10)
+        first = await engine.export_conversation("docx", conversation, None, chat)
+        second = await engine.export_conversation("docx", conversation, None, chat)
+        assert first == second
+        assert len(chat.page_sizes) == 1
+
+        # A new message changes the version hash
+        chat.messages.append(SimpleNamespace(id=str(uuid4()), role="user", content="new", created_at=None))
+        third = await engine.export_conversation("docx", conversation, None, chat)
+        assert third != first
+
+    @pytest.mark.asyncio
+    async def test_pdf_export(self, engine, conversation):
+        pytest.importorskip("xhtml2pdf")
+        path = await engine.export_conversation("pdf", conversation, None, FakeChatService(6))
+        with open(path, "rb") as f:
+            assert f.read(4) == b"%PDF"
+
+    @pytest.mark.asyncio
+    async def test_builder_failure_propagates_and_leaves_no_file(self, engine, conversation):
+        from app.services import export_engine as module
+
+        def broken(title, items, path, as_of):
+            next(iter(items))
+            raise ValueError("builder exploded")
+
+        with patch.dict(module.__dict__, {"build_conversation_docx": broken}):
+            with pytest.raises(ValueError, match="builder exploded"):
+                await engine.export_conversation("docx", conversation, None, FakeChatService(200))
+
+        assert list(engine.cache_dir.iterdir()) == []
+
+
+class TestManuscriptExport:
+
+    @pytest.mark.asyncio
+    async def test_manuscript_written_to_file(self, engine, conversation):
+        from app.services.manuscript_formatter import ManuscriptFormatter
+
+        path = await engine.export_manuscript(conversation, None, FakeChatService(8), ManuscriptFormatter(), style="plain")
+        doc = docx.Document(str(path))
+        assert any("Generated by Benchside" in p.text for p in doc.paragraphs)
+
+    @pytest.mark.asyncio
+    async def test_empty_conversation(self, engine, conversation):
+        from app.services.manuscript_formatter import ManuscriptFormatter
+
+        with pytest.raises(LookupError):
+            await engine.export_manuscript(conversation, None, FakeChatService(0), ManuscriptFormatter())
+
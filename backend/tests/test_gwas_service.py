@@ -7,6 +7,7 @@ Usage:
     pytest tests/test_gwas_service.py -v
 """
 
+import httpx
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 import sys
@@ -129,6 +130,103 @@ class TestVariantLookup:
                         assert result["found"] is False
 
 
+class TestBatchLookup:
+    """Test bulk variant annotation"""
+
+    @pytest.mark.asyncio
+    async def test_lookup_variants_streams_each_variant(self):
+        """Test batch lookup uses one Ensembl POST and yields every variant"""
+        from app.services.gwas_service import GWASService
+        
+        service = GWASService()
+        
+        with patch.object(service, '_query_ensembl_batch', new_callable=AsyncMock) as mock_bulk, \
+             patch.object(service, '_query_ensembl') as mock_single, \
+             patch.object(service, '_query_gwas_catalog', new_callable=AsyncMock) as mock_gwas, \
+             patch.object(service, '_query_open_targets', new_callable=AsyncMock) as mock_ot, \
+             patch.object(service, '_query_clinvar', new_callable=AsyncMock) as mock_clinvar:
+            mock_bulk.return_value = {"rs7903146": {"source": "ensembl", "chromosome": "10"}}
+            mock_gwas.return_value = None
+            mock_ot.return_value = None
+            mock_clinvar.return_value = None
+            
+            results = [r async for r in service.lookup_variants(["rs7903146", "rs1", "RS7903146"])]
+        
+        by_rsid = {r["rsid"]: r for r in results}
+        assert set(by_rsid) == {"rs7903146", "rs1"}
+        assert by_rsid["rs7903146"]["found"] is True
+        assert by_rsid["rs1"]["found"] is False
+        mock_bulk.assert_awaited_once()
+        mock_single.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_unknown_variants_are_negative_cached(self):
+        """Test a not-found rsID is served from cache on the next lookup"""
+        from app.services.gwas_service import GWASService
+        
+        service = GWASService()
+        
+        with patch.object(service, '_query_ensembl', new_callable=AsyncMock) as mock_ensembl, \
+             patch.object(service, '_query_gwas_catalog', new_callable=AsyncMock) as mock_gwas, \
+             patch.object(service, '_query_open_targets', new_callable=AsyncMock) as mock_ot, \
+             patch.object(service, '_query_clinvar', new_callable=AsyncMock) as mock_clinvar:
+            for mock in (mock_ensembl, mock_gwas, mock_ot, mock_clinvar):
+                mock.return_value = None
+            
+            await service.lookup_variant("rs999999999")
+            results = [r async for r in service.lookup_variants(["rs999999999"])]
+        
+        assert results[0]["found"] is False
+        assert mock_ensembl.await_count == 1
+        assert "rs999999999" in service._negative_cache
+        assert "rs999999999" not in service._cache
+
+    @pytest.mark.asyncio
+    async def test_failed_sources_are_not_negative_cached(self):
+        """Test a lookup where sources errored is retried instead of cached as missing"""
+        from app.services.gwas_service import GWASService
+        
+        service = GWASService()
+        outage = httpx.ConnectError("Ensembl unreachable")
+        
+        with patch.object(service, '_query_ensembl', new_callable=AsyncMock) as mock_ensembl, \
+             patch.object(service, '_query_ensembl_batch', new_callable=AsyncMock) as mock_bulk, \
+             patch.object(service, '_query_gwas_catalog', new_callable=AsyncMock) as mock_gwas, \
+             patch.object(service, '_query_open_targets', new_callable=AsyncMock) as mock_ot, \
+             patch.object(service, '_query_clinvar', new_callable=AsyncMock) as mock_clinvar:
+            for mock in (mock_ensembl, mock_bulk, mock_gwas, mock_ot, mock_clinvar):
+                mock.side_effect = outage
+            
+            single = await service.lookup_variant("rs7903146")
+            batch = [r async for r in service.lookup_variants(["rs7903146"])]
+            
+            # One source down, the others answered "not found": still not cached
+            mock_ensembl.side_effect = None
+            mock_ensembl.return_value = None
+            mock_gwas.side_effect = None
+            mock_gwas.return_value = []
+            await service.lookup_variant("rs7903146")
+        
+        assert single["found"] is False and batch[0]["found"] is False
+        assert mock_ensembl.await_count == 2
+        assert mock_bulk.await_count == 1
+        assert "rs7903146" not in service._negative_cache
+        assert "rs7903146" not in service._cache
+
+    @pytest.mark.asyncio
+    async def test_invalid_rsid_skips_network(self):
+        """Test malformed IDs are rejected without querying any API"""
+        from app.services.gwas_service import GWASService
+        
+        service = GWASService()
+        
+        with patch.object(service, '_query_ensembl_batch', new_callable=AsyncMock) as mock_bulk:
+            results = [r async for r in service.lookup_variants(["not_an_rsid"])]
+        
+        assert results[0]["found"] is False
+        mock_bulk.assert_not_called()
+
+
 class TestEnsemblQuery:
     """Test Ensembl API querying"""
 
@@ -0,0 +1,141 @@
+"""
+Test Suite — Generation Job Store
+
+Tests the durable slide/doc job store: event log replay, cross-worker
+visibility, on-disk artifacts and TTL/size eviction.
+
+Usage:
+    pytest tests/test_job_store.py -v
+"""
+
+import asyncio
+import os
+import sys
+import time
+import pytest
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(params=["filesystem", "memory"])
+def store(request, tmp_path):
+    from app.services.job_store import FilesystemJobBackend, JobStore, MemoryJobBackend
+    if request.param == "memory":
+        return JobStore(MemoryJobBackend(), artifact_dir=str(tmp_path / "artifacts"), poll_interval=0.05)
+    return JobStore(FilesystemJobBackend(str(tmp_path)), poll_interval=0.05)
+
+
+async def _collect(store, job_id):
+    return [event async for event in store.follow(job_id)]
+
+
+class TestJobLifecycle:
+
+    @pytest.mark.asyncio
+    async def test_progress_artifact_and_replay(self, store):
+        job_id = store.create("slides", total=3)
+        await store.publish(job_id, {"step": "content", "current": 1, "total": 3, "message": "Writing"})
+        await store.complete(job_id, b"PK-bytes", "deck.pptx", "application/octet-stream")
+
+        job = store.get(job_id)
+        assert job["status"] == "complete"
+        assert job["current"] == 1 and job["message"] == "Writing"
+
+        artifact = store.artifact(job_id)
+        assert artifact["filename"] == "deck.pptx"
+        with open(artifact["path"], "rb") as f:
+            assert f.read() == b"PK-bytes"
+
+        # A late subscriber still sees the full history
+        events = await _collect(store, job_id)
+        assert events == [
+            {"step": "content", "current": 1, "total": 3, "message": "Writing"},
+            {"status": "complete", "job_id": job_id},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_follow_waits_for_live_events(self, store):
+        job_id = store.create("doc")
+        follower = asyncio.create_task(_collect(store, job_id))
+        await asyncio.sleep(0.01)
+        await store.publish(job_id, {"message": "Section 1"})
+        await store.fail(job_id, "boom")
+
+        events = await asyncio.wait_for(follower, timeout=2)
+        assert events == [{"message": "Section 1"}, {"status": "error", "error": "boom"}]
+        assert store.get(job_id)["error"] == "boom"
+        assert store.artifact(job_id) is None
+
+    @pytest.mark.asyncio
+    async def test_follow_ends_when_job_goes_stale(self, store):
+        job_id = store.create("slides")
+        await store.publish(job_id, {"message": "Slide 1"})
+        store.stale_seconds = 0.2  # the worker running it died
+
+        events = await asyncio.wait_for(_collect(store, job_id), timeout=2)
+
+        assert events[0] == {"message": "Slide 1"}
+        assert events[-1]["status"] == "error"
+        assert store.get(job_id)["status"] == "error"
+
+    def test_unknown_job(self, store):
+        assert store.get("7b1e4a7e-0000-4000-8000-000000000000") is None
+        assert store.artifact("7b1e4a7e-0000-4000-8000-000000000000") is None
+
+
+class TestCrossWorker:
+
+    @pytest.mark.asyncio
+    async def test_second_store_on_same_directory_sees_job(self, tmp_path):
+        from app.services.job_store import FilesystemJobBackend, JobStore
+
+        worker_a = JobStore(FilesystemJobBackend(str(tmp_path)), poll_interval=0.05)
+        worker_b = JobStore(FilesystemJobBackend(str(tmp_path)), poll_interval=0.05)
+
+        job_id = worker_a.create("slides")
+        follower = asyncio.create_task(_collect(worker_b, job_id))
+        await worker_a.publish(job_id, {"message": "half way"})
+        await worker_a.complete(job_id, b"data", "deck.pptx", "application/octet-stream")
+
+        events = await asyncio.wait_for(follower, timeout=2)
+        assert [e.get("message") or e.get("status") for e in events] == ["half way", "complete"]
+        assert worker_b.artifact(job_id)["size"] == 4
+
+    def test_rejects_non_uuid_ids(self, tmp_path):
+        from app.services.job_store import FilesystemJobBackend, JobStore
+
+        store = JobStore(FilesystemJobBackend(str(tmp_path / "jobs")))
+        assert store.get("../../etc") is None
+
+
+class TestEviction:
+
+    @pytest.mark.asyncio
+    async def test_expired_jobs_are_removed(self, store):
+        job_id = store.create("doc")
+        await store.complete(job_id, b"x", "a.docx", "application/octet-stream")
+        path = store.artifact(job_id)["path"]
+
+        store.ttl_seconds = 0
+        time.sleep(0.01)
+        assert store.purge() == 1
+        assert store.get(job_id) is None
+        assert not os.path.exists(path)
+
+    @pytest.mark.asyncio
+    async def test_size_cap_evicts_oldest_finished_first(self, store):
+        store.max_jobs = 3
+        running = store.create("slides")
+        finished = []
+        for _ in range(2):
+            job_id = store.create("doc")
+            await store.complete(job_id, b"x", "a.docx", "application/octet-stream")
+            finished.append(job_id)
+
+        newest = store.create("doc")
+
+        assert store.get(finished[0]) is None
+        assert store.get(finished[1]) is not None
+        assert store.get(running) is not None
+        assert store.get(newest) is not None
@@ -0,0 +1,133 @@
+"""
+Test Suite — Lab Report Section DAG
+
+Tests concurrent, dependency-aware section generation in LabReportService.
+
+Usage:
+    pytest tests/test_lab_report.py -v
+"""
+
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+SECTION_KEYWORDS = {
+    "title": "title for the lab report",
+    "introduction": "Introduction section",
+    "materials_methods": "Materials and Methods section",
+    "results": "Results section",
+    "discussion": "Discussion section",
+    "conclusion": "Conclusion (1-2 paragraphs)",
+    "references": "reference list",
+}
+
+
+def _section_of(prompt):
+    return next(name for name, key in SECTION_KEYWORDS.items() if key in prompt)
+
+
+class FakeLLM:
+    """Records call timing per section and returns canned text."""
+
+    def __init__(self, delay=0.05, fail_once=()):
+        self.delay = delay
+        self.fail_once = set(fail_once)
+        self.started = {}
+        self.finished = {}
+        self.calls = []
+
+    async def __call__(self, system_prompt, user_prompt, json_mode=False):
+        name = _section_of(user_prompt)
+        self.calls.append(name)
+        self.started.setdefault(name, time.monotonic())
+        await asyncio.sleep(self.delay)
+        self.finished[name] = time.monotonic()
+        if name in self.fail_once:
+            self.fail_once.discard(name)
+            return ""
+        if name == "references":
+            return "1. Smith J. Pharmacology. 2020."
+        return f"{name} text"
+
+
+@pytest.fixture
+def service():
+    from app.services import lab_report
+    with patch.object(lab_report, "settings", MagicMock(MISTRAL_API_KEY="test-key")):
+        return lab_report.LabReportService()
+
+
+@pytest.fixture(autouse=True)
+def no_serper():
+    """Force the LLM reference fallback."""
+    with patch("app.core.container.container.get", side_effect=RuntimeError("no container")):
+        yield
+
+
+class TestSectionDAG:
+
+    @pytest.mark.asyncio
+    async def test_runs_independent_sections_concurrently(self, service):
+        llm = FakeLLM(delay=0.1)
+        with patch.object(service, "_call_llm", llm):
+            t0 = time.monotonic()
+            report = await service.generate_report("Therapeutic Index", "dose data", "methods")
+            elapsed = time.monotonic() - t0
+
+        assert report["status"] == "complete"
+        assert report["failed_sections"] == []
+        # Longest chain is results -> discussion -> conclusion/references (3 calls), not 7
+        assert elapsed < 0.6
+        assert llm.started["discussion"] >= llm.finished["results"]
+        assert llm.started["conclusion"] >= llm.finished["discussion"]
+        assert llm.started["references"] >= llm.finished["introduction"]
+
+    @pytest.mark.asyncio
+    async def test_streamed_markdown_matches_full_report(self, service):
+        llm = FakeLLM()
+        events = []
+        with patch.object(service, "_call_llm", llm):
+            async for event in service.generate_report_stream("Therapeutic Index", "dose data", "methods"):
+                events.append(event)
+
+        landed = [e["name"] for e in events if e["type"] == "section"]
+        assert sorted(landed) == sorted(SECTION_KEYWORDS)
+        streamed = "".join(e["text"] for e in events if e["type"] == "markdown")
+        report = events[-1]["report"]
+        assert events[-1]["type"] == "complete"
+        assert streamed == report["full_report"]
+        assert streamed.index("## 1. Introduction") < streamed.index("## 4. Discussion") < streamed.index("## 6. References")
+        assert "1. Smith J. Pharmacology. 2020." in streamed
+
+    @pytest.mark.asyncio
+    async def test_section_retry_and_failure(self, service):
+        llm = FakeLLM(fail_once={"results"})
+        with patch.object(service, "_call_llm", llm), \
+             patch("app.services.lab_report.SECTION_RETRY_BACKOFF", 0):
+            report = await service.generate_report("Therapeutic Index", "dose data", "methods")
+
+        assert llm.calls.count("results") == 2
+        assert report["sections"]["results"] == "results text"
+        assert report["failed_sections"] == []
+
+    @pytest.mark.asyncio
+    async def test_failed_section_does_not_block_dependents(self, service):
+        async def llm(system_prompt, user_prompt, json_mode=False):
+            name = _section_of(user_prompt)
+            return "" if name == "results" else f"{name} text"
+
+        with patch.object(service, "_call_llm", llm), \
+             patch("app.services.lab_report.SECTION_RETRIES", 0):
+            report = await service.generate_report("Therapeutic Index", "dose data", "methods")
+
+        assert report["failed_sections"] == ["results"]
+        assert report["sections"]["discussion"] == "discussion text"
+        assert report["sections"]["conclusion"] == "conclusion text"
+        assert report["status"] == "complete"
@@ -0,0 +1,144 @@
+"""
+Test Suite — Local Embedding Micro-Batcher
+
+Tests that local sentence-transformer inference runs off the event loop,
+coalesces concurrent requests into shared batches, serves queries ahead of
+queued document chunks, and can load the ONNX backend.
+
+Usage:
+    pytest tests/test_local_embedding_batcher.py -v
+"""
+
+import asyncio
+import importlib
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+DIMS = 768
+
+
+class FakeModel:
+    """Blocking encoder that records each call's texts and thread."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.threads = set()
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        return np.full((len(texts), DIMS), float(len(self.calls)))
+
+
+@pytest.fixture
+def module():
+    sys.modules.pop("app.services.sentence_transformer_embeddings", None)
+    st = importlib.import_module("app.services.sentence_transformer_embeddings")
+    fake_settings = SimpleNamespace(ENABLE_EMBEDDING_CACHE=False, EMBEDDING_CACHE_TTL=60,
+                                    EMBEDDING_CACHE_MAX_SIZE=10)
+    with patch.object(st, "settings", fake_settings), \
+         patch.object(st, "LOCAL_EMBED_MAX_BATCH", 4), \
+         patch.object(st, "LOCAL_EMBED_MAX_WAIT_MS", 20):
+        yield st
+    sys.modules.pop("app.services.sentence_transformer_embeddings", None)
+
+
+def _service(module, model):
+    service = module.SentenceTransformerEmbeddingsService()
+    service.model = model
+    return service
+
+
+class TestMicroBatcher:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_share_one_encode_off_loop(self, module):
+        model = FakeModel()
+        service = _service(module, model)
+
+        vectors = await asyncio.gather(*(service.generate_embedding(f"q{i}") for i in range(3)))
+
+        assert model.calls == [["search_query: q0", "search_query: q1", "search_query: q2"]]
+        assert all(len(v) == DIMS for v in vectors)
+        assert threading.main_thread().name not in model.threads
+        service._batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_event_loop_keeps_running_during_encode(self, module):
+        service = _service(module, FakeModel(delay=0.3))
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.02)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        await service.generate_embeddings_batch(["chunk"] * 3)
+        beat.cancel()
+
+        assert ticks >= 10
+        service._batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_query_overtakes_queued_ingest(self, module):
+        model = FakeModel(delay=0.05)
+        service = _service(module, model)
+
+        ingest = asyncio.create_task(service.generate_embeddings_batch([f"chunk {i}" for i in range(16)]))
+        await asyncio.sleep(0.03)  # first micro-batch is now encoding
+        query = await service.generate_embedding("warfarin and aspirin")
+
+        assert not ingest.done()
+        chunks = await ingest
+        assert len(model.calls[0]) == 4
+        # The query rode in the second batch, ahead of the remaining 12 chunks
+        assert model.calls[1][0] == "search_query: warfarin and aspirin"
+        assert query[0] == 2.0
+        assert len(chunks) == 16 and all(c is not None for c in chunks)
+        service._batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_encode_failure_marks_batch_items_none(self, module):
+        class Broken(FakeModel):
+            def encode(self, texts, **kwargs):
+                raise RuntimeError("out of memory")
+
+        service = _service(module, Broken())
+
+        result = await service.generate_embeddings_batch(["a", "b"])
+
+        assert result == [None, None]
+        assert service.cache_stats["errors"] == 1
+        service._batcher.close()
+
+
+class TestOnnxBackend:
+
+    def test_int8_backend_loads_quantized_export(self, module):
+        loaded = {}
+
+        class FakeOnnx:
+            def __init__(self, model_name, model_file):
+                loaded.update(model=model_name, file=model_file)
+
+        with patch.object(module, "LOCAL_EMBED_BACKEND", "onnx-int8"), \
+             patch.object(module, "OnnxEncoder", FakeOnnx):
+            service = module.SentenceTransformerEmbeddingsService()
+            service._load_model()
+
+        assert loaded["file"] == "onnx/model_quantized.onnx"
+        assert isinstance(service.model, FakeOnnx)
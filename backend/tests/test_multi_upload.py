@@ -0,0 +1,181 @@
+"""
+Test Suite — Multi-Document Upload Pipeline
+
+Tests that several uploaded files are extracted concurrently, share
+full-size embedding batches and one bulk insert, report per-file progress,
+and fail independently.
+
+Usage:
+    pytest tests/test_multi_upload.py -v
+"""
+
+import asyncio
+import importlib
+import types
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIMS = 8
+
+
+class FakeLoader:
+    """Turns "<n> chunks" files into n one-chunk documents, slowly."""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    def is_supported_format(self, filename):
+        return True
+
+    def get_supported_formats(self):
+        return [".txt"]
+
+    async def load_document(self, file_content, filename, **kwargs):
+        from langchain_core.documents import Document
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if file_content == b"corrupt":
+                raise ValueError("cannot parse")
+            count = int(file_content.split()[0])
+            return [Document(page_content=f"{filename} chunk {i}", metadata={}) for i in range(count)]
+        finally:
+            self.active -= 1
+
+    async def validate_document_content(self, documents, filename, file_type):
+        return {"valid": True, "warnings": []}
+
+
+class FakeSplitter:
+    def split_documents(self, documents):
+        return documents
+
+
+class FakeEmbeddings:
+    max_batch_size = 4
+
+    def __init__(self):
+        self.batches = []
+
+    async def generate_embeddings_batch(self, texts):
+        self.batches.append(list(texts))
+        return [[0.1] * DIMS for _ in texts]
+
+
+class FakeDB:
+    def __init__(self):
+        self.inserts = []
+
+    def table(self, name):
+        assert name == "document_chunks"
+
+        def insert(rows):
+            self.inserts.append(rows)
+            return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows))
+        return SimpleNamespace(insert=insert)
+
+
+@pytest.fixture
+def rag():
+    fake_database = types.ModuleType("app.core.database")
+
+    async def async_db_execute(func, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    fake_database.async_db_execute = async_db_execute
+    # patch.dict restores sys.modules afterwards, dropping everything imported here
+    with patch.dict(sys.modules, {"app.core.database": fake_database}):
+        if not isinstance(sys.modules.get("app.core.config"), types.ModuleType):
+            sys.modules.pop("app.core.config", None)  # replaced by a mock in another test module
+        sys.modules.pop("app.services.enhanced_rag", None)
+        module = importlib.import_module("app.services.enhanced_rag")
+        service = module.EnhancedRAGService.__new__(module.EnhancedRAGService)
+        service.db = FakeDB()
+        service.document_loader = FakeLoader()
+        service.text_splitter = FakeSplitter()
+        service.embeddings_service = FakeEmbeddings()
+        with patch.object(module, "settings", SimpleNamespace(EMBEDDING_DIMENSIONS=DIMS, EMBEDDING_PROVIDER="test")), \
+             patch.object(module, "UPLOAD_INSERT_BATCH_SIZE", 5):
+            yield service
+
+
+class TestMultiUpload:
+
+    @pytest.mark.asyncio
+    async def test_files_share_embedding_batches_and_insert(self, rag):
+        files = [(b"3 chunks", "a.txt"), (b"2 chunks", "b.txt"), (b"3 chunks", "c.txt")]
+
+        results = await rag.process_uploaded_files(files, uuid4(), uuid4(), extract_concurrency=3)
+
+        assert [r.chunk_count for r in results] == [3, 2, 3]
+        assert all(r.success for r in results)
+        # 8 chunks from 3 files -> two full batches of 4, not one batch per file
+        assert [len(b) for b in rag.embeddings_service.batches] == [4, 4]
+        # Rows from all files go out in shared insert batches of 5
+        assert [len(rows) for rows in rag.db.inserts] == [5, 3]
+        assert {row["metadata"]["filename"] for row in rag.db.inserts[0]} != {"a.txt"}
+
+    @pytest.mark.asyncio
+    async def test_extraction_is_concurrent_but_bounded(self, rag):
+        files = [(b"1 chunk", f"{i}.txt") for i in range(6)]
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        await rag.process_uploaded_files(files, uuid4(), uuid4(), extract_concurrency=3)
+
+        assert rag.document_loader.max_active == 3
+        assert loop.time() - start < 6 * rag.document_loader.delay
+
+    @pytest.mark.asyncio
+    async def test_bad_file_fails_alone_with_progress(self, rag):
+        events = []
+
+        async def on_progress(event):
+            events.append((event["index"], event["stage"]))
+
+        files = [(b"2 chunks", "good.txt"), (b"corrupt", "bad.pdf"), (b"1 chunk", "also-good.txt")]
+        results = await rag.process_uploaded_files(files, uuid4(), uuid4(), progress_callback=on_progress)
+
+        assert [r.success for r in results] == [True, False, True]
+        assert "cannot parse" in results[1].message
+        assert sum(len(rows) for rows in rag.db.inserts) == 3
+        assert (1, "failed") in events
+        for index in (0, 2):
+            stages = [stage for i, stage in events if i == index]
+            assert stages == ["extracting", "extracted", "embedded", "done"]
+
+    @pytest.mark.asyncio
+    async def test_failed_insert_batch_is_reported_per_file(self, rag):
+        calls = {"n": 0}
+        original = rag.db.table
+
+        def failing_table(name):
+            table = original(name)
+            insert = table.insert
+
+            def flaky_insert(rows):
+                calls["n"] += 1
+                if calls["n"] == 2:
+                    raise RuntimeError("connection reset")
+                return insert(rows)
+            return SimpleNamespace(insert=flaky_insert)
+
+        rag.db.table = failing_table
+        files = [(b"4 chunks", "a.txt"), (b"4 chunks", "b.txt")]
+
+        results = await rag.process_uploaded_files(files, uuid4(), uuid4())
+
+        # Rows 0-4 stored (a x4, b x1); rows 5-7 (b) failed
+        assert [r.chunk_count for r in results] == [4, 1]
+        assert results[0].errors is None
+        assert any("connection reset" in e for e in results[1].errors)
@@ -0,0 +1,91 @@
+"""
+Test Suite — Page-Parallel PDF Extraction
+
+Tests that the hybrid PDF pipeline produces the same output whether pages
+are extracted in a single thread or across the process pool.
+
+Usage:
+    pytest tests/test_pdf_extraction.py -v
+"""
+
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+fitz = pytest.importorskip("fitz")
+
+
+def _make_pdf(pages=30, blank_every=10):
+    """Text pages with an occasional blank (scanned-looking) page."""
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        if i % blank_every != blank_every - 1:
+            page.insert_text((72, 72), "\n".join([f"Page {i + 1} pharmacology notes."] * 8))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def _fake_vision(items, pre_encoded=None, stats=None, semaphore=None, **kwargs):
+    if stats is not None:
+        stats.update({"images": len(items), "cache_hits": 0, "vlm_calls": len(items), "cache_hit_rate": 0.0})
+    return {item[0]: f"### {item[2]}" for item in items}
+
+
+class TestPageParallelExtraction:
+
+    @pytest.mark.asyncio
+    async def test_pool_matches_single_thread(self):
+        from app.services import vision_service
+
+        content = _make_pdf()
+        outputs = []
+        try:
+            for threshold in (10 ** 6, 1):
+                stats = {}
+                with patch.object(vision_service, "PDF_PROCESS_THRESHOLD_PAGES", threshold), \
+                     patch.object(vision_service, "PDF_PAGES_PER_RANGE", 8), \
+                     patch.object(vision_service, "_batch_vision_analyze", _fake_vision):
+                    outputs.append(await vision_service.process_pdf_hybrid(
+                        content, "notes.pdf", "", "", stats=stats
+                    ))
+                assert stats["images"] == 3
+        finally:
+            vision_service.shutdown_pdf_pool()
+
+        assert outputs[0] == outputs[1]
+        assert "## Page 1\n" in outputs[0]
+        assert "### Page 10 (full page scan)" in outputs[0]
+        # Pages stay in document order
+        assert outputs[0].index("## Page 9\n") < outputs[0].index("### Page 10 ") < outputs[0].index("## Page 11\n")
+
+    def test_plan_drops_template_images(self):
+        from app.services import vision_service
+
+        doc = fitz.open()
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 300, 300), False)
+        png = pix.tobytes("png")
+        for _ in range(4):
+            page = doc.new_page()
+            page.insert_image(fitz.Rect(0, 0, 100, 100), stream=png)
+        content = doc.tobytes()
+        doc.close()
+
+        total_pages, assignments, template_count = vision_service._plan_pdf_images(content)
+        assert total_pages == 4
+        assert assignments == {}
+        assert template_count == 1
+
+    def test_merge_vision_stats(self):
+        from app.services.vision_service import _merge_vision_stats
+
+        merged = _merge_vision_stats([
+            {"images": 3, "cache_hits": 1, "vlm_calls": 2},
+            {"images": 1, "cache_hits": 1, "vlm_calls": 0},
+        ])
+        assert merged == {"images": 4, "cache_hits": 2, "vlm_calls": 2, "cache_hit_rate": 0.5}
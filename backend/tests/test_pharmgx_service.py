@@ -231,6 +231,83 @@ class TestDrugRecommendations:
         assert "CONTRAINDICATED" in guidance or "Avoid" in guidance
 
 
+class TestStreamingParser:
+    """Test index-driven parsing of raw, compressed and file-object uploads"""
+
+    RAW = b"""# 23andMe Raw Data
+# rsid\tchromosome\tposition\tgenotype
+rs548049170\t1\t69869\tTT
+rs1065852\t22\t42522618\tCT
+rs4244285\t10\t94762534\tAG
+rs9923231\t16\t31104684\t--
+"""
+
+    def test_parse_ancestry_split_alleles(self):
+        """Test AncestryDNA allele1/allele2 columns are joined"""
+        from app.services.pharmgx_service import PharmGxService
+
+        service = PharmGxService()
+        file_text = "#AncestryDNA\nrsid\tchromosome\tposition\tallele1\tallele2\nrs4244285\t10\t94762534\tA\tG\n"
+
+        genotypes = service._parse_genetic_file(file_text, "AncestryDNA.txt")
+
+        assert genotypes == {"rs4244285": "AG"}
+
+    def test_parse_skips_no_calls(self):
+        """Test '--' no-call genotypes are dropped"""
+        from app.services.pharmgx_service import PharmGxService
+
+        genotypes = PharmGxService()._parse_genetic_file(self.RAW, "raw.txt")
+
+        assert genotypes == {"rs1065852": "CT", "rs4244285": "AG"}
+
+    def test_parse_gzip_and_zip(self):
+        """Test compressed uploads parse the same as plain text"""
+        import gzip
+        import io
+        import zipfile
+        from app.services.pharmgx_service import PharmGxService
+
+        service = PharmGxService()
+        service.CHUNK_SIZE = 16  # Force lines to straddle chunk boundaries
+
+        zipped = io.BytesIO()
+        with zipfile.ZipFile(zipped, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("genome_raw.txt", self.RAW)
+
+        expected = service._parse_genetic_file(self.RAW, "raw.txt")
+        assert service._parse_genetic_file(gzip.compress(self.RAW), "raw.txt.gz") == expected
+        assert service._parse_genetic_file(zipped.getvalue(), "raw.zip") == expected
+
+    def test_parse_file_object(self):
+        """Test disk-backed uploads are memory-mapped and left open"""
+        import tempfile
+        from app.services.pharmgx_service import PharmGxService
+
+        with tempfile.TemporaryFile() as upload:
+            upload.write(self.RAW)
+            upload.seek(0)
+
+            genotypes = PharmGxService()._parse_genetic_file(upload, "raw.txt")
+
+            assert genotypes["rs1065852"] == "CT"
+            assert not upload.closed
+
+    @pytest.mark.asyncio
+    async def test_drug_lookup_reuses_cached_genotype(self):
+        """Test single_drug_lookup does not re-parse a file already reported on"""
+        from app.services.pharmgx_service import PharmGxService
+
+        service = PharmGxService()
+        await service.generate_report(self.RAW, "raw.txt")
+
+        with patch.object(service, '_parse_genetic_file') as mock_parse:
+            result = await service.single_drug_lookup(self.RAW, "raw.txt", "codeine")
+
+        mock_parse.assert_not_called()
+        assert result["success"] is True
+
+
 class TestReportGeneration:
     """Test full report generation"""
 
@@ -0,0 +1,293 @@
+"""
+Test Suite — Research Task Queue
+
+Tests leased claiming of background research tasks, push wakeups, retry on
+failure and checkpoint/resume of the deep research graph.
+
+Usage:
+    pytest tests/test_research_queue.py -v
+"""
+
+import asyncio
+import importlib
+import types
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeQuery:
+    def __init__(self, db, fields):
+        self.db = db
+        self.fields = fields
+        self.filters = {}
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def execute(self):
+        with self.db.lock:
+            rows = [r for r in self.db.rows.values()
+                    if all(r.get(k) == v for k, v in self.filters.items())]
+            for row in rows:
+                row.update(self.fields)
+            return SimpleNamespace(data=[dict(r) for r in rows])
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db = db
+
+    def insert(self, data):
+        row = {"id": str(uuid4()), "attempts": 0, "lease_owner": None, "checkpoint": None,
+               "created_at": datetime.utcnow().isoformat(), **data}
+        self.db.rows[row["id"]] = row
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[dict(row)]))
+
+    def update(self, fields):
+        return FakeQuery(self.db, fields)
+
+
+class FakeDB:
+    """In-memory research_tasks table with the claim_research_task RPC."""
+
+    def __init__(self):
+        import threading
+        self.rows = {}
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        assert name == "research_tasks"
+        return FakeTable(self)
+
+    def rpc(self, name, params):
+        assert name == "claim_research_task"
+
+        def claim():
+            with self.lock:
+                pending = sorted((r for r in self.rows.values() if r["status"] == "PENDING"),
+                                 key=lambda r: r["created_at"])
+                if not pending:
+                    return SimpleNamespace(data=[])
+                row = pending[0]
+                row.update(status="RUNNING", lease_owner=params["p_worker_id"], attempts=row["attempts"] + 1)
+                return SimpleNamespace(data=[dict(row)])
+
+        return SimpleNamespace(execute=claim)
+
+
+@pytest.fixture
+def queue_module():
+    fake_database = types.ModuleType("app.core.database")
+
+    async def async_db_execute(func, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    fake_database.async_db_execute = async_db_execute
+    with patch.dict(sys.modules, {"app.core.database": fake_database}):
+        sys.modules.pop("app.services.research_tasks", None)
+        yield importlib.import_module("app.services.research_tasks")
+    sys.modules.pop("app.services.research_tasks", None)
+
+
+def _state(report="# Report"):
+    from app.services.deep_research import ResearchState
+    return ResearchState(research_question="q", final_report=report, status="complete")
+
+
+def _service(module, db, research, **kwargs):
+    svc = module.BackgroundResearchService(db, poll_interval=60, **kwargs)
+    svc._container = SimpleNamespace(get=lambda name: {
+        "deep_research_service": research,
+        "chat_service": SimpleNamespace(add_message=AsyncMock()),
+    }[name])
+    return svc
+
+
+async def _wait_for(predicate, timeout=5):
+    for _ in range(int(timeout / 0.02)):
+        if predicate():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not reached")
+
+
+class TestTaskQueue:
+
+    @pytest.mark.asyncio
+    async def test_new_task_wakes_idle_worker(self, queue_module):
+        db = FakeDB()
+        research = SimpleNamespace(run_research=AsyncMock(return_value=_state()))
+        svc = _service(queue_module, db, research)
+
+        loop = asyncio.create_task(svc.worker_loop())
+        try:
+            await asyncio.sleep(0.1)  # worker is now idle, waiting up to 60s
+            task_id = await svc.create_task(uuid4(), uuid4(), "Does metformin extend lifespan?")
+            await _wait_for(lambda: db.rows[task_id]["status"] == "COMPLETED", timeout=2)
+        finally:
+            loop.cancel()
+            await svc.shutdown()
+
+        row = db.rows[task_id]
+        assert row["result_report"] == "# Report"
+        assert row["lease_owner"] is None and row["checkpoint"] is None
+        research.run_research.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_claims_only_when_a_slot_is_free(self, queue_module):
+        db = FakeDB()
+        release = asyncio.Event()
+
+        async def run_research(**kwargs):
+            await release.wait()
+            return _state()
+
+        svc = _service(queue_module, db, SimpleNamespace(run_research=run_research), max_concurrent=1)
+        first = await svc.create_task(uuid4(), uuid4(), "first")
+        second = await svc.create_task(uuid4(), uuid4(), "second")
+
+        loop = asyncio.create_task(svc.worker_loop())
+        try:
+            await _wait_for(lambda: db.rows[first]["status"] == "RUNNING")
+            await asyncio.sleep(0.1)
+            # The second task is not leased while the only slot is busy
+            assert db.rows[second]["status"] == "PENDING"
+            release.set()
+            await _wait_for(lambda: db.rows[second]["status"] == "COMPLETED")
+        finally:
+            loop.cancel()
+            await svc.shutdown()
+        assert db.rows[first]["attempts"] == db.rows[second]["attempts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_requeues_then_fails(self, queue_module):
+        db = FakeDB()
+        failed = _state(report="")
+        failed.status, failed.error_message = "error", "PubMed unavailable"
+        research = SimpleNamespace(run_research=AsyncMock(return_value=failed))
+        svc = _service(queue_module, db, research, max_attempts=2)
+        task_id = await svc.create_task(uuid4(), uuid4(), "q")
+
+        loop = asyncio.create_task(svc.worker_loop())
+        try:
+            await _wait_for(lambda: db.rows[task_id]["status"] == "FAILED")
+        finally:
+            loop.cancel()
+            await svc.shutdown()
+
+        assert research.run_research.await_count == 2
+        assert db.rows[task_id]["error_detail"] == "PubMed unavailable"
+
+    @pytest.mark.asyncio
+    async def test_checkpoints_are_saved_under_lease(self, queue_module):
+        db = FakeDB()
+        svc = _service(queue_module, db, None)
+        task_id = await svc.create_task(uuid4(), uuid4(), "q")
+        task = await svc.claim_task()
+        saved = []
+
+        async def run_research(question, user_id, checkpoint, on_checkpoint):
+            state = _state()
+            state.completed_nodes.append("planner")
+            await on_checkpoint("planner", state)
+            saved.append(dict(db.rows[task_id]))
+            return state
+
+        svc._container = SimpleNamespace(get=lambda name: {
+            "deep_research_service": SimpleNamespace(run_research=run_research),
+            "chat_service": SimpleNamespace(add_message=AsyncMock()),
+        }[name])
+        await svc._process_task(task)
+
+        assert saved[0]["checkpoint_node"] == "planner"
+        assert saved[0]["checkpoint"]["completed_nodes"] == ["planner"]
+
+        # A task whose lease moved to another worker cannot be checkpointed
+        db.rows[task_id].update(status="RUNNING", lease_owner="someone-else")
+        lost = await svc._update_leased(task_id, {"checkpoint": {}})
+        assert lost is False
+
+
+class TestResearchResume:
+
+    @pytest.fixture
+    def service(self):
+        from app.services.deep_research import DeepResearchService
+        svc = DeepResearchService.__new__(DeepResearchService)
+        svc._container = None
+        return svc
+
+    @staticmethod
+    def _stub_nodes(service, calls):
+        from app.services.deep_research import Finding
+
+        async def planner(state):
+            calls.append("planner")
+            state.plan_overview = "plan"
+            return state
+
+        async def researcher(state):
+            calls.append("researcher")
+            state.findings.append(Finding(title="Trial", url="https://example.org", source="PubMed",
+                                          _pubmed_data={"pmid": "1"}))
+            return state
+
+        async def reviewer(state):
+            calls.append("reviewer")
+            return state
+
+        async def writer(state):
+            calls.append("writer")
+            state.final_report = f"# Report from {len(state.findings)} findings"
+            state.status = "complete"
+            return
+            yield
+
+        service._node_planner = planner
+        service._node_researcher = researcher
+        service._node_reviewer = reviewer
+        service._node_writer_streaming = writer
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_roundtrip_and_resume_skips_done_nodes(self, service):
+        from app.services.deep_research import Finding, ResearchState
+
+        calls, checkpoints = [], []
+
+        async def on_checkpoint(node, state):
+            checkpoints.append((node, state.to_checkpoint()))
+
+        self._stub_nodes(service, calls)
+
+        class Crash(Exception):
+            pass
+
+        async def crashing_reviewer(state):
+            raise Crash("worker died")
+
+        service._node_reviewer = crashing_reviewer
+        first = await service.run_research("q", uuid4(), on_checkpoint=on_checkpoint)
+        assert first.status == "error"
+        assert [node for node, _ in checkpoints] == ["planner", "researcher"]
+
+        restored = ResearchState.from_checkpoint(checkpoints[-1][1])
+        assert isinstance(restored.findings[0], Finding)
+        assert restored.findings[0]._pubmed_data == {"pmid": "1"}
+
+        calls.clear()
+        self._stub_nodes(service, calls)
+        state = await service.run_research("q", uuid4(), checkpoint=checkpoints[-1][1], on_checkpoint=on_checkpoint)
+
+        assert calls == ["reviewer", "writer"]
+        assert state.status == "complete"
+        assert state.final_report == "# Report from 1 findings"
+        assert state.completed_nodes == ["planner", "researcher", "reviewer", "writer"]
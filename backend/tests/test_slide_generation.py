@@ -0,0 +1,176 @@
+"""
+Test Suite — Concurrent Slide Generation
+
+Tests that SlideService.generate_slides refines slides and fetches images
+concurrently, keeps per-slide contextual memory, and assembles the deck
+off the event loop while reporting progress.
+
+Usage:
+    pytest tests/test_slide_generation.py -v
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("pptx")
+
+PIXEL = (
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde'
+    b'\x00\x00\x00\x0cIDATx\x9cc\xf8\xff\xff?\x00\x05\xfe\x02\xfe\xdcD\x01\x14\x00\x00\x00\x00IEND\xaeB`\x82'
+)
+
+
+class FakeAI:
+    """Researcher/reviewer stand-in that records prompts and in-flight calls."""
+
+    def __init__(self, delay=0.05, empty_titles=()):
+        self.delay = delay
+        self.empty_titles = set(empty_titles)
+        self.prompts = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate(self, mode, messages, max_tokens, temperature):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        title = re.search(r"Slide title: (.*)", prompt).group(1)
+        bullets = [] if title in self.empty_titles else [{"bullet": f"{title} finding", "context": ""}]
+        return json.dumps({
+            "subtitle_takeaway": f"{title} takeaway",
+            "supporting_data": bullets,
+            "speaker_notes": "notes",
+            "citations": [],
+        })
+
+
+class FakeImages:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch_image_from_pollinations(self, prompt, model, width, height, seed):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return PIXEL
+
+
+def _outline(n=8):
+    slides = [{"layout": "title", "title": "Deck"}]
+    for i in range(1, n):
+        slides.append({
+            "layout": "bullets_only",
+            "title": f"Slide {i}",
+            "subtitle_takeaway": f"Outline takeaway {i}",
+            "bullets": [f"point {i}"],
+            "image_prompt": f"molecule render {i}",
+        })
+    return {"title": "Deck", "theme": "ocean_gradient", "slides": slides}
+
+
+@pytest.fixture(autouse=True)
+def no_research_tools():
+    """generate_slides never searches; keep ResearchTools from reading settings."""
+    with patch("app.services.slide_service.ResearchTools", MagicMock):
+        yield
+
+
+@pytest.fixture
+def service():
+    from app.services.slide_service import SlideService
+    return SlideService(FakeAI(), FakeImages())
+
+
+class TestGenerateSlides:
+
+    @pytest.mark.asyncio
+    async def test_refinement_and_images_run_concurrently(self, service):
+        events = []
+
+        async def on_progress(data):
+            events.append(data)
+
+        t0 = time.monotonic()
+        pptx_bytes = await service.generate_slides(_outline(8), on_progress=on_progress)
+        elapsed = time.monotonic() - t0
+
+        assert pptx_bytes[:2] == b"PK"
+        # 7 content slides x 2 LLM calls + 7 images, serially ~1.05s
+        assert elapsed < 0.6
+        assert service.ai.peak > 1
+        assert service.image_gen.calls == 7
+
+        steps = [e["step"] for e in events]
+        assert steps[-1] == "complete"
+        assert steps.count("content") == 8
+        assert steps.count("images") == 7
+        assembly = [e for e in events if e["step"] == "assembly"]
+        assert assembly[-1]["current"] == assembly[-1]["total"] == 8
+        assert steps.index("assembly") > max(i for i, s in enumerate(steps) if s in ("content", "images"))
+
+    @pytest.mark.asyncio
+    async def test_previous_slide_memory_comes_from_outline(self, service):
+        await service.generate_slides(_outline(4), generate_images=False)
+
+        researcher = [p for p in service.ai.prompts if "Researcher-Writer" in p]
+        slide_2 = next(p for p in researcher if "Slide title: Slide 2" in p)
+        assert "PREVIOUS SLIDE SUMMARY: Slide 'Slide 1': Outline takeaway 1" in slide_2
+        slide_1 = next(p for p in researcher if "Slide title: Slide 1" in p)
+        assert "PREVIOUS SLIDE SUMMARY: Slide 'Deck'" in slide_1
+        assert service.image_gen.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_empty_slide_is_retried(self):
+        from app.services.slide_service import SlideService
+
+        ai = FakeAI(empty_titles={"Slide 2"})
+        service = SlideService(ai, FakeImages())
+        events = []
+
+        async def on_progress(data):
+            events.append(data)
+
+        outline = _outline(4)
+        outline["slides"][2]["bullets"] = []
+        await service.generate_slides(outline, generate_images=False, on_progress=on_progress)
+
+        assert any("Slide title: Slide 2 (RETRY)" in p for p in ai.prompts)
+        assert [e["current"] for e in events if e["step"] == "content_retry"] == [3]
+
+    @pytest.mark.asyncio
+    async def test_assembly_runs_off_event_loop(self, service):
+        threads = []
+        original = service.design.assemble_pptx
+
+        def assemble(**kwargs):
+            threads.append(threading.current_thread())
+            return original(**kwargs)
+
+        service.design.assemble_pptx = assemble
+        await service.generate_slides(_outline(3), generate_images=False)
+
+        assert threads and threads[0] is not threading.main_thread()
+
+    @pytest.mark.asyncio
+    async def test_diagram_prompts_and_failures_yield_no_image(self, service):
+        async def failing(**kwargs):
+            raise RuntimeError("pollinations down")
+
+        assert await service._fetch_slide_image(1, "flowchart of the workflow", "corporate") is None
+        service.image_gen.fetch_image_from_pollinations = failing
+        assert await service._fetch_slide_image(1, "a molecule", "corporate") is None
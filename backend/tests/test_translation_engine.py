@@ -0,0 +1,234 @@
+"""
+Test Suite — Batched Translation Engine
+
+Tests all-languages-in-one-call translation, packing of short strings,
+the translation memory and the resumable backfill job.
+
+Usage:
+    pytest tests/test_translation_engine.py -v
+"""
+
+import asyncio
+import importlib
+import json
+import types
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeQuery:
+    """Just enough of the Supabase query builder for these tables."""
+
+    def __init__(self, rows, key, action="select", payload=None):
+        self.rows = rows
+        self.key = key
+        self.action = action
+        self.payload = payload
+        self.filters = []
+        self._order = None
+        self._limit = None
+
+    def select(self, *columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r[column] > value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def is_(self, column, value):
+        assert value == "null"
+        self.filters.append(lambda r: r.get(column) is None)
+        return self
+
+    def order(self, column, desc=False):
+        self._order = column
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def execute(self):
+        if self.action == "upsert":
+            for row in (self.payload if isinstance(self.payload, list) else [self.payload]):
+                self.rows[tuple(row[k] for k in self.key)] = dict(row)
+            return SimpleNamespace(data=[])
+        matched = [r for r in self.rows.values() if all(f(r) for f in self.filters)]
+        if self.action == "update":
+            for r in matched:
+                r.update(self.payload)
+        if self._order:
+            matched.sort(key=lambda r: r[self._order])
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        return SimpleNamespace(data=[dict(r) for r in matched])
+
+
+class FakeDB:
+    KEYS = {
+        "translation_memory": ("source_hash", "target_language"),
+        "translation_backfill_progress": ("job",),
+        "messages": ("id",),
+        "conversations": ("id",),
+    }
+
+    def __init__(self):
+        self.tables = {name: {} for name in self.KEYS}
+
+    def table(self, name):
+        rows, key = self.tables[name], self.KEYS[name]
+        return SimpleNamespace(
+            select=lambda *c: FakeQuery(rows, key).select(*c),
+            update=lambda payload: FakeQuery(rows, key, "update", payload),
+            upsert=lambda payload, on_conflict=None: FakeQuery(rows, key, "upsert", payload),
+        )
+
+
+class FakeLLM:
+    """Answers structured translation requests as "[lang] text"."""
+
+    def __init__(self, drop_ids=()):
+        self.calls = []
+        self.drop_ids = set(drop_ids)
+
+    async def __call__(self, messages, max_tokens):
+        texts = json.loads(messages[1]["content"])
+        system = messages[0]["content"]
+        langs = [code for code in ("en", "es", "fr", "de", "pt", "zh") if f'"{code}"' in system]
+        self.calls.append((dict(texts), langs))
+        reply = {}
+        for i, text in texts.items():
+            if len(self.calls) == 1 and int(i) in self.drop_ids:
+                continue
+            reply[i] = {lang: f"[{lang}] {text}" for lang in langs}
+        return reply
+
+
+@pytest.fixture
+def module():
+    fake_database = types.ModuleType("app.core.database")
+
+    async def async_db_execute(func, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    fake_database.async_db_execute = async_db_execute
+    with patch.dict(sys.modules, {"app.core.database": fake_database}):
+        sys.modules.pop("app.services.translation_service", None)
+        translation = importlib.import_module("app.services.translation_service")
+        translation.TranslationMemory._cache.clear()
+        with patch.object(translation, "settings", SimpleNamespace(MISTRAL_API_KEY="test-key")):
+            yield translation
+    sys.modules.pop("app.services.translation_service", None)
+
+
+def _service(module, db, llm):
+    service = module.TranslationService(db)
+    service._complete_json = llm
+    return service
+
+
+class TestBatchedTranslation:
+
+    @pytest.mark.asyncio
+    async def test_all_languages_in_one_call(self, module):
+        llm = FakeLLM()
+        service = _service(module, FakeDB(), llm)
+
+        result = await service.translate_to_all_languages("Take with food.")
+
+        assert len(llm.calls) == 1
+        assert set(result) == set(module.SUPPORTED_LANGUAGES)
+        assert result["en"] == "Take with food."
+        assert result["de"] == "[de] Take with food."
+
+    @pytest.mark.asyncio
+    async def test_short_strings_are_packed(self, module):
+        llm = FakeLLM()
+        service = _service(module, FakeDB(), llm)
+        titles = [f"Dosing question {i}" for i in range(30)] + ["Dosing question 0"]
+
+        results = await service.translate_many(titles, targets=["es"])
+
+        assert len(llm.calls) == 1
+        assert len(llm.calls[0][0]) == 30  # duplicate sent once
+        assert [r["es"] for r in results] == [f"[es] {t}" for t in titles]
+
+    @pytest.mark.asyncio
+    async def test_long_text_splits_languages_to_fit_output(self, module):
+        llm = FakeLLM()
+        service = _service(module, FakeDB(), llm)
+        text = "Warfarin interacts with many antibiotics. " * 60
+        tokens = module.count_tokens(text)
+
+        with patch.object(module, "TRANSLATION_MAX_OUTPUT_TOKENS", int(tokens * 1.4 * 2) + 60):
+            result = await service.translate_to_all_languages(text)
+
+        assert [len(langs) for _, langs in llm.calls] == [2, 2, 1]
+        assert len(result) == len(module.SUPPORTED_LANGUAGES)
+
+    @pytest.mark.asyncio
+    async def test_dropped_items_are_retried_alone(self, module):
+        llm = FakeLLM(drop_ids={1})
+        service = _service(module, FakeDB(), llm)
+
+        results = await service.translate_many(["one", "two", "three"], targets=["fr"])
+
+        assert [r["fr"] for r in results] == ["[fr] one", "[fr] two", "[fr] three"]
+        assert list(llm.calls[1][0].values()) == ["two"]
+
+    @pytest.mark.asyncio
+    async def test_memory_avoids_repeat_calls(self, module):
+        db = FakeDB()
+        llm = FakeLLM()
+        service = _service(module, db, llm)
+        await service.translate_to_all_languages("Store below 25°C.")
+        await service.translate_to_all_languages("Store below 25°C.")
+        assert len(llm.calls) == 1
+        assert len(db.tables["translation_memory"]) == 5
+
+        # A new process (empty in-process cache) still reads the persistent memory
+        module.TranslationMemory._cache.clear()
+        fresh_llm = FakeLLM()
+        result = await _service(module, db, fresh_llm).translate_to_all_languages("Store below 25°C.")
+        assert fresh_llm.calls == []
+        assert result["pt"] == "[pt] Store below 25°C."
+
+
+class TestBackfill:
+
+    @pytest.mark.asyncio
+    async def test_backfill_resumes_from_saved_cursor(self, module):
+        db = FakeDB()
+        for i in range(5):
+            row_id = str(uuid4())
+            db.tables["messages"][(row_id,)] = {"id": row_id, "content": f"message {i}", "translations": None}
+        llm = FakeLLM()
+
+        first = module.TranslationBackfill(_service(module, db, llm), page_size=2)
+        progress = await first.run("messages", max_pages=1)
+        assert progress["processed"] == 2 and progress["status"] == "running"
+
+        # A new run (e.g. after a crash) continues from the stored cursor
+        second = module.TranslationBackfill(_service(module, db, llm), page_size=2)
+        progress = await second.run("messages")
+
+        assert progress["processed"] == 5 and progress["failed"] == 0
+        assert db.tables["translation_backfill_progress"][("messages",)]["status"] == "done"
+        rows = db.tables["messages"].values()
+        assert all(set(r["translations"]) == set(module.SUPPORTED_LANGUAGES) for r in rows)
+        assert len(llm.calls) == 3
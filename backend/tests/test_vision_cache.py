@@ -0,0 +1,150 @@
+"""
+Test Suite — VLM Image Description Cache
+
+Tests the content-addressed description cache and its use in the
+hybrid vision pipeline's batch analyzer.
+
+Usage:
+    pytest tests/test_vision_cache.py -v
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    from app.services.vision_cache import VisionDescriptionCache
+    c = VisionDescriptionCache(path=str(tmp_path / "vision.sqlite"), max_entries=3)
+    yield c
+    c.close()
+
+
+def _ok_response(text):
+    resp = MagicMock()
+    resp.status_code = 200
+    resp.json.return_value = {"choices": [{"message": {"content": text}}]}
+    return resp
+
+
+class TestVisionDescriptionCache:
+    """Persistence, eviction and counters"""
+
+    def test_put_and_get(self, cache):
+        cache.put("k1", "a chart")
+        assert cache.get("k1") == "a chart"
+        assert cache.get("missing") is None
+        assert cache.stats["hits"] == 1
+        assert cache.stats["misses"] == 1
+
+    def test_persists_across_instances(self, tmp_path):
+        from app.services.vision_cache import VisionDescriptionCache
+        path = str(tmp_path / "vision.sqlite")
+
+        first = VisionDescriptionCache(path=path)
+        first.put("k1", "a diagram")
+        first.close()
+
+        second = VisionDescriptionCache(path=path)
+        assert second.get("k1") == "a diagram"
+        second.close()
+
+    def test_evicts_least_recently_used(self, cache):
+        for i in range(3):
+            cache.put(f"k{i}", f"desc {i}")
+        # Touch k0 so k1 becomes the oldest entry
+        cache.get("k0")
+        cache.put("k3", "desc 3")
+
+        assert cache.size() == 3
+        assert cache.get("k1") is None
+        assert cache.get("k0") == "desc 0"
+        assert cache.stats["evictions"] == 1
+
+    def test_key_depends_on_prompt_version(self):
+        from app.services.vision_cache import image_key, prompt_version
+        v1 = prompt_version("model-a", "describe")
+        v2 = prompt_version("model-a", "describe differently")
+        assert image_key("AAAA", v1) != image_key("AAAA", v2)
+        assert image_key("AAAA", v1) == image_key("AAAA", v1)
+
+    def test_unwritable_path_disables_cache(self, tmp_path):
+        from app.services.vision_cache import VisionDescriptionCache
+        blocker = tmp_path / "file"
+        blocker.write_text("x")
+        c = VisionDescriptionCache(path=str(blocker / "sub" / "vision.sqlite"))
+        c.put("k1", "desc")
+        assert c.get("k1") is None
+
+
+class TestBatchVisionAnalyzeCache:
+    """Cache lookups happen before any VLM request is queued"""
+
+    @pytest.mark.asyncio
+    async def test_hits_skip_vlm_and_duplicates_share_a_call(self, cache):
+        from app.services import vision_service
+        from app.services.vision_cache import image_key
+
+        cache.put(image_key("CACHED", vision_service.PROMPT_VERSION), "cached description")
+
+        items = [(0, None, "Page 1"), (1, None, "Page 2"), (2, None, "Page 3")]
+        pre_encoded = ["CACHED", "NEW", "NEW"]
+        stats = {}
+
+        client = AsyncMock()
+        client.post = AsyncMock(return_value=_ok_response("fresh description"))
+        client.__aenter__.return_value = client
+
+        with patch.object(vision_service, "vision_cache", cache), \
+             patch.object(vision_service.httpx, "AsyncClient", return_value=client):
+            results = await vision_service._batch_vision_analyze(
+                items, pre_encoded=pre_encoded, api_key="test-key", stats=stats
+            )
+
+        assert client.post.await_count == 1
+        assert results[0] == "### Page 1\ncached description"
+        assert results[1] == "### Page 2\nfresh description"
+        assert results[2] == "### Page 3\nfresh description"
+        assert stats == {"images": 3, "cache_hits": 1, "vlm_calls": 1, "cache_hit_rate": 0.333}
+        # Successful descriptions are written back
+        assert cache.get(image_key("NEW", vision_service.PROMPT_VERSION)) == "fresh description"
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(self, cache):
+        from app.services import vision_service
+        from app.services.vision_cache import image_key
+
+        error = MagicMock()
+        error.status_code = 500
+        client = AsyncMock()
+        client.post = AsyncMock(return_value=error)
+        client.__aenter__.return_value = client
+
+        with patch.object(vision_service, "vision_cache", cache), \
+             patch.object(vision_service.httpx, "AsyncClient", return_value=client):
+            results = await vision_service._batch_vision_analyze(
+                [(0, None, "Image")], pre_encoded=["BROKEN"], api_key="test-key"
+            )
+
+        assert results[0] == "[Image: API Error 500]"
+        assert cache.get(image_key("BROKEN", vision_service.PROMPT_VERSION)) is None
+
+    @pytest.mark.asyncio
+    async def test_cached_results_served_without_api_key(self, cache):
+        from app.services import vision_service
+        from app.services.vision_cache import image_key
+
+        cache.put(image_key("CACHED", vision_service.PROMPT_VERSION), "cached description")
+
+        with patch.object(vision_service, "vision_cache", cache), \
+             patch.object(vision_service, "MISTRAL_API_KEY", ""):
+            results = await vision_service._batch_vision_analyze(
+                [(0, None, "Image"), (1, None, "Other")], pre_encoded=["CACHED", "NEW"]
+            )
+
+        assert results == {0: "### Image\ncached description"}